@@ -7,3 +7,4 @@ load_dotenv()
 
 # Constants
 SKYAI_AGENT_ID = "89256c79-bdfe-435a-8729-4d1e9a9ebca2"
+SKYAI_API_URL = os.getenv("SKYAI_API_URL", "https://api.skysql.com/copilot/v1")
@@ -10,6 +10,7 @@ load_dotenv(override=True)
 import os
 import mariadb
 import logging
+import threading
 from dotenv import load_dotenv
 
 # Configure logging
@@ -19,6 +20,23 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv(override=True)
 
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _connection_params(database: str = None) -> dict:
+    return dict(
+        host=os.getenv("SKYSQL_HOST"),
+        port=int(os.getenv("SKYSQL_PORT", 3306)),
+        user=os.getenv("SKYSQL_USERNAME"),
+        password=os.getenv("SKYSQL_PASSWORD"),
+        database=database,
+        ssl=True,
+        ssl_verify_cert=False,
+        connect_timeout=10
+    )
+
+
 def get_db_connection(database: str = None):
     """
     Get MariaDB connection from environment variables.
@@ -26,19 +44,62 @@ def get_db_connection(database: str = None):
     Throws an exception if connection fails.
     """
     try:
-        conn = mariadb.connect(
-            host=os.getenv("SKYSQL_HOST"),
-            port=int(os.getenv("SKYSQL_PORT", 3306)),
-            user=os.getenv("SKYSQL_USERNAME"),
-            password=os.getenv("SKYSQL_PASSWORD"),
-            database=database,
-            ssl=True,
-            ssl_verify_cert=False,
-            connect_timeout=10
-        )
+        conn = mariadb.connect(**_connection_params(database))
         logger.info(f"Successfully connected to MariaDB/SkySQL (db={database})")
         return conn
     except Exception as e:
         logger.error(f"FATAL: DB CONNECTION FAILED (db={database}): {e}")
         logger.error("Please verify SKYSQL_HOST, SKYSQL_USERNAME, SKYSQL_PASSWORD and network access.")
         raise e
+
+
+def get_host_connection(host: str, port: int = None, database: str = None):
+    """
+    Connection to another server of the topology (e.g. a replica) with the
+    same credentials.
+    """
+    params = _connection_params(database)
+    params["host"] = host
+    if port:
+        params["port"] = int(port)
+    return mariadb.connect(**params)
+
+
+def get_pooled_connection(database: str = None):
+    """
+    Get a connection from the per-database pool (DB_POOL_SIZE connections,
+    default 5). close() returns it to the pool with its session state reset.
+    Falls back to a new connection when every pooled one is in use.
+    """
+    key = database or ""
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            params = {k: v for k, v in _connection_params(database).items() if v is not None}
+            pool = mariadb.ConnectionPool(
+                pool_name=f"pilot_{key or 'default'}",
+                pool_size=int(os.getenv("DB_POOL_SIZE", 5)),
+                pool_reset_connection=True,
+                **params
+            )
+            _pools[key] = pool
+            logger.info(f"Created MariaDB connection pool (db={database}, size={pool.max_size})")
+    try:
+        conn = pool.get_connection()
+    except mariadb.PoolError:
+        conn = None
+    if conn is None:
+        logger.warning(f"Connection pool exhausted (db={database}), opening a dedicated connection")
+        return get_db_connection(database)
+    return conn
+
+
+def close_pools():
+    """Close every pooled connection (application shutdown)"""
+    with _pools_lock:
+        for pool in _pools.values():
+            try:
+                pool.close()
+            except Exception as e:
+                logger.warning(f"Failed to close connection pool {pool.pool_name}: {e}")
+        _pools.clear()
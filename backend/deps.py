@@ -15,6 +15,7 @@ logger = logging.getLogger(__name__)
 from services.index import IndexSimulationService
 from services.rewriter import QueryRewriterService
 from services.prediction import PredictionService
+from services.batch import BatchAnalysisService
 from error_factory import ErrorFactory, ConfigurationError
 
 # Global Instances
@@ -32,10 +33,11 @@ mcp_service = None
 prediction_service = None
 index_service = IndexSimulationService() # No deps needed for instantiation
 rewriter_service = None
+batch_service = None
 
 
 def init_rag_services():
-    global rag_enabled, embedding_service, vector_store, suggestion_service, mcp_service, prediction_service, rewriter_service
+    global rag_enabled, embedding_service, vector_store, suggestion_service, mcp_service, prediction_service, rewriter_service, batch_service
     
     try:
         logger.info("[DEPS] Initializing Real RAG Services...")
@@ -59,6 +61,7 @@ def init_rag_services():
         # Initialize Business Services with RAG dependencies
         prediction_service = PredictionService(embedding_service, vector_store, False) # Real mode
         rewriter_service = QueryRewriterService(embedding_service, vector_store, False, index_service)
+        batch_service = BatchAnalysisService(embedding_service, vector_store, prediction_service, rewriter_service)
         
         rag_enabled = True
         logger.info(f"RAG Services initialized successfully.")
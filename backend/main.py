@@ -6,6 +6,7 @@ import os
 import sys
 import io
 import logging
+from datetime import datetime
 from contextlib import asynccontextmanager
 from apscheduler.schedulers.background import BackgroundScheduler
 
@@ -71,6 +72,12 @@ from routers import (
 # Import Timing Middleware
 from middleware.timing_middleware import TimingMiddleware
 from services.query_poller import get_poller
+from services.plan_watcher import get_plan_watcher
+from services.llm_gateway import llm_gateway
+from database import close_pools
+from services.git_schema import git_schema_loader
+from services.table_stats import get_table_stats
+from services.wait_sampler import get_wait_sampler
 
 # Global scheduler instance
 scheduler: BackgroundScheduler = None
@@ -83,7 +90,7 @@ async def lifespan(app: FastAPI):
     # Startup: Initialize and start the query poller
     if os.getenv("ENABLE_QUERY_POLLER", "true").lower() == "true":
         logger.info("🚀 Starting Background Query Poller...")
-        scheduler = BackgroundScheduler()
+        scheduler = scheduler or BackgroundScheduler()
         poller = get_poller()
         poller.is_running = True
         
@@ -101,6 +108,69 @@ async def lifespan(app: FastAPI):
     else:
         logger.info("⏸️  Query Poller disabled (ENABLE_QUERY_POLLER=false)")
     
+    # Startup: plan-regression watcher (EXPLAIN only, jittered interval)
+    if os.getenv("ENABLE_PLAN_WATCHER", "true").lower() == "true":
+        watcher = get_plan_watcher()
+        if scheduler is None:
+            scheduler = BackgroundScheduler()
+        scheduler.add_job(
+            watcher.run_once,
+            'interval',
+            seconds=watcher.interval_seconds,
+            jitter=int(watcher.interval_seconds * watcher.jitter),
+            id='plan_watcher',
+            name='Plan Regression Watcher',
+            max_instances=1
+        )
+        if not scheduler.running:
+            scheduler.start()
+        watcher.is_running = True
+        logger.info(f"✅ Plan Watcher started (interval: {watcher.interval_seconds}s, top {watcher.top_n})")
+    else:
+        logger.info("⏸️  Plan Watcher disabled (ENABLE_PLAN_WATCHER=false)")
+    
+    # Startup: table statistics snapshots (archiving growth/access deltas)
+    if os.getenv("ENABLE_TABLE_STATS", "true").lower() == "true":
+        table_stats = get_table_stats()
+        if scheduler is None:
+            scheduler = BackgroundScheduler()
+        scheduler.add_job(
+            table_stats.run_once,
+            'interval',
+            seconds=table_stats.interval_seconds,
+            id='table_stats',
+            name='Table Statistics Snapshots',
+            max_instances=1,
+            next_run_time=datetime.now()
+        )
+        if not scheduler.running:
+            scheduler.start()
+        table_stats.is_running = True
+        logger.info(f"✅ Table stats snapshots started (interval: {table_stats.interval_seconds}s)")
+    else:
+        logger.info("⏸️  Table stats snapshots disabled (ENABLE_TABLE_STATS=false)")
+    
+    # Startup: performance_schema wait-event sampler (windowed /wait-events/analyze)
+    if os.getenv("ENABLE_WAIT_SAMPLER", "true").lower() == "true":
+        wait_sampler = get_wait_sampler()
+        if scheduler is None:
+            scheduler = BackgroundScheduler()
+        scheduler.add_job(
+            wait_sampler.run_once,
+            'interval',
+            seconds=wait_sampler.interval_seconds,
+            id='wait_sampler',
+            name='Wait Event Sampler',
+            max_instances=1,
+            next_run_time=datetime.now()
+        )
+        if not scheduler.running:
+            scheduler.start()
+        wait_sampler.is_running = True
+        logger.info(f"✅ Wait event sampler started (interval: {wait_sampler.interval_seconds}s)")
+    else:
+        logger.info("⏸️  Wait event sampler disabled (ENABLE_WAIT_SAMPLER=false)")
+    
     yield
     
     # Shutdown: Stop the scheduler
@@ -109,7 +179,19 @@ async def lifespan(app: FastAPI):
         scheduler.shutdown()
         poller = get_poller()
         poller.is_running = False
+        get_plan_watcher().is_running = False
+        get_table_stats().is_running = False
+        get_wait_sampler().is_running = False
         logger.info("✅ Query Poller stopped")
+    
+    # Release pooled SkyAI connections
+    await llm_gateway.aclose()
+    
+    # Release pooled database connections
+    close_pools()
+    
+    # Stop the schema parser processes
+    git_schema_loader.shutdown()
 
 app = FastAPI(
     title="MariaDB Local Pilot API",
@@ -9,104 +9,189 @@ MCP Tools:
 - search_knowledge_base: Search Jira tickets and documentation
 - analyze_query: Get optimization suggestions for a SQL query
 - get_schema: Get table structure and indexes
+
+Every call is recorded in a bounded ToolCallLog (services/tool_calls.py):
+recent calls for /mcp/history, per-tool counters and latency histograms
+for /mcp/stats.
+
+Tools use pooled connections (database.get_pooled_connection). The async
+entry point (execute_tool_async, used by the stdio server and /mcp/execute)
+runs each tool on a small thread pool with a per-tool timeout, so the event
+loop keeps serving other calls; query_database is also cut server-side with
+max_statement_time. get_schema and list_tables results are cached
+(services.cache.mcp_schema_cache) until they expire or DDL invalidates them.
 """
 
 import os
 import sys
 import json
+import time
 import asyncio
 parent_dir = os.path.dirname(os.path.abspath(__file__))
 if parent_dir not in sys.path:
     sys.path.append(parent_dir)
-from typing import List, Dict, Any, Optional
-import mariadb
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Optional, Tuple
 from dotenv import load_dotenv
+from database import get_pooled_connection, close_pools
 from error_factory import ErrorFactory, DatabaseError, APIError, ValidationError, ServiceError
-from mcp.server.stdio import stdio_server
-from mcp.server import Server, NotificationOptions
-from mcp.server.models import InitializationOptions
-from mcp.types import (
-    Resource,
-    Tool,
-    TextContent,
-    ImageContent,
-    EmbeddedResource,
-)
+from services.cache import mcp_schema_cache, SimpleCache
+from services.tool_calls import ToolCallLog, DEFAULT_CAPACITY
+from services.explain_service import explain_service
+from services.result_stream import ResultStreamer, ndjson_line, DEFAULT_ROW_LIMIT, DEFAULT_BYTE_LIMIT
 
 # Load .env from the same directory as this script
 env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
 load_dotenv(dotenv_path=env_path)
 
+# Seconds before a tool call is abandoned (the agent gets an error result)
+DEFAULT_TOOL_TIMEOUT = 30.0
+TOOL_TIMEOUTS = {
+    "query_database": 30.0,
+    "search_knowledge_base": 20.0,
+    "analyze_query": 30.0,
+    "get_schema": 10.0,
+    "list_databases": 10.0,
+    "list_tables": 10.0,
+}
+
+
+def invalidate_schema_cache(database: Optional[str] = None, cache: SimpleCache = mcp_schema_cache) -> int:
+    """Drop cached get_schema / list_tables results of `database` (all when None) after DDL"""
+    prefix = f"{database}|" if database is not None else ""
+    keys = [k for k in list(cache.cache) if k.startswith(prefix)]
+    for key in keys:
+        cache.remove(key)
+    return len(keys)
+
+
 class MCPService:
     """
     MCP-compatible service that exposes database and RAG capabilities
     to LLMs following the Model Context Protocol standard.
     """
     
-    def __init__(self, vector_store=None, embedding_service=None):
+    def __init__(self, vector_store=None, embedding_service=None,
+                 connection_factory: Callable = get_pooled_connection,
+                 schema_cache: SimpleCache = mcp_schema_cache,
+                 tool_timeouts: Optional[Dict[str, float]] = None,
+                 max_workers: int = int(os.getenv("MCP_TOOL_WORKERS", 4)),
+                 history_size: int = int(os.getenv("MCP_HISTORY_SIZE", DEFAULT_CAPACITY))):
         self.vector_store = vector_store
         self.embedding_service = embedding_service
-        self.tool_history = [] # Shared history for the dashboard
-        self.db_params = {
-            "host": os.getenv("SKYSQL_HOST"),
-            "port": int(os.getenv("SKYSQL_PORT", 3306)),
-            "user": os.getenv("SKYSQL_USERNAME"),
-            "password": os.getenv("SKYSQL_PASSWORD"),
-            "ssl": True
-        }
+        self.tool_calls = ToolCallLog(capacity=history_size) # Shared history for the dashboard
+        self.connection_factory = connection_factory
+        self.schema_cache = schema_cache
+        self.tool_timeouts = {**TOOL_TIMEOUTS, **(tool_timeouts or {})}
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="mcp-tool")
+    
+    def record_tool_call(self, tool_name: str, args: Dict[str, Any], status: str, detail: str = "",
+                         duration_ms: Optional[float] = None, cached: bool = False,
+                         result_bytes: Optional[int] = None, error_class: Optional[str] = None):
+        """Record a tool call for the live dashboard feed and the per-tool stats."""
+        self.tool_calls.record(tool_name, args, status, detail, duration_ms=duration_ms,
+                               result_bytes=result_bytes, error_class=error_class, cached=cached)
     
-    def record_tool_call(self, tool_name: str, args: Dict[str, Any], status: str, detail: str = ""):
-        """Record a tool call for the live dashboard feed."""
-        from datetime import datetime
-        self.tool_history.append({
-            "time": datetime.now().strftime("%H:%M:%S"),
-            "tool": tool_name,
-            "arguments": args,
-            "status": status,
-            "detail": detail or f"Executed {tool_name}"
-        })
-        # Keep only last 20
-        if len(self.tool_history) > 20:
-            self.tool_history.pop(0)
+    @property
+    def tool_history(self) -> List[Dict[str, Any]]:
+        """Last 20 tool calls, oldest first (dashboard feed)"""
+        return self.tool_calls.history(limit=20)
 
-    def execute_tool(self, tool_name: str, args: Dict[str, Any]) -> Dict[str, Any]:
-        """Execute an MCP tool and return the result."""
-        result = {"error": "Unknown error"}
+    def _cached(self, key: str, load: Callable[[], Dict[str, Any]], refresh: bool = False
+                ) -> Tuple[Dict[str, Any], bool]:
+        """Cached tool result for `key` (database-prefixed), loading it on a miss"""
+        if not refresh:
+            cached = self.schema_cache.get(key)
+            if cached is not None:
+                return cached, True
+        result = load()
+        if "error" not in result:
+            self.schema_cache.set(key, result)
+        return result, False
+    
+    def invalidate_schema_cache(self, database: Optional[str] = None) -> int:
+        return invalidate_schema_cache(database, self.schema_cache)
+    
+    def _run_tool(self, tool_name: str, args: Dict[str, Any]) -> Tuple[Dict[str, Any], bool, Optional[str]]:
+        """Dispatch a tool call: (result, served from cache, class of the exception raised)"""
+        cached = False
+        error_class = None
         try:
             if tool_name == "query_database":
-                result = self._query_database(args.get("sql"), args.get("database", "shop_demo"))
+                result = self._query_database(
+                    args.get("sql"),
+                    args.get("database", "shop_demo"),
+                    max_rows=args.get("max_rows", DEFAULT_ROW_LIMIT),
+                    timeout=self.tool_timeouts.get(tool_name)
+                )
             elif tool_name == "search_knowledge_base":
                 result = self._search_knowledge_base(args.get("query"), args.get("limit", 5))
             elif tool_name == "analyze_query":
                 result = self._analyze_query(args.get("sql"))
             elif tool_name == "get_schema":
-                result = self._get_schema(args.get("database"), args.get("table"))
+                database, table = args.get("database"), args.get("table")
+                result, cached = self._cached(f"{database}|get_schema|{table}",
+                                              lambda: self._get_schema(database, table), args.get("refresh", False))
             elif tool_name == "list_databases":
                 result = self._list_databases()
             elif tool_name == "list_tables":
-                result = self._list_tables(args.get("database"))
+                database = args.get("database")
+                result, cached = self._cached(f"{database}|list_tables",
+                                              lambda: self._list_tables(database), args.get("refresh", False))
             else:
                 result = {"error": f"Unknown tool: {tool_name}"}
         except Exception as e:
             # Use ErrorFactory for safe error messaging and structured logging
             safe_msg = ErrorFactory.safe_error_message(e)
             result = {"error": safe_msg}
+            error_class = type(e).__name__
             # Log as service error since it occurred during tool execution dispatch
             ErrorFactory.service_error(
                 "MCP Tool Execution",
                 f"Failed to execute tool {tool_name}",
                 original_error=e
             )
-        
+        return result, cached, error_class
+    
+    def _record_result(self, tool_name: str, args: Dict[str, Any], result: Dict[str, Any],
+                       duration_ms: float, cached: bool, error_class: Optional[str]) -> None:
         # Record for real-time dashboard
         status = "success" if "error" not in result else "error"
         detail = ""
         if tool_name == "query_database" and status == "success":
             detail = f"Found {result.get('row_count', 0)} rows."
         elif tool_name == "search_knowledge_base" and status == "success":
-            detail = f"KB match: {args.get('query')[:30]}..."
+            detail = f"KB match: {(args.get('query') or '')[:30]}..."
         
-        self.record_tool_call(tool_name, args, status, detail)
+        self.record_tool_call(tool_name, args, status, detail, duration_ms=duration_ms, cached=cached,
+                              result_bytes=len(json.dumps(result, default=str)),
+                              error_class=error_class or result.get("error_class"))
+    
+    def execute_tool(self, tool_name: str, args: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute an MCP tool and return the result (blocking, no timeout)."""
+        started = time.perf_counter()
+        result, cached, error_class = self._run_tool(tool_name, args)
+        self._record_result(tool_name, args, result, (time.perf_counter() - started) * 1000, cached, error_class)
+        return result
+    
+    async def execute_tool_async(self, tool_name: str, args: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Execute an MCP tool on the tool thread pool, off the event loop.
+        After the tool's timeout the caller gets an error result; the
+        abandoned call finishes in the background and is not recorded twice.
+        """
+        timeout = self.tool_timeouts.get(tool_name, DEFAULT_TOOL_TIMEOUT)
+        started = time.perf_counter()
+        loop = asyncio.get_event_loop()
+        future = loop.run_in_executor(self._executor, self._run_tool, tool_name, args)
+        try:
+            result, cached, error_class = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            duration_ms = (time.perf_counter() - started) * 1000
+            self.record_tool_call(tool_name, args, "timeout", f"Timed out after {timeout:g}s",
+                                  duration_ms=duration_ms, error_class="TimeoutError")
+            return {"error": f"Tool {tool_name} timed out after {timeout:g}s"}
+        self._record_result(tool_name, args, result, (time.perf_counter() - started) * 1000, cached, error_class)
         return result
 
     def get_tools_manifest(self) -> Dict[str, Any]:
@@ -133,6 +218,11 @@ class MCPService:
                                 "type": "string",
                                 "description": "Target database name",
                                 "default": "shop_demo"
+                            },
+                            "max_rows": {
+                                "type": "integer",
+                                "description": "Maximum number of rows returned (the result is truncated beyond it)",
+                                "default": DEFAULT_ROW_LIMIT
                             }
                         },
                         "required": ["sql"]
@@ -184,6 +274,11 @@ class MCPService:
                             "table": {
                                 "type": "string",
                                 "description": "Table name"
+                            },
+                            "refresh": {
+                                "type": "boolean",
+                                "description": "Bypass the schema cache",
+                                "default": False
                             }
                         },
                         "required": ["database", "table"]
@@ -206,6 +301,11 @@ class MCPService:
                             "database": {
                                 "type": "string",
                                 "description": "Database name"
+                            },
+                            "refresh": {
+                                "type": "boolean",
+                                "description": "Bypass the schema cache",
+                                "default": False
                             }
                         },
                         "required": ["database"]
@@ -226,25 +326,43 @@ class MCPService:
             ]
         }
     
-    def _query_database(self, sql: str, database: str = "shop_demo") -> Dict[str, Any]:
-        """Execute a read-only SQL query."""
-        # Validate read-only
-        sql_upper = sql.strip().upper()
+    @staticmethod
+    def _validate_read_only(sql: str) -> Optional[str]:
+        """Error message if `sql` is not a read-only statement, None otherwise."""
+        sql_upper = (sql or "").strip().upper()
         allowed_prefixes = ("SELECT", "SHOW", "DESCRIBE", "DESC", "EXPLAIN")
         if not any(sql_upper.startswith(prefix) for prefix in allowed_prefixes):
-            return {"error": "Only read-only queries (SELECT, SHOW, DESCRIBE, EXPLAIN) are allowed"}
+            return "Only read-only queries (SELECT, SHOW, DESCRIBE, EXPLAIN) are allowed"
+        return None
+    
+    def _query_database(self, sql: str, database: str = "shop_demo", max_rows: int = DEFAULT_ROW_LIMIT,
+                        max_bytes: int = DEFAULT_BYTE_LIMIT, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Execute a read-only SQL query (rows streamed from the server, capped)."""
+        # Validate read-only
+        error = self._validate_read_only(sql)
+        if error:
+            return {"error": error}
         
+        conn = None
         try:
-            conn = mariadb.connect(**self.db_params, database=database)
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute(sql)
-            results = cursor.fetchall()
-            conn.close()
+            conn = self.connection_factory(database)
+            cursor = conn.cursor(buffered=False)
+            if timeout:
+                # The server stops the statement too (pooled sessions are reset on close)
+                cursor.execute(f"SET SESSION max_statement_time = {float(timeout)}")
+            streamer = ResultStreamer(cursor, row_limit=max_rows, byte_limit=max_bytes)
+            streamer.execute(sql)
+            columns = streamer.columns
+            results = [dict(zip(columns, values)) for values in streamer.rows()]
+            cursor.close()
             
             return {
                 "success": True,
                 "rows": results,
-                "row_count": len(results)
+                "row_count": len(results),
+                "rows_examined": streamer.rows_examined,
+                "truncated": streamer.truncated,
+                "truncated_reason": streamer.truncated_reason
             }
         except Exception as e:
             db_error = ErrorFactory.database_error(
@@ -252,7 +370,58 @@ class MCPService:
                 original_error=e,
                 sql=sql[:100]
             )
-            return {"error": db_error.message}
+            return {"error": db_error.message, "error_class": type(e).__name__}
+        finally:
+            if conn:
+                conn.close()
+    
+    def iter_query_database(self, sql: str, database: str = "shop_demo", max_rows: int = DEFAULT_ROW_LIMIT,
+                            max_bytes: int = DEFAULT_BYTE_LIMIT):
+        """
+        NDJSON lines for a read-only query: {"type": "columns"}, one
+        {"type": "row"} per row as it is read, then {"type": "summary"}
+        or {"type": "error"}.
+        """
+        error = self._validate_read_only(sql)
+        if error:
+            yield ndjson_line({"type": "error", "error": error})
+            return
+        
+        conn = None
+        row_count = 0
+        bytes_sent = 0
+        status = "error"
+        error_class = None
+        started = time.perf_counter()
+        try:
+            conn = self.connection_factory(database)
+            cursor = conn.cursor(buffered=False)
+            streamer = ResultStreamer(cursor, row_limit=max_rows, byte_limit=max_bytes)
+            streamer.execute(sql)
+            yield ndjson_line({"type": "columns", "columns": streamer.columns})
+            for values in streamer.rows():
+                row_count += 1
+                line = ndjson_line({"type": "row", "values": values})
+                bytes_sent += len(line)
+                yield line
+            cursor.close()
+            status = "success"
+            yield ndjson_line({"type": "summary", **streamer.stats()})
+        except Exception as e:
+            db_error = ErrorFactory.database_error(
+                "MCP Database Query failed",
+                original_error=e,
+                sql=sql[:100]
+            )
+            error_class = type(e).__name__
+            yield ndjson_line({"type": "error", "error": db_error.message})
+        finally:
+            if conn:
+                conn.close()
+            self.record_tool_call("query_database", {"sql": sql, "database": database}, status,
+                                  f"Streamed {row_count} rows.",
+                                  duration_ms=(time.perf_counter() - started) * 1000,
+                                  result_bytes=bytes_sent, error_class=error_class)
     
     def _search_knowledge_base(self, query: str, limit: int = 5) -> Dict[str, Any]:
         """Search the Jira knowledge base using vector similarity."""
@@ -307,10 +476,16 @@ class MCPService:
             "analysis": {}
         }
         
-        # Get EXPLAIN plan
-        explain_result = self._query_database(f"EXPLAIN {sql}", "shop_demo")
-        if "error" not in explain_result:
-            result["analysis"]["explain_plan"] = explain_result.get("rows", [])
+        # Get EXPLAIN plan (shared explain cache)
+        try:
+            result["analysis"]["explain_plan"] = explain_service.explain(sql, "shop_demo")
+        except Exception as e:
+            db_error = ErrorFactory.database_error(
+                "MCP EXPLAIN failed",
+                original_error=e,
+                sql=sql[:100]
+            )
+            print(f"[MCP] {db_error}", file=sys.stderr)
         
         # Search knowledge base for similar issues
         if self.embedding_service and self.vector_store:
@@ -390,6 +565,16 @@ class MCPService:
 
 async def main():
     """Main entry point for running as a standalone MCP server via stdio."""
+    # The MCP SDK is only needed here: the API imports MCPService without it
+    from mcp.server.stdio import stdio_server
+    from mcp.server import Server, NotificationOptions
+    from mcp.server.models import InitializationOptions
+    from mcp.types import (
+        Resource,
+        Tool,
+        TextContent,
+    )
+    
     # Initialize services if needed (for Jira search)
     from rag.vector_store import VectorStore
     from rag.embedding_service import EmbeddingService
@@ -423,7 +608,7 @@ async def main():
 
     @server.call_tool()
     async def handle_call_tool(name: str, arguments: dict | None) -> list[TextContent]:
-        result = service.execute_tool(name, arguments or {})
+        result = await service.execute_tool_async(name, arguments or {})
         return [TextContent(type="text", text=json.dumps(result, indent=2))]
 
     @server.list_resources()
@@ -439,19 +624,22 @@ async def main():
             ))
         return resources
 
-    async with stdio_server() as (read_stream, write_stream):
-        await server.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name="mariadb-finops",
-                server_version="1.0.0",
-                capabilities=server.get_capabilities(
-                    notification_options=NotificationOptions(),
-                    experimental_capabilities={},
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await server.run(
+                read_stream,
+                write_stream,
+                InitializationOptions(
+                    server_name="mariadb-finops",
+                    server_version="1.0.0",
+                    capabilities=server.get_capabilities(
+                        notification_options=NotificationOptions(),
+                        experimental_capabilities={},
+                    ),
                 ),
-            ),
-        )
+            )
+    finally:
+        close_pools()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,5 +1,5 @@
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 # =============================================================================
 # Slow Query Models
@@ -63,6 +63,16 @@ class SimilarIssue(BaseModel):
     analysis: Optional[str] = None
 
 
+class AntiPatternFinding(BaseModel):
+    rule_id: str
+    severity: str  # LOW, MEDIUM, HIGH
+    score: int  # 0-100
+    message: str
+    explanation: str
+    suggested_fix: Optional[str] = None
+    suggestion_type: str = "REWRITE"
+
+
 class PredictResponse(BaseModel):
     risk_level: str  # LOW, MEDIUM, HIGH
     risk_score: int  # 0-100
@@ -70,6 +80,7 @@ class PredictResponse(BaseModel):
     similar_issues: List[SimilarIssue]
     suggested_fix: Optional[str] = None
     query_analysis: Optional[str] = None
+    findings: List[AntiPatternFinding] = []
 
 
 # =============================================================================
@@ -98,6 +109,11 @@ class IndexSimulationResponse(BaseModel):
     recommendation: str  # "HIGHLY RECOMMENDED", "RECOMMENDED", "MARGINAL", "NOT RECOMMENDED"
     create_index_sql: str
     ai_analysis: str
+    mode: str = "heuristic"  # "whatif" (EXPLAIN on a sampled branch) or "heuristic"
+    cost_before: Optional[float] = None
+    cost_after: Optional[float] = None
+    index_used: Optional[bool] = None
+    plan_diff: Optional[Dict[str, Any]] = None
 
 
 # =============================================================================
@@ -129,6 +145,21 @@ class RewriteResponse(BaseModel):
     suggested_ddl: Optional[str] = None
     # Optional simulation data
     simulation: Optional[IndexSimulationResponse] = None
+    # EXPLAIN of the original query, when the EXPLAIN stage finished in time
+    original_plan: Optional[ExplainPlan] = None
+    # Pipeline diagnostics: per-stage latency and stages that timed out / failed
+    stage_timings_ms: Dict[str, float] = {}
+    degraded_stages: List[str] = []
+
+
+# Upper bound for a single batch call; larger requests are rejected (422), never truncated
+MAX_BATCH_STATEMENTS = 1000
+
+
+class BatchAnalysisRequest(BaseModel):
+    statements: List[str] = Field(..., max_length=MAX_BATCH_STATEMENTS)
+    database: Optional[str] = None
+    max_concurrency: int = 4  # Concurrent analyses (bounds LLM calls for /rewrite/batch)
 
 
 class FixRequest(BaseModel):
@@ -150,6 +181,8 @@ class SandboxRequest(BaseModel):
     sql: str
     database: Optional[str] = "shop_demo"
     timeout_seconds: Optional[int] = 20
+    max_rows: Optional[int] = 1000  # rows returned to the client, the rest is never fetched
+    max_bytes: Optional[int] = 2 * 1024 * 1024  # JSON-encoded size of the returned rows
 
 
 class SandboxResult(BaseModel):
@@ -157,6 +190,9 @@ class SandboxResult(BaseModel):
     rows: List[List[Any]]
     rows_affected: int
     execution_time_ms: float
+    rows_examined: Optional[int] = None  # rows read by the server (Rows_read delta)
+    truncated: bool = False
+    truncated_reason: Optional[str] = None  # "row_limit" or "byte_limit"
 
 
 class SandboxResponse(BaseModel):
@@ -0,0 +1,451 @@
+"""
+Tokenizing DDL parser
+
+Turns schema files (mysqldump output, hand-written CREATE TABLE files) into
+the same TableDef model services/schema_snapshot.py builds from
+information_schema, so both sides of a drift check compare field by field.
+
+Statements are split on `;` outside parentheses and strings (the tokenizer
+drops comments, including /*!...*/ version comments). Supported:
+
+- CREATE TABLE [IF NOT EXISTS] name (columns, keys, constraints) options
+- CREATE TABLE name LIKE other
+- CREATE [UNIQUE|FULLTEXT|SPATIAL] INDEX name ON table (columns)
+- DROP TABLE [IF EXISTS] a, b
+
+Anything else (inserts, views, routines, ALTER TABLE) is counted and
+skipped. Types and defaults are normalized the way MariaDB reports them in
+information_schema (INT -> INT(11), BOOLEAN -> TINYINT(1), 'x' -> x,
+CURRENT_TIMESTAMP -> current_timestamp()), and unnamed keys and
+constraints get the names the server would give them.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from parser.sql_tokenizer import tokenize, Token, WORD, IDENT, STRING, NUMBER, PUNCT, OPERATOR
+from services.schema_snapshot import (
+    TableDef, ColumnDef, IndexDef, ForeignKeyDef, normalize_expression, charset_of
+)
+
+# Operations returned by parse_ddl(), applied in file order by the loader
+CREATE, CREATE_LIKE, ADD_INDEX, DROP = "create", "like", "index", "drop"
+
+TYPE_ALIASES = {
+    "INTEGER": "INT", "INT4": "INT", "INT8": "BIGINT", "INT2": "SMALLINT", "INT1": "TINYINT",
+    "MIDDLEINT": "MEDIUMINT", "DEC": "DECIMAL", "NUMERIC": "DECIMAL", "FIXED": "DECIMAL",
+    "REAL": "DOUBLE", "FLOAT8": "DOUBLE", "FLOAT4": "FLOAT",
+}
+# Display widths MariaDB fills in: (signed, unsigned)
+INT_WIDTHS = {"TINYINT": (4, 3), "SMALLINT": (6, 5), "MEDIUMINT": (9, 8), "INT": (11, 10), "BIGINT": (20, 20)}
+DEFAULT_LENGTHS = {"CHAR": "1", "BINARY": "1", "BIT": "1", "YEAR": "4"}
+NOW_FUNCTIONS = {"CURRENT_TIMESTAMP", "NOW", "LOCALTIME", "LOCALTIMESTAMP"}
+INDEX_WORDS = {"KEY", "INDEX"}
+
+
+def _is(token: Optional[Token], *words: str) -> bool:
+    return token is not None and token.kind == WORD and token.upper in words
+
+
+def _punct(token: Optional[Token], value: str) -> bool:
+    return token is not None and token.kind == PUNCT and token.value == value
+
+
+def split_statements(tokens: List[Token]) -> List[List[Token]]:
+    statements, current, depth = [], [], 0
+    for token in tokens:
+        if token.kind == PUNCT:
+            if token.value == "(":
+                depth += 1
+            elif token.value == ")":
+                depth = max(0, depth - 1)
+            elif token.value == ";" and depth == 0:
+                if current:
+                    statements.append(current)
+                current = []
+                continue
+        current.append(token)
+    if current:
+        statements.append(current)
+    return statements
+
+
+def split_items(tokens: List[Token]) -> List[List[Token]]:
+    """Comma-separated items at parenthesis depth 0"""
+    items, current, depth = [], [], 0
+    for token in tokens:
+        if token.kind == PUNCT:
+            if token.value == "(":
+                depth += 1
+            elif token.value == ")":
+                depth -= 1
+            elif token.value == "," and depth == 0:
+                items.append(current)
+                current = []
+                continue
+        current.append(token)
+    if current:
+        items.append(current)
+    return items
+
+
+def _group(tokens: List[Token], start: int) -> Tuple[List[Token], int]:
+    """Tokens inside the parentheses opening at `start`, and the index after the closing one"""
+    depth = 0
+    for i in range(start, len(tokens)):
+        token = tokens[i]
+        if token.kind == PUNCT and token.value == "(":
+            depth += 1
+        elif token.kind == PUNCT and token.value == ")":
+            depth -= 1
+            if depth == 0:
+                return tokens[start + 1:i], i + 1
+    return tokens[start + 1:], len(tokens)
+
+
+def _name(tokens: List[Token], i: int) -> Tuple[Optional[str], int]:
+    """[schema.]name -> (name, next index)"""
+    if i >= len(tokens) or tokens[i].kind not in (WORD, IDENT):
+        return None, i
+    name = tokens[i].value
+    if tokens[i].kind == WORD and "." in name:
+        name = name.rsplit(".", 1)[1]
+    i += 1
+    while i + 1 < len(tokens) and _punct(tokens[i], ".") and tokens[i + 1].kind in (WORD, IDENT):
+        name, i = tokens[i + 1].value, i + 2
+    return name, i
+
+
+def _expression(tokens: List[Token]) -> str:
+    return normalize_expression(" ".join(
+        f"'{t.value}'" if t.kind == STRING else f"`{t.value}`" if t.kind == IDENT else t.value for t in tokens
+    ))
+
+
+def _key_columns(tokens: List[Token]) -> Tuple[str, ...]:
+    columns = []
+    for part in split_items(tokens):
+        if not part:
+            continue
+        if _punct(part[0], "("):
+            columns.append(_expression(part))  # functional key part
+        else:
+            columns.append(part[0].value)
+    return tuple(columns)
+
+
+def normalize_type(name: str, args: List[str], unsigned: bool, zerofill: bool) -> str:
+    name = TYPE_ALIASES.get(name, name)
+    if name in ("BOOL", "BOOLEAN"):
+        name, args = "TINYINT", ["1"]
+    unsigned = unsigned or zerofill
+    if not args:
+        if name in INT_WIDTHS:
+            args = [str(INT_WIDTHS[name][1 if unsigned else 0])]
+        elif name == "DECIMAL":
+            args = ["10", "0"]
+        elif name in DEFAULT_LENGTHS:
+            args = [DEFAULT_LENGTHS[name]]
+    elif name == "DECIMAL" and len(args) == 1:
+        args = args + ["0"]
+    rendered = name + (f"({','.join(args)})" if args else "")
+    if unsigned:
+        rendered += " UNSIGNED"
+    if zerofill:
+        rendered += " ZEROFILL"
+    return rendered.upper()
+
+
+class _TableBuilder:
+    def __init__(self, name: str):
+        self.table = TableDef(name)
+        self.fk_count = 0
+        self.check_count = 0
+
+    def _index_name(self, columns: Tuple[str, ...]) -> str:
+        # Unnamed keys are named after their first column: c, c_2, c_3 ...
+        base = columns[0] if columns else "key"
+        name, n = base, 2
+        while name in self.table.indexes:
+            name, n = f"{base}_{n}", n + 1
+        return name
+
+    def add_index(self, kind: str, name: Optional[str], columns: Tuple[str, ...]) -> None:
+        if kind == "PRIMARY KEY":
+            name = "PRIMARY"
+        name = name or self._index_name(columns)
+        self.table.indexes[name] = IndexDef(name, kind, columns)
+
+    def column(self, item: List[Token]) -> None:
+        name = item[0].value
+        i = 1
+        type_name = item[i].upper if i < len(item) else ""
+        i += 1
+        if type_name == "DOUBLE" and _is(item[i] if i < len(item) else None, "PRECISION"):
+            i += 1
+        args: List[str] = []
+        if i < len(item) and _punct(item[i], "("):
+            inner, i = _group(item, i)
+            args = [f"'{t.value}'" if t.kind == STRING else t.value
+                    for t in inner if not _punct(t, ",")]
+        unsigned = zerofill = False
+        nullable, default, auto_increment = True, None, False
+
+        while i < len(item):
+            token = item[i]
+            upper = token.upper if token.kind == WORD else None
+            if upper == "UNSIGNED":
+                unsigned = True
+            elif upper == "ZEROFILL":
+                zerofill = True
+            elif upper == "NOT" and _is(item[i + 1] if i + 1 < len(item) else None, "NULL"):
+                nullable = False
+                i += 1
+            elif upper == "NULL":
+                nullable = True
+            elif upper == "DEFAULT":
+                default, i = self._default(item, i + 1)
+                continue
+            elif upper == "AUTO_INCREMENT":
+                auto_increment = True
+            elif upper == "PRIMARY":
+                self.add_index("PRIMARY KEY", None, (name,))
+                nullable = False
+            elif upper == "UNIQUE":
+                self.add_index("UNIQUE", None, (name,))
+            elif upper == "CHARACTER":
+                i += 3  # CHARACTER SET x
+                continue
+            elif upper in ("CHARSET", "COLLATE", "COMMENT"):
+                i += 2
+                continue
+            elif upper == "ON":
+                # ON UPDATE CURRENT_TIMESTAMP[(n)]
+                i += 3
+                if i < len(item) and _punct(item[i], "("):
+                    _, i = _group(item, i)
+                continue
+            elif upper == "CHECK" and i + 1 < len(item) and _punct(item[i + 1], "("):
+                inner, i = _group(item, i + 1)
+                self.table.checks[name] = _expression(inner)
+                continue
+            elif upper == "REFERENCES":
+                break  # column-level REFERENCES is ignored by InnoDB
+            elif _punct(token, "("):
+                _, i = _group(item, i)
+                continue
+            i += 1
+
+        self.table.columns[name] = ColumnDef(name, normalize_type(type_name, args, unsigned, zerofill),
+                                             nullable, default, auto_increment)
+
+    @staticmethod
+    def _default(item: List[Token], i: int) -> Tuple[Optional[str], int]:
+        if i >= len(item):
+            return None, i
+        token = item[i]
+        if token.kind == STRING:
+            return token.value.replace("''", "'"), i + 1
+        if token.kind == OPERATOR and token.value in ("-", "+") and i + 1 < len(item) and item[i + 1].kind == NUMBER:
+            return (token.value if token.value == "-" else "") + item[i + 1].value, i + 2
+        if token.kind == NUMBER:
+            return token.value, i + 1
+        if _punct(token, "("):
+            inner, end = _group(item, i)
+            return _expression(inner), end
+        if token.kind == WORD:
+            if token.upper == "NULL":
+                return None, i + 1
+            if token.upper in ("TRUE", "FALSE"):
+                return ("1" if token.upper == "TRUE" else "0"), i + 1
+            if token.upper in NOW_FUNCTIONS:
+                if i + 1 < len(item) and _punct(item[i + 1], "("):
+                    inner, end = _group(item, i + 1)
+                    precision = "".join(t.value for t in inner)
+                    return f"current_timestamp({precision})", end
+                return "current_timestamp()", i + 1
+            if i + 1 < len(item) and _punct(item[i + 1], "("):
+                inner, end = _group(item, i + 1)
+                return token.value.lower() + "(" + "".join(t.value for t in inner) + ")", end
+            return token.value, i + 1
+        return token.value, i + 1
+
+    def constraint(self, item: List[Token]) -> None:
+        i, name = 0, None
+        if _is(item[0], "CONSTRAINT"):
+            i = 1
+            if i < len(item) and not _is(item[i], "PRIMARY", "UNIQUE", "FOREIGN", "CHECK"):
+                name, i = _name(item, i)
+        head = item[i].upper if i < len(item) else ""
+
+        if head == "CHECK":
+            inner, _ = _group(item, i + 1)
+            if name is None:
+                self.check_count += 1
+                name = f"CONSTRAINT_{self.check_count}"
+            self.table.checks[name] = _expression(inner)
+            return
+
+        if head == "FOREIGN":
+            i += 1
+            if _is(item[i] if i < len(item) else None, "KEY"):
+                i += 1
+            index_name = None
+            if i < len(item) and not _punct(item[i], "("):
+                index_name, i = _name(item, i)
+            columns_tokens, i = _group(item, i)
+            columns = _key_columns(columns_tokens)
+            i += 1  # REFERENCES
+            ref_table, i = _name(item, i)
+            ref_tokens, i = _group(item, i)
+            rules = {"DELETE": "RESTRICT", "UPDATE": "RESTRICT"}
+            while i < len(item):
+                if _is(item[i], "ON") and i + 1 < len(item):
+                    event, i = item[i + 1].upper, i + 2
+                    action = item[i].upper if i < len(item) else "RESTRICT"
+                    if action in ("SET", "NO") and i + 1 < len(item):
+                        action, i = f"{action} {item[i + 1].upper}", i + 1
+                    rules[event] = action
+                i += 1
+            if name is None:
+                self.fk_count += 1
+                name = f"{self.table.name}_ibfk_{self.fk_count}"
+            self.table.foreign_keys[name] = ForeignKeyDef(name, columns, ref_table or "", _key_columns(ref_tokens),
+                                                          rules["DELETE"], rules["UPDATE"])
+            # InnoDB adds an index for the referencing columns unless one already leads with them
+            covered = any(idx.columns[:len(columns)] == columns for idx in self.table.indexes.values())
+            if not covered:
+                self.add_index("KEY", index_name or name, columns)
+            return
+
+        if head == "PRIMARY":
+            kind = "PRIMARY KEY"
+            i += 2
+        elif head == "UNIQUE":
+            kind = "UNIQUE"
+            i += 1
+            if _is(item[i] if i < len(item) else None, *INDEX_WORDS):
+                i += 1
+        elif head in ("FULLTEXT", "SPATIAL"):
+            kind = head
+            i += 1
+            if _is(item[i] if i < len(item) else None, *INDEX_WORDS):
+                i += 1
+        else:
+            kind = "KEY"
+            i += 1
+        index_name = None
+        if i < len(item) and not _punct(item[i], "(") and not _is(item[i], "USING"):
+            index_name, i = _name(item, i)
+        if _is(item[i] if i < len(item) else None, "USING"):
+            i += 2
+        columns_tokens, _ = _group(item, i)
+        self.add_index(kind, index_name or name, _key_columns(columns_tokens))
+
+    def options(self, tokens: List[Token]) -> None:
+        collation = None
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            upper = token.upper if token.kind == WORD else None
+            if upper in ("ENGINE", "CHARSET", "COLLATE") or (upper == "CHARACTER" and _is(tokens[i + 1] if i + 1 < len(tokens) else None, "SET")):
+                i += 2 if upper == "CHARACTER" else 1
+                if i < len(tokens) and tokens[i].kind == OPERATOR and tokens[i].value == "=":
+                    i += 1
+                if i < len(tokens):
+                    value = tokens[i].value
+                    if upper == "ENGINE":
+                        self.table.engine = value
+                    elif upper == "COLLATE":
+                        collation = value
+                    else:
+                        self.table.charset = value.lower()
+            i += 1
+        if self.table.charset is None and collation:
+            self.table.charset = charset_of(collation)
+
+    def build(self, body: List[Token], options: List[Token]) -> TableDef:
+        items = split_items(body)
+        # Columns first, so unnamed keys and FK indexes see every column name
+        constraints = []
+        for item in items:
+            if not item:
+                continue
+            first = item[0]
+            if first.kind == WORD and first.upper in ("PRIMARY", "UNIQUE", "KEY", "INDEX", "FULLTEXT",
+                                                       "SPATIAL", "CONSTRAINT", "FOREIGN", "CHECK"):
+                constraints.append(item)
+            else:
+                self.column(item)
+        # Keys before foreign keys: InnoDB reuses an existing index for the FK
+        constraints.sort(key=lambda item: any(_is(t, "FOREIGN") for t in item[:3]))
+        for item in constraints:
+            self.constraint(item)
+        primary = self.table.indexes.get("PRIMARY")
+        if primary:
+            for column in primary.columns:
+                col = self.table.columns.get(column)
+                if col is not None and col.nullable:
+                    self.table.columns[column] = col._replace(nullable=False)
+        self.options(options)
+        return self.table
+
+
+def parse_statement(tokens: List[Token]) -> Optional[Tuple[Any, ...]]:
+    if not tokens:
+        return None
+    if _is(tokens[0], "CREATE"):
+        i = 1
+        while i < len(tokens) and _is(tokens[i], "OR", "REPLACE", "TEMPORARY"):
+            i += 1
+        if _is(tokens[i] if i < len(tokens) else None, "TABLE"):
+            i += 1
+            if _is(tokens[i] if i < len(tokens) else None, "IF"):
+                i += 3
+            name, i = _name(tokens, i)
+            if name is None or i >= len(tokens):
+                return None
+            if _is(tokens[i], "LIKE"):
+                source, _ = _name(tokens, i + 1)
+                return (CREATE_LIKE, name, source)
+            if _punct(tokens[i], "("):
+                body, end = _group(tokens, i)
+                if any(_is(t, "SELECT") for t in tokens[end:]):
+                    return None
+                return (CREATE, _TableBuilder(name).build(body, tokens[end:]))
+            return None
+        kind = "KEY"
+        if _is(tokens[i] if i < len(tokens) else None, "UNIQUE", "FULLTEXT", "SPATIAL"):
+            kind = tokens[i].upper
+            i += 1
+        if _is(tokens[i] if i < len(tokens) else None, "INDEX"):
+            index_name, i = _name(tokens, i + 1)
+            while i < len(tokens) and not _is(tokens[i], "ON"):
+                i += 1
+            table, i = _name(tokens, i + 1)
+            if table is None or i >= len(tokens):
+                return None
+            columns_tokens, _ = _group(tokens, i)
+            return (ADD_INDEX, table, IndexDef(index_name, kind, _key_columns(columns_tokens)))
+        return None
+    if _is(tokens[0], "DROP") and _is(tokens[1] if len(tokens) > 1 else None, "TABLE"):
+        names = []
+        for item in split_items(tokens[2:]):
+            if item and _is(item[0], "IF"):
+                item = item[2:]
+            name, _ = _name(item, 0)
+            if name:
+                names.append(name)
+        return (DROP, tuple(names))
+    return None
+
+
+def parse_ddl(sql: str) -> Tuple[List[Tuple[Any, ...]], int]:
+    """Schema operations in file order, and the number of statements skipped"""
+    operations, skipped = [], 0
+    for statement in split_statements(tokenize(sql)):
+        operation = parse_statement(statement)
+        if operation is None:
+            skipped += 1
+        else:
+            operations.append(operation)
+    return operations, skipped
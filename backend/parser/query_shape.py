@@ -0,0 +1,439 @@
+"""
+Query shape parser
+
+Builds a small syntax tree of a statement from parser.sql_tokenizer tokens:
+one QueryBlock per SELECT (subqueries and derived tables are child blocks)
+with its table references, sargable predicates (equality / IN / range /
+prefix LIKE / IS NULL), join equalities and the GROUP BY / ORDER BY column
+lists. Only what index selection needs is modelled; expressions are kept
+as "not sargable" instead of being parsed.
+
+Columns are returned unresolved (qualifier + name); mapping them to tables
+needs the block's aliases and, for unqualified columns in joins, the
+schema (see QueryBlock.resolve).
+"""
+
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+
+from parser.sql_tokenizer import tokenize, Token, WORD, IDENT, STRING, NUMBER, PARAM, PUNCT, OPERATOR
+
+# Predicate kinds
+EQ = "eq"          # col = const, col <=> const, col IS NULL
+IN = "in"          # col IN (...)
+RANGE = "range"    # <, >, <=, >=, BETWEEN, LIKE 'prefix%'
+JOIN = "join"      # a.col = b.col
+
+RESERVED = {
+    "SELECT", "FROM", "WHERE", "AND", "OR", "NOT", "NULL", "IS", "IN", "BETWEEN", "LIKE", "EXISTS",
+    "TRUE", "FALSE", "CASE", "WHEN", "THEN", "ELSE", "END", "AS", "ON", "USING", "JOIN", "INNER",
+    "LEFT", "RIGHT", "OUTER", "CROSS", "NATURAL", "STRAIGHT_JOIN", "GROUP", "BY", "ORDER", "HAVING",
+    "LIMIT", "OFFSET", "UNION", "ALL", "DISTINCT", "ASC", "DESC", "SET", "VALUES", "VALUE", "INTO",
+    "UPDATE", "DELETE", "INSERT", "REPLACE", "WITH", "RECURSIVE", "INTERVAL", "FOR", "LOCK", "SHARE",
+    "MODE", "USE", "FORCE", "IGNORE", "INDEX", "KEY", "DUAL", "ESCAPE", "REGEXP", "RLIKE", "XOR",
+    "DIV", "MOD", "SOUNDS", "LOW_PRIORITY", "HIGH_PRIORITY", "QUICK", "SQL_CALC_FOUND_ROWS",
+    "SQL_NO_CACHE", "SQL_CACHE", "PARTITION", "OVER", "WINDOW", "LATERAL", "ROLLUP",
+}
+
+# Clause keywords at the block's top level
+CLAUSES = {
+    "SELECT": "SELECT", "FROM": "FROM", "JOIN": "FROM", "STRAIGHT_JOIN": "FROM", "WHERE": "WHERE",
+    "ON": "ON", "USING": "USING", "HAVING": "HAVING", "LIMIT": "LIMIT", "SET": "SET",
+    "VALUES": "VALUES", "VALUE": "VALUES", "UPDATE": "UPDATE", "INTO": "INTO", "UNION": "SELECT",
+    "FOR": "LIMIT", "LOCK": "LIMIT",
+}
+
+CONDITION_CLAUSES = {"WHERE", "ON"}
+RANGE_OPERATORS = {"<", ">", "<=", ">="}
+EQ_OPERATORS = {"=", "<=>"}
+
+
+class ColumnRef:
+    __slots__ = ("qualifier", "name")
+
+    def __init__(self, qualifier: Optional[str], name: str):
+        self.qualifier = qualifier
+        self.name = name
+
+    def __repr__(self):
+        return f"{self.qualifier}.{self.name}" if self.qualifier else self.name
+
+
+class Predicate:
+    __slots__ = ("column", "kind", "other", "in_or")
+
+    def __init__(self, column: ColumnRef, kind: str, other: Optional[ColumnRef] = None):
+        self.column = column
+        self.kind = kind
+        self.other = other
+        self.in_or = False
+
+    def __repr__(self):
+        suffix = f" {self.other}" if self.other else ""
+        return f"Predicate({self.column} {self.kind}{suffix}{' OR' if self.in_or else ''})"
+
+
+class TableRef:
+    __slots__ = ("schema", "table", "alias")
+
+    def __init__(self, schema: Optional[str], table: Optional[str], alias: Optional[str]):
+        self.schema = schema
+        self.table = table  # None for derived tables
+        self.alias = alias
+
+    @property
+    def name(self) -> str:
+        return (self.alias or self.table or "").lower()
+
+
+class QueryBlock:
+    __slots__ = ("statement_type", "tables", "predicates", "group_by", "order_by", "children", "parent")
+
+    def __init__(self, statement_type: str = "SELECT", parent: Optional["QueryBlock"] = None):
+        self.statement_type = statement_type
+        self.tables: List[TableRef] = []
+        self.predicates: List[Predicate] = []
+        self.group_by: List[ColumnRef] = []
+        self.order_by: List[Tuple[ColumnRef, bool]] = []  # (column, descending)
+        self.children: List["QueryBlock"] = []
+        self.parent = parent
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def _lookup_alias(self, qualifier: str) -> Tuple[bool, Optional[TableRef]]:
+        name = qualifier.lower().rpartition(".")[2]
+        block = self
+        while block is not None:
+            for ref in block.tables:
+                if ref.name == name or (ref.table and ref.table.lower() == name and not ref.alias):
+                    return True, ref
+            block = block.parent
+        return False, None
+
+    def resolve(self, column: ColumnRef, columns_of: Optional[Dict[str, Set[str]]] = None) -> Optional[TableRef]:
+        """
+        Table reference a column belongs to. Unqualified columns resolve to the
+        only table of the block, or through `columns_of` (table -> column names)
+        when several tables are joined; outer blocks are searched for
+        correlated references.
+        """
+        if column.qualifier:
+            found, ref = self._lookup_alias(column.qualifier)
+            return ref if found else None
+
+        name = column.name.lower()
+        block = self
+        while block is not None:
+            base = [ref for ref in block.tables if ref.table]
+            if len(block.tables) == 1 and base and (columns_of is None or base[0].table.lower() not in columns_of
+                                                    or name in columns_of[base[0].table.lower()]):
+                return base[0]
+            if columns_of is not None:
+                matches = [ref for ref in base if name in columns_of.get(ref.table.lower(), ())]
+                if len(matches) == 1:
+                    return matches[0]
+                if matches:
+                    return None  # ambiguous
+            block = block.parent
+        return None
+
+
+def _merge_identifiers(tokens: List[Token]) -> List[Token]:
+    """`a`.`b` arrives as IDENT . IDENT, merge it into one dotted IDENT"""
+    merged: List[Token] = []
+    i = 0
+    while i < len(tokens):
+        tok = tokens[i]
+        if tok.kind in (WORD, IDENT) and i + 2 < len(tokens) and tokens[i + 1].value == "." \
+                and tokens[i + 2].kind in (WORD, IDENT):
+            parts = [tok.value]
+            while i + 2 < len(tokens) and tokens[i + 1].value == "." and tokens[i + 2].kind in (WORD, IDENT):
+                parts.append(tokens[i + 2].value)
+                i += 2
+            merged.append(Token(IDENT, ".".join(parts)))
+        else:
+            merged.append(tok)
+        i += 1
+    return merged
+
+
+def _matching_paren(tokens: List[Token], start: int, end: int) -> int:
+    depth = 0
+    for j in range(start, end):
+        value = tokens[j].value
+        if tokens[j].kind == PUNCT:
+            if value == "(":
+                depth += 1
+            elif value == ")":
+                depth -= 1
+                if depth == 0:
+                    return j
+    return end - 1
+
+
+def _is_column(tokens: List[Token], i: int, end: int) -> bool:
+    tok = tokens[i]
+    if tok.kind == IDENT:
+        return True
+    if tok.kind != WORD or tok.upper in RESERVED or tok.value.endswith(".*"):
+        return False
+    # name( is a function call
+    return not (i + 1 < end and tokens[i + 1].value == "(")
+
+
+def _column(tok: Token) -> ColumnRef:
+    qualifier, _, name = tok.value.rpartition(".")
+    return ColumnRef(qualifier or None, name)
+
+
+def _is_constant(tokens: List[Token], i: int, end: int) -> bool:
+    tok = tokens[i]
+    if tok.kind in (STRING, NUMBER, PARAM):
+        return True
+    if tok.kind == OPERATOR and tok.value in ("-", "+") and i + 1 < end and tokens[i + 1].kind in (NUMBER, PARAM):
+        return True
+    # NOW(), CURDATE(), INTERVAL arithmetic... evaluated once per statement
+    if tok.kind == WORD and tok.upper not in RESERVED and i + 1 < end and tokens[i + 1].value == "(":
+        return True
+    return tok.upper in ("NULL", "TRUE", "FALSE", "CURRENT_DATE", "CURRENT_TIMESTAMP")
+
+
+def _inside_function(tokens: List[Token], i: int, start: int) -> bool:
+    """Column is an argument of a function (DATE(col) = ...): not sargable"""
+    if i - 2 < start or tokens[i - 1].value != "(":
+        return False
+    prev = tokens[i - 2]
+    return prev.kind == WORD and prev.upper not in RESERVED
+
+
+class _ConditionScanner:
+    """Collects predicates of one WHERE / ON clause, tracking OR groups"""
+
+    def __init__(self, block: QueryBlock):
+        self.block = block
+        self.groups: List[Tuple[bool, List[Predicate]]] = [(False, [])]
+
+    def open_group(self):
+        self.groups.append((False, []))
+
+    def close_group(self):
+        if len(self.groups) > 1:
+            has_or, preds = self.groups.pop()
+            if has_or:
+                for pred in preds:
+                    pred.in_or = True
+            self.groups[-1][1].extend(preds)
+
+    def mark_or(self):
+        has_or, preds = self.groups[-1]
+        self.groups[-1] = (True, preds)
+
+    def add(self, pred: Predicate):
+        self.groups[-1][1].append(pred)
+
+    def finish(self):
+        while len(self.groups) > 1:
+            self.close_group()
+        has_or, preds = self.groups[0]
+        for pred in preds:
+            if has_or:
+                pred.in_or = True
+            self.block.predicates.append(pred)
+        self.groups = [(False, [])]
+
+    def scan(self, tokens: List[Token], i: int, start: int, end: int) -> int:
+        """Try to read a predicate at i. Returns the next index to look at."""
+        tok = tokens[i]
+        if _is_column(tokens, i, end) and not _inside_function(tokens, i, start):
+            if i + 1 >= end:
+                return i + 1
+            nxt = tokens[i + 1]
+            col = _column(tok)
+            if nxt.kind == OPERATOR and nxt.value in EQ_OPERATORS and i + 2 < end:
+                if _is_column(tokens, i + 2, end) and not (i + 3 < end and tokens[i + 3].kind == OPERATOR):
+                    self.add(Predicate(col, JOIN, _column(tokens[i + 2])))
+                    return i + 3
+                if _is_constant(tokens, i + 2, end):
+                    self.add(Predicate(col, EQ))
+                return i + 2
+            if nxt.kind == OPERATOR and nxt.value in RANGE_OPERATORS:
+                if i + 2 < end and _is_constant(tokens, i + 2, end):
+                    self.add(Predicate(col, RANGE))
+                return i + 2
+            if nxt.upper == "IN":
+                self.add(Predicate(col, IN))
+                return i + 2
+            if nxt.upper == "BETWEEN":
+                self.add(Predicate(col, RANGE))
+                return i + 2
+            if nxt.upper == "LIKE" and i + 2 < end:
+                pattern = tokens[i + 2]
+                if pattern.kind == STRING and pattern.value and pattern.value[0] not in "%_":
+                    self.add(Predicate(col, RANGE))
+                return i + 3
+            if nxt.upper == "IS" and i + 2 < end and tokens[i + 2].upper == "NULL":
+                self.add(Predicate(col, EQ))
+                return i + 3
+            return i + 1
+
+        # const op column
+        if _is_constant(tokens, i, end) and tok.kind != WORD and i + 2 < end and tokens[i + 1].kind == OPERATOR \
+                and _is_column(tokens, i + 2, end):
+            op = tokens[i + 1].value
+            if op in EQ_OPERATORS:
+                self.add(Predicate(_column(tokens[i + 2]), EQ))
+            elif op in RANGE_OPERATORS:
+                self.add(Predicate(_column(tokens[i + 2]), RANGE))
+            return i + 3
+        return i + 1
+
+
+def _read_column_list(tokens: List[Token], start: int, end: int, with_direction: bool):
+    """GROUP BY / ORDER BY items. Returns (items, next index, all items were plain columns)"""
+    items, simple = [], True
+    i = start
+    item: List[Token] = []
+
+    def flush():
+        nonlocal simple
+        if not item:
+            return
+        descending = False
+        body = item
+        if with_direction and body[-1].upper in ("ASC", "DESC"):
+            descending = body[-1].upper == "DESC"
+            body = body[:-1]
+        if len(body) == 1 and _is_column(body, 0, 1):
+            items.append((_column(body[0]), descending))
+        else:
+            simple = False
+
+    depth = 0
+    while i < end:
+        tok = tokens[i]
+        if tok.kind == PUNCT and tok.value == "(":
+            depth += 1
+        elif tok.kind == PUNCT and tok.value == ")":
+            if depth == 0:
+                break
+            depth -= 1
+        elif depth == 0 and tok.kind == PUNCT and tok.value == ",":
+            flush()
+            item = []
+            i += 1
+            continue
+        elif depth == 0 and tok.kind == WORD and (tok.upper in CLAUSES or tok.upper in ("ORDER", "GROUP", "WITH")):
+            break
+        elif depth == 0 and tok.kind == PUNCT and tok.value == ";":
+            break
+        item.append(tok)
+        i += 1
+    flush()
+    return items, i, simple
+
+
+def _parse_block(tokens: List[Token], start: int, end: int, parent: Optional[QueryBlock]) -> QueryBlock:
+    first = tokens[start].upper if start < end else "SELECT"
+    block = QueryBlock(first if first in ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE") else "SELECT", parent)
+    clause = None
+    scanner = _ConditionScanner(block)
+    expect_table = False
+    depth = 0
+    i = start
+
+    while i < end:
+        tok = tokens[i]
+        value, upper = tok.value, tok.upper
+
+        # Subquery / derived table: parse as child block
+        if tok.kind == PUNCT and value == "(" and i + 1 < end and tokens[i + 1].upper in ("SELECT", "WITH"):
+            close = _matching_paren(tokens, i, end)
+            child = _parse_block(tokens, i + 1, close, block)
+            block.children.append(child)
+            i = close + 1
+            if clause == "FROM" and expect_table:
+                alias = None
+                if i < end and tokens[i].upper == "AS":
+                    i += 1
+                if i < end and tokens[i].kind in (WORD, IDENT) and tokens[i].upper not in RESERVED:
+                    alias = tokens[i].value
+                    i += 1
+                block.tables.append(TableRef(None, None, alias))
+                expect_table = False
+            continue
+
+        if tok.kind == PUNCT and value == "(":
+            depth += 1
+            if clause in CONDITION_CLAUSES:
+                scanner.open_group()
+            i += 1
+            continue
+        if tok.kind == PUNCT and value == ")":
+            depth = max(0, depth - 1)
+            if clause in CONDITION_CLAUSES:
+                scanner.close_group()
+            i += 1
+            continue
+
+        if depth == 0 and tok.kind == WORD and (upper in CLAUSES or upper in ("GROUP", "ORDER", "DELETE", "INSERT")):
+            if clause in CONDITION_CLAUSES:
+                scanner.finish()
+            if upper in ("GROUP", "ORDER") and i + 1 < end and tokens[i + 1].upper == "BY":
+                items, i, simple = _read_column_list(tokens, i + 2, end, with_direction=(upper == "ORDER"))
+                if upper == "GROUP":
+                    block.group_by = [col for col, _ in items] if simple else []
+                else:
+                    block.order_by = items if simple else []
+                clause = upper
+                continue
+            clause = CLAUSES.get(upper, upper)
+            expect_table = clause in ("FROM", "UPDATE", "INTO")
+            i += 1
+            continue
+
+        if clause in ("FROM", "UPDATE", "INTO"):
+            if tok.kind == PUNCT and value == "," and depth == 0:
+                expect_table = clause == "FROM"
+            elif expect_table and tok.kind in (WORD, IDENT) and upper not in RESERVED:
+                schema, _, table = value.rpartition(".")
+                alias = None
+                j = i + 1
+                if j < end and tokens[j].upper == "AS":
+                    j += 1
+                if j < end and tokens[j].kind in (WORD, IDENT) and tokens[j].upper not in RESERVED \
+                        and tokens[j].upper not in CLAUSES:
+                    alias = tokens[j].value
+                    j += 1
+                block.tables.append(TableRef(schema or None, table, alias))
+                expect_table = False
+                i = j
+                continue
+            elif upper in ("INNER", "LEFT", "RIGHT", "OUTER", "CROSS", "NATURAL"):
+                pass
+            i += 1
+            continue
+
+        if clause in CONDITION_CLAUSES:
+            if tok.kind == WORD and upper == "OR" or tok.kind == OPERATOR and value == "||":
+                scanner.mark_or()
+                i += 1
+                continue
+            i = scanner.scan(tokens, i, start, end)
+            continue
+
+        i += 1
+
+    if clause in CONDITION_CLAUSES:
+        scanner.finish()
+    return block
+
+
+@lru_cache(maxsize=8192)
+def parse_query(sql: str) -> QueryBlock:
+    """Parse a statement into its block tree (cached, treat the result as read-only)"""
+    tokens = _merge_identifiers(tokenize(sql))
+    # WITH cte AS (...) SELECT: the CTE bodies become child blocks of the main statement
+    return _parse_block(tokens, 0, len(tokens), None)
@@ -0,0 +1,79 @@
+"""
+Lightweight SQL tokenizer
+
+Splits a statement into tokens in a single regex pass. Comments are
+dropped, string literals and quoted identifiers are kept as single tokens,
+so keyword checks never match text inside strings or comments.
+"""
+
+import re
+from typing import List
+
+# Token kinds
+WORD = "word"          # keyword or bare identifier (may be dotted: schema.table)
+IDENT = "ident"        # `backtick quoted` identifier, value without backticks
+STRING = "string"      # 'literal' or "literal", value without quotes
+NUMBER = "number"
+PARAM = "param"        # ? placeholder or :name
+PUNCT = "punct"        # ( ) , ; . *
+OPERATOR = "operator"  # = <> <= >= != < > + - / % || etc.
+COMMENT = "comment"    # -- ..., # ... or /* ... */ (strict mode only)
+
+# Leading whitespace is absorbed by each match so it costs no extra iteration
+_TOKEN_RE = re.compile(r"""
+    \s*(?:
+      (?P<comment>--[^\n]*|\#[^\n]*|/\*.*?(?:\*/|$))
+    | (?P<string>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*")
+    | (?P<ident>`(?:[^`]|``)*`)
+    | (?P<number>\d+(?:\.\d+)?(?:[eE][-+]?\d+)?|\.\d+)
+    | (?P<word>[A-Za-z_@$][\w$]*(?:\.(?:[A-Za-z_][\w$]*|`(?:[^`]|``)*`|\*))*)
+    | (?P<param>\?|:[A-Za-z_]\w*)
+    | (?P<operator><=>|<>|!=|<=|>=|\|\||&&|:=|[=<>+\-/%!~^&|])
+    | (?P<punct>[(),;.*])
+    )
+""", re.VERBOSE | re.DOTALL)
+
+
+class Token:
+    __slots__ = ("kind", "value", "upper")
+
+    def __init__(self, kind: str, value: str):
+        self.kind = kind
+        self.value = value
+        self.upper = value.upper()
+
+    def __repr__(self):
+        return f"Token({self.kind}, {self.value!r})"
+
+
+def tokenize(sql: str, strict: bool = False) -> List[Token]:
+    """
+    Tokenize a SQL statement. Unknown characters are skipped; with `strict`
+    they raise ValueError and comments are kept as COMMENT tokens, for
+    callers that validate untrusted SQL fragments.
+    """
+    tokens = []
+    if not sql:
+        return tokens
+    end = 0
+    for match in _TOKEN_RE.finditer(sql):
+        if strict and sql[end:match.start()].strip():
+            raise ValueError(f"Unexpected character {sql[end:match.start()].strip()[0]!r} at position {end}")
+        end = match.end()
+        kind = match.lastgroup
+        if kind == "comment" and strict:
+            tokens.append(Token(COMMENT, match.group(kind)))
+            continue
+        if kind is None or kind == "comment":
+            continue  # trailing whitespace
+        value = match.group(kind)
+        if kind == "string":
+            value = value[1:-1]
+        elif kind == "ident":
+            value = value[1:-1].replace("``", "`")
+        elif kind == "word":
+            value = value.replace("`", "")
+        tokens.append(Token(kind, value))
+    if strict and sql[end:].strip():
+        raise ValueError(f"Unexpected character {sql[end:].strip()[0]!r} at position {end}")
+    return tokens
@@ -4,9 +4,11 @@ Replaces older LLM-based query optimization suggestions
 """
 import os
 import json
-import httpx
 from typing import Optional
+from config import SKYAI_AGENT_ID
 from error_factory import ErrorFactory, APIError, ServiceError
+from services.llm_gateway import llm_gateway
+from services.anti_patterns import detect_anti_patterns
 
 
 class SuggestionService:
@@ -16,12 +18,12 @@ class SuggestionService:
     
     def __init__(self):
         self.api_key = os.getenv("SKYSQL_API_KEY")
-        self.api_url = "https://api.skysql.com/copilot/v1/chat/"
+        self.api_url = f"{llm_gateway.base_url}/chat/"
         
         if not self.api_key:
             print("[SuggestionService] WARNING: SKYSQL_API_KEY not set. AI suggestions will be limited.")
     
-    def get_suggestion(self, context: str, query_fingerprint: str) -> dict:
+    async def get_suggestion(self, context: str, query_fingerprint: str) -> dict:
         """
         Generate optimization suggestion based on context with source justifications.
         
@@ -56,7 +58,7 @@ Return ONLY valid JSON, no markdown."""
         # Try SkyAI Copilot
         if self.api_key:
             try:
-                return self._call_skyai(prompt)
+                return await self._call_skyai(prompt)
             except Exception as e:
                 service_error = ErrorFactory.service_error(
                     "AI Suggestion generation",
@@ -68,30 +70,10 @@ Return ONLY valid JSON, no markdown."""
         # Fallback to heuristic-based suggestion
         return self._heuristic_suggestion(query_fingerprint)
     
-    def _call_skyai(self, prompt: str) -> dict:
-        """Call SkyAI Copilot API synchronously"""
-        import requests
-        
-        response = requests.post(
-            self.api_url,
-            headers={
-                "Content-Type": "application/json",
-                "X-API-Key": self.api_key
-            },
-            json={"prompt": prompt, "agent_id": "89256c79-bdfe-435a-8729-4d1e9a9ebca2"},
-            timeout=30
-        )
-        
-        if response.status_code != 200:
-            api_error = ErrorFactory.api_error(
-                "SkyAI Copilot Suggestion",
-                status_code=response.status_code,
-                original_error=Exception(response.text[:100]),
-                endpoint=self.api_url
-            )
-            raise api_error
-        
-        result = response.json()
+    async def _call_skyai(self, prompt: str) -> dict:
+        """Call SkyAI Copilot API through the shared LLM gateway"""
+        # Gateway raises APIError on non-200 / timeout / open circuit
+        result = await llm_gateway.chat(prompt, agent_id=SKYAI_AGENT_ID, timeout=30.0)
         answer = result.get("answer", "{}")
         
         # Parse JSON from response
@@ -119,37 +101,24 @@ Return ONLY valid JSON, no markdown."""
     
     def _heuristic_suggestion(self, fingerprint: str) -> dict:
         """Fallback heuristic-based suggestion when no AI is available"""
-        sql_upper = fingerprint.upper()
-        
-        suggestion_type = "REWRITE"
+        findings = detect_anti_patterns(fingerprint)
+
         sql_fix = None
         confidence = 0.6
         risks = ["This is a heuristic suggestion - manual review recommended"]
-        
-        if "SELECT *" in sql_upper and "WHERE" not in sql_upper:
-            query_explanation = "This query selects all columns without filtering."
-            performance_assessment = "Full table scan is likely. No WHERE clause means every row is examined."
-            actionable_insights = "Add a WHERE clause to filter results. Consider selecting only needed columns."
-            sql_fix = None
-            
-        elif "IN (SELECT" in sql_upper:
-            query_explanation = "This query uses a subquery in the IN clause."
-            performance_assessment = "Subqueries in IN clauses can be slow due to repeated execution."
-            actionable_insights = "Consider rewriting as a JOIN for better performance."
-            suggestion_type = "REWRITE"
-            
-        elif "LIKE '%" in sql_upper:
-            query_explanation = "This query uses a leading wildcard in LIKE."
-            performance_assessment = "Leading wildcards prevent index usage, causing full scans."
-            actionable_insights = "Consider using full-text search or restructuring the query."
-            suggestion_type = "REWRITE"
-            
+
+        if findings:
+            top = findings[0]
+            query_explanation = f"This query matches the anti-pattern: {top.message}."
+            performance_assessment = top.explanation
+            actionable_insights = " ".join(f.suggested_fix.rstrip(".") + "." for f in findings if f.suggested_fix)
+            suggestion_type = top.suggestion_type
         else:
             query_explanation = "Query pattern requires analysis."
             performance_assessment = "Unable to determine specific issues without AI analysis."
             actionable_insights = "Consider adding indexes on columns in WHERE and JOIN clauses."
             suggestion_type = "INDEX"
-        
+
         return {
             "query_explanation": query_explanation,
             "performance_assessment": performance_assessment,
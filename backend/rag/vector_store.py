@@ -112,6 +112,70 @@ class VectorStore:
             print(f"[VectorStore] {db_error}")
             return []
 
+    def search_similar_batch(self, query_embeddings: List[List[float]], limit: int = 3, threshold: float = 0.5,
+                             queries_per_round_trip: int = 50) -> List[List[Dict[str, Any]]]:
+        """
+        Vector search for many embeddings at once.
+        
+        Each group of `queries_per_round_trip` embeddings is sent as one
+        UNION ALL statement (one ORDER BY ... LIMIT branch per embedding, so
+        every branch can still use the vector index). Returns one result
+        list per input embedding, in input order.
+        """
+        import time
+        start_t = time.time()
+        results: List[List[Dict[str, Any]]] = [[] for _ in query_embeddings]
+        if not query_embeddings:
+            return results
+        
+        try:
+            conn = self.get_connection(database="finops_auditor")
+            cursor = conn.cursor(dictionary=True)
+            
+            for offset in range(0, len(query_embeddings), queries_per_round_trip):
+                group = query_embeddings[offset:offset + queries_per_round_trip]
+                branches = []
+                params = []
+                for i, embedding in enumerate(group):
+                    if not embedding:
+                        continue
+                    branches.append(f"""
+                        (SELECT 
+                            {offset + i} AS query_idx,
+                            source_type, 
+                            source_id, 
+                            content, 
+                            VEC_DISTANCE_COSINE(VEC_FromText(?), embedding) as distance
+                        FROM doc_embeddings
+                        ORDER BY distance ASC
+                        LIMIT ?)""")
+                    params.extend([str(embedding), limit])
+                if not branches:
+                    continue
+                
+                cursor.execute(" UNION ALL ".join(branches), tuple(params))
+                for row in cursor.fetchall():
+                    # Threshold applied after the per-branch LIMIT: rows are
+                    # distance-ordered, so this matches search_similar()
+                    if row['distance'] is not None and row['distance'] < threshold:
+                        idx = int(row.pop('query_idx'))
+                        results[idx].append(row)
+            
+            conn.close()
+            for rows in results:
+                rows.sort(key=lambda r: r['distance'])
+            elapsed = (time.time() - start_t) * 1000
+            print(f"[PERF] Batch vector search (MariaDB) took {elapsed:.2f}ms for {len(query_embeddings)} queries")
+            return results
+        except Exception as e:
+            db_error = ErrorFactory.database_error(
+                "Vector Store Batch Similarity Search",
+                f"Failed to batch search {len(query_embeddings)} embeddings in MariaDB",
+                original_error=e
+            )
+            print(f"[VectorStore] {db_error}")
+            return results
+
     def get_document_count(self) -> int:
         """Get the total number of documents in the vector store"""
         try:
@@ -213,7 +213,7 @@ async def get_suggestion(query_id: int, sql_text: str = None):
 
     # 4. Generate AI Suggestion
     logger.info(f"[/suggest] Analyzing query with {len(sources)} real context sources...")
-    result = deps.suggestion_service.get_suggestion(context, fingerprint)
+    result = await deps.suggestion_service.get_suggestion(context, fingerprint)
     
     # Calculate real-time cost estimation
     rows_examined = 1000 # Default if unknown
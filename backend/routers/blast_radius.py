@@ -10,6 +10,7 @@ from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 from database import get_db_connection
 from error_factory import ErrorFactory, DatabaseError
+from services.anti_patterns import get_features
 
 router = APIRouter()
 
@@ -64,48 +65,33 @@ class BlastRadiusResponse(BaseModel):
 
 def detect_affected_tables(sql: str) -> List[str]:
     """Extract table names from SQL query"""
-    sql_upper = sql.upper()
-    tables = []
-    
-    # Simple table extraction (can be improved with proper SQL parser)
-    keywords = ["FROM", "JOIN", "UPDATE", "INTO", "TABLE"]
-    
-    for keyword in keywords:
-        if keyword in sql_upper:
-            parts = sql_upper.split(keyword)
-            if len(parts) > 1:
-                # Get next word after keyword
-                next_part = parts[1].strip().split()[0] if parts[1].strip() else ""
-                if next_part and next_part not in ["SELECT", "WHERE", "SET", "VALUES"]:
-                    table_name = next_part.replace("(", "").replace(")", "").replace(";", "")
-                    if table_name and table_name not in tables:
-                        tables.append(table_name.lower())
-    
-    return tables
+    # FROM / JOIN / UPDATE / INTO / TABLE targets, including "FROM a, b" lists
+    return list(get_features(sql).tables)
 
 
 def estimate_lock_duration(sql: str, table_size_estimate: int = 1000000) -> float:
     """Estimate lock duration based on query type and table size"""
-    sql_upper = sql.strip().upper()
+    features = get_features(sql)
+    statement_type = features.statement_type
     
     # Base estimates (ms)
-    if sql_upper.startswith("SELECT"):
-        if "FOR UPDATE" in sql_upper:
+    if statement_type == "SELECT":
+        if features.for_update:
             return 50.0  # Row lock
         return 5.0  # No lock
-    elif sql_upper.startswith("UPDATE"):
-        if "WHERE" in sql_upper:
+    elif statement_type == "UPDATE":
+        if features.has_where:
             return 100.0  # Row-level lock
         return table_size_estimate * 0.001  # Full table scan
-    elif sql_upper.startswith("DELETE"):
-        if "WHERE" in sql_upper:
+    elif statement_type == "DELETE":
+        if features.has_where:
             return 80.0
         return table_size_estimate * 0.002
-    elif sql_upper.startswith("INSERT"):
+    elif statement_type == "INSERT":
         return 20.0
-    elif "ALTER TABLE" in sql_upper:
+    elif features.alter_table:
         return table_size_estimate * 0.1  # DDL locks entire table
-    elif "LOCK TABLES" in sql_upper:
+    elif features.lock_tables:
         return 5000.0  # Explicit lock
     
     return 50.0
@@ -188,16 +174,16 @@ def analyze_lock_impact(sql: str, affected_tables: List[str]) -> List[LockImpact
     """Analyze potential lock impact on concurrent queries"""
     
     lock_impacts = []
-    sql_upper = sql.strip().upper()
+    features = get_features(sql)
     
     for table in affected_tables:
         # Determine lock type
-        if "ALTER TABLE" in sql_upper or "LOCK TABLES" in sql_upper:
+        if features.alter_table or features.lock_tables:
             lock_type = "TABLE_LOCK"
             risk_level = "CRITICAL"
             concurrent_blocked = 100
-        elif sql_upper.startswith("UPDATE") or sql_upper.startswith("DELETE"):
-            if "WHERE" in sql_upper:
+        elif features.statement_type in ("UPDATE", "DELETE"):
+            if features.has_where:
                 lock_type = "ROW_LOCK"
                 risk_level = "MEDIUM"
                 concurrent_blocked = 10
@@ -205,7 +191,7 @@ def analyze_lock_impact(sql: str, affected_tables: List[str]) -> List[LockImpact
                 lock_type = "TABLE_SCAN_LOCK"
                 risk_level = "HIGH"
                 concurrent_blocked = 50
-        elif "FOR UPDATE" in sql_upper:
+        elif features.for_update:
             lock_type = "ROW_LOCK"
             risk_level = "MEDIUM"
             concurrent_blocked = 5
@@ -1,13 +1,90 @@
 from fastapi import APIRouter, HTTPException, Body
+from fastapi.responses import StreamingResponse
+from typing import List, Tuple
 import os
 import time
-import requests
+import asyncio
 import deps
 from schemas.brain import BrainChatRequest, BrainChatResponse, BrainSource, ChatRequest
 from error_factory import ErrorFactory, APIError, ServiceError, DatabaseError
+from services.llm_gateway import llm_gateway
+from services.cache import document_count_cache
+from services.sse import format_sse, SSE_HEADERS
 
 router = APIRouter()
 
+def _retrieve_context(user_message: str) -> Tuple[str, List[BrainSource]]:
+    """Vector search the knowledge base and build the prompt context + display sources"""
+    query_embedding = deps.embedding_service.get_embedding(user_message)
+    similar_docs = deps.vector_store.search_similar(query_embedding, limit=5)
+    
+    # Build context from retrieved documents
+    context_parts = []
+    sources = []
+    for doc in similar_docs:
+        source_type = doc.get('source_type', 'unknown')
+        source_id = doc.get('source_id', 'unknown')
+        content = doc.get('content', '')[:500]
+        context_parts.append(f"[{source_type}:{source_id}]\n{content}")
+        
+        # Parse source for display
+        sources.append(BrainSource(
+            type=source_type,
+            id=source_id,
+            title=source_id if source_type == "jira" else "Documentation",
+            relevance=""  # Will be filled by AI
+        ))
+    
+    return "\n\n".join(context_parts), sources
+
+
+def _build_prompt(user_message: str, context: str) -> str:
+    return f"""You are MariaDB Brain - an AI assistant that knows everything about MariaDB.
+You have access to 10 years of Jira tickets, bug reports, and documentation.
+
+USER QUESTION: {user_message}
+
+RETRIEVED KNOWLEDGE BASE CONTEXT:
+{context if context else "No specific context retrieved."}
+
+INSTRUCTIONS:
+1. Answer the user's question directly and helpfully
+2. If the retrieved context contains relevant information, cite it naturally (e.g., "According to MDEV-XXXX...")
+3. Be concise but thorough
+4. If you don't know something or it's not in the context, say so honestly
+5. Focus on being practical and actionable
+6. Use markdown formatting for code blocks, lists, etc.
+
+Respond with a helpful answer:"""
+
+
+def _fallback_answer(sources: List[BrainSource], error: Exception) -> str:
+    """Context-based response when AI is unavailable"""
+    if sources:
+        answer = f"Based on the knowledge base, I found {len(sources)} relevant sources:\n\n"
+        for src in sources[:3]:
+            answer += f"- **{src.id}**: {src.title}\n"
+        answer += "\nPlease check these sources for detailed information."
+        return answer
+    return f"I'm unable to process your question at the moment. (Error: {str(error)[:100]})"
+
+
+async def _retrieve_context_async(user_message: str) -> Tuple[str, List[BrainSource]]:
+    """Run the blocking embedding + vector search off the event loop"""
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, _retrieve_context, user_message)
+    except Exception as e:
+        # Use ErrorFactory for service errors
+        service_error = ErrorFactory.service_error(
+            "Vector Store Search",
+            "Brain chat vector search failed",
+            original_error=e
+        )
+        print(f"[/brain/chat] Vector search failed: {service_error}")
+        return "", []
+
+
 @router.post("/chat", response_model=BrainChatResponse)
 async def brain_chat(request: BrainChatRequest):
     """
@@ -30,40 +107,8 @@ async def brain_chat(request: BrainChatRequest):
             kb_count=0
         )
     
-    # 1. Get embedding for user question
-    try:
-        query_embedding = deps.embedding_service.get_embedding(user_message)
-        similar_docs = deps.vector_store.search_similar(query_embedding, limit=5)
-        
-        # Build context from retrieved documents
-        context_parts = []
-        sources = []
-        for doc in similar_docs:
-            source_type = doc.get('source_type', 'unknown')
-            source_id = doc.get('source_id', 'unknown')
-            content = doc.get('content', '')[:500]
-            context_parts.append(f"[{source_type}:{source_id}]\n{content}")
-            
-            # Parse source for display
-            sources.append(BrainSource(
-                type=source_type,
-                id=source_id,
-                title=source_id if source_type == "jira" else "Documentation",
-                relevance=""  # Will be filled by AI
-            ))
-        
-        context = "\n\n".join(context_parts)
-        
-    except Exception as e:
-        # Use ErrorFactory for service errors
-        service_error = ErrorFactory.service_error(
-            "Vector Store Search",
-            "Brain chat vector search failed",
-            original_error=e
-        )
-        print(f"[/brain/chat] Vector search failed: {service_error}")
-        context = ""
-        sources = []
+    # 1. Get embedding for user question and search the knowledge base
+    context, sources = await _retrieve_context_async(user_message)
     
     # 2. Generate AI response using SkyAI Copilot
     try:
@@ -71,39 +116,8 @@ async def brain_chat(request: BrainChatRequest):
         if not skysql_api_key:
             raise Exception("SKYSQL_API_KEY not configured")
         
-        prompt = f"""You are MariaDB Brain - an AI assistant that knows everything about MariaDB.
-You have access to 10 years of Jira tickets, bug reports, and documentation.
-
-USER QUESTION: {user_message}
-
-RETRIEVED KNOWLEDGE BASE CONTEXT:
-{context if context else "No specific context retrieved."}
-
-INSTRUCTIONS:
-1. Answer the user's question directly and helpfully
-2. If the retrieved context contains relevant information, cite it naturally (e.g., "According to MDEV-XXXX...")
-3. Be concise but thorough
-4. If you don't know something or it's not in the context, say so honestly
-5. Focus on being practical and actionable
-6. Use markdown formatting for code blocks, lists, etc.
-
-Respond with a helpful answer:"""
-
-        response = requests.post(
-            "https://api.skysql.com/copilot/v1/chat",
-            headers={
-                "Content-Type": "application/json",
-                "X-API-Key": skysql_api_key
-            },
-            json={"prompt": prompt},
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            answer = result.get("answer", "No response from AI.")
-        else:
-            raise Exception(f"SkyAI returned {response.status_code}")
+        result = await llm_gateway.chat(_build_prompt(user_message, context), path="/chat", timeout=30.0)
+        answer = result.get("answer", "No response from AI.")
         
     except Exception as e:
         # Use ErrorFactory for API errors
@@ -114,14 +128,7 @@ Respond with a helpful answer:"""
             endpoint="/copilot/v1/chat"
         )
         print(f"[/brain/chat] AI generation failed: {api_error}")
-        # Provide context-based response when AI is unavailable
-        if sources:
-            answer = f"Based on the knowledge base, I found {len(sources)} relevant sources:\n\n"
-            for src in sources[:3]:
-                answer += f"- **{src.id}**: {src.title}\n"
-            answer += "\nPlease check these sources for detailed information."
-        else:
-            answer = f"I'm unable to process your question at the moment. (Error: {str(e)[:100]})"
+        answer = _fallback_answer(sources, e)
     
     # Get KB count
     kb_count = 0
@@ -140,6 +147,65 @@ Respond with a helpful answer:"""
     )
 
 
+@router.post("/chat/stream")
+async def brain_chat_stream(request: BrainChatRequest):
+    """
+    Streaming variant of /brain/chat (server-sent events).
+    
+    Emits `sources` as soon as the vector search finishes, then `token`
+    events as answer text arrives, then a final `done` event.
+    """
+    user_message = request.message.strip()
+
+    async def event_stream():
+        start_total = time.time()
+        if not deps.rag_enabled:
+            yield format_sse("token", {"text": "⚠️ The knowledge base is currently offline. Please check the backend configuration."})
+            yield format_sse("done", {"kb_count": 0})
+            return
+        if not user_message:
+            yield format_sse("token", {"text": "Please ask me a question about MariaDB!"})
+            yield format_sse("done", {"kb_count": 0})
+            return
+
+        context, sources = await _retrieve_context_async(user_message)
+        yield format_sse("sources", {
+            "sources": [src.model_dump() for src in sources[:3]],
+            "elapsed_ms": round((time.time() - start_total) * 1000, 2)
+        })
+
+        error = None
+        try:
+            if not os.getenv("SKYSQL_API_KEY"):
+                raise Exception("SKYSQL_API_KEY not configured")
+            async for chunk in llm_gateway.stream_chat(_build_prompt(user_message, context), path="/chat", timeout=30.0):
+                yield format_sse("token", {"text": chunk})
+        except Exception as e:
+            api_error = ErrorFactory.api_error(
+                "SkyAI Brain chat streaming failed",
+                status_code=500,
+                original_error=e,
+                endpoint="/copilot/v1/chat"
+            )
+            print(f"[/brain/chat/stream] AI generation failed: {api_error}")
+            error = str(e)[:200]
+            yield format_sse("token", {"text": _fallback_answer(sources, e)})
+
+        kb_count = document_count_cache.get("kb_count")
+        if kb_count is None:
+            try:
+                kb_count = deps.vector_store.get_document_count()
+                document_count_cache.set("kb_count", kb_count)
+            except Exception:
+                kb_count = 0
+
+        elapsed_total = (time.time() - start_total) * 1000
+        print(f"[PERF] Total /brain/chat/stream processing took {elapsed_total:.2f}ms")
+        yield format_sse("done", {"kb_count": kb_count, "elapsed_ms": round(elapsed_total, 2), "error": error})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
 @router.get("/stats")
 async def brain_stats():
     """Get knowledge base statistics"""
@@ -148,7 +214,7 @@ async def brain_stats():
     
     try:
         kb_count = deps.vector_store.get_document_count()
-        return {"kb_count": kb_count, "status": "online"}
+        return {"kb_count": kb_count, "status": "online", "llm_gateway": llm_gateway.get_stats()}
     except Exception as e:
         # Use ErrorFactory for service errors
         service_error = ErrorFactory.service_error(
@@ -164,8 +230,6 @@ async def copilot_chat(request: ChatRequest = Body(...)):
     """
     Forward chat to SkyAI Copilot API (MariaDB's native AI assistant)
     """
-    import httpx
-    
     skysql_api_key = os.getenv("SKYSQL_API_KEY")
     
     if not skysql_api_key:
@@ -175,25 +239,12 @@ async def copilot_chat(request: ChatRequest = Body(...)):
         )
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://api.skysql.com/copilot/v1/chat",
-                headers={
-                    "Content-Type": "application/json",
-                    "X-API-Key": skysql_api_key
-                },
-                json={"prompt": request.prompt, "context": request.context},
-                timeout=30.0
-            )
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"SkyAI Copilot API error: {response.text}"
-                )
-    except httpx.TimeoutException:
-        raise HTTPException(status_code=504, detail="SkyAI Copilot request timed out")
-    except httpx.RequestError as e:
-        raise HTTPException(status_code=503, detail=f"SkyAI Copilot connection failed: {str(e)}")
+        return await llm_gateway.chat(
+            request.prompt,
+            context=request.context,
+            path="/chat",
+            timeout=30.0
+        )
+    except APIError as e:
+        # Gateway maps timeouts to 504 and connection failures / open circuit to 503
+        raise HTTPException(status_code=e.status_code, detail=e.message)
@@ -1,10 +1,13 @@
 from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 import os
 import json
+import time
 import logging
 from error_factory import ErrorFactory
+from services.sse import format_sse, SSE_HEADERS
 
 # Dependencies
 import deps
@@ -29,9 +32,10 @@ class ChatResponse(BaseModel):
 # --- LangChain Setup ---
 # We initialize this lazily or on module load if services are ready
 _chain = None
+_retriever = None
 
 def get_langchain_chain():
-    global _chain
+    global _chain, _retriever
     if _chain:
         return _chain
         
@@ -47,6 +51,7 @@ def get_langchain_chain():
             database="finops_auditor"
         )
         retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
+        _retriever = retriever
         
         # 2. Setup LLM (Mock or Real)
         # For the demo, if no API key, we might use a fake LLM or just context injection.
@@ -90,9 +95,15 @@ def get_langchain_chain():
         def format_docs(docs):
             return "\n\n".join(f"[Ticket {d.metadata.get('source_id')}]: {d.page_content}" for d in docs)
 
+        def resolve_docs(x):
+            # Streaming callers retrieve first (to emit sources early) and pass docs in
+            if x.get("docs") is not None:
+                return x["docs"]
+            return retriever.invoke(x["question"])
+
         _chain = (
             {
-                "context": (lambda x: format_docs(retriever.invoke(x["question"]))),
+                "context": (lambda x: format_docs(resolve_docs(x))),
                 "question": lambda x: x["question"],
                 "system_context": lambda x: x["system_context"]
             }
@@ -150,3 +161,55 @@ async def chat(request: ChatRequest):
         )
         logger.error(service_error)
         return ChatResponse(answer=f"I encountered an error processing your request: {str(service_error)}")
+
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Streaming variant of /chat (server-sent events).
+    
+    Emits `sources` right after retrieval, then `token` events from the
+    LangChain chain's astream(), then a final `done` event.
+    """
+    async def event_stream():
+        start_total = time.time()
+        if not deps.rag_enabled:
+            yield format_sse("token", {"text": "RAG Services are currently unavailable. Please check backend logs."})
+            yield format_sse("done", {})
+            return
+
+        chain = get_langchain_chain()
+        if not chain:
+            yield format_sse("token", {"text": "[System] LangChain Agent not initialized. Falling back to rule-based diagnostic.\n\n" +
+                                               "Analysis: The query seems to be scanning too many rows. Please run 'EXPLAIN' manually."})
+            yield format_sse("done", {})
+            return
+
+        error = None
+        try:
+            docs = await _retriever.ainvoke(request.prompt)
+            yield format_sse("sources", {
+                "sources": [dict(d.metadata) for d in docs],
+                "elapsed_ms": round((time.time() - start_total) * 1000, 2)
+            })
+
+            async for chunk in chain.astream({
+                "question": request.prompt,
+                "system_context": request.context or "No system context provided.",
+                "docs": docs
+            }):
+                if chunk:
+                    yield format_sse("token", {"text": chunk})
+        except Exception as e:
+            service_error = ErrorFactory.service_error(
+                "Copilot Chain",
+                "Chain streaming failed during chat processing",
+                original_error=e
+            )
+            logger.error(service_error)
+            error = str(service_error)
+            yield format_sse("token", {"text": f"I encountered an error processing your request: {error}"})
+
+        yield format_sse("done", {"elapsed_ms": round((time.time() - start_total) * 1000, 2), "error": error})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
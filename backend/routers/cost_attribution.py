@@ -3,6 +3,7 @@ from pydantic import BaseModel
 from typing import Optional, Dict, Any
 from error_factory import ErrorFactory
 import re
+from services.anti_patterns import get_features
 
 router = APIRouter(prefix="/cost", tags=["cost"])
 
@@ -63,27 +64,28 @@ def estimate_io_requests(sql: str, rows_examined: Optional[int] = None) -> int:
         # Approximation: 1 I/O request per 100 rows examined, min 1
         return max(rows_examined // 100, 1)
     
-    # Heuristic estimation based on query patterns
-    sql_lower = sql.lower()
+    # Heuristic estimation based on query structure (shared rule engine features)
+    features = get_features(sql)
+    select_star = features.select_star
     
     # Pattern: subquery IN (expensive, often full scans or correlated)
-    if "in (select" in sql_lower:
+    if features.in_subquery or features.not_in_subquery:
         return 5000
         
     # Pattern: JOIN (optimized)
-    if "join" in sql_lower:
+    if features.has_join:
         # If it's a join but with SELECT *, assume it's still medium-heavy
-        if "select *" in sql_lower:
+        if select_star:
             return 800 # Reduced from 2000
         return 200 # Reduced from 500
 
     # Full table scan (SELECT * without WHERE)
-    if "select *" in sql_lower and "where" not in sql_lower:
+    if select_star and not features.has_where:
         return 5000 # Reduced from 10000
     
     # Query with WHERE but no explicit columns
-    if "where" in sql_lower:
-        if "select *" in sql_lower:
+    if features.has_where:
+        if select_star:
             return 400 # Reduced from 1000
         return 100 # Reduced from 300
     
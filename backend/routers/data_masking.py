@@ -3,15 +3,27 @@ Dynamic Data Masking Router
 Automatic PII masking (emails, credit cards, etc.) based on role
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import re
-from database import get_db_connection
+import asyncio
 from error_factory import ErrorFactory
+from database import get_pooled_connection
+from mcp_service import MCPService
+from services.pii_sampler import pii_sampler
+from services.masking_engine import (
+    MaskingEngine, NdjsonMaskingStream, mask_arrow_stream, arrow_available, redact_column,
+    DIGIT_RE, NON_DIGIT_RE
+)
+from services.result_stream import ResultStreamer, ndjson_line, NDJSON_HEADERS
 
 router = APIRouter(prefix="/masking", tags=["Data Masking"])
 
+ARROW_STREAM_TYPE = "application/vnd.apache.arrow.stream"
+masking_engine = MaskingEngine()
+
 
 class MaskingAnalyzeRequest(BaseModel):
     database: str = "shop_demo"
@@ -24,6 +36,14 @@ class MaskingApplyRequest(BaseModel):
     masking_level: str = "partial"
 
 
+class MaskingQueryRequest(BaseModel):
+    sql: str
+    database: str = "shop_demo"
+    masking_level: str = "partial"  # partial | full; the proxy never returns clear PII
+    max_rows: int = 100000
+    max_bytes: int = 64 * 1024 * 1024
+
+
 class MaskingRule(BaseModel):
     column_pattern: str
     data_type: str
@@ -36,6 +56,10 @@ class MaskingConfigureRequest(BaseModel):
     rules: List[MaskingRule]
 
 
+TEXT_TYPES = ('char', 'varchar', 'tinytext', 'text', 'mediumtext', 'longtext')
+NUMBER_TYPES = ('int', 'bigint', 'decimal')
+
+
 class PIIDetector:
     """PII column detector"""
     
@@ -43,56 +67,86 @@ class PIIDetector:
         'email': {
             'column_names': ['email', 'mail', 'e_mail', 'contact_email'],
             'regex': r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$',
-            'masking_strategy': 'partial_email'
+            'masking_strategy': 'partial_email',
+            'data_types': TEXT_TYPES
         },
         'phone': {
             'column_names': ['phone', 'telephone', 'mobile', 'cell', 'tel'],
             'regex': r'^\+?[\d\s\-\(\)]{10,}$',
-            'masking_strategy': 'partial_phone'
+            'masking_strategy': 'partial_phone',
+            'data_types': TEXT_TYPES + NUMBER_TYPES
         },
         'credit_card': {
             'column_names': ['credit_card', 'card_number', 'cc', 'card', 'payment_card'],
             'regex': r'^\d{4}[\s\-]?\d{4}[\s\-]?\d{4}[\s\-]?\d{4}$',
-            'masking_strategy': 'partial_card'
+            'masking_strategy': 'partial_card',
+            'data_types': TEXT_TYPES + NUMBER_TYPES
         },
         'ssn': {
             'column_names': ['ssn', 'social_security', 'security_number'],
             'regex': r'^\d{3}-\d{2}-\d{4}$',
-            'masking_strategy': 'full_mask'
+            'masking_strategy': 'full_mask',
+            'data_types': TEXT_TYPES
         },
         'iban': {
             'column_names': ['iban', 'bank_account', 'account_number'],
             'regex': r'^[A-Z]{2}\d{2}[A-Z0-9]{1,30}$',
-            'masking_strategy': 'partial_iban'
+            'masking_strategy': 'partial_iban',
+            'data_types': TEXT_TYPES
         },
         'address': {
             'column_names': ['address', 'street', 'home_address', 'billing_address'],
             'regex': None,
-            'masking_strategy': 'partial_address'
+            'masking_strategy': 'partial_address',
+            'data_types': TEXT_TYPES
         }
     }
     
+    COMPILED_PATTERNS = {
+        pii_type: re.compile(config['regex'])
+        for pii_type, config in PII_PATTERNS.items() if config['regex']
+    }
+    
     @classmethod
-    def detect_pii_column(cls, column_name: str, sample_values: List[str]) -> Optional[Dict]:
-        """Detects if a column contains PII"""
+    def match_pii_type(cls, column_name: str, data_type: Optional[str] = None) -> Optional[str]:
+        """PII type suggested by a column's name (and SQL type, when known)"""
         column_lower = column_name.lower()
         
         for pii_type, config in cls.PII_PATTERNS.items():
             if any(pattern in column_lower for pattern in config['column_names']):
-                confidence = 0.8
-                
-                if config['regex'] and sample_values:
-                    matches = sum(1 for val in sample_values if val and re.match(config['regex'], str(val)))
-                    if matches > 0:
-                        confidence = min(0.95, 0.8 + (matches / len(sample_values)) * 0.15)
-                
-                return {
-                    'pii_type': pii_type,
-                    'confidence': confidence,
-                    'masking_strategy': config['masking_strategy']
-                }
+                if data_type is not None and data_type.lower() not in config['data_types']:
+                    return None
+                return pii_type
         
         return None
+    
+    @classmethod
+    def is_candidate(cls, column_name: str, data_type: Optional[str] = None) -> bool:
+        """Prefilter for sampling: only these columns can be reported as PII"""
+        return cls.match_pii_type(column_name, data_type) is not None
+    
+    @classmethod
+    def detect_pii_column(cls, column_name: str, sample_values: List[str],
+                          data_type: Optional[str] = None) -> Optional[Dict]:
+        """Detects if a column contains PII"""
+        pii_type = cls.match_pii_type(column_name, data_type)
+        if pii_type is None:
+            return None
+        
+        config = cls.PII_PATTERNS[pii_type]
+        confidence = 0.8
+        
+        pattern = cls.COMPILED_PATTERNS.get(pii_type)
+        if pattern and sample_values:
+            matches = sum(1 for val in sample_values if val and pattern.match(str(val)))
+            if matches > 0:
+                confidence = min(0.95, 0.8 + (matches / len(sample_values)) * 0.15)
+        
+        return {
+            'pii_type': pii_type,
+            'confidence': confidence,
+            'masking_strategy': config['masking_strategy']
+        }
 
 
 class DataMasker:
@@ -124,11 +178,12 @@ class DataMasker:
         if level == "full":
             return "***-***-****"
         
-        digits = re.sub(r'\D', '', phone)
+        digits = NON_DIGIT_RE.sub('', phone)
         if len(digits) < 4:
             return "***"
         
-        return phone[:-4].replace(re.findall(r'\d', phone[:-4])[0] if re.findall(r'\d', phone[:-4]) else '', '*', len(re.findall(r'\d', phone[:-4])) - 2) + phone[-4:]
+        head_digits = DIGIT_RE.findall(phone[:-4])
+        return phone[:-4].replace(head_digits[0] if head_digits else '', '*', len(head_digits) - 2) + phone[-4:]
     
     @staticmethod
     def mask_credit_card(card: str, level: str = "partial") -> str:
@@ -139,7 +194,7 @@ class DataMasker:
         if level == "full":
             return "****-****-****-****"
         
-        digits = re.sub(r'\D', '', card)
+        digits = NON_DIGIT_RE.sub('', card)
         if len(digits) < 4:
             return "****"
         
@@ -218,44 +273,24 @@ class DataMasker:
 async def analyze_pii_columns(request: MaskingAnalyzeRequest):
     """
     Analyzes database columns to detect PII
+    
+    Only columns whose name and type can hold PII are sampled, one query
+    per table, tables in parallel (see services/pii_sampler.py).
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        cursor.execute(f"USE {request.database}")
-        
-        if request.tables:
-            tables_clause = "AND TABLE_NAME IN (" + ','.join(['%s'] * len(request.tables)) + ")"
-            cursor.execute(f"""
-                SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE
-                FROM INFORMATION_SCHEMA.COLUMNS
-                WHERE TABLE_SCHEMA = %s {tables_clause}
-                ORDER BY TABLE_NAME, ORDINAL_POSITION
-            """, (request.database, *request.tables))
-        else:
-            cursor.execute("""
-                SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE
-                FROM INFORMATION_SCHEMA.COLUMNS
-                WHERE TABLE_SCHEMA = %s
-                ORDER BY TABLE_NAME, ORDINAL_POSITION
-            """, (request.database,))
-        
-        columns = cursor.fetchall()
+        loop = asyncio.get_event_loop()
+        columns, samples, stats = await loop.run_in_executor(
+            None, pii_sampler.sample, request.database, request.tables, PIIDetector.is_candidate
+        )
         
         pii_columns = []
         
-        for col in columns:
-            table_name = col['TABLE_NAME']
-            column_name = col['COLUMN_NAME']
-            data_type = col['DATA_TYPE']
-            
-            cursor.execute(
-                f"SELECT {column_name} FROM {table_name} WHERE {column_name} IS NOT NULL LIMIT 5"
-            )
-            samples = [row[column_name] for row in cursor.fetchall()]
+        for table_name, column_name, data_type in columns:
+            column_samples = samples.get((table_name, column_name))
+            if column_samples is None:
+                continue
             
-            pii_info = PIIDetector.detect_pii_column(column_name, samples)
+            pii_info = PIIDetector.detect_pii_column(column_name, column_samples, data_type)
             
             if pii_info:
                 pii_columns.append({
@@ -266,20 +301,18 @@ async def analyze_pii_columns(request: MaskingAnalyzeRequest):
                     'confidence': pii_info['confidence'],
                     'masking_strategy': pii_info['masking_strategy'],
                     'sample_masked': DataMasker.apply_masking(
-                        samples[0] if samples else None,
+                        column_samples[0] if column_samples else None,
                         pii_info['pii_type']
                     )
                 })
         
-        cursor.close()
-        conn.close()
-        
         return {
             "success": True,
             "database": request.database,
             "total_columns_analyzed": len(columns),
             "pii_columns_detected": len(pii_columns),
             "pii_columns": pii_columns,
+            "sampling": stats,
             "recommendations": [
                 "Enable masking for DBA role to ensure GDPR compliance",
                 "Configure audit trail to track who accessed PII data",
@@ -289,7 +322,6 @@ async def analyze_pii_columns(request: MaskingAnalyzeRequest):
         
     except Exception as e:
         db_error = ErrorFactory.database_error(
-            "PII Analysis",
             f"Failed to analyze PII columns in database {request.database}",
             original_error=e
         )
@@ -300,6 +332,51 @@ async def analyze_pii_columns(request: MaskingAnalyzeRequest):
         }
 
 
+def resolve_masking_level(role: str, requested: str) -> str:
+    """admin sees clear values, dba the requested level, everyone else full masks"""
+    if role == "admin":
+        return "none"
+    if role == "dba":
+        return requested
+    return "full"
+
+
+def detect_pii_columns(columns: List[str]) -> Dict[int, str]:
+    """Result column index -> PII type, from the column names"""
+    pii_column_indices = {}
+    for idx, col_name in enumerate(columns):
+        pii_info = PIIDetector.detect_pii_column(col_name, [])
+        if pii_info:
+            pii_column_indices[idx] = pii_info['pii_type']
+    return pii_column_indices
+
+
+def source_pii_columns(cursor, columns: List[str]) -> Tuple[Dict[int, str], List[int]]:
+    """
+    Result column index -> PII type, from the source table/column of each
+    result column (cursor.metadata org_table / org_field of MariaDB
+    Connector/Python), so aliases don't hide PII. Columns without a source
+    column (CONCAT(email, ''), other expressions) can't be classified and
+    are returned as unverified. Raises ValueError without metadata.
+    """
+    metadata = getattr(cursor, "metadata", None) or {}
+    source_tables = metadata.get("org_table") or ()
+    source_columns = metadata.get("org_field") or ()
+    if len(source_tables) != len(columns) or len(source_columns) != len(columns):
+        raise ValueError("Result column source metadata unavailable, refusing to stream the result")
+    
+    pii_columns, unverified = {}, []
+    for idx, (name, source_table, source_column) in enumerate(zip(columns, source_tables, source_columns)):
+        if not source_table or not source_column:
+            unverified.append(idx)
+            continue
+        # The source name decides; a PII-looking alias is masked too
+        pii_info = PIIDetector.detect_pii_column(source_column, []) or PIIDetector.detect_pii_column(name, [])
+        if pii_info:
+            pii_columns[idx] = pii_info['pii_type']
+    return pii_columns, unverified
+
+
 @router.post("/apply")
 async def apply_masking(request: MaskingApplyRequest):
     """
@@ -315,33 +392,16 @@ async def apply_masking(request: MaskingApplyRequest):
         columns = request.query_result['columns']
         rows = request.query_result.get('rows', [])
         
-        pii_column_indices = {}
-        for idx, col_name in enumerate(columns):
-            pii_info = PIIDetector.detect_pii_column(col_name, [])
-            if pii_info:
-                pii_column_indices[idx] = pii_info['pii_type']
-        
-        if request.role == "admin":
-            masking_level = "none"
-        elif request.role == "dba":
-            masking_level = request.masking_level
-        else:
-            masking_level = "full"
+        pii_column_indices = detect_pii_columns(columns)
+        masking_level = resolve_masking_level(request.role, request.masking_level)
         
         if masking_level == "none":
             masked_rows = rows
         else:
-            masked_rows = []
-            for row in rows:
-                masked_row = list(row)
-                for idx, pii_type in pii_column_indices.items():
-                    if idx < len(masked_row):
-                        masked_row[idx] = DataMasker.apply_masking(
-                            masked_row[idx],
-                            pii_type,
-                            masking_level
-                        )
-                masked_rows.append(masked_row)
+            masked_rows = masking_engine.mask_rows(
+                [list(row) for row in rows],
+                masking_engine.maskers(pii_column_indices, masking_level)
+            )
         
         return {
             "success": True,
@@ -371,6 +431,120 @@ async def apply_masking(request: MaskingApplyRequest):
         }
 
 
+@router.post("/apply/stream")
+async def apply_masking_stream(http_request: Request, role: str = "dba", masking_level: str = "partial"):
+    """
+    Streaming variant of /apply for large exports
+    
+    The body is NDJSON - a {"type": "columns"} line then {"type": "row"}
+    lines or bare JSON arrays, e.g. the output of /sandbox/test/stream -
+    or, with Content-Type application/vnd.apache.arrow.stream and pyarrow
+    installed, an Arrow IPC stream. Rows are masked in column batches as
+    the body arrives and returned in the same format; NDJSON output ends
+    with a {"type": "masking_summary"} line (rows, cells masked, rows/sec).
+    """
+    level = resolve_masking_level(role, masking_level)
+    content_type = http_request.headers.get("content-type", "")
+    
+    if content_type.startswith(ARROW_STREAM_TYPE):
+        if not arrow_available():
+            raise HTTPException(status_code=415, detail="Arrow input needs pyarrow on the server")
+        body = await http_request.body()
+        return StreamingResponse(mask_arrow_stream(body, detect_pii_columns, level), media_type=ARROW_STREAM_TYPE)
+    
+    async def ndjson():
+        stream = NdjsonMaskingStream(detect_pii_columns, level, masking_engine)
+        try:
+            async for chunk in http_request.stream():
+                for line in stream.feed(chunk):
+                    yield line
+            for line in stream.finish():
+                yield line
+        except ValueError as e:
+            service_error = ErrorFactory.service_error(
+                "Data Masking",
+                "Invalid NDJSON input for streamed masking",
+                original_error=e
+            )
+            yield ndjson_line({"type": "error", "error": str(service_error), "rows_masked": stream.rows})
+    
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson", headers=NDJSON_HEADERS)
+
+
+@router.post("/query/stream")
+async def stream_masked_query(request: MaskingQueryRequest):
+    """
+    Masking proxy: runs a read-only query and streams the masked rows
+    
+    Unlike /apply, clear PII never leaves the server: there is no role
+    that turns masking off, masking_level only chooses partial or full.
+    PII columns are found from the source table/column of each result
+    column, not from its (possibly aliased) name; computed columns can't
+    be classified and are fully masked (unverified_columns). Same
+    read-only rules as the MCP query_database tool. Rows are read from an
+    unbuffered cursor, capped like /sandbox/test/stream (max_rows /
+    max_bytes) and masked batch by batch with the masking functions
+    resolved once per column, so memory use does not depend on the result
+    size.
+    
+    Lines: {"type": "columns"} (with masked_columns), {"type": "row"} per
+    row, then {"type": "summary"} or {"type": "error"}.
+    """
+    level = "full" if request.masking_level == "full" else "partial"
+    error = MCPService._validate_read_only(request.sql)
+    
+    def ndjson():
+        if error:
+            yield ndjson_line({"type": "error", "error": error})
+            return
+        
+        conn = None
+        cursor = None
+        try:
+            conn = get_pooled_connection(request.database)
+            cursor = conn.cursor(buffered=False)
+            streamer = ResultStreamer(cursor, row_limit=request.max_rows, byte_limit=request.max_bytes)
+            streamer.execute(request.sql)
+            columns = streamer.columns
+            try:
+                pii_columns, unverified = source_pii_columns(cursor, columns)
+            except ValueError:
+                streamer.finish()
+                raise
+            maskers = masking_engine.maskers(pii_columns, level)
+            for idx in unverified:
+                maskers[idx] = redact_column
+            yield ndjson_line({
+                "type": "columns",
+                "columns": columns,
+                "masked_columns": [columns[idx] for idx in sorted(maskers)],
+                "unverified_columns": [columns[idx] for idx in unverified]
+            })
+            
+            for values in masking_engine.mask_stream(streamer.rows(), maskers):
+                yield ndjson_line({"type": "row", "values": values})
+            
+            yield ndjson_line({
+                "type": "summary",
+                **streamer.stats(),
+                "masking_level": level
+            })
+        except Exception as e:
+            db_error = ErrorFactory.database_error(
+                "Masked query failed",
+                original_error=e,
+                sql=request.sql[:100]
+            )
+            yield ndjson_line({"type": "error", "error": str(db_error)})
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+    
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson", headers=NDJSON_HEADERS)
+
+
 @router.get("/rules")
 async def get_masking_rules(role: str = "dba"):
     """
@@ -1,15 +1,19 @@
 """
 Database Branching Router
 Copy-on-write style database cloning for safe DDL and optimization testing.
+Branches are cloned by background jobs (services/branch_cloner.py).
 """
 
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional
+import asyncio
 import hashlib
 from datetime import datetime
 from database import get_db_connection
 from error_factory import ErrorFactory
+from services.branch_cloner import branch_cloner, COMPLETED
+from services.branch_diff import BranchDataDiff
 
 router = APIRouter(prefix="/branching", tags=["Database Branching"])
 
@@ -19,11 +23,22 @@ class BranchCreateRequest(BaseModel):
     branch_name: str
     description: Optional[str] = None
     copy_data: bool = False
+    tables: Optional[List[str]] = None
+    sample_percent: Optional[float] = Field(None, gt=0, le=100)
+    filters: Optional[Dict[str, str]] = None  # table -> WHERE condition
+    fk_closure: bool = True
+    parallelism: int = Field(4, ge=1, le=32)
+    chunk_size: int = Field(5000, ge=100, le=100000)
+    wait: bool = False  # respond once the clone finished (the synchronous behaviour before clone jobs)
 
 
 class BranchCompareRequest(BaseModel):
     source_database: str
     branch_database: str
+    compare_data: bool = False
+    tables: Optional[List[str]] = None
+    chunk_size: int = Field(10000, ge=100, le=1000000)
+    algorithm: str = "crc32"  # crc32 | md5
 
 
 class BranchMergeRequest(BaseModel):
@@ -43,8 +58,14 @@ class BranchManager:
         return hashlib.sha256(content.encode()).hexdigest()[:12]
     
     @staticmethod
-    def create_branch_database(conn, source_db: str, branch_name: str, copy_data: bool = False) -> str:
-        """Creates a new isolated branch database by cloning schema and optionally data"""
+    def create_branch_database(conn, source_db: str, branch_name: str, copy_data: bool = False,
+                               tables: Optional[List[str]] = None, sample_rows: Optional[int] = None) -> str:
+        """
+        Creates a new isolated branch database by cloning schema and optionally data,
+        serially on `conn` (small, synchronous clones such as what-if seeds;
+        /branching/create uses services/branch_cloner.py). `tables` restricts the clone to a subset of tables; with `sample_rows`
+        (and copy_data) at most that many randomly sampled rows are copied per table.
+        """
         cursor = conn.cursor(dictionary=True)
         
         branch_db_name = f"{source_db}_branch_{branch_name}"
@@ -53,8 +74,9 @@ class BranchManager:
         cursor.execute(f"DROP DATABASE IF EXISTS `{branch_db_name}`")
         cursor.execute(f"CREATE DATABASE `{branch_db_name}`")
         
-        cursor.execute(f"SHOW TABLES FROM `{source_db}`")
-        tables = [list(row.values())[0] for row in cursor.fetchall()]
+        if tables is None:
+            cursor.execute(f"SHOW TABLES FROM `{source_db}`")
+            tables = [list(row.values())[0] for row in cursor.fetchall()]
         
         # Disable foreign key checks for the cloning process (session-level)
         cursor.execute("SET SESSION FOREIGN_KEY_CHECKS = 0")
@@ -69,10 +91,7 @@ class BranchManager:
                 cursor.execute(create_table_ddl)
                 
                 if copy_data:
-                    cursor.execute(f"""
-                        INSERT INTO `{branch_db_name}`.`{table}`
-                        SELECT * FROM `{source_db}`.`{table}`
-                    """)
+                    BranchManager.copy_table_data(cursor, source_db, branch_db_name, table, sample_rows)
         finally:
             # Re-enable foreign key checks
             cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
@@ -80,6 +99,36 @@ class BranchManager:
         cursor.close()
         return branch_db_name
     
+    @staticmethod
+    def copy_table_data(cursor, source_db: str, branch_db: str, table: str, sample_rows: Optional[int] = None) -> None:
+        """Copies all rows, or a random sample of about `sample_rows` rows"""
+        sample_filter = ""
+        if sample_rows:
+            cursor.execute("""
+                SELECT TABLE_ROWS FROM INFORMATION_SCHEMA.TABLES
+                WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s
+            """, (source_db, table))
+            row = cursor.fetchone()
+            table_rows = int((row or {}).get('TABLE_ROWS') or 0)
+            if table_rows > sample_rows:
+                # Single pass with a Bernoulli filter instead of ORDER BY RAND()
+                fraction = min(1.0, 1.2 * sample_rows / table_rows)
+                sample_filter = f" WHERE RAND() < {fraction:.6f} LIMIT {int(sample_rows)}"
+        
+        cursor.execute(f"""
+            INSERT INTO `{branch_db}`.`{table}`
+            SELECT * FROM `{source_db}`.`{table}`{sample_filter}
+        """)
+    
+    @staticmethod
+    def drop_branch_database(conn, branch_db_name: str) -> None:
+        """Drops a branch database (only names created by create_branch_database)"""
+        if '_branch_' not in branch_db_name:
+            raise ValueError(f"Refusing to drop non-branch database '{branch_db_name}'")
+        cursor = conn.cursor()
+        cursor.execute(f"DROP DATABASE IF EXISTS `{branch_db_name}`")
+        cursor.close()
+    
     @staticmethod
     def get_schema_diff(conn, db1: str, db2: str) -> Dict[str, Any]:
         """Compares schemas between two databases to find DDL differences"""
@@ -120,57 +169,50 @@ class BranchManager:
 async def create_branch(request: BranchCreateRequest):
     """
     Creates a database branch (simulated copy-on-write)
+    
+    Returns as soon as the empty branch database exists; tables are cloned
+    in parallel by a background job. Poll GET /branching/jobs/{job_id} for
+    per-table progress, or send wait=true to get the response once the
+    branch is complete. size_mb and creation_time_sec are only known then
+    (null while the job runs; the finished job reports them too).
     """
     try:
-        conn = get_db_connection()
-        
-        cursor = conn.cursor(dictionary=True)
-        
-        cursor.execute("SHOW DATABASES")
-        databases = [row['Database'] for row in cursor.fetchall()]
-        
-        if request.source_database not in databases:
-            cursor.close()
-            conn.close()
-            return {
-                "success": False,
-                "message": f"Source database '{request.source_database}' not found"
-            }
-        
         branch_id = BranchManager.generate_branch_id(
             request.source_database,
             request.branch_name
         )
         
-        start_time = datetime.now()
-        
-        branch_db_name = BranchManager.create_branch_database(
-            conn,
+        loop = asyncio.get_event_loop()
+        job = await loop.run_in_executor(None, lambda: branch_cloner.start(
             request.source_database,
             request.branch_name,
-            request.copy_data
-        )
-        
-        creation_time_sec = (datetime.now() - start_time).total_seconds()
-        
-        cursor.execute(f"""
-            SELECT 
-                ROUND(SUM(DATA_LENGTH + INDEX_LENGTH) / 1024 / 1024, 2) as size_mb
-            FROM INFORMATION_SCHEMA.TABLES
-            WHERE TABLE_SCHEMA = %s
-        """, (branch_db_name,))
-        
-        size_result = cursor.fetchone()
-        size_mb = size_result.get('size_mb', 0) if size_result else 0
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+            copy_data=request.copy_data,
+            tables=request.tables,
+            sample_percent=request.sample_percent,
+            filters=request.filters,
+            fk_closure=request.fk_closure,
+            chunk_size=request.chunk_size,
+            parallelism=request.parallelism,
+            background=not request.wait
+        ))
+        branch_db_name = job.branch_database
+        summary = job.to_dict(include_tables=False)
+        
+        if request.wait and job.status != COMPLETED:
+            return {
+                "success": False,
+                "mode": "error",
+                "message": job.error or f"Branch creation {job.status.lower()}",
+                "job_id": job.job_id,
+                "status": job.status
+            }
         
         return {
             "success": True,
             "mode": "live",
-            "message": "Branch created successfully",
+            "message": "Branch created successfully" if request.wait else "Branch creation started",
+            "job_id": job.job_id,
+            "status": job.status,
             "branch": {
                 "branch_id": branch_id,
                 "branch_name": request.branch_name,
@@ -178,16 +220,20 @@ async def create_branch(request: BranchCreateRequest):
                 "source_database": request.source_database,
                 "description": request.description,
                 "created_at": datetime.now().isoformat(),
-                "size_mb": float(size_mb or 0),
                 "data_copied": request.copy_data,
-                "creation_time_sec": round(creation_time_sec, 2)
+                "sample_percent": request.sample_percent,
+                "tables": len(job.tables),
+                "size_mb": summary["size_mb"],
+                "creation_time_sec": summary["creation_time_sec"]
             },
             "usage": {
+                "progress": f"GET /branching/jobs/{job.job_id}",
                 "test_ddl": f"USE {branch_db_name}; ALTER TABLE orders ADD INDEX ...",
                 "compare": f"POST /branching/compare with source={request.source_database}, branch={branch_db_name}",
                 "merge": f"POST /branching/merge with branch={branch_db_name}, target={request.source_database}"
             },
             "recommendations": [
+                "Wait for the clone job to complete before testing",
                 "Test your DDL changes in this branch",
                 "Run load tests without affecting production",
                 "Compare schemas before merging",
@@ -195,9 +241,13 @@ async def create_branch(request: BranchCreateRequest):
             ]
         }
         
+    except ValueError as e:
+        return {
+            "success": False,
+            "message": str(e)
+        }
     except Exception as e:
         db_error = ErrorFactory.database_error(
-            "Database Branching",
             f"Failed to create branch database for {request.source_database}",
             original_error=e
         )
@@ -208,6 +258,51 @@ async def create_branch(request: BranchCreateRequest):
         }
 
 
+@router.get("/jobs")
+async def list_branch_jobs():
+    """Branch clone jobs started or resumed by this backend"""
+    return {"success": True, "jobs": branch_cloner.list_jobs()}
+
+
+@router.get("/jobs/{job_id}")
+async def get_branch_job(job_id: str):
+    """Progress of a branch clone job, per table"""
+    job = branch_cloner.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Branch job {job_id} not found")
+    return {"success": True, "job": job.to_dict()}
+
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_branch_job(job_id: str):
+    """Stop a clone job after the current chunks; it can be resumed later"""
+    job = branch_cloner.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Branch job {job_id} not found")
+    return {"success": True, "job": job.to_dict()}
+
+
+@router.post("/jobs/{job_id}/resume")
+async def resume_branch_job(job_id: str):
+    """Resume a cancelled or failed clone job from its checkpoints (also after a restart)"""
+    try:
+        loop = asyncio.get_event_loop()
+        job = await loop.run_in_executor(None, branch_cloner.resume, job_id)
+        return {"success": True, "job": job.to_dict()}
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        db_error = ErrorFactory.database_error(
+            f"Failed to resume branch job {job_id}",
+            original_error=e
+        )
+        return {
+            "success": False,
+            "mode": "error",
+            "message": str(db_error)
+        }
+
+
 @router.get("/list")
 async def list_branches(source_database: Optional[str] = None):
     """
@@ -263,7 +358,6 @@ async def list_branches(source_database: Optional[str] = None):
         
     except Exception as e:
         db_error = ErrorFactory.database_error(
-            "Database Branching List",
             "Failed to list active database branches",
             original_error=e
         )
@@ -278,6 +372,9 @@ async def list_branches(source_database: Optional[str] = None):
 async def compare_branches(request: BranchCompareRequest):
     """
     Compares branch schema with source
+    
+    With compare_data, also reports which rows were inserted, deleted or
+    updated in the branch, using per-chunk checksums (services/branch_diff.py).
     """
     try:
         conn = get_db_connection()
@@ -295,6 +392,23 @@ async def compare_branches(request: BranchCompareRequest):
             len(diff['tables_only_in_branch']) > 0 or
             len(diff['schema_differences']) > 0
         )
+        summary = {
+            "tables_only_in_source": len(diff['tables_only_in_source']),
+            "tables_only_in_branch": len(diff['tables_only_in_branch']),
+            "tables_with_schema_changes": len(diff['schema_differences']),
+            "common_tables": len(diff['common_tables'])
+        }
+        
+        data_diff = None
+        if request.compare_data:
+            differ = BranchDataDiff(chunk_size=request.chunk_size, algorithm=request.algorithm)
+            loop = asyncio.get_event_loop()
+            data_diff = await loop.run_in_executor(
+                None, differ.diff, request.source_database, request.branch_database, request.tables
+            )
+            summary["tables_with_data_changes"] = len(data_diff['tables_with_changes'])
+            summary["rows_changed"] = data_diff['rows_inserted'] + data_diff['rows_deleted'] + data_diff['rows_updated']
+            has_differences = has_differences or bool(data_diff['tables_with_changes'])
         
         return {
             "success": True,
@@ -302,13 +416,9 @@ async def compare_branches(request: BranchCompareRequest):
             "source_database": request.source_database,
             "branch_database": request.branch_database,
             "has_differences": has_differences,
-            "summary": {
-                "tables_only_in_source": len(diff['tables_only_in_source']),
-                "tables_only_in_branch": len(diff['tables_only_in_branch']),
-                "tables_with_schema_changes": len(diff['schema_differences']),
-                "common_tables": len(diff['common_tables'])
-            },
+            "summary": summary,
             "differences": diff,
+            "data_differences": data_diff,
             "merge_safe": not has_differences or len(diff['tables_only_in_source']) == 0,
             "recommendations": [
                 "Review schema differences before merging",
@@ -320,9 +430,13 @@ async def compare_branches(request: BranchCompareRequest):
             ]
         }
         
+    except ValueError as e:
+        return {
+            "success": False,
+            "message": str(e)
+        }
     except Exception as e:
         db_error = ErrorFactory.database_error(
-            "Database Branching Comparison",
             f"Failed to compare source {request.source_database} and branch {request.branch_database}",
             original_error=e
         )
@@ -413,7 +527,6 @@ async def merge_branch(request: BranchMergeRequest):
         
     except Exception as e:
         db_error = ErrorFactory.database_error(
-            "Database Branching Merge",
             f"Failed to merge branch {request.branch_database} into {request.target_database}",
             original_error=e
         )
@@ -437,12 +550,10 @@ async def delete_branch(branch_database: str):
             }
         
         conn = get_db_connection()
-        cursor = conn.cursor()
         
-        cursor.execute(f"DROP DATABASE IF EXISTS {branch_database}")
+        BranchManager.drop_branch_database(conn, branch_database)
         
         conn.commit()
-        cursor.close()
         conn.close()
         
         return {
@@ -453,7 +564,6 @@ async def delete_branch(branch_database: str):
         
     except Exception as e:
         db_error = ErrorFactory.database_error(
-            "Database Branching Deletion",
             f"Failed to delete branch database {branch_database}",
             original_error=e
         )
@@ -1,6 +1,8 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+import json
 import deps
-from models import RewriteRequest, RewriteResponse, FixRequest, FixResponse
+from models import RewriteRequest, RewriteResponse, FixRequest, FixResponse, BatchAnalysisRequest
 
 router = APIRouter()
 
@@ -16,6 +18,26 @@ async def rewrite_query(request: RewriteRequest):
     """
     return await deps.rewriter_service.rewrite_query(request)
 
+@router.post("/rewrite/batch")
+async def rewrite_batch(request: BatchAnalysisRequest):
+    """
+    Rewrite a whole slow-log snapshot in one call.
+    
+    Statements are deduplicated by fingerprint and streamed back as NDJSON
+    (one line per unique fingerprint, in completion order). `indexes` maps
+    each result back to the positions in `statements`.
+    """
+    if deps.batch_service is None:
+        raise HTTPException(status_code=503, detail="Batch analysis unavailable: RAG services are not initialized")
+    
+    async def ndjson():
+        async for item in deps.batch_service.stream_rewrites(
+            request.statements, request.database, request.max_concurrency
+        ):
+            yield json.dumps(item, default=str) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
 @router.post("/execute-fix", response_model=FixResponse)
 async def execute_fix(request: FixRequest):
     """
@@ -1,104 +1,38 @@
 from fastapi import APIRouter
-from typing import Optional
-from database import get_db_connection
-from schemas.simulation import IndexSimulationRequest, IndexSimulationResponse, ExplainPlan
-import re
+from typing import Any, Dict, List
+from schemas.simulation import IndexSimulationRequest, IndexSimulationResponse, IndexCandidatesRequest, IndexAdvisorRequest
+from services.index_advisor import index_advisor
+import deps
 
 router = APIRouter()
 
-async def _perform_index_simulation(sql: str, proposed_index: str, database: Optional[str] = "shop_demo") -> IndexSimulationResponse:
-    """Helper function to perform index simulation logic"""
-    
-    # Parse the index definition to extract table and columns
-    index_match = re.search(
-        r'CREATE\s+INDEX\s+(\w+)\s+ON\s+(\w+)\s*\(([^)]+)\)',
-        proposed_index,
-        re.IGNORECASE
-    )
-    
-    if not index_match:
-        # Fallback for simple simulations
-        index_name = "idx_suggested"
-        table_name = "unknown"
-        index_columns = ["id"]
-    else:
-        index_name = index_match.group(1)
-        table_name = index_match.group(2)
-        index_columns = [col.strip() for col in index_match.group(3).split(',')]
-    
-    # Step 1: Get current EXPLAIN plan
-    current_plan = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        if database:
-            cursor.execute(f"USE {database}")
-        
-        cursor.execute(f"EXPLAIN {sql}")
-        explain_result = cursor.fetchone()
-        conn.close()
-        
-        if explain_result:
-            rows = explain_result.get('rows', 1000)
-            access_type = explain_result.get('type', 'ALL')
-            
-            time_multipliers = {
-                'ALL': 1.0, 'index': 0.8, 'range': 0.3, 'ref': 0.1, 'eq_ref': 0.05, 'const': 0.01, 'system': 0.001
-            }
-            multiplier = time_multipliers.get(access_type, 1.0)
-            estimated_time = (rows * 0.05 * multiplier)
-            
-            current_plan = ExplainPlan(
-                access_type=access_type,
-                rows_examined=rows,
-                key=explain_result.get('key'),
-                key_len=explain_result.get('key_len'),
-                extra=explain_result.get('Extra'),
-                estimated_time_ms=round(estimated_time, 2)
-            )
-    except:
-        current_plan = ExplainPlan(
-            access_type="ALL", rows_examined=10000, key=None, extra="Using where", estimated_time_ms=500.0
-        )
-    
-    # Step 2: Heuristic/AI estimation of improvement
-    improvement = 85.0 if current_plan.access_type == "ALL" else 40.0
-    with_index_access_type = "ref"
-    with_index_rows = max(1, current_plan.rows_examined // 100)
-    
-    # Check if index columns appear in query for better estimation
-    sql_upper = sql.upper()
-    index_cols_in_query = sum(1 for col in index_columns if col.upper() in sql_upper)
-    
-    if index_cols_in_query > 0:
-        improvement = min(95.0, improvement + (index_cols_in_query * 5))
-        recommendation = "HIGHLY RECOMMENDED" if improvement > 80 else "RECOMMENDED"
-    else:
-        improvement = 10.0
-        recommendation = "MARGINAL"
-
-    with_index_plan = ExplainPlan(
-        access_type=with_index_access_type,
-        rows_examined=with_index_rows,
-        key=index_name,
-        key_len=str(len(index_columns) * 4),
-        extra="Using index",
-        estimated_time_ms=round(current_plan.estimated_time_ms * (100 - improvement) / 100, 2)
-    )
-    
-    ai_analysis = f"Optimized access: '{with_index_access_type}' via {index_name}. Expected latency reduction: {improvement}%."
-    
-    return IndexSimulationResponse(
-        current_plan=current_plan,
-        with_index_plan=with_index_plan,
-        improvement_percent=round(improvement, 1),
-        recommendation=recommendation,
-        create_index_sql=proposed_index,
-        ai_analysis=ai_analysis
-    )
-
 @router.post("/simulate-index", response_model=IndexSimulationResponse)
 async def simulate_index(request: IndexSimulationRequest):
     """🎯 Virtual Index Simulator wrapper"""
-    return await _perform_index_simulation(request.sql, request.proposed_index, request.database)
+    # What-if EXPLAIN on a sampled branch, heuristic estimate if no branch can be created
+    return await deps.index_service.perform_index_simulation(request.sql, request.proposed_index, request.database)
+
+@router.post("/simulate-indexes", response_model=List[IndexSimulationResponse])
+async def simulate_indexes(request: IndexCandidatesRequest):
+    """Evaluate several candidate indexes for one query, concurrently, on throwaway branches"""
+    return await deps.index_service.simulate_candidates(request.sql, request.candidate_indexes, request.database)
+
+@router.post("/index-advisor")
+async def index_advisor_recommend(request: IndexAdvisorRequest) -> Dict[str, Any]:
+    """Index set for the whole slow-log workload (or the given statements), under a write budget"""
+    workload = None
+    if request.workload is not None:
+        workload = index_advisor.aggregate([
+            {"sql": s.sql, "executions": s.executions, "total_time": s.total_time_s} for s in request.workload
+        ])
+    return await index_advisor.arecommend(
+        request.database or "shop_demo",
+        index_service=deps.index_service,
+        validate_top=request.validate_top,
+        workload=workload,
+        lookback_hours=request.lookback_hours,
+        max_fingerprints=request.max_fingerprints,
+        max_indexes=request.max_indexes,
+        write_budget_pct=request.write_budget_pct,
+        strategy=request.strategy,
+    )
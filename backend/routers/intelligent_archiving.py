@@ -2,12 +2,16 @@
 ML-based predictive archiving to optimize storage costs
 """
 
+import asyncio
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 from database import get_db_connection
 from error_factory import ErrorFactory
+from services.chunked_archiver import chunked_archiver, ArchiveThrottle, replica_factories_from_env
+from services.archive_export import archive_exporter, target_from_env, available_formats
+from services.table_stats import get_table_stats
 
 router = APIRouter(prefix="/archiving", tags=["Intelligent Archiving"])
 
@@ -17,6 +21,7 @@ class ArchivingAnalyzeRequest(BaseModel):
     tables: Optional[List[str]] = None
     min_size_gb: float = 1.0
     min_age_days: int = 90
+    window_hours: Optional[float] = None  # delta window for access/growth rates (all snapshots by default)
 
 
 class ArchivingSimulateRequest(BaseModel):
@@ -32,6 +37,24 @@ class ArchivingExecuteRequest(BaseModel):
     archive_strategy: str = "s3"
     retention_days: int = 90
     dry_run: bool = True
+    date_column: str = "updated_at"
+    batch_size: int = 1000  # rows per chunk transaction
+    max_threads_running: int = 25  # pause while the server is busier than this
+    max_replication_lag_s: float = 5.0  # pause while a replica (ARCHIVE_REPLICA_HOSTS) lags more
+
+
+class ArchivingExportRequest(BaseModel):
+    database: str = "shop_demo"
+    table: str
+    retention_days: int = 90
+    date_column: str = "updated_at"
+    format: Optional[str] = None  # parquet, csv.zst or csv.gz; best available by default
+    target: str = "local"  # local (ARCHIVE_LOCAL_DIR) or s3 (ARCHIVE_S3_*, MinIO-compatible)
+    parallelism: int = 4
+    delete_after_verify: bool = False
+    batch_size: int = 1000
+    max_threads_running: int = 25
+    max_replication_lag_s: float = 5.0
 
 
 class StorageCostCalculator:
@@ -83,6 +106,15 @@ class StorageCostCalculator:
 class AccessPatternAnalyzer:
     """Access pattern analyzer"""
     
+    @staticmethod
+    def analyze_schema_access(database: str, tables: Optional[List[str]] = None,
+                              window_hours: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Access patterns, sizes and growth of all tables at once (set-based
+        queries, rates from snapshot deltas; see services/table_stats.py)
+        """
+        return get_table_stats().analyze(database, tables, window_hours)
+    
     @staticmethod
     def analyze_table_access(conn, database: str, table: str, days: int = 30) -> Dict[str, Any]:
         """Analyzes access patterns of a table"""
@@ -138,7 +170,6 @@ class AccessPatternAnalyzer:
             
         except Exception as e:
             db_error = ErrorFactory.database_error(
-                "Access Pattern Analysis",
                 f"Failed to analyze access patterns for table {database}.{table}",
                 original_error=e
             )
@@ -162,11 +193,14 @@ class ArchivingPredictor:
         size_gb: float,
         access_frequency: str,
         age_days: int,
-        growth_rate: float
+        growth_rate: Optional[float]
     ) -> Dict[str, Any]:
         """
         Predicts archiving score (0-100)
         A higher score indicates a stronger archiving candidate
+        
+        growth_rate is the fraction of the table size added per 30 days
+        (None when no earlier snapshot is available)
         """
         score = 0
         reasons = []
@@ -204,9 +238,9 @@ class ArchivingPredictor:
             score += 10
             reasons.append(f"Moderate age: {age_days} days")
         
-        if growth_rate < 0.01:
+        if growth_rate is not None and growth_rate < 0.01:
             score += 10
-            reasons.append("Minimal growth rate")
+            reasons.append(f"Minimal growth rate: {growth_rate * 100:.1f}%/month")
         
         score = min(score, 100)
         
@@ -238,58 +272,22 @@ async def analyze_archiving_candidates(request: ArchivingAnalyzeRequest):
     Analyze candidate tables for archiving
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        cursor.execute(f"USE {request.database}")
-        
-        if request.tables:
-            tables_clause = "AND TABLE_NAME IN (" + ','.join(['%s'] * len(request.tables)) + ")"
-            cursor.execute(f"""
-                SELECT 
-                    TABLE_NAME,
-                    ROUND((DATA_LENGTH + INDEX_LENGTH) / 1024 / 1024 / 1024, 2) as size_gb,
-                    TABLE_ROWS,
-                    CREATE_TIME,
-                    UPDATE_TIME
-                FROM INFORMATION_SCHEMA.TABLES
-                WHERE TABLE_SCHEMA = %s {tables_clause}
-                AND TABLE_TYPE = 'BASE TABLE'
-                ORDER BY (DATA_LENGTH + INDEX_LENGTH) DESC
-            """, (request.database, *request.tables))
-        else:
-            cursor.execute(f"""
-                SELECT 
-                    TABLE_NAME,
-                    ROUND((DATA_LENGTH + INDEX_LENGTH) / 1024 / 1024 / 1024, 2) as size_gb,
-                    TABLE_ROWS,
-                    CREATE_TIME,
-                    UPDATE_TIME
-                FROM INFORMATION_SCHEMA.TABLES
-                WHERE TABLE_SCHEMA = %s
-                AND TABLE_TYPE = 'BASE TABLE'
-                AND (DATA_LENGTH + INDEX_LENGTH) / 1024 / 1024 / 1024 >= %s
-                ORDER BY (DATA_LENGTH + INDEX_LENGTH) DESC
-            """, (request.database, request.min_size_gb))
-        
-        tables = cursor.fetchall()
+        loop = asyncio.get_event_loop()
+        tables = await loop.run_in_executor(None, lambda: AccessPatternAnalyzer.analyze_schema_access(
+            request.database, request.tables, request.window_hours
+        ))
         
         candidates = []
         total_archivable_gb = 0
         total_potential_savings = 0
         
-        for table_info in tables:
-            table_name = table_info['TABLE_NAME']
-            size_gb = float(table_info['size_gb'] or 0)
+        for table_name, table_info in sorted(tables.items(), key=lambda t: t[1]['size_bytes'], reverse=True):
+            size_gb = table_info['size_gb']
             
             if size_gb < request.min_size_gb:
                 continue
             
-            access_pattern = AccessPatternAnalyzer.analyze_table_access(
-                conn, request.database, table_name
-            )
-            
-            update_time = table_info.get('UPDATE_TIME')
+            update_time = table_info.get('update_time')
             if update_time:
                 age_days = (datetime.now() - update_time).days
             else:
@@ -298,11 +296,18 @@ async def analyze_archiving_candidates(request: ArchivingAnalyzeRequest):
             if age_days < request.min_age_days:
                 continue
             
+            access_pattern = {
+                key: table_info[key] for key in (
+                    'read_count', 'write_count', 'total_read_time_sec', 'total_write_time_sec',
+                    'access_frequency', 'total_access', 'accesses_per_day', 'basis', 'window_days'
+                )
+            }
+            
             prediction = ArchivingPredictor.predict_archiving_score(
                 size_gb=size_gb,
                 access_frequency=access_pattern['access_frequency'],
                 age_days=age_days,
-                growth_rate=0.01
+                growth_rate=table_info['growth_rate']
             )
             
             if prediction['recommendation'] in ['HIGHLY_RECOMMENDED', 'RECOMMENDED']:
@@ -313,8 +318,9 @@ async def analyze_archiving_candidates(request: ArchivingAnalyzeRequest):
                 candidates.append({
                     'table': table_name,
                     'size_gb': size_gb,
-                    'rows': table_info['TABLE_ROWS'],
+                    'rows': table_info['rows'],
                     'age_days': age_days,
+                    'growth_rate': table_info['growth_rate'],
                     'access_pattern': access_pattern,
                     'prediction': prediction,
                     'potential_savings': savings
@@ -325,9 +331,6 @@ async def analyze_archiving_candidates(request: ArchivingAnalyzeRequest):
         
         candidates.sort(key=lambda x: x['prediction']['archiving_score'], reverse=True)
         
-        cursor.close()
-        conn.close()
-        
         return {
             "success": True,
             "mode": "live",
@@ -352,7 +355,6 @@ async def analyze_archiving_candidates(request: ArchivingAnalyzeRequest):
         
     except Exception as e:
         db_error = ErrorFactory.database_error(
-            "Archiving Analysis",
             f"Failed to analyze archiving candidates for database {request.database}",
             original_error=e
         )
@@ -511,6 +513,10 @@ async def simulate_archiving(request: ArchivingSimulateRequest):
 async def execute_archiving(request: ArchivingExecuteRequest):
     """
     Execute table archiving (async)
+    
+    Rows are moved in primary-key chunks, one short transaction per chunk,
+    by a background job (see services/chunked_archiver.py). Poll
+    GET /archiving/jobs/{job_id} for progress.
     """
     try:
         if request.dry_run:
@@ -526,55 +532,39 @@ async def execute_archiving(request: ArchivingExecuteRequest):
                 ]
             }
         
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        archive_table = f"{request.table}_archive"
-        
-        cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS {request.database}.{archive_table}
-            LIKE {request.database}.{request.table}
-        """)
-        
-        cursor.execute(f"""
-            INSERT INTO {request.database}.{archive_table}
-            SELECT * FROM {request.database}.{request.table}
-            WHERE updated_at < DATE_SUB(NOW(), INTERVAL %s DAY)
-        """, (request.retention_days,))
-        
-        archived_rows = cursor.rowcount
-        
-        cursor.execute(f"""
-            DELETE FROM {request.database}.{request.table}
-            WHERE updated_at < DATE_SUB(NOW(), INTERVAL %s DAY)
-        """, (request.retention_days,))
-        
-        deleted_rows = cursor.rowcount
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+        throttle = ArchiveThrottle(
+            max_threads_running=request.max_threads_running,
+            max_replication_lag_s=request.max_replication_lag_s,
+            replica_factories=replica_factories_from_env()
+        )
+        job = chunked_archiver.start(
+            request.database,
+            request.table,
+            request.retention_days,
+            date_column=request.date_column,
+            batch_size=request.batch_size,
+            throttle=throttle
+        )
         
         return {
             "success": True,
             "mode": "live",
-            "message": "Archiving completed successfully",
+            "message": "Archiving started",
             "table": request.table,
-            "archive_table": archive_table,
-            "archived_rows": archived_rows,
-            "deleted_rows": deleted_rows,
-            "status": "COMPLETED",
+            "archive_table": job.archive_table,
+            "job_id": job.job_id,
+            "status": job.status,
+            "job": job.to_dict(),
             "next_steps": [
-                f"Verify data in {archive_table}",
+                f"Follow progress with GET /archiving/jobs/{job.job_id}",
+                f"Verify data in {job.archive_table}",
                 "Create unified view for transparent access",
-                "Monitor query performance",
                 "Schedule periodic archiving"
             ]
         }
         
     except Exception as e:
         db_error = ErrorFactory.database_error(
-            "Archiving Execution",
             f"Failed to execute archiving for table {request.database}.{request.table}",
             original_error=e
         )
@@ -583,3 +573,123 @@ async def execute_archiving(request: ArchivingExecuteRequest):
             "mode": "error",
             "message": str(db_error)
         }
+
+
+@router.get("/jobs")
+async def list_archiving_jobs():
+    """Archiving jobs started or resumed by this backend"""
+    return {"success": True, "jobs": chunked_archiver.list_jobs()}
+
+
+@router.get("/jobs/{job_id}")
+async def get_archiving_job(job_id: str):
+    """Progress of an archiving job (checkpoint, rows/sec, throttling)"""
+    job = chunked_archiver.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Archiving job {job_id} not found")
+    return {"success": True, "job": job.to_dict()}
+
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_archiving_job(job_id: str):
+    """Stop a job after its current chunk; it can be resumed later"""
+    job = chunked_archiver.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Archiving job {job_id} not found")
+    return {"success": True, "job": job.to_dict()}
+
+
+@router.post("/jobs/{job_id}/resume")
+async def resume_archiving_job(job_id: str, database: str = "shop_demo"):
+    """Resume a cancelled or failed job from its last committed chunk (also after a restart)"""
+    try:
+        job = chunked_archiver.resume(job_id, database)
+        return {"success": True, "job": job.to_dict()}
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        db_error = ErrorFactory.database_error(
+            f"Failed to resume archiving job {job_id}",
+            original_error=e
+        )
+        return {
+            "success": False,
+            "mode": "error",
+            "message": str(db_error)
+        }
+
+
+@router.post("/export")
+async def export_archive(request: ArchivingExportRequest):
+    """
+    Export archivable rows to compressed, date-partitioned files
+    
+    Rows older than the retention period are read in parallel primary-key
+    ranges and written as Parquet/CSV files to a local directory or an
+    S3-compatible bucket (see services/archive_export.py). The export is
+    verified (file hashes, per-range row checksums) and, with
+    delete_after_verify, the exported rows are then removed from the table
+    by a delete-only chunked job, which re-checks each chunk's checksum on
+    its locked rows and stops at the first chunk changed since the export.
+    """
+    try:
+        target = target_from_env(request.target)
+        loop = asyncio.get_event_loop()
+        manifest = await loop.run_in_executor(None, lambda: archive_exporter.export(
+            request.database,
+            request.table,
+            request.retention_days,
+            date_column=request.date_column,
+            fmt=request.format,
+            target=target,
+            parallelism=request.parallelism,
+            chunk_rows=request.batch_size
+        ))
+        verification = await loop.run_in_executor(None, lambda: archive_exporter.verify(manifest, target))
+        
+        job = None
+        if request.delete_after_verify and verification["verified"] and manifest["rows_exported"]:
+            throttle = ArchiveThrottle(
+                max_threads_running=request.max_threads_running,
+                max_replication_lag_s=request.max_replication_lag_s,
+                replica_factories=replica_factories_from_env()
+            )
+            job = chunked_archiver.start(
+                request.database,
+                request.table,
+                request.retention_days,
+                date_column=request.date_column,
+                batch_size=request.batch_size,
+                throttle=throttle,
+                copy_rows=False,
+                cutoff=manifest["cutoff"],
+                pk_limit=manifest["last_pk"],
+                checksums={
+                    "columns": manifest["columns"],
+                    "chunks": [chunk for entry in manifest["ranges"] for chunk in entry["chunks"]]
+                }
+            )
+        
+        return {
+            "success": verification["verified"],
+            "mode": "export",
+            "table": request.table,
+            "manifest": manifest,
+            "verification": verification,
+            "delete_job_id": job.job_id if job else None,
+            "job": job.to_dict() if job else None,
+            "available_formats": available_formats()
+        }
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        db_error = ErrorFactory.database_error(
+            f"Failed to export archive for table {request.database}.{request.table}",
+            original_error=e
+        )
+        return {
+            "success": False,
+            "mode": "error",
+            "message": str(db_error)
+        }
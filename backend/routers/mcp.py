@@ -1,7 +1,9 @@
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 import deps
-from schemas.mcp import MCPExecuteRequest
+from schemas.mcp import MCPExecuteRequest, MCPQueryStreamRequest
 from error_factory import ErrorFactory
+from services.result_stream import ndjson_line, NDJSON_HEADERS
 
 router = APIRouter()
 
@@ -16,7 +18,7 @@ async def get_mcp_manifest():
 async def execute_mcp_tool(request: MCPExecuteRequest):
     """Execute an MCP tool"""
     if deps.mcp_service:
-        return deps.mcp_service.execute_tool(request.tool, request.arguments)
+        return await deps.mcp_service.execute_tool_async(request.tool, request.arguments)
     
     service_error = ErrorFactory.service_error(
         "MCP Service",
@@ -24,9 +26,31 @@ async def execute_mcp_tool(request: MCPExecuteRequest):
     )
     return {"error": str(service_error)}
 
+@router.post("/query/stream")
+async def stream_mcp_query(request: MCPQueryStreamRequest):
+    """query_database as NDJSON: rows are streamed from the server as they are read"""
+    if deps.mcp_service:
+        lines = deps.mcp_service.iter_query_database(
+            request.sql, request.database or "shop_demo", request.max_rows, request.max_bytes
+        )
+    else:
+        service_error = ErrorFactory.service_error(
+            "MCP Service",
+            "MCP Service not available or not initialized"
+        )
+        lines = iter([ndjson_line({"type": "error", "error": str(service_error)})])
+    return StreamingResponse(lines, media_type="application/x-ndjson", headers=NDJSON_HEADERS)
+
 @router.get("/history")
-async def get_mcp_history():
-    """Get recent MCP tool execution history"""
+async def get_mcp_history(limit: int = 20):
+    """Get recent MCP tool execution history (oldest first)"""
     if deps.mcp_service:
-        return deps.mcp_service.tool_history
+        return deps.mcp_service.tool_calls.history(limit=limit)
     return []
+
+@router.get("/stats")
+async def get_mcp_stats():
+    """Per-tool call counts, errors, timeouts, cache hits and latency histograms since start"""
+    if deps.mcp_service:
+        return deps.mcp_service.tool_calls.stats()
+    return {"total_calls": 0, "tools": {}}
@@ -9,6 +9,10 @@ import json
 from datetime import datetime
 from database import get_db_connection
 from error_factory import ErrorFactory
+from services.plan_model import parse_plan, plan_distance, plan_tables, detect_plan_flip
+from services.plan_baselines import plan_baseline_store
+from services.plan_watcher import get_plan_watcher
+from services.explain_service import explain_service
 
 router = APIRouter(prefix="/plan/baseline", tags=["Plan Stability"])
 
@@ -22,6 +26,7 @@ class BaselineCreateRequest(BaseModel):
 class BaselineCompareRequest(BaseModel):
     sql: str
     fingerprint: Optional[str] = None
+    explain_only: bool = False  # compare estimated cost instead of executing the query
 
 
 class BaselineForceRequest(BaseModel):
@@ -48,51 +53,25 @@ def generate_fingerprint(sql: str) -> str:
     return hashlib.sha256(normalized.encode()).hexdigest()[:16]
 
 
-def parse_explain_json(explain_result: List[Dict]) -> Dict[str, Any]:
-    """Parses EXPLAIN FORMAT=JSON results"""
-    if not explain_result or not explain_result[0]:
-        return {}
-    
-    explain_json = explain_result[0].get('EXPLAIN', '{}')
-    if isinstance(explain_json, str):
-        return json.loads(explain_json)
-    return explain_json
-
-
 def calculate_plan_distance(plan1: Dict, plan2: Dict) -> float:
     """
     Calculates the distance between two execution plans
     0.0 = identical, 1.0 = completely different
+
+    Weighted tree edit distance over the full EXPLAIN JSON tree (joins,
+    nested loops, sorts, subqueries), see services.plan_model.
     """
     if not plan1 or not plan2:
         return 1.0
-    
-    distance = 0.0
-    
-    query_block1 = plan1.get('query_block', {})
-    query_block2 = plan2.get('query_block', {})
-    
-    if query_block1.get('table', {}).get('access_type') != query_block2.get('table', {}).get('access_type'):
-        distance += 0.5
-    
-    key1 = query_block1.get('table', {}).get('key')
-    key2 = query_block2.get('table', {}).get('key')
-    if key1 != key2:
-        distance += 0.3
-    
-    using_filesort1 = 'filesort' in str(query_block1).lower()
-    using_filesort2 = 'filesort' in str(query_block2).lower()
-    if using_filesort1 != using_filesort2:
-        distance += 0.2
-    
-    return min(distance, 1.0)
+    return plan_distance(plan1, plan2)
 
 
 def extract_index_from_plan(plan: Dict) -> Optional[str]:
-    """Extracts the index name used in the plan"""
-    query_block = plan.get('query_block', {})
-    table = query_block.get('table', {})
-    return table.get('key')
+    """Extracts the index name used in the plan (first table of the join order)"""
+    for table in plan_tables(parse_plan(plan)):
+        if table.key:
+            return table.key
+    return None
 
 
 def generate_hint(sql: str, index_name: str, hint_type: str = "USE_INDEX") -> str:
@@ -146,9 +125,7 @@ async def create_baseline(request: BaselineCreateRequest):
                     "fingerprint": fingerprint
                 }
         
-        cursor.execute(f"EXPLAIN FORMAT=JSON {request.sql}")
-        explain_result = cursor.fetchall()
-        plan = parse_explain_json(explain_result)
+        plan = explain_service.explain(request.sql, fmt="json", cursor=cursor)
         
         start_time = datetime.now()
         cursor.execute(request.sql)
@@ -178,6 +155,16 @@ async def create_baseline(request: BaselineCreateRequest):
         cursor.close()
         conn.close()
         
+        plan_baseline_store.put({
+            "fingerprint": fingerprint,
+            "query_pattern": request.sql,
+            "best_plan": plan,
+            "best_execution_time_ms": execution_time_ms,
+            "best_cost": float(estimated_cost),
+            "created_at": start_time,
+            "last_validated": start_time
+        })
+        
         return {
             "success": True,
             "message": "Baseline created successfully",
@@ -218,11 +205,8 @@ async def compare_with_baseline(request: BaselineCompareRequest):
         
         fingerprint = request.fingerprint or generate_fingerprint(request.sql)
         
-        cursor.execute(
-            "SELECT * FROM query_plan_baselines WHERE fingerprint = %s",
-            (fingerprint,)
-        )
-        baseline = cursor.fetchone()
+        # Served from memory after the first load
+        baseline = plan_baseline_store.get(fingerprint, cursor=cursor)
         
         if not baseline:
             cursor.close()
@@ -234,23 +218,25 @@ async def compare_with_baseline(request: BaselineCompareRequest):
                 "recommendation": "Call POST /plan/baseline/create to establish a baseline"
             }
         
-        cursor.execute(f"EXPLAIN FORMAT=JSON {request.sql}")
-        explain_result = cursor.fetchall()
-        current_plan = parse_explain_json(explain_result)
-        
-        start_time = datetime.now()
-        cursor.execute(request.sql)
-        cursor.fetchall()
-        current_execution_time_ms = int((datetime.now() - start_time).total_seconds() * 1000)
+        current_plan = explain_service.explain(request.sql, fmt="json", cursor=cursor)
         
-        baseline_plan = json.loads(baseline['best_plan'])
-        plan_distance = calculate_plan_distance(baseline_plan, current_plan)
+        current_tree = parse_plan(current_plan)
+        current_execution_time_ms = None
+        if request.explain_only:
+            # Compare optimizer cost estimates, the statement itself is not run
+            before, after = baseline['plan_tree'].cost, current_tree.cost
+        else:
+            start_time = datetime.now()
+            cursor.execute(request.sql)
+            cursor.fetchall()
+            current_execution_time_ms = int((datetime.now() - start_time).total_seconds() * 1000)
+            before, after = baseline['best_execution_time_ms'], current_execution_time_ms
         
-        plan_flip_detected = plan_distance > 0.3
+        baseline_plan = baseline['best_plan']
+        plan_diff, plan_flip_detected = detect_plan_flip(baseline['plan_tree'], current_tree)
+        distance = plan_diff["distance"]
         
-        performance_regression = (
-            current_execution_time_ms > baseline['best_execution_time_ms'] * 1.5
-        )
+        performance_regression = before > 0 and after > before * 1.5
         
         cursor.close()
         conn.close()
@@ -260,10 +246,11 @@ async def compare_with_baseline(request: BaselineCompareRequest):
             "fingerprint": fingerprint,
             "plan_flip_detected": plan_flip_detected,
             "performance_regression": performance_regression,
-            "plan_distance": round(plan_distance, 2),
+            "plan_distance": round(distance, 2),
+            "plan_diff": plan_diff,
             "baseline": {
                 "execution_time_ms": baseline['best_execution_time_ms'],
-                "cost": float(baseline['best_cost']),
+                "cost": baseline['best_cost'],
                 "created_at": baseline['created_at'].isoformat() if baseline['created_at'] else None
             },
             "current": {
@@ -281,13 +268,10 @@ async def compare_with_baseline(request: BaselineCompareRequest):
             })
         
         if performance_regression:
-            degradation_pct = int(
-                ((current_execution_time_ms - baseline['best_execution_time_ms']) 
-                 / baseline['best_execution_time_ms']) * 100
-            )
+            degradation_pct = int(((after - before) / before) * 100)
             result["recommendations"].append({
                 "severity": "CRITICAL",
-                "message": f"Performance regression: {degradation_pct}% slower than baseline",
+                "message": f"Performance regression: {degradation_pct}% {'costlier' if request.explain_only else 'slower'} than baseline",
                 "action": "Force baseline plan immediately or investigate statistics"
             })
             
@@ -379,11 +363,7 @@ async def force_baseline_plan(request: BaselineForceRequest):
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute(
-            "SELECT best_plan FROM query_plan_baselines WHERE fingerprint = %s",
-            (request.fingerprint,)
-        )
-        baseline = cursor.fetchone()
+        baseline = plan_baseline_store.get(request.fingerprint, cursor=cursor)
         
         if not baseline:
             cursor.close()
@@ -393,7 +373,7 @@ async def force_baseline_plan(request: BaselineForceRequest):
                 "message": "Baseline not found"
             }
         
-        baseline_plan = json.loads(baseline['best_plan'])
+        baseline_plan = baseline['best_plan']
         index_name = extract_index_from_plan(baseline_plan)
         
         if not index_name:
@@ -406,9 +386,7 @@ async def force_baseline_plan(request: BaselineForceRequest):
         
         rewritten_sql = generate_hint(request.sql, index_name, request.hint_type)
         
-        cursor.execute(f"EXPLAIN FORMAT=JSON {rewritten_sql}")
-        explain_result = cursor.fetchall()
-        new_plan = parse_explain_json(explain_result)
+        new_plan = explain_service.explain(rewritten_sql, fmt="json", cursor=cursor)
         
         start_time = datetime.now()
         cursor.execute(rewritten_sql)
@@ -443,6 +421,39 @@ async def force_baseline_plan(request: BaselineForceRequest):
         }
 
 
+@router.get("/watcher/status")
+async def plan_watcher_status():
+    """
+    Status of the background plan-regression watcher
+    """
+    return get_plan_watcher().get_status()
+
+
+@router.get("/watcher/events")
+async def plan_watcher_events(since: int = 0, limit: int = 100):
+    """
+    Plan flips raised by the watcher (poll with ?since=<last seen id>)
+    """
+    events = get_plan_watcher().get_events(since=since, limit=limit)
+    return {
+        "success": True,
+        "count": len(events),
+        "last_id": events[-1]["id"] if events else since,
+        "events": events
+    }
+
+
+@router.post("/watcher/run")
+async def plan_watcher_run():
+    """
+    Run one watch cycle now (EXPLAIN only, never executes the statements)
+    """
+    import asyncio
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(None, get_plan_watcher().run_once)
+    return {"success": True, **result}
+
+
 @router.delete("/{fingerprint}")
 async def delete_baseline(fingerprint: str):
     """
@@ -460,6 +471,7 @@ async def delete_baseline(fingerprint: str):
         deleted = cursor.rowcount > 0
         
         conn.commit()
+        plan_baseline_store.invalidate(fingerprint)
         cursor.close()
         conn.close()
         
@@ -48,8 +48,9 @@ async def stop_poller():
     from main import scheduler
     poller = get_poller()
     
-    if scheduler and scheduler.running:
-        scheduler.pause() # Pause instead of shutdown to avoid lifespan issues
+    if scheduler and scheduler.running and scheduler.get_job('query_poller'):
+        # Pause only this job: the scheduler also runs the plan watcher
+        scheduler.pause_job('query_poller') # Pause instead of shutdown to avoid lifespan issues
         poller.is_running = False
         return {"success": True, "message": "Query poller paused successfully"}
     
@@ -62,8 +63,8 @@ async def start_poller():
     from main import scheduler
     poller = get_poller()
     
-    if scheduler:
-        scheduler.resume()
+    if scheduler and scheduler.get_job('query_poller'):
+        scheduler.resume_job('query_poller')
         poller.is_running = True
         return {"success": True, "message": "Query poller resumed successfully"}
     
@@ -1,8 +1,14 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 import time
+import asyncio
 from database import get_db_connection
 from models import SandboxRequest, SandboxResponse, SandboxResult
 from error_factory import ErrorFactory
+from services.sandbox_bench import sandbox_benchmark
+from services.result_stream import (
+    ResultStreamer, ndjson_line, NDJSON_HEADERS, DEFAULT_ROW_LIMIT, DEFAULT_BYTE_LIMIT
+)
 
 router = APIRouter()
 
@@ -39,6 +45,21 @@ def is_dangerous_query(sql: str) -> tuple[bool, str]:
     return False, ""
 
 
+def begin_sandbox_transaction(cursor, timeout_seconds: int):
+    """REPEATABLE READ transaction with a statement timeout; callers always ROLLBACK"""
+    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+    cursor.execute("START TRANSACTION")
+    cursor.execute(f"SET SESSION max_statement_time = {int(timeout_seconds)}")
+
+
+def make_streamer(cursor, request: SandboxRequest) -> ResultStreamer:
+    return ResultStreamer(
+        cursor,
+        row_limit=request.max_rows or DEFAULT_ROW_LIMIT,
+        byte_limit=request.max_bytes or DEFAULT_BYTE_LIMIT
+    )
+
+
 @router.post("/sandbox/test", response_model=SandboxResponse)
 async def test_query_in_sandbox(request: SandboxRequest):
     """
@@ -59,6 +80,8 @@ async def test_query_in_sandbox(request: SandboxRequest):
     - Timeout protection (default 5s)
     - Dangerous operations blocked (DROP, TRUNCATE, etc.)
     - Isolated transaction (REPEATABLE READ)
+    - Results are streamed from the server and capped (max_rows / max_bytes),
+      a large SELECT is never loaded into memory
     """
     
     # Security check
@@ -81,29 +104,28 @@ async def test_query_in_sandbox(request: SandboxRequest):
     try:
         # Get database connection
         conn = get_db_connection(database=request.database)
-        cursor = conn.cursor(dictionary=True)
+        # Unbuffered: rows come off the wire as they are consumed
+        cursor = conn.cursor(buffered=False)
         
         start_time = time.time()
         
-        # Start transaction with REPEATABLE READ isolation
-        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
-        cursor.execute("START TRANSACTION")
+        begin_sandbox_transaction(cursor, request.timeout_seconds)
         
-        # Execute the query with timeout
-        cursor.execute(f"SET SESSION max_statement_time = {request.timeout_seconds}")
-        cursor.execute(request.sql)
+        # Execute the query (server-side row cap)
+        streamer = make_streamer(cursor, request)
+        streamer.execute(request.sql)
         
         # Get results
         rows_affected = cursor.rowcount
         
-        # For SELECT queries, fetch results
-        if query_type == "SELECT":
-            results = cursor.fetchall()
-            columns = list(results[0].keys()) if results else []
-            rows = [list(row.values()) for row in results]
+        # For SELECT queries, read results up to the row / byte cap
+        if streamer.has_result_set:
+            columns = streamer.columns
+            rows = list(streamer.rows())
+            rows_affected = len(rows)
         else:
             # For UPDATE/DELETE/INSERT, show affected rows
-            results = []
+            streamer.finish()
             columns = ["rows_affected"]
             rows = [[rows_affected]]
         
@@ -115,6 +137,8 @@ async def test_query_in_sandbox(request: SandboxRequest):
         # Build success message
         if query_type == "SELECT":
             message = f"Query tested safely - {len(rows)} rows returned"
+            if streamer.truncated:
+                message += f" (truncated at {streamer.truncated_reason.replace('_', ' ')})"
         else:
             message = f"Query tested safely - would affect {rows_affected} rows (NOT persisted)"
         
@@ -126,7 +150,10 @@ async def test_query_in_sandbox(request: SandboxRequest):
                 columns=columns,
                 rows=rows,
                 rows_affected=rows_affected,
-                execution_time_ms=round(execution_time_ms, 2)
+                execution_time_ms=round(execution_time_ms, 2),
+                rows_examined=streamer.rows_examined,
+                truncated=streamer.truncated,
+                truncated_reason=streamer.truncated_reason
             ),
             query_type=query_type,
             warning="⚠️ Changes were NOT persisted - this was a safe test" if query_type != "SELECT" else None,
@@ -142,7 +169,6 @@ async def test_query_in_sandbox(request: SandboxRequest):
                 pass
         
         db_error = ErrorFactory.database_error(
-            "Sandbox Query Execution",
             "Query failed during safe sandbox test",
             original_error=e,
             sql=request.sql[:100]
@@ -180,15 +206,91 @@ async def test_query_in_sandbox(request: SandboxRequest):
             conn.close()
 
 
+@router.post("/sandbox/test/stream")
+async def stream_query_in_sandbox(request: SandboxRequest):
+    """
+    NDJSON variant of /sandbox/test, same safety rules.
+    
+    Lines: {"type": "columns"}, one {"type": "row"} per row as it is read
+    from the server, then {"type": "summary"} (rows returned / examined,
+    truncation) or {"type": "error"}. Memory use does not depend on the
+    result size.
+    """
+    is_dangerous, danger_reason = is_dangerous_query(request.sql)
+    query_type = detect_query_type(request.sql)
+    
+    def ndjson():
+        if is_dangerous:
+            yield ndjson_line({"type": "error", "error": danger_reason, "message": "Query blocked for safety"})
+            return
+        
+        conn = None
+        cursor = None
+        try:
+            conn = get_db_connection(database=request.database)
+            cursor = conn.cursor(buffered=False)
+            start_time = time.time()
+            begin_sandbox_transaction(cursor, request.timeout_seconds)
+            
+            streamer = make_streamer(cursor, request)
+            streamer.execute(request.sql)
+            has_rows = streamer.has_result_set
+            rows_affected = cursor.rowcount
+            yield ndjson_line({"type": "columns", "columns": streamer.columns, "query_type": query_type})
+            
+            for values in streamer.rows():
+                yield ndjson_line({"type": "row", "values": values})
+            execution_time_ms = (time.time() - start_time) * 1000
+            
+            # CRITICAL: Always rollback to prevent any changes
+            cursor.execute("ROLLBACK")
+            
+            yield ndjson_line({
+                "type": "summary",
+                **streamer.stats(),
+                "rows_affected": streamer.rows_returned if has_rows else rows_affected,
+                "execution_time_ms": round(execution_time_ms, 2),
+                "persisted": False
+            })
+        except Exception as e:
+            if cursor:
+                try:
+                    cursor.execute("ROLLBACK")
+                except:
+                    pass
+            db_error = ErrorFactory.database_error(
+                "Query failed during safe sandbox test",
+                original_error=e,
+                sql=request.sql[:100]
+            )
+            yield ndjson_line({"type": "error", "error": str(db_error)})
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+    
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson", headers=NDJSON_HEADERS)
+
+
 @router.post("/sandbox/compare")
-async def compare_queries(original_sql: str, optimized_sql: str, database: str = "shop_demo"):
+async def compare_queries(original_sql: str, optimized_sql: str, database: str = "shop_demo",
+                          benchmark: bool = False, repetitions: int = 10, warmup: int = 2):
     """
     🔬 Compare two queries side-by-side in sandbox
     
     Useful for comparing original vs optimized queries to see the difference
     in execution time and rows examined.
+    
+    With benchmark=true each query gets `warmup` unrecorded runs and
+    `repetitions` recorded runs in alternating A/B order on two pooled
+    connections, with SHOW SESSION STATUS deltas, median/p95 and a
+    Mann-Whitney U significance test (see services/sandbox_bench.py).
     """
     
+    if benchmark:
+        return await _benchmark_queries(original_sql, optimized_sql, database, repetitions, warmup)
+    
     # Test original query
     original_result = await test_query_in_sandbox(
         SandboxRequest(sql=original_sql, database=database)
@@ -214,3 +316,44 @@ async def compare_queries(original_sql: str, optimized_sql: str, database: str =
         "improvement_percent": round(improvement_percent, 2),
         "recommendation": "Use optimized query" if improvement_percent > 10 else "Marginal improvement"
     }
+
+
+async def _benchmark_queries(original_sql: str, optimized_sql: str, database: str,
+                             repetitions: int, warmup: int) -> dict:
+    query_types = []
+    for sql in (original_sql, optimized_sql):
+        is_dangerous, danger_reason = is_dangerous_query(sql)
+        if is_dangerous:
+            return {"mode": "benchmark", "success": False, "error": danger_reason, "sql": sql}
+        query_type = detect_query_type(sql)
+        if query_type == "UNKNOWN":
+            return {
+                "mode": "benchmark",
+                "success": False,
+                "error": "Benchmark mode supports SELECT, UPDATE, DELETE and INSERT statements",
+                "sql": sql
+            }
+        query_types.append(query_type)
+    
+    repetitions = max(3, min(repetitions, 200))
+    warmup = max(0, min(warmup, 20))
+    # Writes run one after the other, even inside rolled-back transactions they take locks
+    read_only = all(t == "SELECT" for t in query_types)
+    
+    loop = asyncio.get_running_loop()
+    try:
+        result = await loop.run_in_executor(None, lambda: sandbox_benchmark.compare(
+            original_sql, optimized_sql, database,
+            repetitions=repetitions, warmup=warmup, read_only=read_only
+        ))
+    except Exception as e:
+        db_error = ErrorFactory.database_error(
+            "Sandbox benchmark failed",
+            original_error=e,
+            database=database
+        )
+        return {"mode": "benchmark", "success": False, "error": str(db_error)}
+    
+    result["success"] = True
+    result["query_types"] = {"original": query_types[0], "optimized": query_types[1]}
+    return result
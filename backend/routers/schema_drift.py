@@ -6,21 +6,27 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 import re
+import asyncio
 from database import get_db_connection
 from error_factory import ErrorFactory
+from services.explain_service import explain_service
+from services.schema_snapshot import schema_snapshots, diff_snapshots
+from services.git_schema import git_schema_loader
+from mcp_service import invalidate_schema_cache
 
 router = APIRouter(prefix="/drift", tags=["Schema Drift"])
 
 
 class DriftDetectRequest(BaseModel):
     database: str = "shop_demo"
-    git_schema_path: Optional[str] = None
+    git_schema_path: Optional[str] = None  # .sql file or directory in a checkout (relative to GIT_SCHEMA_ROOT)
     tables: Optional[List[str]] = None
 
 
 class DriftGenerateFixRequest(BaseModel):
     database: str = "shop_demo"
     drift_report: Dict[str, Any]
+    git_schema_path: Optional[str] = None
 
 
 class DriftApplyFixRequest(BaseModel):
@@ -237,31 +243,42 @@ async def detect_drift(request: DriftDetectRequest):
     Detect schema drifts between Git and Production
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        cursor.execute(f"USE {request.database}")
-        
+        loop = asyncio.get_event_loop()
+        snapshot_future = loop.run_in_executor(None, schema_snapshots.get, request.database)
+        git_schema = None
+        if request.git_schema_path:
+            git_schema = await loop.run_in_executor(None, git_schema_loader.load, request.git_schema_path)
+        snapshot, schema_changed = await snapshot_future
+        
+        prod_tables = snapshot.tables
+        git_tables = git_schema.tables if git_schema else prod_tables
         if request.tables:
-            tables = request.tables
-        else:
-            cursor.execute(f"SHOW TABLES FROM {request.database}")
-            tables = [list(row.values())[0] for row in cursor.fetchall()]
+            wanted = {t.lower() for t in request.tables}
+            prod_tables = {name: t for name, t in prod_tables.items() if name.lower() in wanted}
+            git_tables = {name: t for name, t in git_tables.items() if name.lower() in wanted}
+        
+        changed, missing_tables, extra_tables = diff_snapshots(git_tables, prod_tables)
         
         drift_report = {
             'database': request.database,
-            'tables_analyzed': len(tables),
+            'tables_analyzed': len(prod_tables),
             'tables_with_drift': 0,
-            'total_issues': 0,
-            'drifts': {}
+            'total_issues': len(missing_tables) + len(extra_tables),
+            'missing_tables': missing_tables,
+            'extra_tables': extra_tables,
+            'drifts': {},
+            'snapshot': {
+                'checksum': snapshot.checksum,
+                'taken_at': snapshot.taken_at,
+                'load_time_ms': snapshot.load_time_ms,
+                'queries': snapshot.queries
+            },
+            'git_schema': git_schema.summary() if git_schema else None
         }
         
-        for table in tables:
-            prod_schema = SchemaParser.get_production_schema(conn, request.database, table)
-            
-            git_schema = prod_schema
-            
-            drift = DriftDetector.compare_schemas(git_schema, prod_schema)
+        # Only tables whose fingerprints differ are compared in detail
+        for table, git_table, prod_table in changed:
+            drift = DriftDetector.compare_schemas(git_table.to_dict(), prod_table.to_dict())
             
             if drift['has_drift']:
                 drift_report['tables_with_drift'] += 1
@@ -276,8 +293,10 @@ async def detect_drift(request: DriftDetectRequest):
                 )
                 drift_report['total_issues'] += issues_count
         
-        cursor.close()
-        conn.close()
+        if drift_report['tables_with_drift'] or schema_changed:
+            # Cached EXPLAIN plans and MCP schemas for this database may predate the drift
+            explain_service.invalidate(request.database)
+            invalidate_schema_cache(request.database)
         
         severity = "NONE"
         if drift_report['total_issues'] > 0:
@@ -302,9 +321,10 @@ async def detect_drift(request: DriftDetectRequest):
             ]
         }
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         db_error = ErrorFactory.database_error(
-            "Drift Detection",
             f"Failed to detect schema drift for database {request.database}",
             original_error=e
         )
@@ -316,12 +336,12 @@ async def detect_drift(request: DriftDetectRequest):
 
 
 @router.get("/report")
-async def get_drift_report(database: str = "shop_demo"):
+async def get_drift_report(database: str = "shop_demo", git_schema_path: Optional[str] = None):
     """
     Retrieve a detailed drift report
     """
     try:
-        detect_result = await detect_drift(DriftDetectRequest(database=database))
+        detect_result = await detect_drift(DriftDetectRequest(database=database, git_schema_path=git_schema_path))
         
         if not detect_result.get('success'):
             return detect_result
@@ -407,21 +427,25 @@ async def generate_fix_script(request: DriftGenerateFixRequest):
     Generate a SQL script to fix drift
     """
     try:
-        conn = get_db_connection()
+        loop = asyncio.get_event_loop()
+        snapshot, _ = await loop.run_in_executor(None, schema_snapshots.get, request.database)
+        git_tables = snapshot.tables
+        if request.git_schema_path:
+            git_tables = (await loop.run_in_executor(None, git_schema_loader.load, request.git_schema_path)).tables
         
         all_statements = []
         
         for table, drift in request.drift_report.get('drifts', {}).items():
-            prod_schema = SchemaParser.get_production_schema(conn, request.database, table)
-            git_schema = prod_schema
+            prod_table = snapshot.tables.get(table)
+            git_table = git_tables.get(table)
+            prod_schema = prod_table.to_dict() if prod_table else {}
+            git_schema = git_table.to_dict() if git_table else prod_schema
             
             statements = DriftFixGenerator.generate_fix_script(
                 table, drift, git_schema, prod_schema
             )
             all_statements.extend(statements)
         
-        conn.close()
-        
         fix_script = '\n'.join(all_statements)
         
         return {
@@ -493,6 +517,11 @@ async def apply_fix_script(request: DriftApplyFixRequest):
         cursor.close()
         conn.close()
         
+        if executed:
+            explain_service.invalidate(request.database)
+            schema_snapshots.invalidate(request.database)
+            invalidate_schema_cache(request.database)
+        
         return {
             "success": len(failed) == 0,
             "mode": "live",
@@ -505,7 +534,6 @@ async def apply_fix_script(request: DriftApplyFixRequest):
         
     except Exception as e:
         db_error = ErrorFactory.database_error(
-            "Drift Fix Application",
             f"Failed to apply fix script for database {request.database}",
             original_error=e
         )
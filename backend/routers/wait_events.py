@@ -6,8 +6,10 @@ from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 import mariadb
 import os
+import asyncio
 from dotenv import load_dotenv
 from error_factory import ErrorFactory
+from services.wait_sampler import get_wait_sampler
 
 load_dotenv()
 
@@ -17,6 +19,9 @@ class WaitEventsRequest(BaseModel):
     query_id: Optional[int] = None
     thread_id: Optional[int] = None
     analyze_current: bool = True
+    # Deltas over the last N seconds of sampled snapshots instead of counters since server start
+    window_seconds: Optional[int] = None
+    top: int = 10
 
 class WaitEventDetail(BaseModel):
     event_name: str
@@ -41,6 +46,10 @@ class WaitEventsResponse(BaseModel):
     top_wait_events: List[WaitEventDetail]
     lock_waits: List[LockWaitDetail]
     recommendations: List[str]
+    window: Optional[Dict[str, Any]] = None
+    top_statements: List[Dict[str, Any]] = []
+    table_io: List[Dict[str, Any]] = []
+    timeline: List[Dict[str, Any]] = []
 
 def get_db_connection():
     """MariaDB connection with mock fallback"""
@@ -140,10 +149,35 @@ def analyze_wait_events_live(conn) -> Dict[str, Any]:
             "total_lock_waits": len(lock_waits),
             "total_threads": stats['total_threads'] if stats else 0,
             "threads_waiting_locks": stats['threads_waiting_locks'] if stats else 0,
-            "total_wait_time_ms": total_wait
+            "total_wait_time_ms": total_wait,
+            "basis": "cumulative"
         }
     }
 
+def apply_window(data: Dict[str, Any], windowed: Dict[str, Any]) -> None:
+    """Replace the cumulative top wait events with the sampler's deltas over the window"""
+    data["wait_events"] = [
+        WaitEventDetail(
+            event_name=e["key"],
+            count=e["count"],
+            total_wait_ms=e["total_wait_ms"],
+            avg_wait_ms=e["avg_wait_ms"],
+            percentage=e["percentage"]
+        )
+        for e in windowed["waits"]
+    ]
+    # Totals over every event active in the window, not just the top ones returned
+    totals = windowed["totals"]["waits"]
+    data["summary"].update({
+        "total_wait_events": totals["keys"],
+        "total_wait_time_ms": totals["wait_ms"],
+        "basis": "window"
+    })
+    data["window"] = windowed["window"]
+    data["top_statements"] = windowed["statements"]
+    data["table_io"] = windowed["table_io"]
+    data["timeline"] = windowed["timeline"]
+
 def generate_mock_wait_events() -> Dict[str, Any]:
     """Generate mock wait events for the demo"""
     wait_events = [
@@ -255,6 +289,24 @@ async def analyze_wait_events(request: WaitEventsRequest):
                 data = analyze_wait_events_live(conn)
                 mode = "live"
                 conn.close()
+                if request.window_seconds:
+                    # A sampler failure keeps the live cumulative result
+                    try:
+                        loop = asyncio.get_event_loop()
+                        windowed = await loop.run_in_executor(
+                            None, get_wait_sampler().analyze, request.window_seconds, request.top
+                        )
+                        if windowed:
+                            apply_window(data, windowed)
+                        else:
+                            data["summary"]["window_note"] = "Fewer than two snapshots in the window, counters are cumulative"
+                    except Exception as e:
+                        db_error = ErrorFactory.database_error(
+                            "Wait event sampler failed, counters are cumulative",
+                            original_error=e
+                        )
+                        print(f"[Wait Events] {db_error}")
+                        data["summary"]["window_note"] = "Sampler unavailable, counters are cumulative"
             except Exception as e:
                 print(f"[Wait Events] Live analysis failed: {e}")
                 data = generate_mock_wait_events()
@@ -272,7 +324,11 @@ async def analyze_wait_events(request: WaitEventsRequest):
             summary=data["summary"],
             top_wait_events=data["wait_events"],
             lock_waits=data["lock_waits"],
-            recommendations=recommendations
+            recommendations=recommendations,
+            window=data.get("window"),
+            top_statements=data.get("top_statements", []),
+            table_io=data.get("table_io", []),
+            timeline=data.get("timeline", [])
         )
     
     except Exception as e:
@@ -283,6 +339,13 @@ async def analyze_wait_events(request: WaitEventsRequest):
         )
         raise HTTPException(status_code=500, detail=str(service_error))
 
+@router.get("/sampler")
+async def wait_sampler_status():
+    """
+    Snapshot sampler state: interval, snapshots held, cost of the last sample
+    """
+    return get_wait_sampler().get_status()
+
 @router.get("/health")
 async def wait_events_health():
     """
@@ -315,8 +378,7 @@ async def wait_events_health():
     
     except Exception as e:
         db_error = ErrorFactory.database_error(
-            "Wait Events Health Check",
-            "Failed to verify Performance Schema status",
+            "Wait Events Health Check: failed to verify Performance Schema status",
             original_error=e
         )
         return {
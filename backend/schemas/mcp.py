@@ -1,6 +1,13 @@
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 class MCPExecuteRequest(BaseModel):
     tool: str
     arguments: Dict[str, Any]
+
+
+class MCPQueryStreamRequest(BaseModel):
+    sql: str
+    database: Optional[str] = "shop_demo"
+    max_rows: int = 10000
+    max_bytes: int = 16 * 1024 * 1024
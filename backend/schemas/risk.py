@@ -14,6 +14,16 @@ class SimilarIssue(BaseModel):
     analysis: Optional[str] = None
 
 
+class AntiPatternFinding(BaseModel):
+    rule_id: str
+    severity: str  # LOW, MEDIUM, HIGH
+    score: int  # 0-100
+    message: str
+    explanation: str
+    suggested_fix: Optional[str] = None
+    suggestion_type: str = "REWRITE"
+
+
 class PredictResponse(BaseModel):
     risk_level: str  # LOW, MEDIUM, HIGH
     risk_score: int  # 0-100
@@ -21,3 +31,4 @@ class PredictResponse(BaseModel):
     similar_issues: List[SimilarIssue]
     suggested_fix: Optional[str] = None
     query_analysis: Optional[str] = None
+    findings: List[AntiPatternFinding] = []
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 class IndexSimulationRequest(BaseModel):
     sql: str
@@ -7,6 +7,29 @@ class IndexSimulationRequest(BaseModel):
     database: Optional[str] = None
 
 
+class IndexCandidatesRequest(BaseModel):
+    sql: str
+    candidate_indexes: List[str]  # CREATE INDEX / ALTER TABLE ... ADD INDEX statements
+    database: Optional[str] = None
+
+
+class WorkloadStatement(BaseModel):
+    sql: str
+    executions: int = 1
+    total_time_s: float = 0.0
+
+
+class IndexAdvisorRequest(BaseModel):
+    database: Optional[str] = None
+    lookback_hours: int = 24
+    max_fingerprints: int = 20000
+    workload: Optional[List[WorkloadStatement]] = None  # instead of the slow log
+    max_indexes: int = 10
+    write_budget_pct: float = 5.0  # write overhead allowed, % of total workload time
+    strategy: str = "greedy"  # "greedy" or "knapsack"
+    validate_top: int = 0  # what-if simulate the N best recommendations
+
+
 class ExplainPlan(BaseModel):
     access_type: str  # "ALL", "ref", "range", "index", "eq_ref", etc.
     rows_examined: int
@@ -23,3 +46,8 @@ class IndexSimulationResponse(BaseModel):
     recommendation: str  # "HIGHLY RECOMMENDED", "RECOMMENDED", "MARGINAL", "NOT RECOMMENDED"
     create_index_sql: str
     ai_analysis: str
+    mode: str = "heuristic"  # "whatif" (EXPLAIN on a sampled branch) or "heuristic"
+    cost_before: Optional[float] = None
+    cost_after: Optional[float] = None
+    index_used: Optional[bool] = None
+    plan_diff: Optional[Dict[str, Any]] = None
@@ -0,0 +1,124 @@
+"""
+Throughput benchmark for the anti-pattern rule engine
+
+Compares the previous per-consumer substring / regex checks (predictor,
+rewriter, suggester and cost attribution each re-scanning the statement)
+with one services.anti_patterns.analyze() call per statement.
+
+Usage:
+    python scripts/bench_anti_patterns.py                  # 5000 generated queries
+    python scripts/bench_anti_patterns.py --queries 20000 --unique 500
+"""
+import argparse
+import random
+import re
+import time
+import sys
+import os
+
+# Add backend to path
+sys.path.append(os.getcwd())
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TABLES = ["orders", "customers", "products", "order_items", "payments", "shipments"]
+COLUMNS = ["id", "customer_id", "status", "created_at", "total_amount", "name", "email", "country"]
+
+TEMPLATES = [
+    "SELECT * FROM {t1}",
+    "SELECT {c1}, {c2} FROM {t1} WHERE {c1} = {n} LIMIT 10",
+    "SELECT * FROM {t1} WHERE {c1} IN (\n  SELECT {c2} FROM {t2} WHERE {c3} = 'active'\n) ORDER BY {c2}",
+    "SELECT {c1} FROM {t1} WHERE {c2} LIKE '%{w}' OR {c3} = {n} OR {c1} > {n}",
+    "SELECT a.{c1}, b.{c2} FROM {t1} a, {t2} b",
+    "SELECT {c1}, (SELECT COUNT(*) FROM {t2} x WHERE x.{c2} = y.{c1}) FROM {t1} y WHERE y.{c3} = {n}",
+    "UPDATE {t1} SET {c1} = {n} WHERE {c2} NOT IN (SELECT {c2} FROM {t2})",
+    "SELECT o.* FROM {t1} o JOIN {t2} c ON c.{c1} = o.{c2} WHERE o.{c3} = '{w}' ORDER BY o.{c1} LIMIT 50",
+]
+
+
+def generate_queries(count: int, unique: int, seed: int = 42):
+    rng = random.Random(seed)
+    pool = []
+    for _ in range(unique):
+        t1, t2 = rng.sample(TABLES, 2)
+        c1, c2, c3 = rng.sample(COLUMNS, 3)
+        pool.append(rng.choice(TEMPLATES).format(
+            t1=t1, t2=t2, c1=c1, c2=c2, c3=c3, n=rng.randint(1, 10000), w=rng.choice(["smith", "son", "x"])
+        ))
+    return [rng.choice(pool) for _ in range(count)]
+
+
+def legacy_checks(sql: str):
+    """Condensed copy of the checks each consumer used to run on its own"""
+    sql_upper = sql.upper()
+    sql_lower = sql.lower()
+    hits = []
+    # predictor
+    if "SLEEP(" in sql_upper:
+        hits.append("sleep")
+    elif "SELECT *" in sql_upper and "WHERE" not in sql_upper:
+        hits.append("select_star_no_where")
+    elif "LIKE '%" in sql_upper or 'LIKE "%' in sql_upper:
+        hits.append("like")
+    elif "IN (SELECT" in sql_upper:
+        hits.append("in")
+    elif "CROSS JOIN" in sql_upper or ", " in sql_upper and "WHERE" not in sql_upper:
+        hits.append("cartesian")
+    # rewriter
+    if re.search(r'\bIN\s*\(\s*SELECT\b', sql_upper):
+        hits.append("in")
+    if re.search(r'\bSELECT\s+\*\b', sql_upper):
+        hits.append("select_star")
+    if re.search(r"LIKE\s+['\"]%", sql_upper):
+        hits.append("like")
+    if re.search(r'\bWHERE\b.*\bOR\b.*\bOR\b', sql_upper):
+        hits.append("or")
+    if re.search(r'\bNOT\s+IN\s*\(\s*SELECT\b', sql_upper):
+        hits.append("not_in")
+    if re.search(r'\bSELECT\b.*\(\s*SELECT\b', sql_upper) and 'WHERE' not in sql_upper.split('(')[0]:
+        hits.append("correlated")
+    if 'ORDER BY' in sql_upper and 'LIMIT' not in sql_upper:
+        hits.append("order_by")
+    # suggester
+    if "SELECT *" in sql_upper and "WHERE" not in sql_upper:
+        hits.append("select_star_no_where")
+    # cost attribution
+    if "in (select" in sql_lower or "join" in sql_lower or "where" in sql_lower:
+        hits.append("io")
+    return hits
+
+
+def bench(label, fn, queries):
+    start = time.perf_counter()
+    for sql in queries:
+        fn(sql)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {len(queries):>7} queries  {elapsed * 1000:9.1f}ms  "
+          f"{len(queries) / elapsed:12,.0f} q/s  {elapsed / len(queries) * 1e6:7.1f}us/q")
+    return elapsed
+
+
+def main(args):
+    from services import anti_patterns
+
+    queries = generate_queries(args.queries, args.unique)
+    print(f"{len(queries)} queries, {len(set(queries))} distinct\n")
+
+    legacy = bench("legacy checks", legacy_checks, queries)
+
+    def uncached(sql):
+        anti_patterns._analyze_cached.cache_clear()
+        return anti_patterns.analyze(sql)
+
+    cold = bench("rule engine (no cache)", uncached, queries)
+    anti_patterns._analyze_cached.cache_clear()
+    warm = bench("rule engine (cached)", anti_patterns.analyze, queries)
+
+    print(f"\nuncached engine / legacy: {cold / legacy:.2f}x time, cached: {warm / legacy:.2f}x time")
+    print(f"cache: {anti_patterns._analyze_cached.cache_info()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the anti-pattern rule engine")
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--unique", type=int, default=1000, help="distinct statements in the workload")
+    main(parser.parse_args())
@@ -0,0 +1,104 @@
+"""
+Benchmark for the Git-side schema loader
+
+Writes a synthetic schema (one CREATE TABLE file per table, with indexes
+and foreign keys) to a temporary directory and times:
+
+- a cold load, serial and on the process pool,
+- a warm load (all files answered from the blob-hash cache),
+- a CI-style rerun in a fresh loader with one file edited (disk cache),
+- the in-memory diff against a "production" model with 1% drifted tables.
+
+No database is needed.
+
+Usage:
+    python scripts/bench_git_schema.py                  # 1000 tables
+    python scripts/bench_git_schema.py --tables 5000 --workers 8
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import time
+import sys
+import os
+
+# Add backend to path
+sys.path.append(os.getcwd())
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.cache import SimpleCache
+from services.git_schema import GitSchemaLoader, copy_table
+from services.schema_snapshot import diff_snapshots, ColumnDef
+
+TYPES = ["INT", "BIGINT UNSIGNED", "VARCHAR(255)", "DECIMAL(10,2)", "DATETIME", "TEXT", "TINYINT(1)", "CHAR(2)"]
+
+
+def table_ddl(rng: random.Random, i: int) -> str:
+    columns = [f"  `id` BIGINT UNSIGNED NOT NULL AUTO_INCREMENT"]
+    for c in range(rng.randint(6, 20)):
+        column_type = rng.choice(TYPES)
+        default = " DEFAULT '0'" if column_type.startswith(("INT", "TINYINT")) else ""
+        columns.append(f"  `c{c}` {column_type} {'NOT NULL' if rng.random() < 0.5 else 'NULL'}{default} COMMENT 'column {c}'")
+    columns.append("  `created_at` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP")
+    keys = ["  PRIMARY KEY (`id`)", "  KEY `idx_created` (`created_at`)", "  UNIQUE KEY `uq_c0` (`c0`, `id`)"]
+    if i > 0 and rng.random() < 0.3:
+        keys.append(f"  CONSTRAINT `fk_t{i}_parent` FOREIGN KEY (`c1`) REFERENCES `t{rng.randrange(i)}` (`id`) ON DELETE CASCADE")
+    body = ",\n".join(columns + keys)
+    return (f"-- table t{i}\nDROP TABLE IF EXISTS `t{i}`;\n"
+            f"CREATE TABLE `t{i}` (\n{body}\n) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;\n")
+
+
+def timed(label, fn):
+    started = time.perf_counter()
+    result = fn()
+    print(f"{label:<42} {(time.perf_counter() - started) * 1000:9.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tables", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    workdir = tempfile.mkdtemp(prefix="bench_git_schema_")
+    schema_dir = os.path.join(workdir, "schema")
+    cache_dir = os.path.join(workdir, "cache")
+    os.makedirs(schema_dir)
+    for i in range(args.tables):
+        with open(os.path.join(schema_dir, f"t{i:05d}.sql"), "w") as f:
+            f.write(table_ddl(rng, i))
+    print(f"{args.tables} tables, {args.workers} workers\n")
+
+    try:
+        serial = GitSchemaLoader(cache=SimpleCache(), max_workers=1)
+        timed("cold load, serial", lambda: serial.load(schema_dir))
+
+        parallel = GitSchemaLoader(cache=SimpleCache(), cache_dir=cache_dir, max_workers=args.workers)
+        git = timed("cold load, process pool", lambda: parallel.load(schema_dir))
+        timed("warm load (memory cache)", lambda: parallel.load(schema_dir))
+
+        with open(os.path.join(schema_dir, "t00007.sql"), "a") as f:
+            f.write("CREATE INDEX idx_c1 ON t7 (c1);\n")
+        rerun = GitSchemaLoader(cache=SimpleCache(), cache_dir=cache_dir, max_workers=args.workers)
+        result = timed("CI rerun, 1 file changed (disk cache)", lambda: rerun.load(schema_dir))
+        print(f"{'':<42} parsed {result.parsed}, cached {result.cache_hits}")
+
+        # Production: same tables, 1% with an extra column
+        production = {}
+        for name, table in git.tables.items():
+            if rng.random() < 0.01:
+                table = copy_table(table)
+                table._fingerprint = None
+                table.columns["hotfix"] = ColumnDef("hotfix", "INT(11)", True, None, False)
+            production[name] = table
+        changed, _, _ = timed("diff against production (fingerprints)", lambda: diff_snapshots(git.tables, production))
+        print(f"{'':<42} {len(changed)} drifted tables")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
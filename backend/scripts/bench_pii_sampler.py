@@ -0,0 +1,153 @@
+"""
+Benchmark for PII column sampling (/masking/analyze)
+
+Builds a synthetic schema (500 columns by default, a few PII-looking ones
+per table) behind an in-memory connection that sleeps `--latency-ms` per
+query to stand in for the network round trip, and times:
+
+- the previous approach: one `SELECT col ... LIMIT 5` per column,
+- the bulk sampler with a single worker (prefilter + one query per table),
+- the bulk sampler with `--workers` tables in parallel,
+- regex matching of the samples with the precompiled patterns.
+
+No database is needed.
+
+Usage:
+    python scripts/bench_pii_sampler.py                        # 500 columns, 1 ms per query
+    python scripts/bench_pii_sampler.py --columns 5000 --latency-ms 0.5 --workers 8
+"""
+import argparse
+import re
+import time
+import sys
+import os
+
+# Add backend to path
+sys.path.append(os.getcwd())
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.pii_sampler import PIISampler
+from routers.data_masking import PIIDetector
+
+PII_COLUMNS = [("email", "varchar"), ("phone", "varchar"), ("iban", "varchar"), ("created_at", "datetime")]
+
+
+class LatencyServer:
+    def __init__(self, columns: int, per_table: int, latency_s: float):
+        self.latency_s = latency_s
+        self.columns = []
+        table = 0
+        while len(self.columns) < columns:
+            layout = PII_COLUMNS + [(f"c{i}", "varchar") for i in range(per_table - len(PII_COLUMNS))]
+            self.columns.extend((f"t{table:03d}", c, data_type) for c, data_type in layout)
+            table += 1
+        self.columns = self.columns[:columns]
+        self.queries = 0
+
+    def value(self, column, row):
+        return {"email": f"user{row}@example.com", "phone": f"+33 6 12 34 {row:02d} 78",
+                "iban": f"FR76300060000112345678901{row:02d}"}.get(column, f"{column}-{row}")
+
+    def connect(self, database=None):
+        return LatencyConnection(self)
+
+
+class LatencyConnection:
+    def __init__(self, server):
+        self.server = server
+
+    def cursor(self, dictionary=False):
+        return LatencyCursor(self.server, dictionary)
+
+    def close(self):
+        pass
+
+
+class LatencyCursor:
+    def __init__(self, server, dictionary):
+        self.server = server
+        self.dictionary = dictionary
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        self.server.queries += 1
+        time.sleep(self.server.latency_s)
+        if "information_schema.COLUMNS" in sql or "INFORMATION_SCHEMA.COLUMNS" in sql:
+            self.rows = list(self.server.columns)
+            if self.dictionary:
+                self.rows = [{"TABLE_NAME": t, "COLUMN_NAME": c, "DATA_TYPE": d} for t, c, d in self.rows]
+            return
+        columns = re.findall(r"`?(\w+)`? IS NOT NULL", sql)
+        limit = int(sql.rsplit("LIMIT", 1)[1])
+        rows = [tuple(self.server.value(c, r) for c in columns) for r in range(limit)]
+        self.rows = [dict(zip(columns, row)) for row in rows] if self.dictionary else rows
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+def legacy_analyze(server):
+    """The previous /masking/analyze loop: one query per column"""
+    conn = server.connect()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE FROM INFORMATION_SCHEMA.COLUMNS")
+    detected = 0
+    for col in cursor.fetchall():
+        column_name = col["COLUMN_NAME"]
+        cursor.execute(f"SELECT {column_name} FROM {col['TABLE_NAME']} WHERE {column_name} IS NOT NULL LIMIT 5")
+        samples = [row[column_name] for row in cursor.fetchall()]
+        detected += PIIDetector.detect_pii_column(column_name, samples) is not None
+    return detected
+
+
+def bulk_analyze(server, workers):
+    sampler = PIISampler(connection_factory=server.connect, max_workers=workers)
+    columns, samples, _ = sampler.sample("bench", is_candidate=PIIDetector.is_candidate)
+    return sum(PIIDetector.detect_pii_column(c, samples[(t, c)], d) is not None
+               for t, c, d in columns if (t, c) in samples)
+
+
+def timed(label, server, fn):
+    server.queries = 0
+    started = time.perf_counter()
+    result = fn()
+    print(f"{label:<40} {(time.perf_counter() - started) * 1000:9.1f} ms  {server.queries:5d} queries  "
+          f"{result} PII columns")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--columns", type=int, default=500)
+    parser.add_argument("--per-table", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=1.0)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    server = LatencyServer(args.columns, args.per_table, args.latency_ms / 1000)
+    print(f"{len(server.columns)} columns, {args.per_table} per table, {args.latency_ms} ms per query\n")
+
+    timed("per-column queries (previous)", server, lambda: legacy_analyze(server))
+    timed("bulk sampler, 1 worker", server, lambda: bulk_analyze(server, 1))
+    timed(f"bulk sampler, {args.workers} workers", server, lambda: bulk_analyze(server, args.workers))
+
+    values = [server.value(c, r) for c in ("email", "phone", "iban") for r in range(100)] * 100
+    for label, match in (("re.match per value (previous)", lambda p, v: re.match(p, v)),
+                         ("precompiled patterns", None)):
+        started = time.perf_counter()
+        for pii_type, config in PIIDetector.PII_PATTERNS.items():
+            if not config["regex"]:
+                continue
+            if match:
+                sum(1 for v in values if match(config["regex"], v))
+            else:
+                pattern = PIIDetector.COMPILED_PATTERNS[pii_type]
+                sum(1 for v in values if pattern.match(v))
+        print(f"{label:<40} {(time.perf_counter() - started) * 1000:9.1f} ms  {len(values) * 5} matches")
+
+
+if __name__ == "__main__":
+    main()
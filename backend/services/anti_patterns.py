@@ -0,0 +1,347 @@
+"""
+SQL anti-pattern rule engine
+
+Shared by the risk predictor, the query rewriter, the suggestion fallback,
+cost attribution and blast radius analysis. The statement is tokenized once
+(parser.sql_tokenizer), a single walk over the tokens collects structural
+features (clause, nesting depth, subqueries, tables), then every registered
+rule is evaluated against those features.
+
+Because the walk is token based, keywords inside string literals or
+comments no longer trigger rules, and multi-line statements such as
+"IN (\\n SELECT" are detected the same as single-line ones.
+"""
+
+from functools import lru_cache
+from typing import Callable, List, Optional, Tuple
+
+from models import AntiPatternFinding
+from parser.sql_tokenizer import tokenize, WORD, IDENT, STRING, PUNCT, OPERATOR
+
+SEVERITY_ORDER = {"HIGH": 3, "MEDIUM": 2, "LOW": 1}
+
+STATEMENT_KEYWORDS = {"SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE"}
+
+# Keywords that start a new clause at the current nesting depth
+CLAUSE_KEYWORDS = {
+    "SELECT": "SELECT", "FROM": "FROM", "JOIN": "FROM", "WHERE": "WHERE",
+    "GROUP": "GROUP", "HAVING": "HAVING", "ORDER": "ORDER", "LIMIT": "LIMIT",
+    "SET": "SET", "VALUES": "VALUES", "ON": "ON", "USING": "ON",
+    "UNION": None, "INTERSECT": None, "EXCEPT": None, "FOR": "FOR", "INTO": "INTO",
+}
+
+# Keywords that are followed by a table name
+TABLE_PREFIXES = {"FROM", "JOIN", "UPDATE", "INTO", "TABLE", "TABLES"}
+
+NOT_TABLE_NAMES = {
+    "SELECT", "WHERE", "SET", "VALUES", "VALUE", "IF", "EXISTS", "NOT", "LATERAL",
+    "DUAL", "ONLY", "IGNORE", "LOW_PRIORITY", "QUICK", "STRAIGHT_JOIN",
+}
+
+# Cache size for analyze(); statements are usually repeated fingerprints
+ANALYSIS_CACHE_SIZE = 4096
+
+
+class SqlFeatures:
+    """Structural facts about a statement, collected in one token walk"""
+
+    __slots__ = (
+        "statement_type", "tables", "has_where", "has_limit", "has_order_by",
+        "has_group_by", "has_join", "has_cross_join", "has_join_condition",
+        "implicit_join", "select_star", "in_subquery", "not_in_subquery",
+        "select_list_subquery", "leading_wildcard_like", "where_or_count",
+        "sleep_call", "has_equality", "for_update", "alter_table", "lock_tables",
+        "token_count",
+    )
+
+    def __init__(self):
+        self.statement_type = "UNKNOWN"
+        self.tables: List[str] = []
+        self.has_where = False          # top-level WHERE
+        self.has_limit = False          # top-level LIMIT
+        self.has_order_by = False       # top-level ORDER BY
+        self.has_group_by = False
+        self.has_join = False           # any JOIN, at any depth
+        self.has_cross_join = False
+        self.has_join_condition = False
+        self.implicit_join = False      # top-level "FROM a, b"
+        self.select_star = False
+        self.in_subquery = False        # IN (SELECT ...)
+        self.not_in_subquery = False    # NOT IN (SELECT ...)
+        self.select_list_subquery = False
+        self.leading_wildcard_like = False
+        self.where_or_count = 0
+        self.sleep_call = False
+        self.has_equality = False
+        self.for_update = False
+        self.alter_table = False
+        self.lock_tables = False
+        self.token_count = 0
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def extract_features(sql: str) -> SqlFeatures:
+    """Tokenize `sql` and collect SqlFeatures in a single pass"""
+    features = SqlFeatures()
+    tokens = tokenize(sql)
+    features.token_count = len(tokens)
+    if not tokens:
+        return features
+
+    clauses: List[Optional[str]] = [None]  # current clause per paren depth
+    in_top_where = False
+    expect_table = False
+    first_word = None
+    prev = prev2 = prev3 = None
+
+    for tok in tokens:
+        kind = tok.kind
+        upper = tok.upper
+        depth = len(clauses) - 1
+
+        if kind == PUNCT:
+            if upper == "(":
+                clauses.append(None)
+                expect_table = False
+            elif upper == ")":
+                if len(clauses) > 1:
+                    clauses.pop()
+            elif upper == ",":
+                # "FROM a, b" - next token is another table
+                if clauses[-1] == "FROM":
+                    expect_table = True
+                    if depth == 0:
+                        features.implicit_join = True
+            elif upper == "*":
+                if prev is not None and prev.kind == WORD and prev.upper in ("SELECT", "DISTINCT"):
+                    features.select_star = True
+        elif kind == OPERATOR:
+            if upper == "=":
+                features.has_equality = True
+        elif kind == STRING:
+            if prev is not None and prev.upper == "LIKE" and tok.value.startswith("%"):
+                features.leading_wildcard_like = True
+        elif kind in (WORD, IDENT):
+            if expect_table and (kind == IDENT or (upper not in NOT_TABLE_NAMES and upper[0] != "@")):
+                expect_table = False
+                name = tok.value.lower()
+                if name not in features.tables:
+                    features.tables.append(name)
+                prev3, prev2, prev = prev2, prev, tok
+                continue
+            expect_table = False
+
+            if kind == WORD:
+                if first_word is None:
+                    first_word = upper
+                    features.statement_type = "SELECT" if upper == "WITH" else upper
+                elif first_word == "WITH" and depth == 0 and upper in STATEMENT_KEYWORDS \
+                        and features.statement_type == "SELECT" and upper != "SELECT":
+                    # WITH ... UPDATE/DELETE/INSERT
+                    features.statement_type = upper
+
+                if upper in CLAUSE_KEYWORDS:
+                    if upper == "INTO" and clauses[-1] not in (None, "INTO"):
+                        pass  # SELECT ... INTO @var
+                    else:
+                        clauses[-1] = CLAUSE_KEYWORDS[upper]
+                    if depth == 0:
+                        in_top_where = upper == "WHERE"
+
+                if upper in TABLE_PREFIXES:
+                    expect_table = True
+
+                if upper == "SELECT" and prev is not None and prev.upper == "(":
+                    if prev2 is not None and prev2.upper == "IN":
+                        if prev3 is not None and prev3.upper == "NOT":
+                            features.not_in_subquery = True
+                        else:
+                            features.in_subquery = True
+                    elif len(clauses) > 1 and clauses[-2] == "SELECT":
+                        features.select_list_subquery = True
+                elif upper == "WHERE":
+                    if depth == 0:
+                        features.has_where = True
+                elif upper == "LIMIT":
+                    if depth == 0:
+                        features.has_limit = True
+                elif upper == "BY" and depth == 0 and prev is not None:
+                    if prev.upper == "ORDER":
+                        features.has_order_by = True
+                    elif prev.upper == "GROUP":
+                        features.has_group_by = True
+                elif upper == "JOIN":
+                    features.has_join = True
+                    if prev is not None and prev.upper == "CROSS":
+                        features.has_cross_join = True
+                elif upper in ("ON", "USING"):
+                    if clauses[-1] == "ON":
+                        features.has_join_condition = True
+                elif upper == "OR":
+                    if in_top_where:
+                        features.where_or_count += 1
+                elif upper == "UPDATE":
+                    if prev is not None and prev.upper == "FOR":
+                        features.for_update = True
+                        expect_table = False
+                elif upper == "TABLE":
+                    if prev is not None and prev.upper == "ALTER":
+                        features.alter_table = True
+                elif upper == "TABLES":
+                    if prev is not None and prev.upper == "LOCK":
+                        features.lock_tables = True
+                elif upper == "SHARE" and prev is not None and prev.upper == "IN":
+                    features.for_update = True  # LOCK IN SHARE MODE
+                elif upper.endswith(".*") and prev is not None and prev.upper in ("SELECT", "DISTINCT"):
+                    features.select_star = True
+                elif upper == "SLEEP" or upper.endswith(".SLEEP"):
+                    features.sleep_call = True
+
+        prev3, prev2, prev = prev2, prev, tok
+
+    return features
+
+
+class Rule:
+    """An anti-pattern rule: `check(features)` decides whether it fires"""
+
+    __slots__ = ("rule_id", "severity", "score", "message", "explanation",
+                 "suggested_fix", "suggestion_type", "check")
+
+    def __init__(self, rule_id: str, severity: str, score: int, message: str,
+                 explanation: str, suggested_fix: str, check: Callable[[SqlFeatures], bool],
+                 suggestion_type: str = "REWRITE"):
+        self.rule_id = rule_id
+        self.severity = severity
+        self.score = score
+        self.message = message
+        self.explanation = explanation
+        self.suggested_fix = suggested_fix
+        self.suggestion_type = suggestion_type
+        self.check = check
+
+    def finding(self) -> AntiPatternFinding:
+        return AntiPatternFinding(
+            rule_id=self.rule_id,
+            severity=self.severity,
+            score=self.score,
+            message=self.message,
+            explanation=self.explanation,
+            suggested_fix=self.suggested_fix,
+            suggestion_type=self.suggestion_type
+        )
+
+
+RULES: List[Rule] = [
+    Rule(
+        "sleep_call", "HIGH", 95,
+        "Execution delay detected via SLEEP() function",
+        "Query explicitly pauses execution, causing artificial performance degradation and connection holding.",
+        "Remove SLEEP() functions from production code.",
+        lambda f: f.sleep_call
+    ),
+    Rule(
+        "write_without_where", "HIGH", 90,
+        "UPDATE/DELETE without WHERE clause - modifies every row",
+        "The statement touches the whole table and holds locks on every row until commit.",
+        "Add a WHERE clause, or process the table in primary key batches.",
+        lambda f: f.statement_type in ("UPDATE", "DELETE") and not f.has_where
+    ),
+    Rule(
+        "select_star_no_where", "HIGH", 85,
+        "SELECT * without WHERE clause - likely full table scan",
+        "Full table scan detected. No filtering will cause all rows to be examined.",
+        "Add a WHERE clause to filter results, or specify only needed columns.",
+        lambda f: f.select_star and not f.has_where and not f.has_limit and f.statement_type == "SELECT"
+    ),
+    Rule(
+        "cartesian_product", "HIGH", 80,
+        "Potential cartesian product - no join condition detected",
+        "Missing join conditions can create cartesian products with massive row counts.",
+        "Add an explicit JOIN ... ON condition between the tables.",
+        lambda f: (f.has_cross_join or f.implicit_join) and not f.has_where and not f.has_join_condition
+    ),
+    Rule(
+        "leading_wildcard_like", "MEDIUM", 70,
+        "LIKE '%...' - leading wildcard prevents index usage",
+        "Leading wildcard patterns prevent index usage, causing full scans.",
+        "Consider FULLTEXT search or restructuring the query",
+        lambda f: f.leading_wildcard_like
+    ),
+    Rule(
+        "in_subquery", "MEDIUM", 60,
+        "IN (SELECT ...) subquery - can be rewritten as JOIN",
+        "Subqueries in IN clauses can be inefficient. Consider rewriting as JOIN.",
+        "Convert IN subquery to INNER JOIN for better performance",
+        lambda f: f.in_subquery
+    ),
+    Rule(
+        "not_in_subquery", "MEDIUM", 60,
+        "NOT IN (SELECT ...) - can be slow with NULLs",
+        "NOT IN subqueries return no rows when the subquery yields a NULL and are hard to optimize.",
+        "Consider LEFT JOIN + IS NULL or NOT EXISTS",
+        lambda f: f.not_in_subquery
+    ),
+    Rule(
+        "select_list_subquery", "MEDIUM", 50,
+        "Correlated subquery in SELECT - executes per row",
+        "A subquery in the select list is evaluated once per returned row.",
+        "Consider rewriting as JOIN with aggregation",
+        lambda f: f.select_list_subquery
+    ),
+    Rule(
+        "multiple_or", "LOW", 40,
+        "Multiple OR conditions - may prevent index optimization",
+        "OR across different columns often forces a full scan or an index merge.",
+        "Consider splitting into UNION ALL for index usage",
+        lambda f: f.where_or_count >= 2
+    ),
+    Rule(
+        "select_star", "LOW", 35,
+        "SELECT * - retrieves all columns unnecessarily",
+        "Fetching every column increases I/O and prevents covering indexes.",
+        "Specify only required columns instead of SELECT *",
+        lambda f: f.select_star
+    ),
+    Rule(
+        "order_by_without_limit", "LOW", 30,
+        "ORDER BY without LIMIT - sorts entire result set",
+        "The whole result set is sorted even if only the first rows are used.",
+        "Add LIMIT if only top N results are needed",
+        lambda f: f.has_order_by and not f.has_limit
+    ),
+]
+
+
+def register_rule(rule: Rule) -> None:
+    """Add (or replace, by rule_id) a rule in the registry"""
+    RULES[:] = [r for r in RULES if r.rule_id != rule.rule_id] + [rule]
+    _analyze_cached.cache_clear()
+
+
+@lru_cache(maxsize=ANALYSIS_CACHE_SIZE)
+def _analyze_cached(sql: str) -> Tuple[SqlFeatures, Tuple[AntiPatternFinding, ...]]:
+    features = extract_features(sql)
+    matched = [rule for rule in RULES if rule.check(features)]
+    matched.sort(key=lambda r: (SEVERITY_ORDER[r.severity], r.score), reverse=True)
+    return features, tuple(rule.finding() for rule in matched)
+
+
+def analyze(sql: str) -> Tuple[SqlFeatures, List[AntiPatternFinding]]:
+    """
+    Returns (features, findings). Findings are ordered by severity then score,
+    so findings[0] is the most important one. Features and findings are
+    shared through the cache and must not be mutated.
+    """
+    features, findings = _analyze_cached(sql or "")
+    return features, list(findings)
+
+
+def get_features(sql: str) -> SqlFeatures:
+    return _analyze_cached(sql or "")[0]
+
+
+def detect_anti_patterns(sql: str) -> List[AntiPatternFinding]:
+    return analyze(sql)[1]
@@ -0,0 +1,182 @@
+"""
+Batch predict / rewrite for whole slow-log snapshots
+
+Statements are deduplicated by fingerprint, embedded in a single
+get_embeddings_batch() call and searched with one bulk vector query, then
+analyzed concurrently. Results are yielded as each fingerprint completes so
+the router can stream them back.
+"""
+import time
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from models import PredictRequest, RewriteRequest, MAX_BATCH_STATEMENTS
+from parser.query_parser import SlowQueryParser
+from error_factory import ErrorFactory
+
+logger = logging.getLogger("uvicorn")
+
+# Upper bound for a single batch call (MAX_BATCH_STATEMENTS is enforced by BatchAnalysisRequest)
+MAX_BATCH_CONCURRENCY = 16
+
+# Same thresholds as the single-statement services
+PREDICT_DISTANCE_THRESHOLD = 0.7
+REWRITE_DISTANCE_THRESHOLD = 0.8
+
+
+class BatchAnalysisService:
+    def __init__(self, embedding_service, vector_store, prediction_service, rewriter_service):
+        self.embedding_service = embedding_service
+        self.vector_store = vector_store
+        self.prediction_service = prediction_service
+        self.rewriter_service = rewriter_service
+        self.parser = SlowQueryParser()
+
+    @property
+    def rag_available(self) -> bool:
+        """
+        Bulk RAG runs whenever the embedding service and vector store exist.
+        The single-statement services' rag_enabled flag is not consulted:
+        deps builds them with rag_enabled=False.
+        """
+        return bool(self.embedding_service and self.vector_store)
+
+    @staticmethod
+    def _check_size(statements: List[str]) -> List[str]:
+        # Every statement gets a result line; dropping some would leave the client waiting for them
+        if len(statements) > MAX_BATCH_STATEMENTS:
+            raise ValueError(f"Batch of {len(statements)} statements exceeds the limit of {MAX_BATCH_STATEMENTS}")
+        return statements
+
+    def group_by_fingerprint(self, statements: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Map fingerprint -> {"sql": first statement seen, "indexes": [input positions]}.
+        Empty statements are dropped. Insertion order follows first occurrence.
+        """
+        groups: Dict[str, Dict[str, Any]] = {}
+        for i, raw in enumerate(statements):
+            sql = (raw or "").strip()
+            if not sql:
+                continue
+            fingerprint = self.parser.normalize_query(sql)
+            if fingerprint not in groups:
+                groups[fingerprint] = {"sql": sql, "indexes": []}
+            groups[fingerprint]["indexes"].append(i)
+        return groups
+
+    async def _bulk_similar(self, fingerprints: List[str], threshold: float) -> Dict[str, List[dict]]:
+        """One embedding batch + one bulk vector search for all fingerprints"""
+        if not (self.embedding_service and self.vector_store) or not fingerprints:
+            return {}
+
+        loop = asyncio.get_running_loop()
+        try:
+            start = time.time()
+            embeddings = await loop.run_in_executor(
+                None, self.embedding_service.get_embeddings_batch, fingerprints
+            )
+            if len(embeddings) != len(fingerprints):
+                # get_embeddings_batch drops texts it can't embed; can't align safely
+                raise ValueError(f"expected {len(fingerprints)} embeddings, got {len(embeddings)}")
+            embed_ms = (time.time() - start) * 1000
+
+            start = time.time()
+            hits = await loop.run_in_executor(
+                None,
+                lambda: self.vector_store.search_similar_batch(embeddings, limit=10, threshold=threshold)
+            )
+            print(f"[PERF] Batch RAG: {len(fingerprints)} embeddings in {embed_ms:.2f}ms, "
+                  f"vector search in {(time.time() - start) * 1000:.2f}ms")
+            return dict(zip(fingerprints, hits))
+        except Exception as e:
+            service_error = ErrorFactory.service_error(
+                "Batch RAG Search",
+                "Bulk embedding / vector search failed",
+                original_error=e,
+                fingerprints=len(fingerprints)
+            )
+            print(f"[/batch] RAG search failed: {service_error}")
+            return {}
+
+    @staticmethod
+    def _clamp_concurrency(max_concurrency: int) -> int:
+        return max(1, min(MAX_BATCH_CONCURRENCY, max_concurrency))
+
+    async def _stream(self, groups: Dict[str, Dict[str, Any]], analyze, max_concurrency: int) -> AsyncIterator[Dict[str, Any]]:
+        """Run `analyze(fingerprint, group)` for every group and yield results as they complete"""
+        semaphore = asyncio.Semaphore(self._clamp_concurrency(max_concurrency))
+
+        async def run(fingerprint: str, group: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                start = time.time()
+                item = {"fingerprint": fingerprint, "indexes": group["indexes"], "sql": group["sql"]}
+                try:
+                    result = await analyze(fingerprint, group)
+                    item["result"] = result.model_dump()
+                except Exception as e:
+                    service_error = ErrorFactory.service_error(
+                        "Batch Analysis",
+                        "Analysis failed for statement",
+                        original_error=e,
+                        fingerprint=fingerprint[:100]
+                    )
+                    item["error"] = str(service_error)
+                item["elapsed_ms"] = round((time.time() - start) * 1000, 2)
+                return item
+
+        tasks = [asyncio.create_task(run(fp, group)) for fp, group in groups.items()]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Client disconnected mid-stream: don't keep burning LLM calls
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def stream_predictions(self, statements: List[str], max_concurrency: int = 8) -> AsyncIterator[Dict[str, Any]]:
+        start_total = time.time()
+        groups = self.group_by_fingerprint(self._check_size(statements))
+        yield {"event": "start", "statements": len(statements), "unique_fingerprints": len(groups)}
+
+        if self.rag_available:
+            similar = await self._bulk_similar(list(groups), PREDICT_DISTANCE_THRESHOLD)
+
+            async def analyze(fingerprint: str, group: Dict[str, Any]):
+                # Heuristic scoring only - no per-statement I/O left after the bulk search
+                return self.prediction_service.assess_risk(group["sql"], similar.get(fingerprint, []))
+        else:
+            async def analyze(fingerprint: str, group: Dict[str, Any]):
+                # Same "RAG unavailable" answer as /predict
+                return await self.prediction_service.predict_query_risk(PredictRequest(sql=group["sql"]))
+
+        async for item in self._stream(groups, analyze, max_concurrency):
+            yield {"event": "result", **item}
+
+        yield {"event": "done", "elapsed_ms": round((time.time() - start_total) * 1000, 2)}
+
+    async def stream_rewrites(self, statements: List[str], database: Optional[str] = None,
+                              max_concurrency: int = 4) -> AsyncIterator[Dict[str, Any]]:
+        start_total = time.time()
+        groups = self.group_by_fingerprint(self._check_size(statements))
+        yield {"event": "start", "statements": len(statements), "unique_fingerprints": len(groups)}
+
+        rag_results: Dict[str, Tuple[list, list]] = {}
+        if self.rag_available:
+            similar = await self._bulk_similar(list(groups), REWRITE_DISTANCE_THRESHOLD)
+            rag_results = {
+                fp: self.rewriter_service.build_similar_tickets(docs) for fp, docs in similar.items()
+            }
+
+        async def analyze(fingerprint: str, group: Dict[str, Any]):
+            # Semaphore in _stream bounds concurrent LLM calls
+            return await self.rewriter_service.rewrite_query(
+                RewriteRequest(sql=group["sql"], database=database),
+                rag_results=rag_results.get(fingerprint)
+            )
+
+        async for item in self._stream(groups, analyze, max_concurrency):
+            yield {"event": "result", **item}
+
+        yield {"event": "done", "elapsed_ms": round((time.time() - start_total) * 1000, 2)}
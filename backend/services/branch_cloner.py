@@ -0,0 +1,703 @@
+"""
+Parallel database branch cloning
+
+Creates `{source}_branch_{name}` as a background job instead of the serial
+SHOW CREATE TABLE + INSERT ... SELECT * loop of BranchManager:
+
+- tables are cloned concurrently, one pooled connection per worker,
+- data is copied in primary-key order, `chunk_size` source rows per
+  chunk (keyset bounds, like services/chunked_archiver.py); every chunk
+  is one transaction that also advances the table's checkpoint in the
+  job state tables, so a chunk is either copied with its checkpoint or
+  not at all,
+- a subset can be cloned: `sample_percent` keeps a deterministic sample
+  (CRC32 of the primary key) and `filters` gives a WHERE condition per
+  table; with `fk_closure` the parent rows referenced by copied child
+  rows are copied too, so the branch has no dangling foreign keys
+  (parents are cloned after their children for that reason),
+- progress is kept per table; a failed or cancelled job resumes table by
+  table from its last committed chunk, also after a restart.
+
+Job state lives in its own schema (BRANCH_JOBS_DATABASE, default
+`pilot_branching`) so neither the source nor the branch gets extra tables.
+"""
+
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from database import get_pooled_connection
+from error_factory import ErrorFactory
+from parser.sql_tokenizer import tokenize, COMMENT, IDENT, PUNCT, STRING, WORD
+from services.chunked_archiver import quote, keyset_condition
+
+logger = logging.getLogger("uvicorn")
+
+STATE_DATABASE = os.getenv("BRANCH_JOBS_DATABASE", "pilot_branching")
+STATE_TABLES_DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS `{database}`.`clone_jobs` (
+        job_id VARCHAR(36) PRIMARY KEY,
+        source_database VARCHAR(64) NOT NULL,
+        branch_database VARCHAR(64) NOT NULL,
+        options TEXT NOT NULL,
+        status VARCHAR(16) NOT NULL,
+        error TEXT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS `{database}`.`clone_tables` (
+        job_id VARCHAR(36) NOT NULL,
+        table_name VARCHAR(64) NOT NULL,
+        status VARCHAR(16) NOT NULL,
+        last_pk TEXT NULL,
+        rows_copied BIGINT NOT NULL DEFAULT 0,
+        chunks INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (job_id, table_name)
+    ) ENGINE=InnoDB
+    """,
+)
+
+RUNNING, COMPLETED, FAILED, CANCELLED = "RUNNING", "COMPLETED", "FAILED", "CANCELLED"
+# Table states: PENDING (not created yet), COPYING (created, rows past last_pk left), DONE
+PENDING, COPYING, DONE = "PENDING", "COPYING", "DONE"
+
+# Row filters are pasted into INSERT ... SELECT: keywords that would read other rows or tables
+FILTER_FORBIDDEN_WORDS = frozenset({
+    "SELECT", "UNION", "EXCEPT", "INTERSECT", "FROM", "INTO", "TABLE", "VALUES", "WITH",
+    "LOAD_FILE", "SLEEP", "BENCHMARK",
+})
+SAMPLE_BUCKETS = 1000000
+
+
+def validate_filter(table: str, condition: str) -> None:
+    """
+    A row filter must be one condition on the table's own columns: no
+    comments, statements, subqueries or set operations, balanced
+    parentheses and no reference qualified by anything but the table.
+    Raises ValueError otherwise.
+    """
+    def invalid(reason: str) -> ValueError:
+        return ValueError(f"Invalid row filter for {table}: {reason}: {condition!r}")
+
+    try:
+        tokens = tokenize(condition, strict=True)
+    except ValueError as e:
+        raise invalid(str(e))
+    if not tokens:
+        raise invalid("empty condition")
+    depth = 0
+    for i, token in enumerate(tokens):
+        if token.kind == COMMENT:
+            raise invalid("comments are not allowed")
+        if token.kind == STRING and "\\" in token.value:
+            raise invalid("backslashes in strings are not allowed")
+        if token.kind == WORD and (token.upper in FILTER_FORBIDDEN_WORDS or token.value.startswith("@")):
+            raise invalid(f"{token.value} is not allowed")
+        if token.kind == WORD and "." in token.value:
+            qualifier = token.value.rpartition(".")[0]
+            if qualifier.lower() != table.lower():
+                raise invalid(f"{token.value} is not a column of {table}")
+        if token.kind == PUNCT:
+            if token.value == ";":
+                raise invalid("only one condition is allowed")
+            if token.value == ".":
+                previous = tokens[i - 1] if i else None
+                if not (previous and previous.kind in (WORD, IDENT) and previous.value.lower() == table.lower()
+                        and (i < 2 or tokens[i - 2].value != ".")):
+                    raise invalid(f"references outside {table} are not allowed")
+            depth += {"(": 1, ")": -1}.get(token.value, 0)
+            if depth < 0:
+                raise invalid("unbalanced parentheses")
+    if depth:
+        raise invalid("unbalanced parentheses")
+
+
+def sample_condition(pk_columns: List[str], percent: float) -> str:
+    """Deterministic sample: the same rows are selected again when a job resumes"""
+    if not pk_columns:
+        return f"RAND() < {percent / 100:.6f}"
+    key = ", ".join(quote(c) for c in pk_columns)
+    return f"MOD(CRC32(CONCAT_WS('#', {key})), {SAMPLE_BUCKETS}) < {int(round(percent / 100 * SAMPLE_BUCKETS))}"
+
+
+class TableClone:
+    def __init__(self, table: str):
+        self.table = table
+        self.status = PENDING
+        self.pk_columns: List[str] = []
+        self.last_pk: Optional[List[Any]] = None
+        self.rows_copied = 0
+        self.chunks = 0
+        self.rows_estimate: Optional[int] = None
+        self.pk_range: Optional[Tuple[float, float]] = None
+        # Children in the clone set: (child table, child columns, referenced columns)
+        self.referenced_by: List[Tuple[str, Tuple[str, ...], Tuple[str, ...]]] = []
+        self.row_filter: Optional[str] = None
+        self.error: Optional[str] = None
+
+    def progress_pct(self) -> Optional[float]:
+        if self.status == DONE:
+            return 100.0
+        if self.status == PENDING:
+            return 0.0
+        if self.pk_range and self.last_pk:
+            low, high = self.pk_range
+            if high > low:
+                return round(min(99.9, (float(self.last_pk[0]) - low) / (high - low) * 100), 1)
+        if self.rows_estimate:
+            return round(min(99.9, self.rows_copied / self.rows_estimate * 100), 1)
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "table": self.table,
+            "status": self.status,
+            "primary_key": self.pk_columns,
+            "checkpoint": self.last_pk,
+            "chunks": self.chunks,
+            "rows_copied": self.rows_copied,
+            "rows_estimate": self.rows_estimate,
+            "progress_pct": self.progress_pct(),
+            "fk_closure_from": [child for child, _, _ in self.referenced_by],
+            "error": self.error,
+        }
+
+
+class BranchCloneJob:
+    def __init__(self, job_id: str, source_database: str, branch_database: str, tables: List[str],
+                 copy_data: bool = False, sample_percent: Optional[float] = None,
+                 filters: Optional[Dict[str, str]] = None, fk_closure: bool = True,
+                 chunk_size: int = 5000, parallelism: int = 4):
+        self.job_id = job_id
+        self.source_database = source_database
+        self.branch_database = branch_database
+        self.copy_data = copy_data
+        self.sample_percent = sample_percent
+        self.filters = filters or {}
+        self.fk_closure = fk_closure
+        self.chunk_size = chunk_size
+        self.parallelism = parallelism
+        self.tables: Dict[str, TableClone] = {t: TableClone(t) for t in tables}
+
+        self.status = RUNNING
+        self.error: Optional[str] = None
+        self.warnings: List[str] = []
+        self.dependencies: Dict[str, Set[str]] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.size_mb: Optional[float] = None
+        self.run_rows = 0
+        self.stop_requested = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def subset(self) -> bool:
+        return bool(self.filters) or (self.sample_percent is not None and self.sample_percent < 100)
+
+    def options(self) -> Dict[str, Any]:
+        return {
+            "tables": list(self.tables),
+            "copy_data": self.copy_data,
+            "sample_percent": self.sample_percent,
+            "filters": self.filters,
+            "fk_closure": self.fk_closure,
+            "chunk_size": self.chunk_size,
+            "parallelism": self.parallelism,
+        }
+
+    def add_rows(self, rows: int) -> None:
+        with self._lock:
+            self.run_rows += rows
+
+    def progress_pct(self) -> Optional[float]:
+        if self.status == COMPLETED:
+            return 100.0
+        if not self.tables:
+            return None
+        if self.copy_data:
+            estimate = sum(t.rows_estimate or 0 for t in self.tables.values())
+            if estimate:
+                copied = sum((t.rows_estimate or 0) if t.status == DONE else min(t.rows_copied, t.rows_estimate or 0)
+                             for t in self.tables.values())
+                return round(min(99.9, copied / estimate * 100), 1)
+        done = sum(1 for t in self.tables.values() if t.status == DONE)
+        return round(min(99.9, done / len(self.tables) * 100), 1)
+
+    def to_dict(self, include_tables: bool = True) -> Dict[str, Any]:
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0
+        result = {
+            "job_id": self.job_id,
+            "source_database": self.source_database,
+            "branch_database": self.branch_database,
+            "status": self.status,
+            "options": self.options(),
+            "tables_total": len(self.tables),
+            "tables_done": sum(1 for t in self.tables.values() if t.status == DONE),
+            "rows_copied": sum(t.rows_copied for t in self.tables.values()),
+            "progress_pct": self.progress_pct(),
+            "rows_per_sec": round(self.run_rows / elapsed, 1) if elapsed > 0 else 0.0,
+            "elapsed_seconds": round(elapsed, 1),
+            "creation_time_sec": round(elapsed, 2) if self.status == COMPLETED else None,
+            "size_mb": self.size_mb,
+            "warnings": self.warnings,
+            "error": self.error,
+        }
+        if include_tables:
+            result["tables"] = [t.to_dict() for t in self.tables.values()]
+        return result
+
+
+class BranchCloner:
+    def __init__(self, connection_factory: Callable = get_pooled_connection,
+                 state_database: str = STATE_DATABASE):
+        self.connection_factory = connection_factory
+        self.state_database = state_database
+        self.jobs: Dict[str, BranchCloneJob] = {}
+        self._lock = threading.Lock()
+        self._state_ready = False
+
+    @property
+    def _state(self) -> str:
+        return quote(self.state_database)
+
+    # ------------------------------------------------------------------
+    # Job lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self, source_database: str, branch_name: str, copy_data: bool = False,
+              tables: Optional[List[str]] = None, sample_percent: Optional[float] = None,
+              filters: Optional[Dict[str, str]] = None, fk_closure: bool = True,
+              chunk_size: int = 5000, parallelism: int = 4, background: bool = True) -> BranchCloneJob:
+        """
+        Recreate `{source_database}_branch_{branch_name}` (empty) and clone the
+        source tables into it on a background thread. Raises ValueError for
+        an unknown source, table or an invalid option.
+        """
+        branch_database = f"{source_database}_branch_{branch_name}"
+        quote(source_database)
+        quote(branch_database)
+        if sample_percent is not None and not 0 < sample_percent <= 100:
+            raise ValueError("sample_percent must be in (0, 100]")
+        for table, condition in (filters or {}).items():
+            quote(table)
+            validate_filter(table, condition)
+
+        conn = self.connection_factory()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT SCHEMA_NAME FROM information_schema.SCHEMATA WHERE SCHEMA_NAME = %s",
+                           (source_database,))
+            if not cursor.fetchall():
+                raise ValueError(f"Source database '{source_database}' not found")
+            cursor.execute("""
+                SELECT TABLE_NAME FROM information_schema.TABLES
+                WHERE TABLE_SCHEMA = %s AND TABLE_TYPE = 'BASE TABLE'
+                ORDER BY TABLE_NAME
+            """, (source_database,))
+            available = [row[0] for row in cursor.fetchall()]
+            if tables is not None:
+                unknown = sorted(set(tables) - set(available))
+                if unknown:
+                    raise ValueError(f"Tables not found in {source_database}: {', '.join(unknown)}")
+                available = [t for t in available if t in set(tables)]
+            unknown = sorted(set(filters or {}) - set(available))
+            if unknown:
+                raise ValueError(f"Row filters for tables that are not cloned: {', '.join(unknown)}")
+
+            job = BranchCloneJob(str(uuid.uuid4()), source_database, branch_database, available,
+                                 copy_data=copy_data, sample_percent=sample_percent, filters=filters,
+                                 fk_closure=fk_closure, chunk_size=max(1, chunk_size),
+                                 parallelism=max(1, parallelism))
+
+            self._ensure_state(cursor)
+            cursor.execute(f"DROP DATABASE IF EXISTS {quote(branch_database)}")
+            cursor.execute(f"CREATE DATABASE {quote(branch_database)}")
+            cursor.execute(f"""
+                INSERT INTO {self._state}.`clone_jobs` (job_id, source_database, branch_database, options, status)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (job.job_id, source_database, branch_database, json.dumps(job.options()), RUNNING))
+            for table in job.tables:
+                cursor.execute(f"""
+                    INSERT INTO {self._state}.`clone_tables` (job_id, table_name, status)
+                    VALUES (%s, %s, %s)
+                """, (job.job_id, table, PENDING))
+            conn.commit()
+            cursor.close()
+        finally:
+            conn.close()
+
+        with self._lock:
+            self.jobs[job.job_id] = job
+        self._launch(job, background)
+        return job
+
+    def resume(self, job_id: str, background: bool = True) -> BranchCloneJob:
+        """Continue a failed / cancelled / interrupted job; finished tables are kept"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+        if job is not None and job.status == RUNNING and job.thread and job.thread.is_alive():
+            return job
+        if job is None:
+            job = self._load(job_id)
+            with self._lock:
+                self.jobs[job_id] = job
+        if job.status == COMPLETED:
+            return job
+        job.stop_requested.clear()
+        job.error = None
+        job.warnings = []
+        self._launch(job, background)
+        return job
+
+    def cancel(self, job_id: str) -> Optional[BranchCloneJob]:
+        """Stop every table after its current chunk; the job can be resumed later"""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            job.stop_requested.set()
+        return job
+
+    def get(self, job_id: str) -> Optional[BranchCloneJob]:
+        return self.jobs.get(job_id)
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        return [job.to_dict(include_tables=False) for job in self.jobs.values()]
+
+    def _ensure_state(self, cursor) -> None:
+        if self._state_ready:
+            return
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {self._state}")
+        for ddl in STATE_TABLES_DDL:
+            cursor.execute(ddl.format(database=self.state_database))
+        self._state_ready = True
+
+    def _load(self, job_id: str) -> BranchCloneJob:
+        conn = self.connection_factory()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"SELECT * FROM {self._state}.`clone_jobs` WHERE job_id = %s", (job_id,))
+            row = cursor.fetchone()
+            if not row:
+                cursor.close()
+                raise KeyError(f"Branch clone job {job_id} not found in {self.state_database}.clone_jobs")
+            cursor.execute(f"SELECT * FROM {self._state}.`clone_tables` WHERE job_id = %s", (job_id,))
+            table_rows = cursor.fetchall()
+            cursor.close()
+        finally:
+            conn.close()
+
+        options = json.loads(row["options"])
+        job = BranchCloneJob(job_id, row["source_database"], row["branch_database"], options["tables"],
+                             copy_data=options["copy_data"], sample_percent=options.get("sample_percent"),
+                             filters=options.get("filters"), fk_closure=options.get("fk_closure", True),
+                             chunk_size=int(options.get("chunk_size") or 5000),
+                             parallelism=int(options.get("parallelism") or 4))
+        job.status = row.get("status") or FAILED
+        for table_row in table_rows:
+            clone = job.tables.get(table_row["table_name"])
+            if clone is not None:
+                clone.status = table_row["status"]
+                clone.last_pk = json.loads(table_row["last_pk"]) if table_row.get("last_pk") else None
+                clone.rows_copied = int(table_row.get("rows_copied") or 0)
+                clone.chunks = int(table_row.get("chunks") or 0)
+        return job
+
+    def _launch(self, job: BranchCloneJob, background: bool) -> None:
+        job.status = RUNNING
+        if background:
+            job.thread = threading.Thread(target=self.run, args=(job,), daemon=True,
+                                          name=f"branch-clone-{job.job_id[:8]}")
+            job.thread.start()
+        else:
+            self.run(job)
+
+    def _save_status(self, job: BranchCloneJob) -> None:
+        try:
+            conn = self.connection_factory()
+            try:
+                cursor = conn.cursor()
+                cursor.execute(f"UPDATE {self._state}.`clone_jobs` SET status = %s, error = %s WHERE job_id = %s",
+                               (job.status, job.error, job.job_id))
+                conn.commit()
+                cursor.close()
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.warning(f"[BranchCloner] Could not save status of job {job.job_id}: {e}")
+
+    def _size_mb(self, job: BranchCloneJob) -> Optional[float]:
+        """Data + index size of the finished branch"""
+        try:
+            conn = self.connection_factory()
+            try:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT ROUND(SUM(DATA_LENGTH + INDEX_LENGTH) / 1024 / 1024, 2)
+                    FROM information_schema.TABLES
+                    WHERE TABLE_SCHEMA = %s
+                """, (job.branch_database,))
+                row = cursor.fetchone()
+                cursor.close()
+            finally:
+                conn.close()
+            return float(row[0] or 0) if row else 0.0
+        except Exception as e:
+            logger.warning(f"[BranchCloner] Could not measure branch {job.branch_database}: {e}")
+            return None
+
+    # ------------------------------------------------------------------
+    # Plan
+    # ------------------------------------------------------------------
+
+    def _plan(self, cursor, job: BranchCloneJob) -> None:
+        """Primary keys, size estimates, FK closure and the order it imposes"""
+        names = list(job.tables)
+        if not names:
+            return
+        placeholders = ", ".join(["%s"] * len(names))
+        cursor.execute(f"""
+            SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = %s AND INDEX_NAME = 'PRIMARY' AND TABLE_NAME IN ({placeholders})
+            ORDER BY TABLE_NAME, SEQ_IN_INDEX
+        """, [job.source_database] + names)
+        for table, column in cursor.fetchall():
+            job.tables[table].pk_columns.append(column)
+
+        cursor.execute(f"""
+            SELECT TABLE_NAME, TABLE_ROWS FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = %s AND TABLE_NAME IN ({placeholders})
+        """, [job.source_database] + names)
+        for table, rows in cursor.fetchall():
+            estimate = int(rows or 0)
+            if table not in job.filters and job.sample_percent is not None:
+                estimate = int(estimate * job.sample_percent / 100)
+            job.tables[table].rows_estimate = estimate
+
+        if job.copy_data:
+            for clone in job.tables.values():
+                if len(clone.pk_columns) == 1 and clone.status != DONE:
+                    pk = quote(clone.pk_columns[0])
+                    cursor.execute(f"SELECT MIN({pk}), MAX({pk}) FROM {quote(job.source_database)}.{quote(clone.table)}")
+                    low, high = cursor.fetchone()
+                    if isinstance(low, (int, float)) and isinstance(high, (int, float)):
+                        clone.pk_range = (float(low), float(high))
+
+        job.dependencies = {table: set() for table in names}
+        if job.copy_data and job.subset and job.fk_closure:
+            self._plan_closure(cursor, job)
+        for clone in job.tables.values():
+            clone.row_filter = self._row_filter(job, clone)
+
+    def _plan_closure(self, cursor, job: BranchCloneJob) -> None:
+        cursor.execute("""
+            SELECT TABLE_NAME, CONSTRAINT_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME
+            FROM information_schema.KEY_COLUMN_USAGE
+            WHERE TABLE_SCHEMA = %s AND REFERENCED_TABLE_SCHEMA = %s
+            ORDER BY TABLE_NAME, CONSTRAINT_NAME, ORDINAL_POSITION
+        """, (job.source_database, job.source_database))
+        constraints: Dict[Tuple[str, str], Tuple[str, List[str], List[str]]] = {}
+        for child, name, column, parent, ref_column in cursor.fetchall():
+            entry = constraints.setdefault((child, name), (parent, [], []))
+            entry[1].append(column)
+            entry[2].append(ref_column)
+
+        for (child, name), (parent, columns, ref_columns) in constraints.items():
+            if child not in job.tables or parent not in job.tables:
+                continue
+            if child == parent:
+                job.warnings.append(f"{child}.{name} references its own table; "
+                                    f"parent rows outside the subset are not added")
+                continue
+            if self._copies_all_rows(job, parent):
+                continue
+            job.tables[parent].referenced_by.append((child, tuple(columns), tuple(ref_columns)))
+            job.dependencies[parent].add(child)
+
+        # FK cycles: drop the closure edges of one table until the order is a DAG
+        remaining = {t: set(d) for t, d in job.dependencies.items()}
+        while remaining:
+            ready = [t for t, deps in remaining.items() if not deps]
+            if not ready:
+                table = min(remaining, key=lambda t: (len(remaining[t]), t))
+                cut = remaining[table]
+                job.dependencies[table] -= cut
+                parent = job.tables[table]
+                parent.referenced_by = [edge for edge in parent.referenced_by if edge[0] not in cut]
+                job.warnings.append(f"Foreign key cycle: rows of {table} referenced by "
+                                    f"{', '.join(sorted(cut))} are not added")
+                ready = [table]
+            for table in ready:
+                del remaining[table]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+
+    @staticmethod
+    def _copies_all_rows(job: BranchCloneJob, table: str) -> bool:
+        return table not in job.filters and (job.sample_percent is None or job.sample_percent >= 100)
+
+    @staticmethod
+    def _row_filter(job: BranchCloneJob, clone: TableClone) -> Optional[str]:
+        """Rows of the subset (None: every row)"""
+        if BranchCloner._copies_all_rows(job, clone.table):
+            return None
+        condition = job.filters.get(clone.table)
+        terms = [f"({condition})" if condition else sample_condition(clone.pk_columns, job.sample_percent)]
+        branch = quote(job.branch_database)
+        for child, columns, ref_columns in clone.referenced_by:
+            refs = ", ".join(quote(c) for c in ref_columns)
+            child_columns = ", ".join(quote(c) for c in columns)
+            terms.append(f"({refs}) IN (SELECT {child_columns} FROM {branch}.{quote(child)})")
+        return " OR ".join(terms)
+
+    # ------------------------------------------------------------------
+    # Clone
+    # ------------------------------------------------------------------
+
+    def _checkpoint(self, cursor, job: BranchCloneJob, clone: TableClone, copied: int) -> None:
+        cursor.execute(f"""
+            UPDATE {self._state}.`clone_tables`
+            SET status = %s, last_pk = %s, rows_copied = rows_copied + %s, chunks = chunks + %s
+            WHERE job_id = %s AND table_name = %s
+        """, (clone.status, json.dumps(clone.last_pk, default=str) if clone.last_pk else None,
+              copied, 1 if copied or clone.status == DONE else 0, job.job_id, clone.table))
+
+    def _copy_chunk(self, conn, cursor, job: BranchCloneJob, clone: TableClone) -> int:
+        source = f"{quote(job.source_database)}.{quote(clone.table)}"
+        where, params = [], []
+        upper = None
+        if clone.pk_columns:
+            if clone.last_pk:
+                condition, values = keyset_condition(clone.pk_columns, clone.last_pk, ">", ">")
+                where.append(condition)
+                params.extend(values)
+            pk_list = ", ".join(quote(c) for c in clone.pk_columns)
+            # Chunks span `chunk_size` source rows; a sparse sample reads wider ranges
+            span = job.chunk_size
+            if clone.row_filter and job.sample_percent and clone.table not in job.filters:
+                span = int(min(job.chunk_size * 100, job.chunk_size * 100 / job.sample_percent))
+            cursor.execute(f"""
+                SELECT {pk_list} FROM {source}
+                {'WHERE ' + ' AND '.join(where) if where else ''}
+                ORDER BY {pk_list}
+                LIMIT 1 OFFSET {span - 1}
+            """, params)
+            row = cursor.fetchone()
+            if row:
+                upper = list(row)
+                condition, values = keyset_condition(clone.pk_columns, upper, "<", "<=")
+                where.append(condition)
+                params.extend(values)
+        if clone.row_filter:
+            where.append(f"({clone.row_filter})")
+
+        try:
+            cursor.execute(f"""
+                INSERT INTO {quote(job.branch_database)}.{quote(clone.table)}
+                SELECT * FROM {source}
+                {'WHERE ' + ' AND '.join(where) if where else ''}
+            """, params)
+            copied = max(0, cursor.rowcount)
+            clone.last_pk, clone.status = (upper, COPYING) if upper else (clone.last_pk, DONE)
+            self._checkpoint(cursor, job, clone, copied)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        clone.rows_copied += copied
+        clone.chunks += 1
+        return copied
+
+    def _clone_table(self, job: BranchCloneJob, clone: TableClone) -> None:
+        conn = self.connection_factory()
+        try:
+            cursor = conn.cursor()
+            # Parents may be filled after their children (FK closure)
+            cursor.execute("SET SESSION foreign_key_checks = 0, unique_checks = 0")
+            if clone.status == PENDING:
+                cursor.execute(f"SHOW CREATE TABLE {quote(job.source_database)}.{quote(clone.table)}")
+                ddl = cursor.fetchone()[1]
+                cursor.execute(f"DROP TABLE IF EXISTS {quote(job.branch_database)}.{quote(clone.table)}")
+                cursor.execute(f"USE {quote(job.branch_database)}")
+                cursor.execute(ddl)
+                clone.status = COPYING if job.copy_data else DONE
+                self._checkpoint(cursor, job, clone, 0)
+                conn.commit()
+            while clone.status == COPYING and not job.stop_requested.is_set():
+                job.add_rows(self._copy_chunk(conn, cursor, job, clone))
+            cursor.close()
+        finally:
+            conn.close()
+
+    def run(self, job: BranchCloneJob) -> BranchCloneJob:
+        job.started_at = time.time()
+        job.finished_at = None
+        job.run_rows = 0
+        try:
+            conn = self.connection_factory()
+            try:
+                cursor = conn.cursor()
+                cursor.execute(f"CREATE DATABASE IF NOT EXISTS {quote(job.branch_database)}")
+                self._plan(cursor, job)
+                cursor.close()
+            finally:
+                conn.close()
+
+            done = {t for t, clone in job.tables.items() if clone.status == DONE}
+            pending = set(job.tables) - done
+            failures = []
+            with ThreadPoolExecutor(max_workers=job.parallelism,
+                                    thread_name_prefix=f"branch-clone-{job.job_id[:8]}") as pool:
+                running = {}
+                while pending or running:
+                    if not job.stop_requested.is_set():
+                        for table in sorted(pending):
+                            if job.dependencies.get(table, set()) <= done:
+                                pending.discard(table)
+                                running[pool.submit(self._clone_table, job, job.tables[table])] = table
+                    if not running:
+                        break
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        table = running.pop(future)
+                        try:
+                            future.result()
+                        except Exception as e:
+                            job.tables[table].error = str(e)
+                            failures.append((table, e))
+                            job.stop_requested.set()  # the others stop after their current chunk
+                        if job.tables[table].status == DONE:
+                            done.add(table)
+
+            if failures:
+                table, error = failures[0]
+                raise RuntimeError(f"Cloning table {table} failed: {error}") from error
+            job.status = COMPLETED if len(done) == len(job.tables) else CANCELLED
+            if job.status == COMPLETED:
+                job.size_mb = self._size_mb(job)
+        except Exception as e:
+            db_error = ErrorFactory.database_error(
+                f"Branch clone of {job.source_database} into {job.branch_database} stopped",
+                original_error=e,
+                job_id=job.job_id
+            )
+            logger.error(f"[BranchCloner] {db_error}")
+            job.status = FAILED
+            job.error = str(db_error)
+        finally:
+            job.finished_at = time.time()
+            self._save_status(job)
+        logger.info(f"[BranchCloner] Job {job.job_id} {job.status}: "
+                    f"{sum(t.rows_copied for t in job.tables.values())} rows, {len(job.tables)} tables")
+        return job
+
+
+# Global instance
+branch_cloner = BranchCloner()
@@ -0,0 +1,296 @@
+"""
+Incremental data diff between a source database and one of its branches
+
+Compares table contents without moving every row to the client, in the
+style of pt-table-checksum:
+
+- each table is split into primary-key ranges of about `chunk_size` rows
+  (boundaries come from one ROW_NUMBER() query on the source),
+- every range gets a COUNT(*) + BIT_XOR(CRC32 or MD5 of the row)
+  aggregate, computed on the source and the branch in parallel,
+- only ranges whose aggregates differ are looked at again: they are split
+  into `fanout` smaller ranges, down to `leaf_rows` rows, where the primary
+  keys and row hashes of both sides are fetched and compared.
+
+Unchanged data costs one aggregate per chunk; rows are transferred only
+around the changes, so the cost is O(changes) rather than O(table size).
+Tables are compared on their common columns; tables without a primary key
+(or with a different one in the branch) are reported as skipped.
+"""
+
+import math
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from database import get_pooled_connection
+from services.chunked_archiver import quote, keyset_condition, row_hash_sql
+
+logger = logging.getLogger("uvicorn")
+
+ALGORITHMS = ("crc32", "md5")
+INSERTED, DELETED, UPDATED = "inserted", "deleted", "updated"
+
+# (lower bound exclusive, upper bound inclusive); None means unbounded
+PkRange = Tuple[Optional[List[Any]], Optional[List[Any]]]
+
+
+class TablePlan:
+    __slots__ = ("table", "pk_columns", "columns", "checksum_sql", "leaf_sql", "result")
+
+    def __init__(self, table: str, pk_columns: List[str], columns: List[str], algorithm: str):
+        self.table = table
+        self.pk_columns = pk_columns
+        self.columns = columns
+        self.checksum_sql = f"COUNT(*), COALESCE(BIT_XOR({row_hash_sql(columns, algorithm, aggregate=True)}), 0)"
+        pk_list = ", ".join(quote(c) for c in pk_columns)
+        self.leaf_sql = (f"SELECT {pk_list}, {row_hash_sql(columns, algorithm)} FROM {{source}} "
+                         f"WHERE {{where}} ORDER BY {pk_list}")
+        self.result: Dict[str, Any] = {
+            "table": table,
+            "primary_key": pk_columns,
+            "status": "identical",
+            "chunks_checked": 0,
+            "chunks_mismatched": 0,
+            "rows_fetched": 0,
+            "inserted": 0,
+            "deleted": 0,
+            "updated": 0,
+            "rows": [],
+            "truncated": False,
+        }
+
+
+class BranchDataDiff:
+    def __init__(self, connection_factory: Callable = get_pooled_connection,
+                 chunk_size: int = 10000, leaf_rows: int = 200, fanout: int = 16,
+                 algorithm: str = "crc32", max_workers: int = 4, max_rows_reported: int = 1000):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown checksum algorithm {algorithm!r} (expected one of {', '.join(ALGORITHMS)})")
+        self.connection_factory = connection_factory
+        self.chunk_size = max(1, chunk_size)
+        self.leaf_rows = max(1, leaf_rows)
+        self.fanout = max(2, fanout)
+        self.algorithm = algorithm
+        self.max_workers = max(1, max_workers)
+        self.max_rows_reported = max_rows_reported
+        self.queries = 0
+        self._lock = threading.Lock()
+
+    def _query(self, sql: str, params: List[Any]) -> List[Tuple]:
+        conn = self.connection_factory()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+            cursor.close()
+        finally:
+            conn.close()
+        with self._lock:
+            self.queries += 1
+        return rows
+
+    @staticmethod
+    def _range_where(plan: TablePlan, pk_range: PkRange) -> Tuple[str, List[Any]]:
+        lower, upper = pk_range
+        where, params = [], []
+        if lower:
+            condition, values = keyset_condition(plan.pk_columns, lower, ">", ">")
+            where.append(condition)
+            params.extend(values)
+        if upper:
+            condition, values = keyset_condition(plan.pk_columns, upper, "<", "<=")
+            where.append(condition)
+            params.extend(values)
+        return " AND ".join(where) or "1 = 1", params
+
+    # ------------------------------------------------------------------
+    # Plan
+    # ------------------------------------------------------------------
+
+    def _catalog(self, database: str) -> Tuple[Dict[str, List[str]], Dict[str, List[str]]]:
+        """Columns and primary key columns of every table, two queries"""
+        columns: Dict[str, List[str]] = {}
+        for table, column in self._query("""
+            SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = %s
+            ORDER BY TABLE_NAME, ORDINAL_POSITION
+        """, [database]):
+            columns.setdefault(table, []).append(column)
+        primary_keys: Dict[str, List[str]] = {}
+        for table, column in self._query("""
+            SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = %s AND INDEX_NAME = 'PRIMARY'
+            ORDER BY TABLE_NAME, SEQ_IN_INDEX
+        """, [database]):
+            primary_keys.setdefault(table, []).append(column)
+        return columns, primary_keys
+
+    def _plans(self, source_db: str, branch_db: str, tables: Optional[List[str]],
+               skipped: List[Dict[str, Any]]) -> List[TablePlan]:
+        source_columns, source_pks = self._catalog(source_db)
+        branch_columns, branch_pks = self._catalog(branch_db)
+        common = sorted(set(source_columns) & set(branch_columns))
+        if tables is not None:
+            common = [t for t in common if t in set(tables)]
+
+        plans = []
+        for table in common:
+            pk = source_pks.get(table)
+            if not pk:
+                skipped.append({"table": table, "reason": "no primary key"})
+                continue
+            if branch_pks.get(table) != pk:
+                skipped.append({"table": table, "reason": f"primary key differs in the branch ({branch_pks.get(table)})"})
+                continue
+            branch_set = set(branch_columns[table])
+            columns = [c for c in source_columns[table] if c in branch_set]
+            plan = TablePlan(table, pk, columns, self.algorithm)
+            ignored = sorted(set(source_columns[table]) ^ branch_set)
+            if ignored:
+                plan.result["columns_ignored"] = ignored
+            plans.append(plan)
+        return plans
+
+    def _boundaries(self, database: str, plan: TablePlan, pk_range: PkRange, step: int) -> List[List[Any]]:
+        """Every `step`-th primary key inside the range, in one query"""
+        where, params = self._range_where(plan, pk_range)
+        pk_list = ", ".join(quote(c) for c in plan.pk_columns)
+        rows = self._query(f"""
+            SELECT {pk_list} FROM (
+                SELECT {pk_list}, ROW_NUMBER() OVER (ORDER BY {pk_list}) AS rn
+                FROM {quote(database)}.{quote(plan.table)}
+                WHERE {where}
+            ) AS boundaries
+            WHERE MOD(rn, {int(step)}) = 0
+            ORDER BY {pk_list}
+        """, params)
+        with self._lock:
+            plan.result["rows_fetched"] += len(rows)
+        return [list(row) for row in rows]
+
+    @staticmethod
+    def _split(pk_range: PkRange, boundaries: List[List[Any]]) -> List[PkRange]:
+        lower, upper = pk_range
+        if upper is not None and boundaries and boundaries[-1] == upper:
+            boundaries = boundaries[:-1]
+        ranges, previous = [], lower
+        for boundary in boundaries:
+            ranges.append((previous, boundary))
+            previous = boundary
+        ranges.append((previous, upper))
+        return ranges
+
+    # ------------------------------------------------------------------
+    # Compare
+    # ------------------------------------------------------------------
+
+    def _checksum(self, database: str, plan: TablePlan, pk_range: PkRange) -> Tuple[int, int]:
+        where, params = self._range_where(plan, pk_range)
+        rows = self._query(f"SELECT {plan.checksum_sql} FROM {quote(database)}.{quote(plan.table)} WHERE {where}", params)
+        count, checksum = rows[0] if rows else (0, 0)
+        return int(count or 0), int(checksum or 0)
+
+    def _leaf_rows(self, database: str, plan: TablePlan, pk_range: PkRange) -> Dict[Tuple, Any]:
+        where, params = self._range_where(plan, pk_range)
+        rows = self._query(plan.leaf_sql.format(source=f"{quote(database)}.{quote(plan.table)}", where=where), params)
+        with self._lock:
+            plan.result["rows_fetched"] += len(rows)
+        width = len(plan.pk_columns)
+        return {tuple(row[:width]): row[width] for row in rows}
+
+    def _record(self, plan: TablePlan, source_rows: Dict[Tuple, Any], branch_rows: Dict[Tuple, Any]) -> None:
+        changes = []
+        for key in source_rows.keys() | branch_rows.keys():
+            if key not in branch_rows:
+                changes.append((key, DELETED))
+            elif key not in source_rows:
+                changes.append((key, INSERTED))
+            elif source_rows[key] != branch_rows[key]:
+                changes.append((key, UPDATED))
+        with self._lock:
+            result = plan.result
+            for key, change in changes:
+                result[change] += 1
+                if len(result["rows"]) < self.max_rows_reported:
+                    result["rows"].append({"pk": list(key), "change": change})
+                else:
+                    result["truncated"] = True
+
+    def _compare_range(self, pool, source_db: str, branch_db: str, plan: TablePlan,
+                       pk_range: PkRange) -> List[PkRange]:
+        """Mismatched sub-ranges to look at next (leaf ranges are settled here)"""
+        source = pool.submit(self._checksum, source_db, plan, pk_range)
+        branch = self._checksum(branch_db, plan, pk_range)
+        source = source.result()
+        with self._lock:
+            plan.result["chunks_checked"] += 1
+            if source != branch:
+                plan.result["chunks_mismatched"] += 1
+        if source == branch:
+            return []
+
+        rows = max(source[0], branch[0])
+        if rows > self.leaf_rows:
+            # Split on the side that has more rows in the range
+            database = source_db if source[0] >= branch[0] else branch_db
+            step = max(self.leaf_rows, math.ceil(rows / self.fanout))
+            sub_ranges = self._split(pk_range, self._boundaries(database, plan, pk_range, step))
+            if len(sub_ranges) > 1:
+                return sub_ranges
+        source_rows = pool.submit(self._leaf_rows, source_db, plan, pk_range)
+        branch_rows = self._leaf_rows(branch_db, plan, pk_range)
+        self._record(plan, source_rows.result(), branch_rows)
+        return []
+
+    def diff(self, source_db: str, branch_db: str, tables: Optional[List[str]] = None) -> Dict[str, Any]:
+        quote(source_db)
+        quote(branch_db)
+        started = time.perf_counter()
+        self.queries = 0
+        skipped: List[Dict[str, Any]] = []
+        plans = self._plans(source_db, branch_db, tables, skipped)
+
+        # Checksum tasks hand their source-side query to the same pool, so it needs spare workers
+        with ThreadPoolExecutor(max_workers=self.max_workers * 2, thread_name_prefix="branch-diff") as pool:
+            frontier = []
+            for plan, boundaries in zip(plans, pool.map(
+                    lambda plan: self._boundaries(source_db, plan, (None, None), self.chunk_size), plans)):
+                frontier.extend((plan, pk_range) for pk_range in self._split((None, None), boundaries))
+
+            # Breadth first: every level's ranges are compared in parallel
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="branch-diff-range") as ranges:
+                while frontier:
+                    results = list(ranges.map(
+                        lambda item: self._compare_range(pool, source_db, branch_db, item[0], item[1]), frontier))
+                    frontier = [(plan, sub_range) for (plan, _), sub_ranges in zip(frontier, results)
+                                for sub_range in sub_ranges]
+
+        tables_result = []
+        for plan in plans:
+            result = plan.result
+            result["rows"].sort(key=lambda r: r["pk"])
+            if result["inserted"] or result["deleted"] or result["updated"]:
+                result["status"] = "different"
+            tables_result.append(result)
+
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+        logger.info(f"[BranchDataDiff] {source_db} vs {branch_db}: {len(plans)} tables, "
+                    f"{self.queries} queries, {sum(r['rows_fetched'] for r in tables_result)} rows fetched in {elapsed_ms}ms")
+        return {
+            "source_database": source_db,
+            "branch_database": branch_db,
+            "algorithm": self.algorithm,
+            "chunk_size": self.chunk_size,
+            "tables": tables_result,
+            "skipped_tables": skipped,
+            "tables_with_changes": [r["table"] for r in tables_result if r["status"] == "different"],
+            "rows_inserted": sum(r["inserted"] for r in tables_result),
+            "rows_deleted": sum(r["deleted"] for r in tables_result),
+            "rows_updated": sum(r["updated"] for r in tables_result),
+            "rows_fetched": sum(r["rows_fetched"] for r in tables_result),
+            "queries": self.queries,
+            "elapsed_ms": elapsed_ms,
+        }
@@ -2,17 +2,21 @@
 Simple in-memory cache service for expensive operations
 """
 import time
+from collections import OrderedDict
 from typing import Any, Optional, Dict
 from functools import wraps
 
 class SimpleCache:
-    def __init__(self, ttl_seconds: int = 300):
+    def __init__(self, ttl_seconds: int = 300, max_entries: Optional[int] = None):
         """
         Initialize cache with TTL (time-to-live) in seconds
-        Default: 5 minutes
+        Default: 5 minutes, unbounded. With max_entries the least recently
+        used entry is evicted once the cache is full (for unbounded key
+        spaces such as prompts).
         """
-        self.cache: Dict[str, tuple[Any, float]] = {}
+        self.cache: Dict[str, tuple[Any, float]] = OrderedDict()
         self.ttl = ttl_seconds
+        self.max_entries = max_entries
     
     def get(self, key: str) -> Optional[Any]:
         """Get value from cache if not expired"""
@@ -25,11 +29,22 @@ class SimpleCache:
             del self.cache[key]
             return None
         
+        if self.max_entries is not None:
+            self.cache.move_to_end(key)
         return value
     
     def set(self, key: str, value: Any):
         """Set value in cache with current timestamp"""
-        self.cache[key] = (value, time.time())
+        now = time.time()
+        self.cache[key] = (value, now)
+        if self.max_entries is not None:
+            self.cache.move_to_end(key)
+            if len(self.cache) > self.max_entries:
+                # Full: drop expired entries first, then the least recently used
+                for stale in [k for k, (_, timestamp) in self.cache.items() if now - timestamp > self.ttl]:
+                    del self.cache[stale]
+                while len(self.cache) > self.max_entries:
+                    self.cache.popitem(last=False)
     
     def clear(self):
         """Clear all cache entries"""
@@ -44,6 +59,11 @@ class SimpleCache:
 query_rewrite_cache = SimpleCache(ttl_seconds=600)  # 10 minutes for rewrites
 document_count_cache = SimpleCache(ttl_seconds=60)  # 1 minute for counts
 embedding_cache = SimpleCache(ttl_seconds=300)  # 5 minutes for embeddings
+llm_response_cache = SimpleCache(ttl_seconds=600, max_entries=1000)  # 10 minutes for SkyAI responses (keyed by prompt hash)
+plan_baseline_cache = SimpleCache(ttl_seconds=3600)  # 1 hour for plan baselines
+explain_cache = SimpleCache(ttl_seconds=600)  # 10 minutes for EXPLAIN plans (also keyed by schema version)
+ddl_parse_cache = SimpleCache(ttl_seconds=86400)  # 1 day for parsed schema files (keyed by git blob hash)
+mcp_schema_cache = SimpleCache(ttl_seconds=300)  # 5 minutes for MCP get_schema / list_tables (invalidated on DDL)
 
 def cache_result(cache_instance: SimpleCache, key_prefix: str = ""):
     """
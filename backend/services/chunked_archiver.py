@@ -0,0 +1,560 @@
+"""
+Online chunked archiver
+
+Moves rows older than a cutoff from `table` to `table_archive` without the
+long single transaction of INSERT ... SELECT + DELETE over the whole table:
+
+- the primary key is walked in keyset order, `batch_size` matching rows at
+  a time (`WHERE date_col < cutoff AND pk > last_pk ORDER BY pk LIMIT n`),
+- each chunk is one short transaction: lock the chunk's rows, copy them,
+  delete them (the copied and deleted counts must match or the chunk is
+  rolled back) and advance the checkpoint row in `archive_jobs`, so a
+  chunk is either fully archived with its checkpoint or not at all,
+- before every chunk the job waits while Threads_running or the
+  replication lag of the configured replicas is above its limit,
+- the cutoff is computed once when the job is created, so a resumed job
+  archives exactly the same rows; a failed or cancelled job resumes from
+  its last committed chunk, also after a restart (state is read back from
+  `archive_jobs`).
+
+Rows already exported and verified elsewhere (services/archive_export.py)
+are removed with the same machinery in delete-only mode (no archive
+table), bounded by the highest exported primary key. With the export's
+per-chunk checksums, each chunk is the exported one: its locked rows are
+hashed again in the delete transaction and a chunk whose count or
+checksum differs from the export is rolled back and fails the job, so a
+row changed since the export is never deleted.
+
+Jobs run on a background thread; progress, rows/sec and throttling are
+available while they run.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from database import get_db_connection, get_host_connection
+from error_factory import ErrorFactory
+from services.explain_service import explain_service, ExplainService
+
+logger = logging.getLogger("uvicorn")
+
+IDENTIFIER_RE = re.compile(r'^\w+$')
+
+JOBS_TABLE = "archive_jobs"
+JOBS_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS `{database}`.`archive_jobs` (
+        job_id VARCHAR(36) PRIMARY KEY,
+        table_name VARCHAR(64) NOT NULL,
+        archive_table VARCHAR(64) NOT NULL,
+        date_column VARCHAR(64) NOT NULL,
+        cutoff DATETIME NOT NULL,
+        batch_size INT NOT NULL,
+        last_pk TEXT NULL,
+        pk_limit TEXT NULL,
+        checksums LONGTEXT NULL,
+        rows_copied BIGINT NOT NULL DEFAULT 0,
+        rows_deleted BIGINT NOT NULL DEFAULT 0,
+        chunks INT NOT NULL DEFAULT 0,
+        status VARCHAR(16) NOT NULL,
+        error TEXT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB
+"""
+
+RUNNING, THROTTLED, COMPLETED, FAILED, CANCELLED = "RUNNING", "THROTTLED", "COMPLETED", "FAILED", "CANCELLED"
+ACTIVE_STATUSES = (RUNNING, THROTTLED)
+
+
+def quote(identifier: str) -> str:
+    if not identifier or not IDENTIFIER_RE.match(identifier):
+        raise ValueError(f"Invalid identifier: {identifier!r}")
+    return f"`{identifier}`"
+
+
+def row_hash_sql(columns: List[str], algorithm: str = "crc32", aggregate: bool = False) -> str:
+    """
+    Hash of a row's values. CONCAT_WS skips NULLs, so NULL-ness is appended
+    separately (NULL and '' hash differently). The MD5 aggregate XORs the
+    first 64 bits of each row digest.
+    """
+    quoted = [quote(c) for c in columns]
+    nulls = ", ".join(f"ISNULL({c})" for c in quoted)
+    concat = f"CONCAT_WS('#', {', '.join(quoted)}, CONCAT({nulls}))"
+    if algorithm == "md5":
+        return f"CAST(CONV(LEFT(MD5({concat}), 16), 16, 10) AS UNSIGNED)" if aggregate else f"MD5({concat})"
+    return f"CRC32({concat})"
+
+
+def keyset_condition(columns: List[str], values: List[Any], op: str, last_op: str) -> Tuple[str, List[Any]]:
+    """
+    Row comparison expanded into an OR of prefixes, e.g. (a, b) > (x, y) ->
+    (a > x) OR (a = x AND b > y), which the optimizer turns into PK ranges.
+    """
+    parts, params = [], []
+    for i, column in enumerate(columns):
+        terms = [f"{quote(c)} = %s" for c in columns[:i]]
+        terms.append(f"{quote(column)} {last_op if i == len(columns) - 1 else op} %s")
+        parts.append("(" + " AND ".join(terms) + ")")
+        params.extend(values[:i + 1])
+    return "(" + " OR ".join(parts) + ")", params
+
+
+class ArchiveThrottle:
+    """Blocks between chunks while the server is busy or replicas lag"""
+
+    def __init__(self, max_threads_running: int = 25, max_replication_lag_s: float = 5.0,
+                 replica_factories: Optional[List[Callable]] = None,
+                 check_interval_s: float = 1.0, max_wait_s: float = 900.0):
+        self.max_threads_running = max_threads_running
+        self.max_replication_lag_s = max_replication_lag_s
+        self.replica_factories = replica_factories or []
+        self.check_interval_s = check_interval_s
+        self.max_wait_s = max_wait_s
+        self._replicas: List[Any] = []
+
+    @staticmethod
+    def threads_running(cursor) -> int:
+        cursor.execute("SHOW GLOBAL STATUS LIKE 'Threads_running'")
+        row = cursor.fetchone()
+        return int(row[1]) if row else 0
+
+    def replication_lag(self) -> Optional[float]:
+        """Worst Seconds_Behind_Master over the replicas (inf if one is stopped)"""
+        if not self.replica_factories:
+            return None
+        if not self._replicas:
+            self._replicas = [factory() for factory in self.replica_factories]
+        worst = 0.0
+        for conn in self._replicas:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SHOW ALL SLAVES STATUS")
+            for row in cursor.fetchall():
+                lag = row.get("Seconds_Behind_Master")
+                worst = max(worst, float("inf") if lag is None else float(lag))
+            cursor.close()
+        return worst
+
+    def reasons(self, cursor) -> List[str]:
+        reasons = []
+        running = self.threads_running(cursor)
+        if running > self.max_threads_running:
+            reasons.append(f"Threads_running {running} > {self.max_threads_running}")
+        lag = self.replication_lag()
+        if lag is not None and lag > self.max_replication_lag_s:
+            reasons.append(f"replication lag {lag}s > {self.max_replication_lag_s}s")
+        return reasons
+
+    def wait(self, cursor, job: "ArchiveJob") -> float:
+        """Seconds spent waiting; raises TimeoutError after max_wait_s"""
+        waited = 0.0
+        while not job.stop_requested.is_set():
+            reasons = self.reasons(cursor)
+            if not reasons:
+                break
+            if waited >= self.max_wait_s:
+                raise TimeoutError(f"Throttled for more than {self.max_wait_s:.0f}s: {'; '.join(reasons)}")
+            job.status = THROTTLED
+            job.throttle_reason = "; ".join(reasons)
+            time.sleep(self.check_interval_s)
+            waited += self.check_interval_s
+        job.status = RUNNING
+        job.throttle_reason = None
+        return waited
+
+    def close(self) -> None:
+        for conn in self._replicas:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self._replicas = []
+
+
+def replica_factories_from_env() -> List[Callable]:
+    """ARCHIVE_REPLICA_HOSTS=host1[:port],host2[:port] -> connection factories"""
+    factories = []
+    for entry in filter(None, (h.strip() for h in os.getenv("ARCHIVE_REPLICA_HOSTS", "").split(","))):
+        host, _, port = entry.partition(":")
+        factories.append(lambda host=host, port=port: get_host_connection(host, int(port) if port else None))
+    return factories
+
+
+class ArchiveJob:
+    def __init__(self, job_id: str, database: str, table: str, archive_table: str, date_column: str,
+                 cutoff: datetime, batch_size: int):
+        self.job_id = job_id
+        self.database = database
+        self.table = table
+        self.archive_table = archive_table
+        self.date_column = date_column
+        self.cutoff = cutoff
+        self.batch_size = batch_size
+
+        self.pk_columns: List[str] = []
+        self.last_pk: Optional[List[Any]] = None
+        self.pk_limit: Optional[List[Any]] = None  # inclusive upper bound of the walk
+        # Delete-only: {"columns": [...], "chunks": [{"last_pk", "rows", "crc"}, ...]} of the export
+        self.checksums: Optional[Dict[str, Any]] = None
+        self.rows_copied = 0
+        self.rows_deleted = 0
+        self.chunks = 0
+        self.status = RUNNING
+        self.error: Optional[str] = None
+        self.throttle_reason: Optional[str] = None
+
+        self.rows_estimate: Optional[int] = None
+        self.pk_range: Optional[Tuple[float, float]] = None  # single numeric PK: (min, max)
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.run_rows = 0           # rows archived by the current run (rows/sec)
+        self.throttled_seconds = 0.0
+        self.stop_requested = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def progress_pct(self) -> Optional[float]:
+        if self.status == COMPLETED:
+            return 100.0
+        if self.pk_range and self.last_pk:
+            low, high = self.pk_range
+            if high > low:
+                return round(min(99.9, (float(self.last_pk[0]) - low) / (high - low) * 100), 1)
+        if self.rows_estimate:
+            return round(min(99.9, self.rows_copied / self.rows_estimate * 100), 1)
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0
+        rows_per_sec = self.run_rows / elapsed if elapsed > 0 else 0.0
+        remaining = max(0, (self.rows_estimate or 0) - self.rows_copied)
+        return {
+            "job_id": self.job_id,
+            "database": self.database,
+            "table": self.table,
+            "archive_table": self.archive_table or None,
+            "mode": "copy_delete" if self.archive_table else "delete_only",
+            "date_column": self.date_column,
+            "cutoff": str(self.cutoff),
+            "batch_size": self.batch_size,
+            "primary_key": self.pk_columns,
+            "status": self.status,
+            "checkpoint": self.last_pk,
+            "chunks": self.chunks,
+            "chunks_verified": len(self.checksums["chunks"]) if self.checksums else None,
+            "rows_copied": self.rows_copied,
+            "rows_deleted": self.rows_deleted,
+            "rows_estimate": self.rows_estimate,
+            "progress_pct": self.progress_pct(),
+            "rows_per_sec": round(rows_per_sec, 1),
+            "eta_seconds": round(remaining / rows_per_sec) if rows_per_sec > 0 and self.status in ACTIVE_STATUSES else None,
+            "elapsed_seconds": round(elapsed, 1),
+            "throttled_seconds": round(self.throttled_seconds, 1),
+            "throttle_reason": self.throttle_reason,
+            "error": self.error,
+        }
+
+
+class ChunkedArchiver:
+    def __init__(self, connection_factory: Callable = get_db_connection,
+                 throttle_factory: Optional[Callable[[], ArchiveThrottle]] = None,
+                 explainer: ExplainService = explain_service,
+                 chunk_pause_s: float = 0.0):
+        self.connection_factory = connection_factory
+        self.explainer = explainer
+        self.throttle_factory = throttle_factory or (lambda: ArchiveThrottle(replica_factories=replica_factories_from_env()))
+        self.chunk_pause_s = chunk_pause_s
+        self.jobs: Dict[str, ArchiveJob] = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Job lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self, database: str, table: str, retention_days: int, date_column: str = "updated_at",
+              batch_size: int = 1000, throttle: Optional[ArchiveThrottle] = None,
+              background: bool = True, copy_rows: bool = True, cutoff: Optional[datetime] = None,
+              pk_limit: Optional[List[Any]] = None, checksums: Optional[Dict[str, Any]] = None) -> ArchiveJob:
+        """
+        Start archiving rows with `date_column` older than `retention_days`
+        (or than an explicit `cutoff`). With copy_rows=False the rows are
+        only deleted, up to `pk_limit` (inclusive) when given, and chunk by
+        chunk as exported when `checksums` are given.
+        """
+        for name in (database, table, date_column):
+            quote(name)
+        if checksums and copy_rows:
+            raise ValueError("Export checksums only apply to delete-only jobs")
+        archive_table = f"{table}_archive" if copy_rows else ""
+        db = quote(database)
+
+        conn = self.connection_factory()
+        try:
+            cursor = conn.cursor()
+            if cutoff is None:
+                cursor.execute("SELECT NOW() - INTERVAL %s DAY", (retention_days,))
+                cutoff = cursor.fetchone()[0]
+            cursor.execute(JOBS_TABLE_DDL.format(database=database))
+            cursor.execute(f"ALTER TABLE {db}.{JOBS_TABLE} ADD COLUMN IF NOT EXISTS checksums LONGTEXT NULL AFTER pk_limit")
+            if archive_table:
+                cursor.execute(f"CREATE TABLE IF NOT EXISTS {db}.{quote(archive_table)} LIKE {db}.{quote(table)}")
+            job = ArchiveJob(str(uuid.uuid4()), database, table, archive_table, date_column, cutoff,
+                             max(1, batch_size))
+            job.pk_limit = pk_limit
+            job.checksums = checksums
+            cursor.execute(f"""
+                INSERT INTO {db}.{JOBS_TABLE}
+                    (job_id, table_name, archive_table, date_column, cutoff, batch_size, pk_limit, checksums, status)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, (job.job_id, table, archive_table, date_column, cutoff, job.batch_size,
+                  json.dumps(pk_limit, default=str) if pk_limit else None,
+                  json.dumps(checksums, default=str) if checksums else None, RUNNING))
+            conn.commit()
+            cursor.close()
+        finally:
+            conn.close()
+
+        with self._lock:
+            self.jobs[job.job_id] = job
+        self._launch(job, throttle, background)
+        return job
+
+    def resume(self, job_id: str, database: str, throttle: Optional[ArchiveThrottle] = None,
+               background: bool = True) -> ArchiveJob:
+        """Continue a failed / cancelled / interrupted job from its last committed chunk"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+        if job is not None and job.status in ACTIVE_STATUSES and job.thread and job.thread.is_alive():
+            return job
+        if job is None:
+            job = self._load(job_id, database)
+            with self._lock:
+                self.jobs[job_id] = job
+        if job.status == COMPLETED:
+            return job
+        job.stop_requested.clear()
+        job.error = None
+        self._launch(job, throttle, background)
+        return job
+
+    def cancel(self, job_id: str) -> Optional[ArchiveJob]:
+        """Stop after the current chunk; the job can be resumed later"""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            job.stop_requested.set()
+        return job
+
+    def get(self, job_id: str) -> Optional[ArchiveJob]:
+        return self.jobs.get(job_id)
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        return [job.to_dict() for job in self.jobs.values()]
+
+    def _load(self, job_id: str, database: str) -> ArchiveJob:
+        conn = self.connection_factory()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"SELECT * FROM {quote(database)}.{JOBS_TABLE} WHERE job_id = %s", (job_id,))
+            row = cursor.fetchone()
+            cursor.close()
+        finally:
+            conn.close()
+        if not row:
+            raise KeyError(f"Archive job {job_id} not found in {database}.{JOBS_TABLE}")
+        job = ArchiveJob(job_id, database, row["table_name"], row["archive_table"], row["date_column"],
+                         row["cutoff"], int(row["batch_size"]))
+        job.last_pk = json.loads(row["last_pk"]) if row.get("last_pk") else None
+        job.pk_limit = json.loads(row["pk_limit"]) if row.get("pk_limit") else None
+        job.checksums = json.loads(row["checksums"]) if row.get("checksums") else None
+        job.rows_copied = int(row.get("rows_copied") or 0)
+        job.rows_deleted = int(row.get("rows_deleted") or 0)
+        job.chunks = int(row.get("chunks") or 0)
+        job.status = row.get("status") or FAILED
+        return job
+
+    def _launch(self, job: ArchiveJob, throttle: Optional[ArchiveThrottle], background: bool) -> None:
+        job.status = RUNNING
+        throttle = throttle or self.throttle_factory()
+        if background:
+            job.thread = threading.Thread(target=self.run, args=(job, throttle), daemon=True,
+                                          name=f"archiver-{job.job_id[:8]}")
+            job.thread.start()
+        else:
+            self.run(job, throttle)
+
+    # ------------------------------------------------------------------
+    # Chunk loop
+    # ------------------------------------------------------------------
+
+    def _prepare(self, cursor, job: ArchiveJob) -> None:
+        cursor.execute("""
+            SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.STATISTICS
+            WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND INDEX_NAME = 'PRIMARY'
+            ORDER BY SEQ_IN_INDEX
+        """, (job.database, job.table))
+        job.pk_columns = [row[0] for row in cursor.fetchall()]
+        if not job.pk_columns:
+            raise ValueError(f"{job.database}.{job.table} has no primary key, it can't be archived in chunks")
+
+        if len(job.pk_columns) == 1:
+            pk = quote(job.pk_columns[0])
+            cursor.execute(f"SELECT MIN({pk}), MAX({pk}) FROM {quote(job.database)}.{quote(job.table)}")
+            low, high = cursor.fetchone()
+            if isinstance(low, (int, float)) and isinstance(high, (int, float)):
+                job.pk_range = (float(low), float(high))
+
+        try:
+            plan = self.explainer.explain(
+                f"SELECT * FROM {quote(job.database)}.{quote(job.table)} "
+                f"WHERE {quote(job.date_column)} < '{job.cutoff}'",
+                job.database
+            )
+            job.rows_estimate = job.rows_copied + int(plan[0].get("rows") or 0) if plan else None
+        except Exception:
+            job.rows_estimate = None  # progress then comes from the PK position only
+
+    @staticmethod
+    def _chunk_where(job: ArchiveJob, upper: Optional[List[Any]]) -> Tuple[str, List[Any]]:
+        """Rows past the checkpoint, older than the cutoff, up to `upper` (inclusive)"""
+        where, params = [f"{quote(job.date_column)} < %s"], [job.cutoff]
+        if job.last_pk:
+            condition, values = keyset_condition(job.pk_columns, job.last_pk, ">", ">")
+            where.append(condition)
+            params.extend(values)
+        if upper:
+            condition, values = keyset_condition(job.pk_columns, upper, "<", "<=")
+            where.append(condition)
+            params.extend(values)
+        return " AND ".join(where), params
+
+    def _next_upper_bound(self, cursor, job: ArchiveJob) -> Optional[List[Any]]:
+        """PK of the last row of the next chunk, None when nothing is left"""
+        if job.checksums:
+            # Exported chunks are deleted one by one, the checkpoint counts them
+            chunks = job.checksums["chunks"]
+            return chunks[job.chunks]["last_pk"] if job.chunks < len(chunks) else None
+        pk_list = ", ".join(quote(c) for c in job.pk_columns)
+        where, params = self._chunk_where(job, job.pk_limit)
+        cursor.execute(f"""
+            SELECT {pk_list} FROM {quote(job.database)}.{quote(job.table)}
+            WHERE {where}
+            ORDER BY {pk_list}
+            LIMIT {int(job.batch_size)}
+        """, params)
+        rows = cursor.fetchall()
+        return list(rows[-1]) if rows else None
+
+    def _archive_chunk(self, conn, cursor, job: ArchiveJob, upper: List[Any]) -> int:
+        db, table = quote(job.database), quote(job.table)
+        chunk_where, params = self._chunk_where(job, upper)
+        pk_list = ", ".join(quote(c) for c in job.pk_columns)
+
+        try:
+            # Lock the chunk first so copy and delete see the same rows
+            if job.checksums:
+                expected = job.checksums["chunks"][job.chunks]
+                row_hash = row_hash_sql(job.checksums["columns"])
+                cursor.execute(f"SELECT COUNT(*), COALESCE(BIT_XOR({row_hash}), 0) FROM {db}.{table} "
+                               f"WHERE {chunk_where} FOR UPDATE", params)
+                copied, crc = cursor.fetchone()
+                if copied != expected["rows"] or int(crc) != expected["crc"]:
+                    raise RuntimeError(
+                        f"Chunk ending at {upper}: {copied} rows with checksum {int(crc)}, exported "
+                        f"{expected['rows']} rows with checksum {expected['crc']}; rows changed since the export, rolled back"
+                    )
+            else:
+                cursor.execute(f"SELECT {pk_list} FROM {db}.{table} WHERE {chunk_where} FOR UPDATE", params)
+                copied = len(cursor.fetchall())
+            if job.archive_table:
+                cursor.execute(f"INSERT INTO {db}.{quote(job.archive_table)} SELECT * FROM {db}.{table} WHERE {chunk_where}", params)
+                copied = cursor.rowcount
+            cursor.execute(f"DELETE FROM {db}.{table} WHERE {chunk_where}", params)
+            deleted = cursor.rowcount
+            if copied != deleted:
+                raise RuntimeError(f"Chunk ending at {upper}: copied {copied} rows but deleted {deleted}, rolled back")
+            cursor.execute(f"""
+                UPDATE {db}.{JOBS_TABLE}
+                SET last_pk = %s, rows_copied = rows_copied + %s, rows_deleted = rows_deleted + %s,
+                    chunks = chunks + 1, status = %s
+                WHERE job_id = %s
+            """, (json.dumps(upper, default=str), copied, deleted, RUNNING, job.job_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        job.last_pk = upper
+        job.rows_copied += copied
+        job.rows_deleted += deleted
+        job.chunks += 1
+        return copied
+
+    def _save_status(self, job: ArchiveJob) -> None:
+        try:
+            conn = self.connection_factory()
+            try:
+                cursor = conn.cursor()
+                cursor.execute(f"UPDATE {quote(job.database)}.{JOBS_TABLE} SET status = %s, error = %s WHERE job_id = %s",
+                               (job.status, job.error, job.job_id))
+                conn.commit()
+                cursor.close()
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.warning(f"[ChunkedArchiver] Could not save status of job {job.job_id}: {e}")
+
+    def run(self, job: ArchiveJob, throttle: ArchiveThrottle) -> ArchiveJob:
+        job.started_at = time.time()
+        job.finished_at = None
+        job.run_rows = 0
+        conn = None
+        try:
+            conn = self.connection_factory()
+            cursor = conn.cursor()
+            # Each chunk is its own transaction; keep lock waits short
+            cursor.execute("SET SESSION innodb_lock_wait_timeout = 10")
+            self._prepare(cursor, job)
+
+            while not job.stop_requested.is_set():
+                job.throttled_seconds += throttle.wait(cursor, job)
+                if job.stop_requested.is_set():
+                    break
+                upper = self._next_upper_bound(cursor, job)
+                if upper is None:
+                    job.status = COMPLETED
+                    break
+                job.run_rows += self._archive_chunk(conn, cursor, job, upper)
+                if self.chunk_pause_s:
+                    time.sleep(self.chunk_pause_s)
+
+            if job.status != COMPLETED:
+                job.status = CANCELLED
+            cursor.close()
+        except Exception as e:
+            db_error = ErrorFactory.database_error(
+                f"Chunked archiving of {job.database}.{job.table} stopped",
+                original_error=e,
+                job_id=job.job_id,
+                checkpoint=json.dumps(job.last_pk, default=str)
+            )
+            logger.error(f"[ChunkedArchiver] {db_error}")
+            job.status = FAILED
+            job.error = str(db_error)
+        finally:
+            job.finished_at = time.time()
+            throttle.close()
+            if conn:
+                conn.close()
+            self._save_status(job)
+        logger.info(f"[ChunkedArchiver] Job {job.job_id} {job.status}: {job.rows_copied} rows in {job.chunks} chunks")
+        return job
+
+
+# Global instance
+chunked_archiver = ChunkedArchiver()
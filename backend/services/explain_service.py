@@ -0,0 +1,302 @@
+"""
+Shared EXPLAIN service
+
+Every EXPLAIN issued by the backend (index simulation, plan baselines, the
+plan-regression watcher, the rewrite pipeline, MCP analyze_query) goes
+through ExplainService so repeated statements are planned once.
+
+Cached plans are keyed by (database, format, statement fingerprint, schema
+version). The schema version is a hash of CREATE_TIME / UPDATE_TIME from
+information_schema.TABLES and the ANALYZE timestamp from
+mysql.innodb_table_stats for every table the statement references, so DDL
+or fresh statistics produce a new key instead of a stale plan. Table
+versions are read with one query per schema and reused for
+`schema_check_interval` seconds; schema-drift detection and other DDL-aware
+callers can call invalidate() to drop them immediately.
+
+Concurrent identical EXPLAINs are collapsed: the first caller runs the
+statement, the others wait for its result.
+"""
+
+import copy
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from database import get_db_connection
+from error_factory import ErrorFactory
+from services.anti_patterns import get_features, STATEMENT_KEYWORDS
+from services.cache import explain_cache, SimpleCache
+
+logger = logging.getLogger("uvicorn")
+
+FORMATS = ("traditional", "json")
+
+SYSTEM_SCHEMAS = ("mysql", "information_schema", "performance_schema", "sys")
+
+# Scope key for statements whose tables are not qualified and no database is given
+ANY_SCHEMA = "*"
+
+TABLE_VERSIONS_QUERY = """
+    SELECT t.TABLE_SCHEMA AS table_schema, t.TABLE_NAME AS table_name,
+           t.CREATE_TIME AS create_time, t.UPDATE_TIME AS update_time,
+           s.last_update AS analyzed_at
+    FROM information_schema.TABLES t
+    LEFT JOIN mysql.innodb_table_stats s
+           ON s.database_name = t.TABLE_SCHEMA AND s.table_name = t.TABLE_NAME
+    WHERE {where}
+"""
+
+# Fallback when the account cannot read mysql.innodb_table_stats
+TABLE_VERSIONS_QUERY_NO_STATS = """
+    SELECT TABLE_SCHEMA AS table_schema, TABLE_NAME AS table_name,
+           CREATE_TIME AS create_time, UPDATE_TIME AS update_time,
+           NULL AS analyzed_at
+    FROM information_schema.TABLES
+    WHERE {where}
+"""
+
+
+def statement_fingerprint(sql: str) -> str:
+    """Whitespace-insensitive statement hash (literals are kept, they drive row estimates)"""
+    normalized = ' '.join(sql.strip().rstrip(';').split())
+    return hashlib.sha256(normalized.encode()).hexdigest()[:16]
+
+
+class ExplainService:
+    def __init__(self, connection_factory: Callable = get_db_connection,
+                 cache: SimpleCache = explain_cache,
+                 schema_check_interval: float = 30.0):
+        self.connection_factory = connection_factory
+        self.cache = cache
+        self.schema_check_interval = schema_check_interval
+
+        # schema -> (loaded_at, {table: version tuple})
+        self._versions: Dict[str, Tuple[float, Dict[str, tuple]]] = {}
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._stats_without_analyze = False
+
+        self.hits = 0
+        self.misses = 0
+        self.deduplicated = 0
+        self.uncached = 0
+        self.invalidations = 0
+        self.version_loads = 0
+
+    # ------------------------------------------------------------------
+    # Schema / statistics versions
+    # ------------------------------------------------------------------
+
+    def _load_versions(self, schema: str) -> Dict[str, tuple]:
+        if schema == ANY_SCHEMA:
+            where = "t.TABLE_SCHEMA NOT IN ({})".format(", ".join(["%s"] * len(SYSTEM_SCHEMAS)))
+            params = SYSTEM_SCHEMAS
+        else:
+            where, params = "t.TABLE_SCHEMA = %s", (schema,)
+
+        conn = self.connection_factory()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            rows = None
+            if not self._stats_without_analyze:
+                try:
+                    cursor.execute(TABLE_VERSIONS_QUERY.format(where=where), params)
+                    rows = cursor.fetchall()
+                except Exception:
+                    # No access to mysql.innodb_table_stats, DDL is still tracked
+                    self._stats_without_analyze = True
+            if rows is None:
+                cursor.execute(TABLE_VERSIONS_QUERY_NO_STATS.format(where=where.replace("t.", "")), params)
+                rows = cursor.fetchall()
+            cursor.close()
+        finally:
+            conn.close()
+
+        versions: Dict[str, tuple] = {}
+        for row in rows:
+            version = (str(row.get("create_time")), str(row.get("update_time")), str(row.get("analyzed_at")))
+            name = str(row["table_name"]).lower()
+            key = name if schema != ANY_SCHEMA else f"{str(row['table_schema']).lower()}.{name}"
+            versions[key] = version
+        with self._lock:
+            self.version_loads += 1
+        return versions
+
+    def _schema_versions(self, schema: str) -> Dict[str, tuple]:
+        with self._lock:
+            snapshot = self._versions.get(schema)
+        if snapshot and time.time() - snapshot[0] < self.schema_check_interval:
+            return snapshot[1]
+
+        versions = self._load_versions(schema)
+        if snapshot and snapshot[1] != versions:
+            # DDL / ANALYZE since the last snapshot: drop plans for this schema now
+            # rather than waiting for their TTL (their keys can't be hit anymore anyway)
+            self._drop_entries(schema)
+        with self._lock:
+            self._versions[schema] = (time.time(), versions)
+        return versions
+
+    def schema_hash(self, sql: str, database: Optional[str]) -> str:
+        """Hash of the versions of every table referenced by `sql`"""
+        parts = []
+        for table in sorted(set(get_features(sql).tables)):
+            schema, _, name = table.rpartition(".")
+            schema = schema or (database.lower() if database else ANY_SCHEMA)
+            versions = self._schema_versions(schema)
+            if schema == ANY_SCHEMA:
+                matches = sorted(v for k, v in versions.items() if k.rpartition(".")[2] == name)
+                parts.append(f"{table}={matches}")
+            else:
+                parts.append(f"{schema}.{name}={versions.get(name)}")
+        return hashlib.sha256("|".join(parts).encode()).hexdigest()[:16]
+
+    # ------------------------------------------------------------------
+    # EXPLAIN
+    # ------------------------------------------------------------------
+
+    def _run_explain(self, sql: str, database: Optional[str], fmt: str, cursor=None):
+        statement = f"EXPLAIN FORMAT=JSON {sql}" if fmt == "json" else f"EXPLAIN {sql}"
+        if cursor is not None:
+            cursor.execute(statement)
+            rows = cursor.fetchall()
+        else:
+            conn = self.connection_factory(database=database) if database else self.connection_factory()
+            try:
+                cur = conn.cursor(dictionary=True)
+                cur.execute(statement)
+                rows = cur.fetchall()
+                cur.close()
+            finally:
+                conn.close()
+
+        if fmt != "json":
+            return [dict(row) for row in rows]
+        if not rows or not rows[0]:
+            return {}
+        plan = rows[0].get("EXPLAIN", "{}")
+        return json.loads(plan) if isinstance(plan, (str, bytes)) else plan
+
+    def explain(self, sql: str, database: Optional[str] = None, fmt: str = "traditional",
+                cursor=None, use_cache: bool = True):
+        """
+        EXPLAIN `sql`. Returns the list of plan rows for fmt="traditional" and
+        the parsed plan document for fmt="json". An open `cursor`
+        (dictionary=True, already on `database`) can be passed to reuse the
+        caller's connection. Errors from the server are raised to the caller.
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported EXPLAIN format: {fmt}")
+        # Only plain DML: "EXPLAIN ANALYZE ..." would execute the statement
+        if get_features(sql).statement_type not in STATEMENT_KEYWORDS:
+            raise ValueError("Only SELECT, INSERT, UPDATE, DELETE and REPLACE statements can be explained")
+
+        if not use_cache:
+            with self._lock:
+                self.uncached += 1
+            return self._run_explain(sql, database, fmt, cursor)
+
+        try:
+            version = self.schema_hash(sql, database)
+        except Exception as e:
+            db_error = ErrorFactory.database_error(
+                "Failed to read table versions, EXPLAIN result will not be cached",
+                original_error=e,
+                database=database
+            )
+            logger.warning(f"[ExplainService] {db_error}")
+            with self._lock:
+                self.uncached += 1
+            return self._run_explain(sql, database, fmt, cursor)
+
+        key = f"{(database or ANY_SCHEMA).lower()}|{fmt}|{statement_fingerprint(sql)}|{version}"
+        cached = self.cache.get(key)
+        if cached is not None:
+            with self._lock:
+                self.hits += 1
+            return copy.deepcopy(cached)
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+                self.misses += 1
+            else:
+                self.deduplicated += 1
+
+        if not leader:
+            return copy.deepcopy(future.result())
+
+        try:
+            plan = self._run_explain(sql, database, fmt, cursor)
+            self.cache.set(key, plan)
+            future.set_result(plan)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+        return copy.deepcopy(plan)
+
+    async def aexplain(self, sql: str, database: Optional[str] = None, fmt: str = "traditional",
+                       use_cache: bool = True):
+        """explain() on a worker thread, for async endpoints"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: self.explain(sql, database, fmt, use_cache=use_cache))
+
+    # ------------------------------------------------------------------
+    # Invalidation / stats
+    # ------------------------------------------------------------------
+
+    def _drop_entries(self, schema: Optional[str]) -> int:
+        if schema is None:
+            dropped = len(self.cache.cache)
+            self.cache.clear()
+            return dropped
+        prefix = f"{schema.lower()}|"
+        keys = [k for k in list(self.cache.cache) if k.startswith(prefix) or k.startswith(f"{ANY_SCHEMA}|")]
+        for key in keys:
+            self.cache.remove(key)
+        return len(keys)
+
+    def invalidate(self, database: Optional[str] = None) -> int:
+        """
+        Forget table versions and cached plans for `database` (all databases
+        when None). Call after DDL or when schema drift is detected.
+        """
+        with self._lock:
+            if database is None:
+                self._versions.clear()
+            else:
+                self._versions.pop(database.lower(), None)
+                self._versions.pop(ANY_SCHEMA, None)
+            self.invalidations += 1
+        return self._drop_entries(database)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.deduplicated
+        return {
+            "cached_plans": len(self.cache.cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "deduplicated": self.deduplicated,
+            "uncached": self.uncached,
+            "hit_rate": round((self.hits + self.deduplicated) / lookups, 3) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "version_loads": self.version_loads,
+            "tracked_schemas": sorted(self._versions),
+            "analyze_timestamps": not self._stats_without_analyze,
+        }
+
+
+# Global instance
+explain_service = ExplainService()
@@ -0,0 +1,256 @@
+"""
+Git-side schema loader for drift detection
+
+Loads the schema checked into a repository (a directory of .sql files or a
+single dump) into the TableDef model used for production snapshots:
+
+- every file is parsed by parser/ddl_parser.py; the result is cached
+  under the file's git blob hash (same value as `git hash-object`), in
+  memory and, when SCHEMA_PARSE_CACHE_DIR is set, on disk, so repeated
+  CI runs only re-parse files that changed,
+- cache misses are parsed on a process pool, shared by all requests and
+  created on first use, once there are enough of them to pay for it
+  (smaller loads are parsed in-process); workers also compute the table
+  fingerprints, so the diff against production is a comparison of hashes,
+- operations are applied in path order (CREATE TABLE, CREATE INDEX,
+  CREATE TABLE ... LIKE, DROP TABLE), so numbered migration files work
+  as well as one file per table.
+
+Schema paths are confined to GIT_SCHEMA_ROOT (the repository checkout
+by default): paths are resolved against it, symlinks included, and
+anything outside is rejected.
+"""
+
+import os
+import time
+import pickle
+import hashlib
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+
+from parser.ddl_parser import parse_ddl, CREATE, CREATE_LIKE, ADD_INDEX, DROP
+from services.cache import ddl_parse_cache, SimpleCache
+from services.schema_snapshot import TableDef
+
+logger = logging.getLogger("uvicorn")
+
+SCHEMA_EXTENSIONS = (".sql", ".ddl")
+# Bumped when the parser output changes, so old disk cache entries are ignored
+PARSER_VERSION = 1
+# Checkout this backend runs from
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def blob_hash(data: bytes) -> str:
+    """Git object id of a file's content"""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def parse_schema_file(data: bytes) -> Tuple[List[Tuple[Any, ...]], int]:
+    """Worker entry point: parse one file and precompute table fingerprints"""
+    operations, skipped = parse_ddl(data.decode("utf-8", errors="replace"))
+    for operation in operations:
+        if operation[0] == CREATE:
+            operation[1].fingerprint
+    return operations, skipped
+
+
+def copy_table(table: TableDef, name: Optional[str] = None) -> TableDef:
+    copy = TableDef(name or table.name, table.engine, table.charset)
+    copy.columns = dict(table.columns)
+    copy.indexes = dict(table.indexes)
+    copy.foreign_keys = dict(table.foreign_keys)
+    copy.checks = dict(table.checks)
+    if name is None or name == table.name:
+        copy._fingerprint = table._fingerprint
+    return copy
+
+
+class GitSchema:
+    __slots__ = ("path", "tables", "files", "parsed", "cache_hits", "skipped_statements", "load_time_ms")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tables: Dict[str, TableDef] = {}
+        self.files = 0
+        self.parsed = 0
+        self.cache_hits = 0
+        self.skipped_statements = 0
+        self.load_time_ms = 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "tables": len(self.tables),
+            "files": self.files,
+            "parsed": self.parsed,
+            "cache_hits": self.cache_hits,
+            "skipped_statements": self.skipped_statements,
+            "load_time_ms": self.load_time_ms,
+        }
+
+
+class GitSchemaLoader:
+    def __init__(self, cache: SimpleCache = ddl_parse_cache, cache_dir: Optional[str] = None,
+                 root: Optional[str] = None, max_workers: Optional[int] = None,
+                 parallel_threshold: int = 64):
+        self.cache = cache
+        self.cache_dir = cache_dir
+        self.root = os.path.realpath(root or REPOSITORY_ROOT)
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+        self.parallel_threshold = parallel_threshold
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def resolve(self, path: str) -> str:
+        """Path relative to the root (or absolute inside it), after resolving symlinks"""
+        resolved = os.path.realpath(os.path.join(self.root, path))
+        if os.path.commonpath([resolved, self.root]) != self.root:
+            raise ValueError(f"Schema path {path!r} is outside GIT_SCHEMA_ROOT")
+        if not os.path.exists(resolved):
+            raise ValueError(f"Schema path {path!r} does not exist")
+        return resolved
+
+    @staticmethod
+    def discover(path: str) -> List[str]:
+        if os.path.isfile(path):
+            return [path]
+        files = []
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+            files.extend(os.path.join(dirpath, f) for f in filenames if f.lower().endswith(SCHEMA_EXTENSIONS))
+        return sorted(files)
+
+    # ------------------------------------------------------------------
+    # Parse cache
+    # ------------------------------------------------------------------
+
+    def _disk_path(self, key: str) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        return os.path.join(self.cache_dir, key[:2], f"{key}.v{PARSER_VERSION}.pickle")
+
+    def _cached(self, key: str):
+        result = self.cache.get(f"ddl:{key}")
+        if result is not None:
+            return result
+        path = self._disk_path(key)
+        if path and os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    result = pickle.load(f)
+                self.cache.set(f"ddl:{key}", result)
+                return result
+            except Exception as e:
+                logger.debug(f"Ignoring unreadable schema parse cache entry {path}: {e}")
+        return None
+
+    def _store(self, key: str, result) -> None:
+        self.cache.set(f"ddl:{key}", result)
+        path = self._disk_path(key)
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = f"{path}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as f:
+                    pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, path)
+            except OSError as e:
+                logger.debug(f"Could not write schema parse cache entry {path}: {e}")
+
+    def _parse_all(self, blobs: Dict[str, bytes]) -> Dict[str, Any]:
+        """Parse cache misses, on a process pool when there are enough of them"""
+        if len(blobs) >= self.parallel_threshold and self.max_workers > 1:
+            keys = list(blobs)
+            chunksize = max(1, len(keys) // (self.max_workers * 4))
+            try:
+                results = self._get_pool().map(parse_schema_file, [blobs[k] for k in keys], chunksize=chunksize)
+                return dict(zip(keys, results))
+            except BrokenProcessPool as e:
+                # A worker died: start a new pool next time, parse this load in-process
+                logger.warning(f"Schema parser pool failed, parsing in-process: {e}")
+                self.shutdown()
+        return {key: parse_schema_file(data) for key, data in blobs.items()}
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._pool
+
+    def shutdown(self) -> None:
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    # ------------------------------------------------------------------
+    # Load
+    # ------------------------------------------------------------------
+
+    def load(self, path: str) -> GitSchema:
+        started = time.perf_counter()
+        resolved = self.resolve(path)
+        schema = GitSchema(path)
+
+        file_keys: List[str] = []
+        results: Dict[str, Any] = {}
+        misses: Dict[str, bytes] = {}
+        for file_path in self.discover(resolved):
+            with open(file_path, "rb") as f:
+                data = f.read()
+            key = blob_hash(data)
+            file_keys.append(key)
+            if key in results or key in misses:
+                continue
+            cached = self._cached(key)
+            if cached is not None:
+                results[key] = cached
+                schema.cache_hits += 1
+            else:
+                misses[key] = data
+
+        for key, result in self._parse_all(misses).items():
+            self._store(key, result)
+            results[key] = result
+        schema.files = len(file_keys)
+        schema.parsed = len(misses)
+
+        tables = schema.tables
+        for key in file_keys:
+            operations, skipped = results[key]
+            schema.skipped_statements += skipped
+            for operation in operations:
+                kind = operation[0]
+                if kind == CREATE:
+                    # Cached objects are shared: later CREATE INDEX works on a copy
+                    tables[operation[1].name] = operation[1]
+                elif kind == ADD_INDEX:
+                    table = tables.get(operation[1])
+                    if table is not None:
+                        table = copy_table(table)
+                        table._fingerprint = None
+                        table.indexes[operation[2].name] = operation[2]
+                        tables[table.name] = table
+                elif kind == CREATE_LIKE:
+                    source = tables.get(operation[2])
+                    if source is not None:
+                        tables[operation[1]] = copy_table(source, operation[1])
+                elif kind == DROP:
+                    for name in operation[1]:
+                        tables.pop(name, None)
+
+        schema.load_time_ms = round((time.perf_counter() - started) * 1000, 2)
+        logger.info(f"Git schema {path}: {len(tables)} tables from {schema.files} files "
+                    f"({schema.parsed} parsed, {schema.cache_hits} cached) in {schema.load_time_ms}ms")
+        return schema
+
+
+# Global instance
+git_schema_loader = GitSchemaLoader(
+    cache_dir=os.getenv("SCHEMA_PARSE_CACHE_DIR") or None,
+    root=os.getenv("GIT_SCHEMA_ROOT") or None
+)
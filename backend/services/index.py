@@ -1,17 +1,166 @@
-from typing import Optional
+from typing import Any, Dict, List, Optional
+import os
 import re
+import asyncio
+import logging
+import threading
 from models import IndexSimulationResponse, ExplainPlan
-from database import get_db_connection
 from error_factory import ErrorFactory, DatabaseError
+from services.explain_service import explain_service
+from services.index_whatif import IndexWhatIfEngine
+from services.plan_model import plan_tables
+
+logger = logging.getLogger("uvicorn")
+
+DEFAULT_DATABASE = "shop_demo"
+
+TIME_MULTIPLIERS = {
+    'ALL': 1.0, 'index': 0.8, 'range': 0.3, 'ref': 0.1, 'eq_ref': 0.05, 'const': 0.01, 'system': 0.001
+}
+
 
 class IndexSimulationService:
+    def __init__(self, whatif_engine: Optional[IndexWhatIfEngine] = None, use_branch: Optional[bool] = None):
+        self.whatif = whatif_engine or IndexWhatIfEngine(
+            sample_rows=int(os.getenv("INDEX_WHATIF_SAMPLE_ROWS", "20000"))
+        )
+        if use_branch is None:
+            # On by default; INDEX_WHATIF_ENABLED=false keeps only the heuristic estimate
+            use_branch = os.getenv("INDEX_WHATIF_ENABLED", "true").lower() == "true"
+        self.use_branch = use_branch
+
     async def perform_index_simulation(
         self,
         sql: str,
         proposed_index: str,
         database: Optional[str] = "shop_demo"
     ) -> IndexSimulationResponse:
-        """Helper function to perform index simulation logic"""
+        """Simulate one proposed index (what-if on a branch, heuristic fallback)"""
+        results = await self.simulate_candidates(sql, [proposed_index], database)
+        return results[0]
+
+    async def simulate_candidates(
+        self,
+        sql: str,
+        proposed_indexes: List[str],
+        database: Optional[str] = "shop_demo"
+    ) -> List[IndexSimulationResponse]:
+        """
+        Evaluate several candidate indexes for the same statement on a single
+        what-if branch where they are all built once; any candidate the
+        branch simulation could not evaluate falls back to the heuristic
+        estimate.
+        When the caller stops waiting (stage timeout), the remaining
+        candidates are skipped and the branch is dropped.
+        """
+        database = database or DEFAULT_DATABASE
+        whatif_results: List[Optional[Dict[str, Any]]] = [None] * len(proposed_indexes)
+        if self.use_branch:
+            stop = threading.Event()
+            try:
+                loop = asyncio.get_running_loop()
+                whatif_results = await loop.run_in_executor(
+                    None, self.whatif.simulate, sql, proposed_indexes, database, stop
+                )
+            except asyncio.CancelledError:
+                stop.set()
+                raise
+            except Exception as e:
+                db_error = ErrorFactory.database_error(
+                    "What-if branch simulation unavailable, using heuristic estimate",
+                    original_error=e,
+                    database=database,
+                    sql=sql[:100]
+                )
+                logger.warning(f"[/simulate] {db_error}")
+
+        responses = []
+        for proposed_index, result in zip(proposed_indexes, whatif_results):
+            if result and not result.get("error"):
+                responses.append(self._whatif_response(proposed_index, result))
+            else:
+                responses.append(await self._heuristic_simulation(sql, proposed_index, database))
+        return responses
+
+    @staticmethod
+    def _explain_plan(node, scale: Dict[str, float], default_scale: float) -> ExplainPlan:
+        """ExplainPlan for one table access, rows projected from the sample to the source table"""
+        if node is None:
+            return ExplainPlan(access_type="ALL", rows_examined=0, key=None, extra=None, estimated_time_ms=0.0)
+        access_type = node.access_type or "ALL"
+        access_type = access_type if access_type == "ALL" else access_type.lower()
+        rows = int(round(node.rows * scale.get((node.table or "").lower(), default_scale)))
+        return ExplainPlan(
+            access_type=access_type,
+            rows_examined=rows,
+            key=node.key,
+            key_len=None,
+            extra=", ".join(node.flags) or None,
+            estimated_time_ms=round(rows * 0.05 * TIME_MULTIPLIERS.get(access_type, 1.0), 2)
+        )
+
+    def _whatif_response(self, proposed_index: str, result: Dict[str, Any]) -> IndexSimulationResponse:
+        candidate = result["index"]
+        before_tables = plan_tables(result["before_tree"])
+        after_tables = plan_tables(result["after_tree"])
+
+        # The access the candidate is meant for: the table using the index after,
+        # otherwise the most expensive table access
+        target = next((n for n in after_tables if n.key and candidate.name.lower() in n.key.lower().split(",")), None)
+        if target is None and after_tables:
+            target = max(after_tables, key=lambda n: n.cost)
+        label = target.table if target else None
+        before = next((n for n in before_tables if n.table == label), None)
+        if before is None and before_tables:
+            before = max(before_tables, key=lambda n: n.cost)
+
+        scale = result["scale"]
+        default_scale = max(scale.values()) if scale else 1.0
+        cost_before, cost_after = result["cost_before"], result["cost_after"]
+        improvement = (cost_before - cost_after) / cost_before * 100 if cost_before > 0 else 0.0
+        improvement = max(0.0, improvement)
+
+        if not result["index_used"]:
+            recommendation = "NOT RECOMMENDED"
+        elif improvement >= 50:
+            recommendation = "HIGHLY RECOMMENDED"
+        elif improvement >= 20:
+            recommendation = "RECOMMENDED"
+        else:
+            recommendation = "MARGINAL"
+
+        current_plan = self._explain_plan(before, scale, default_scale)
+        with_index_plan = self._explain_plan(target, scale, default_scale)
+        if result["index_used"]:
+            ai_analysis = (
+                f"Optimizer picks {candidate.name} on a sampled branch: '{current_plan.access_type}' -> "
+                f"'{with_index_plan.access_type}', plan cost {round(cost_before, 2)} -> {round(cost_after, 2)} "
+                f"({round(improvement, 1)}% lower)."
+            )
+        else:
+            ai_analysis = f"Optimizer ignores {candidate.name} on a sampled branch; the plan is unchanged."
+
+        return IndexSimulationResponse(
+            current_plan=current_plan,
+            with_index_plan=with_index_plan,
+            improvement_percent=round(improvement, 1),
+            recommendation=recommendation,
+            create_index_sql=proposed_index,
+            ai_analysis=ai_analysis,
+            mode="whatif",
+            cost_before=round(cost_before, 2),
+            cost_after=round(cost_after, 2),
+            index_used=result["index_used"],
+            plan_diff=result["plan_diff"]
+        )
+
+    async def _heuristic_simulation(
+        self,
+        sql: str,
+        proposed_index: str,
+        database: Optional[str] = "shop_demo"
+    ) -> IndexSimulationResponse:
+        """Heuristic estimate from the current EXPLAIN (no branch available)"""
         
         # Parse the index definition to extract table and columns
         index_match = re.search(
@@ -33,24 +182,15 @@ class IndexSimulationService:
         # Step 1: Get current EXPLAIN plan
         current_plan = None
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor(dictionary=True)
-            
-            if database:
-                cursor.execute(f"USE {database}")
-            
-            cursor.execute(f"EXPLAIN {sql}")
-            explain_result = cursor.fetchone()
-            conn.close()
+            # Shared, cached EXPLAIN (keyed by schema/statistics version)
+            plan_rows = await explain_service.aexplain(sql, database)
+            explain_result = plan_rows[0] if plan_rows else None
             
             if explain_result:
                 rows = explain_result.get('rows', 1000)
                 access_type = explain_result.get('type', 'ALL')
                 
-                time_multipliers = {
-                    'ALL': 1.0, 'index': 0.8, 'range': 0.3, 'ref': 0.1, 'eq_ref': 0.05, 'const': 0.01, 'system': 0.001
-                }
-                multiplier = time_multipliers.get(access_type, 1.0)
+                multiplier = TIME_MULTIPLIERS.get(access_type, 1.0)
                 estimated_time = (rows * 0.05 * multiplier)
                 
                 current_plan = ExplainPlan(
@@ -118,5 +258,6 @@ class IndexSimulationService:
             improvement_percent=round(improvement, 1),
             recommendation=recommendation,
             create_index_sql=proposed_index,
-            ai_analysis=ai_analysis
+            ai_analysis=ai_analysis,
+            mode="heuristic"
         )
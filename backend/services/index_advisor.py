@@ -0,0 +1,597 @@
+"""
+Workload-driven index advisor
+
+Works on the aggregated slow-log workload instead of one query at a time:
+
+1. Statements are grouped by fingerprint and weighted by their total
+   execution time (frequency x cost).
+2. Each fingerprint is parsed once (parser.query_shape) and turned into
+   table access patterns: equality / IN / range predicate columns, join
+   lookup columns and ORDER BY / GROUP BY columns per table. Identical
+   patterns coming from different fingerprints are merged.
+3. Candidate indexes (single and composite, equality columns first, then
+   one range or the sort columns) are generated per pattern and scored
+   against every pattern of the same table with a selectivity model,
+   relative to what the existing indexes already provide.
+4. A set is chosen greedily (lazy greedy on savings per unit of write
+   overhead) or with a 0/1 knapsack, under a write-overhead budget
+   expressed as a share of the workload time. Write overhead per index is
+   derived from the time spent in INSERT/UPDATE/DELETE on the table.
+
+The top recommendations can be validated with IndexSimulationService
+(what-if EXPLAIN on a branch) for their heaviest query.
+"""
+
+import re
+import math
+import time
+import heapq
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from database import get_db_connection
+from error_factory import ErrorFactory
+from parser.query_parser import SlowQueryParser
+from parser.query_shape import parse_query, EQ, IN, RANGE, JOIN
+
+logger = logging.getLogger("uvicorn")
+
+EQ_SELECTIVITY = 0.05     # col = const, when no index cardinality is known
+IN_SELECTIVITY = 0.15     # col IN (...)
+IN_LIST_SIZE = 5          # values assumed in an IN list when cardinality is known
+RANGE_SELECTIVITY = 0.3   # <, >, BETWEEN, LIKE 'prefix%'
+SORT_SHARE = 0.3          # share of a table access spent sorting when no index provides the order
+MAX_BENEFIT = 0.95        # an index never removes the whole cost of an access
+MIN_TABLE_ROWS = 1000     # smaller tables are scanned cheaply, not worth an index
+WRITE_FACTOR = 0.1        # extra write time per secondary index, share of the table's write time
+WRITE_WIDTH_FACTOR = 0.25 # ... plus this much per additional column
+KNAPSACK_ITEMS = 500
+KNAPSACK_BUCKETS = 1000
+
+WRITE_STATEMENTS = {"INSERT", "UPDATE", "DELETE", "REPLACE"}
+
+# Approximate key bytes per type, for the size estimate
+TYPE_WIDTHS = {
+    "tinyint": 1, "smallint": 2, "mediumint": 3, "int": 4, "integer": 4, "bigint": 8,
+    "float": 4, "double": 8, "decimal": 8, "date": 3, "datetime": 8, "timestamp": 4,
+    "time": 3, "year": 1, "bit": 1, "enum": 2, "set": 8, "uuid": 16,
+}
+UNINDEXABLE_TYPES = {"text", "tinytext", "mediumtext", "longtext", "blob", "tinyblob", "mediumblob",
+                     "longblob", "json", "geometry"}
+
+
+class WorkloadQuery:
+    __slots__ = ("fingerprint", "sql", "executions", "total_time", "database")
+
+    def __init__(self, fingerprint: str, sql: str, executions: int, total_time: float, database: Optional[str] = None):
+        self.fingerprint = fingerprint
+        self.sql = sql
+        self.executions = executions
+        self.total_time = total_time
+        self.database = database
+
+
+class TableInfo:
+    __slots__ = ("name", "rows", "columns", "indexes", "cardinality")
+
+    def __init__(self, name: str, rows: int):
+        self.name = name
+        self.rows = rows
+        self.columns: Dict[str, int] = {}              # lower name -> key width (0 = not indexable)
+        self.indexes: Dict[str, List[str]] = {}        # index name -> lower column names
+        self.cardinality: Dict[str, int] = {}          # leading index column -> cardinality
+
+
+class AccessPattern:
+    """How one table is accessed by one or more fingerprints"""
+    __slots__ = ("table", "eq", "ranges", "sort", "weight", "queries", "current")
+
+    def __init__(self, table: str, eq: Dict[str, str], ranges: Tuple[str, ...], sort: Tuple[str, ...]):
+        self.table = table
+        self.eq = eq              # column -> EQ / IN
+        self.ranges = ranges
+        self.sort = sort
+        self.weight = 0.0         # seconds of workload time spent in this access
+        self.queries: Dict[int, float] = {}
+        self.current = 0.0        # benefit already provided by existing indexes
+
+
+class Candidate:
+    __slots__ = ("table", "columns", "postings", "write_cost", "size_bytes")
+
+    def __init__(self, table: str, columns: Tuple[str, ...]):
+        self.table = table
+        self.columns = columns
+        self.postings: List[Tuple[int, float]] = []  # (pattern index, benefit fraction)
+        self.write_cost = 0.0
+        self.size_bytes = 0
+
+    def gain(self, patterns: List[AccessPattern], best: List[float]) -> float:
+        total = 0.0
+        for idx, benefit in self.postings:
+            if benefit > best[idx]:
+                total += patterns[idx].weight * (benefit - best[idx])
+        return total
+
+
+def index_name(table: str, columns: Tuple[str, ...]) -> str:
+    name = f"idx_{table}_{'_'.join(columns)}"
+    return re.sub(r'\W', '_', name)[:64]
+
+
+def shape_order(columns: Tuple[str, ...]) -> Tuple[int, Tuple[str, ...]]:
+    """
+    Deterministic candidate order: wider (composite / covering) shapes
+    first, then by column names. benefit() is capped at MAX_BENEFIT, so a
+    single column and its composite extension can tie; selection keeps the
+    first of equal candidates, which is then always the composite.
+    """
+    return -len(columns), columns
+
+
+class IndexAdvisor:
+    def __init__(self, connection_factory: Callable = get_db_connection, max_width: int = 3):
+        self.connection_factory = connection_factory
+        self.max_width = max_width
+        self.parser = SlowQueryParser()
+
+    # ------------------------------------------------------------------
+    # Inputs
+    # ------------------------------------------------------------------
+
+    def load_workload(self, database: Optional[str] = None, lookback_hours: int = 24,
+                      limit: int = 20000) -> List[WorkloadQuery]:
+        """Slow log statements aggregated by fingerprint (sample = heaviest statement text)"""
+        db_filter = "AND db = %s" if database else ""
+        params = (lookback_hours, database, limit) if database else (lookback_hours, limit)
+        conn = self.connection_factory()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"""
+                SELECT db, sql_text, COUNT(*) AS executions,
+                       SUM(TIME_TO_SEC(query_time)) AS total_time
+                FROM mysql.slow_log
+                WHERE start_time >= NOW() - INTERVAL %s HOUR {db_filter}
+                GROUP BY db, sql_text
+                ORDER BY total_time DESC
+                LIMIT %s
+            """, params)
+            rows = cursor.fetchall()
+            cursor.close()
+        finally:
+            conn.close()
+        return self.aggregate([
+            {"sql": row.get("sql_text"), "executions": row.get("executions"),
+             "total_time": row.get("total_time"), "database": row.get("db")}
+            for row in rows
+        ])
+
+    def aggregate(self, statements: List[Dict[str, Any]]) -> List[WorkloadQuery]:
+        """Group raw statements ({"sql", "executions", "total_time"}) by fingerprint"""
+        grouped: Dict[str, WorkloadQuery] = {}
+        heaviest: Dict[str, float] = {}
+        for row in statements:
+            sql = row.get("sql") or ""
+            if isinstance(sql, bytes):
+                sql = sql.decode("utf-8", errors="ignore")
+            if not sql.strip():
+                continue
+            executions = int(row.get("executions") or 1)
+            total_time = float(row.get("total_time") or 0.0)
+            fingerprint = self.parser.normalize_query(sql).lower()
+            query = grouped.get(fingerprint)
+            if query is None:
+                query = grouped[fingerprint] = WorkloadQuery(fingerprint, sql, 0, 0.0, row.get("database"))
+                heaviest[fingerprint] = -1.0
+            query.executions += executions
+            query.total_time += total_time
+            if total_time > heaviest[fingerprint]:
+                heaviest[fingerprint] = total_time
+                query.sql = sql
+        return sorted(grouped.values(), key=lambda q: q.total_time, reverse=True)
+
+    def load_schema(self, database: str) -> Dict[str, TableInfo]:
+        """Row counts, column widths and existing indexes in three set-based queries"""
+        conn = self.connection_factory()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT TABLE_NAME, TABLE_ROWS FROM information_schema.TABLES
+                WHERE TABLE_SCHEMA = %s AND TABLE_TYPE = 'BASE TABLE'
+            """, (database,))
+            tables = {row["TABLE_NAME"].lower(): TableInfo(row["TABLE_NAME"], int(row.get("TABLE_ROWS") or 0))
+                      for row in cursor.fetchall()}
+
+            cursor.execute("""
+                SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE, CHARACTER_MAXIMUM_LENGTH
+                FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = %s
+            """, (database,))
+            for row in cursor.fetchall():
+                table = tables.get(row["TABLE_NAME"].lower())
+                if table is not None:
+                    table.columns[row["COLUMN_NAME"].lower()] = self._key_width(
+                        (row.get("DATA_TYPE") or "").lower(), row.get("CHARACTER_MAXIMUM_LENGTH"))
+
+            cursor.execute("""
+                SELECT TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX, COLUMN_NAME, CARDINALITY
+                FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = %s
+                ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX
+            """, (database,))
+            for row in cursor.fetchall():
+                table = tables.get(row["TABLE_NAME"].lower())
+                if table is None:
+                    continue
+                column = row["COLUMN_NAME"].lower()
+                table.indexes.setdefault(row["INDEX_NAME"], []).append(column)
+                if int(row.get("SEQ_IN_INDEX") or 0) == 1 and row.get("CARDINALITY"):
+                    table.cardinality[column] = max(table.cardinality.get(column, 0), int(row["CARDINALITY"]))
+            cursor.close()
+        finally:
+            conn.close()
+        return tables
+
+    @staticmethod
+    def _key_width(data_type: str, max_length: Optional[int]) -> int:
+        if data_type in UNINDEXABLE_TYPES:
+            return 0
+        if data_type in TYPE_WIDTHS:
+            return TYPE_WIDTHS[data_type]
+        # (var)char / (var)binary: assume a typical value, not the declared maximum
+        return min(int(max_length or 32), 32) + 2
+
+    # ------------------------------------------------------------------
+    # Access patterns
+    # ------------------------------------------------------------------
+
+    def _extract_patterns(self, workload: List[WorkloadQuery], schema: Dict[str, TableInfo]):
+        """Returns (patterns, write time per table)"""
+        columns_of = {name: set(info.columns) for name, info in schema.items()}
+        patterns: Dict[tuple, AccessPattern] = {}
+        write_time: Dict[str, float] = defaultdict(float)
+
+        for query_idx, query in enumerate(workload):
+            try:
+                root = parse_query(query.sql)
+            except Exception:
+                continue  # unparsable statement, nothing to learn from it
+
+            if root.statement_type in WRITE_STATEMENTS and root.tables and root.tables[0].table:
+                target = root.tables[0].table.lower()
+                if target in schema:
+                    write_time[target] += query.total_time
+
+            accesses: List[Tuple[str, Dict[str, str], List[str], Tuple[str, ...]]] = []
+            for block in root.walk():
+                per_ref: Dict[int, Tuple[Dict[str, str], List[str]]] = {}
+                for pred in block.predicates:
+                    if pred.in_or:
+                        continue
+                    sides = [(pred.column, pred.other)]
+                    if pred.kind == JOIN:
+                        sides.append((pred.other, pred.column))
+                    for column, other in sides:
+                        ref = block.resolve(column, columns_of)
+                        if ref is None or not ref.table or ref.table.lower() not in schema:
+                            continue
+                        if pred.kind == JOIN and block.resolve(other, columns_of) is ref:
+                            continue  # same-table comparison, not a lookup
+                        eq, ranges = per_ref.setdefault(id(ref), ({}, []))
+                        name = column.name.lower()
+                        if pred.kind in (EQ, JOIN):
+                            eq[name] = EQ
+                        elif pred.kind == IN:
+                            eq.setdefault(name, IN)
+                        elif pred.kind == RANGE and name not in ranges:
+                            ranges.append(name)
+
+                # ORDER BY (or GROUP BY) served by an index only if it is on one table
+                sort_refs, sort_cols = set(), []
+                sort_items = [col for col, _ in block.order_by] or block.group_by
+                directions = {desc for _, desc in block.order_by}
+                for column in sort_items:
+                    ref = block.resolve(column, columns_of)
+                    sort_refs.add(id(ref) if ref is not None and ref.table else None)
+                    sort_cols.append(column.name.lower())
+                sort_ref = next(iter(sort_refs)) if len(sort_refs) == 1 and len(directions) <= 1 else None
+
+                for ref in block.tables:
+                    if not ref.table or ref.table.lower() not in schema:
+                        continue
+                    eq, ranges = per_ref.get(id(ref), ({}, []))
+                    sort = tuple(sort_cols) if sort_ref == id(ref) else ()
+                    accesses.append((ref.table.lower(), eq, ranges, sort))
+
+            if not accesses:
+                continue
+            total_rows = sum(max(schema[t].rows, 1) for t, _, _, _ in accesses)
+            for table, eq, ranges, sort in accesses:
+                info = schema[table]
+                if info.rows < MIN_TABLE_ROWS:
+                    continue
+                eq = {c: k for c, k in eq.items() if info.columns.get(c)}
+                ranges = tuple(c for c in ranges if info.columns.get(c) and c not in eq)
+                sort = sort if all(info.columns.get(c) for c in sort) else ()
+                if not eq and not ranges and not sort:
+                    continue
+                key = (table, tuple(sorted(eq.items())), ranges, sort)
+                pattern = patterns.get(key)
+                if pattern is None:
+                    pattern = patterns[key] = AccessPattern(table, eq, ranges, sort)
+                weight = query.total_time * max(info.rows, 1) / total_rows
+                pattern.weight += weight
+                pattern.queries[query_idx] = pattern.queries.get(query_idx, 0.0) + weight
+
+        return list(patterns.values()), write_time
+
+    # ------------------------------------------------------------------
+    # Benefit model
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _selectivity(info: TableInfo, column: str, kind: str) -> float:
+        cardinality = info.cardinality.get(column)
+        if cardinality:
+            per_value = 1.0 / cardinality
+            return min(1.0, per_value * IN_LIST_SIZE) if kind == IN else per_value
+        return IN_SELECTIVITY if kind == IN else EQ_SELECTIVITY
+
+    def benefit(self, pattern: AccessPattern, columns: Tuple[str, ...], info: TableInfo) -> float:
+        """Share of the access cost an index on `columns` removes (0 .. MAX_BENEFIT)"""
+        selectivity, i = 1.0, 0
+        while i < len(columns) and columns[i] in pattern.eq:
+            selectivity *= self._selectivity(info, columns[i], pattern.eq[columns[i]])
+            i += 1
+        eq_prefix = i
+        used_range = False
+        if i < len(columns) and columns[i] in pattern.ranges:
+            selectivity *= RANGE_SELECTIVITY
+            i += 1
+            used_range = True
+        fraction = 1.0 - selectivity if i > 0 else 0.0
+
+        sort = pattern.sort
+        if sort and not used_range and tuple(columns[eq_prefix:eq_prefix + len(sort)]) == sort:
+            fraction += (1.0 - fraction) * SORT_SHARE
+        return min(fraction, MAX_BENEFIT)
+
+    def _candidate_columns(self, pattern: AccessPattern) -> List[Tuple[str, ...]]:
+        width = self.max_width
+        # Equality before IN, then by name so patterns share candidates
+        eq = sorted(pattern.eq, key=lambda c: (pattern.eq[c] == IN, c))[:width]
+        shapes = set()
+        if eq:
+            shapes.add(tuple(eq))
+        for column in pattern.ranges:
+            shapes.add(tuple(eq[:width - 1]) + (column,))
+            shapes.add((column,))
+        if pattern.sort and len(eq) + len(pattern.sort) <= width:
+            shapes.add(tuple(eq) + pattern.sort)
+        for column in eq:
+            shapes.add((column,))
+        return [s for s in shapes if len(set(s)) == len(s)]
+
+    def build_candidates(self, patterns: List[AccessPattern], schema: Dict[str, TableInfo],
+                         write_time: Dict[str, float]) -> List[Candidate]:
+        by_table: Dict[str, List[int]] = defaultdict(list)
+        for idx, pattern in enumerate(patterns):
+            by_table[pattern.table].append(idx)
+
+        candidates: List[Candidate] = []
+        for table, pattern_ids in by_table.items():
+            info = schema[table]
+            existing = [tuple(cols) for cols in info.indexes.values()]
+
+            # Patterns a candidate can help, by the candidate's leading column
+            leading: Dict[str, List[int]] = defaultdict(list)
+            for idx in pattern_ids:
+                pattern = patterns[idx]
+                pattern.current = max((self.benefit(pattern, cols, info) for cols in existing), default=0.0)
+                for column in set(pattern.eq) | set(pattern.ranges) | set(pattern.sort[:1]):
+                    leading[column].append(idx)
+
+            shapes = set()
+            for idx in pattern_ids:
+                shapes.update(self._candidate_columns(patterns[idx]))
+
+            for columns in sorted(shapes, key=shape_order):
+                # Already covered by the leading columns of an existing index
+                if any(cols[:len(columns)] == columns for cols in existing):
+                    continue
+                candidate = Candidate(info.name, columns)
+                for idx in leading.get(columns[0], ()):
+                    benefit = self.benefit(patterns[idx], columns, info)
+                    if benefit > patterns[idx].current:
+                        candidate.postings.append((idx, benefit))
+                if not candidate.postings:
+                    continue
+                candidate.write_cost = write_time.get(table, 0.0) * WRITE_FACTOR * (
+                    1 + WRITE_WIDTH_FACTOR * (len(columns) - 1))
+                candidate.size_bytes = info.rows * (sum(info.columns[c] for c in columns) + 8 + 10)
+                candidates.append(candidate)
+        return candidates
+
+    # ------------------------------------------------------------------
+    # Selection
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _select_greedy(candidates: List[Candidate], patterns: List[AccessPattern], best: List[float],
+                       budget: float, max_indexes: int) -> List[Candidate]:
+        """Lazy greedy on gain / write cost; gains only shrink as indexes are added"""
+        eps = 1e-9
+        heap = []
+        for i, candidate in enumerate(candidates):
+            gain = candidate.gain(patterns, best)
+            # Ties go to the earlier candidate, i.e. the wider one (see shape_order)
+            heapq.heappush(heap, (-gain / (candidate.write_cost + eps), -gain, i))
+
+        chosen, spent = [], 0.0
+        while heap and len(chosen) < max_indexes:
+            _, _, i = heapq.heappop(heap)
+            candidate = candidates[i]
+            gain = candidate.gain(patterns, best)
+            if gain <= candidate.write_cost or gain <= 0:
+                continue
+            key = -gain / (candidate.write_cost + eps)
+            if heap and key > heap[0][0]:
+                heapq.heappush(heap, (key, -gain, i))  # stale bound, re-rank
+                continue
+            if spent + candidate.write_cost > budget:
+                continue
+            chosen.append(candidate)
+            spent += candidate.write_cost
+            for idx, benefit in candidate.postings:
+                if benefit > best[idx]:
+                    best[idx] = benefit
+        return chosen
+
+    @staticmethod
+    def _select_knapsack(candidates: List[Candidate], patterns: List[AccessPattern], best: List[float],
+                         budget: float, max_indexes: int) -> List[Candidate]:
+        """0/1 knapsack on standalone net gains, then re-checked with interactions"""
+        items = [(c.gain(patterns, best) - c.write_cost, c) for c in candidates]
+        items = sorted([it for it in items if it[0] > 0], key=lambda it: it[0], reverse=True)[:KNAPSACK_ITEMS]
+        if not items:
+            return []
+
+        unit = budget / KNAPSACK_BUCKETS if budget > 0 else 0.0
+        weights = [0 if unit == 0 or c.write_cost == 0 else math.ceil(c.write_cost / unit) for _, c in items]
+        if unit == 0:
+            weights = [0 if c.write_cost == 0 else KNAPSACK_BUCKETS + 1 for _, c in items]
+        capacity = KNAPSACK_BUCKETS
+        value = [0.0] * (capacity + 1)
+        keep = [[False] * (capacity + 1) for _ in items]
+        for n, ((net, _), weight) in enumerate(zip(items, weights)):
+            if weight > capacity:
+                continue
+            for cap in range(capacity, weight - 1, -1):
+                if value[cap - weight] + net > value[cap]:
+                    value[cap] = value[cap - weight] + net
+                    keep[n][cap] = True
+
+        picked, cap = [], capacity
+        for n in range(len(items) - 1, -1, -1):
+            if keep[n][cap]:
+                picked.append(items[n][1])
+                cap -= weights[n]
+
+        chosen = []
+        for candidate in sorted(picked, key=lambda c: c.gain(patterns, best), reverse=True):
+            if len(chosen) >= max_indexes:
+                break
+            gain = candidate.gain(patterns, best)
+            if gain <= candidate.write_cost:
+                continue
+            chosen.append(candidate)
+            for idx, benefit in candidate.postings:
+                if benefit > best[idx]:
+                    best[idx] = benefit
+        return chosen
+
+    # ------------------------------------------------------------------
+    # Entry points
+    # ------------------------------------------------------------------
+
+    def recommend(self, database: str, workload: Optional[List[WorkloadQuery]] = None,
+                  schema: Optional[Dict[str, TableInfo]] = None, lookback_hours: int = 24,
+                  max_fingerprints: int = 20000, max_indexes: int = 10,
+                  write_budget_pct: float = 5.0, strategy: str = "greedy") -> Dict[str, Any]:
+        start = time.time()
+        if workload is None:
+            workload = self.load_workload(database, lookback_hours, max_fingerprints)
+        workload = workload[:max_fingerprints]
+        if schema is None:
+            schema = self.load_schema(database)
+
+        patterns, write_time = self._extract_patterns(workload, schema)
+        candidates = self.build_candidates(patterns, schema, write_time)
+
+        total_time = sum(q.total_time for q in workload)
+        budget = total_time * write_budget_pct / 100.0
+        best = [p.current for p in patterns]
+        select = self._select_knapsack if strategy == "knapsack" else self._select_greedy
+        chosen = select(candidates, patterns, list(best), budget, max_indexes)
+
+        # An index whose columns prefix another chosen index on the same table is redundant
+        chosen = [c for c in chosen if not any(
+            o is not c and o.table == c.table and len(o.columns) > len(c.columns)
+            and o.columns[:len(c.columns)] == c.columns for o in chosen)]
+
+        recommendations = []
+        for candidate in chosen:
+            gain = candidate.gain(patterns, best)
+            per_query: Dict[int, float] = defaultdict(float)
+            for idx, benefit in candidate.postings:
+                if benefit > best[idx]:
+                    pattern = patterns[idx]
+                    for query_idx, weight in pattern.queries.items():
+                        per_query[query_idx] += weight * (benefit - best[idx])
+                    best[idx] = benefit
+            top = sorted(per_query.items(), key=lambda kv: kv[1], reverse=True)
+            columns = ", ".join(candidate.columns)
+            recommendations.append({
+                "table": candidate.table,
+                "columns": list(candidate.columns),
+                "create_index_sql": f"CREATE INDEX {index_name(candidate.table, candidate.columns)} "
+                                    f"ON {candidate.table} ({columns})",
+                "estimated_savings_s": round(gain, 3),
+                "savings_pct": round(gain / total_time * 100, 2) if total_time else 0.0,
+                "write_overhead_s": round(candidate.write_cost, 3),
+                "estimated_size_mb": round(candidate.size_bytes / 1024 / 1024, 2),
+                "queries_improved": len(per_query),
+                "top_queries": [
+                    {"fingerprint": workload[q].fingerprint[:300], "savings_s": round(s, 3)}
+                    for q, s in top[:3]
+                ],
+                "representative_sql": workload[top[0][0]].sql if top else None,
+            })
+
+        savings = sum(r["estimated_savings_s"] for r in recommendations)
+        return {
+            "database": database,
+            "strategy": "knapsack" if strategy == "knapsack" else "greedy",
+            "fingerprints_analyzed": len(workload),
+            "access_patterns": len(patterns),
+            "candidates_considered": len(candidates),
+            "total_workload_time_s": round(total_time, 3),
+            "estimated_total_savings_s": round(savings, 3),
+            "estimated_savings_pct": round(savings / total_time * 100, 2) if total_time else 0.0,
+            "write_budget_s": round(budget, 3),
+            "write_overhead_s": round(sum(r["write_overhead_s"] for r in recommendations), 3),
+            "recommendations": recommendations,
+            "elapsed_ms": round((time.time() - start) * 1000, 2),
+        }
+
+    async def arecommend(self, database: str, index_service=None, validate_top: int = 0,
+                         **kwargs) -> Dict[str, Any]:
+        """
+        recommend() on a worker thread; the `validate_top` best recommendations
+        are then checked with IndexSimulationService on their heaviest query.
+        """
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, lambda: self.recommend(database, **kwargs))
+
+        to_validate = [r for r in result["recommendations"][:validate_top] if r["representative_sql"]]
+        if index_service is not None and to_validate:
+            simulations = await asyncio.gather(*[
+                index_service.perform_index_simulation(r["representative_sql"], r["create_index_sql"], database)
+                for r in to_validate
+            ], return_exceptions=True)
+            for recommendation, simulation in zip(to_validate, simulations):
+                if isinstance(simulation, Exception):
+                    service_error = ErrorFactory.service_error(
+                        "Index Advisor",
+                        "Validation of a recommended index failed",
+                        original_error=simulation,
+                        create_index_sql=recommendation["create_index_sql"]
+                    )
+                    logger.warning(f"[IndexAdvisor] {service_error}")
+                    continue
+                recommendation["simulation"] = simulation.model_dump()
+        return result
+
+
+# Global instance
+index_advisor = IndexAdvisor()
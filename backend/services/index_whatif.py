@@ -0,0 +1,306 @@
+"""
+What-if index simulation on a throwaway branch
+
+The tables referenced by the statement are cloned (schema + a random sample
+of rows) into one branch with BranchManager. Every candidate is built once:
+the tables are indexed and ANALYZEd in parallel, one pooled connection per
+table. All candidates are then made invisible to the optimizer with
+ALTER INDEX ... IGNORED (a metadata-only change) and the statement is
+EXPLAINed; for each candidate only its own index is made visible again and
+the statement EXPLAINed, so candidates never see each other's indexes.
+IGNORED is table metadata shared by every session, so these EXPLAINs run
+one at a time, but each is a plan lookup with no index build in between.
+All plans come from the same data and statistics, so the optimizer's cost
+delta is a like-for-like comparison. The branch is dropped when the
+simulation ends, including on errors; once `stop` is set the remaining
+candidates are skipped.
+
+Row estimates on the branch are for the sample; `scale` (source rows /
+sampled rows per table) is returned so callers can project them back.
+"""
+
+import re
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from database import get_pooled_connection
+from error_factory import ErrorFactory
+from routers.database_branching import BranchManager
+from services.anti_patterns import get_features, STATEMENT_KEYWORDS
+from services.explain_service import explain_service, ExplainService
+from services.plan_model import parse_plan, plan_tables, plan_cost, diff_plans
+
+logger = logging.getLogger("uvicorn")
+
+CREATE_INDEX_RE = re.compile(
+    r'^\s*CREATE\s+(UNIQUE\s+)?INDEX\s+`?(\w+)`?\s+ON\s+(?:`?(\w+)`?\.)?`?(\w+)`?\s*\((.+)\)\s*;?\s*$',
+    re.IGNORECASE | re.DOTALL
+)
+ALTER_ADD_INDEX_RE = re.compile(
+    r'^\s*ALTER\s+TABLE\s+(?:`?(\w+)`?\.)?`?(\w+)`?\s+ADD\s+(UNIQUE\s+)?(?:INDEX|KEY)\s+`?(\w+)`?\s*\((.+)\)\s*;?\s*$',
+    re.IGNORECASE | re.DOTALL
+)
+# Column list: names, optional prefix lengths and ASC/DESC, nothing else
+INDEX_COLUMNS_RE = re.compile(r'^[\w\s,()`]+$')
+# MariaDB limit for database and index names
+MAX_IDENTIFIER_LENGTH = 64
+
+
+class IndexCandidate:
+    __slots__ = ("name", "table", "columns", "unique", "ddl")
+
+    def __init__(self, name: str, table: str, columns: List[str], unique: bool, ddl: str):
+        self.name = name
+        self.table = table
+        self.columns = columns
+        self.unique = unique
+        self.ddl = ddl
+
+    @property
+    def column_names(self) -> List[str]:
+        """Bare column names (prefix lengths and ASC/DESC stripped)"""
+        return [re.split(r'[\s(]', col.replace('`', '').strip())[0] for col in self.columns]
+
+    def create_sql(self, database: str) -> str:
+        """CREATE INDEX rebuilt from the parsed parts, never the caller's raw DDL"""
+        unique = "UNIQUE " if self.unique else ""
+        return f"CREATE {unique}INDEX `{self.name}` ON `{database}`.`{self.table}` ({', '.join(self.columns)})"
+
+    def ignored_sql(self, database: str, ignored: bool = True) -> str:
+        return (f"ALTER TABLE `{database}`.`{self.table}` ALTER INDEX `{self.name}` "
+                f"{'IGNORED' if ignored else 'NOT IGNORED'}")
+
+
+def parse_index_ddl(ddl: str) -> IndexCandidate:
+    """Parse CREATE INDEX / ALTER TABLE ... ADD INDEX. Raises ValueError otherwise."""
+    match = CREATE_INDEX_RE.match(ddl)
+    if match:
+        unique, name, _, table, columns = match.groups()
+    else:
+        match = ALTER_ADD_INDEX_RE.match(ddl)
+        if not match:
+            raise ValueError(f"Not a CREATE INDEX / ALTER TABLE ADD INDEX statement: {ddl[:100]}")
+        _, table, unique, name, columns = match.groups()
+    if not INDEX_COLUMNS_RE.match(columns):
+        raise ValueError(f"Unsupported index column list: {columns[:100]}")
+    if len(name) > MAX_IDENTIFIER_LENGTH:
+        raise ValueError(f"Index name longer than {MAX_IDENTIFIER_LENGTH} characters: {name[:100]}")
+    return IndexCandidate(
+        name=name,
+        table=table.lower(),
+        columns=[col.strip() for col in columns.split(',') if col.strip()],
+        unique=bool(unique),
+        ddl=ddl
+    )
+
+
+def retarget_sql(sql: str, source_db: str, branch_db: str) -> str:
+    """Point `source_db.table` references at the branch"""
+    pattern = re.compile(r'`?\b' + re.escape(source_db) + r'\b`?\s*\.', re.IGNORECASE)
+    return pattern.sub(f'`{branch_db}`.', sql)
+
+
+class IndexWhatIfEngine:
+    def __init__(self, connection_factory: Callable = get_pooled_connection,
+                 explainer: ExplainService = explain_service,
+                 sample_rows: int = 20000, max_workers: int = 4):
+        self.connection_factory = connection_factory
+        self.explainer = explainer
+        self.sample_rows = sample_rows
+        self.max_workers = max(1, max_workers)
+
+    @staticmethod
+    def _analyze(cursor, database: str, tables: List[str]) -> None:
+        for table in tables:
+            try:
+                # MariaDB engine-independent statistics (histograms) for the sample
+                cursor.execute(f"ANALYZE TABLE `{database}`.`{table}` PERSISTENT FOR ALL")
+            except Exception:
+                cursor.execute(f"ANALYZE TABLE `{database}`.`{table}`")
+            cursor.fetchall()
+
+    def _source_tables(self, cursor, sql: str, database: str, candidates: List[IndexCandidate]) -> Dict[str, int]:
+        """Base tables of `database` used by the statement or the candidates -> TABLE_ROWS"""
+        names = set(c.table for c in candidates)
+        for table in get_features(sql).tables:
+            schema, _, name = table.rpartition(".")
+            if not schema or schema == database.lower():
+                names.add(name)
+
+        placeholders = ", ".join(["%s"] * len(names))
+        cursor.execute(f"""
+            SELECT TABLE_NAME, TABLE_ROWS FROM INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_SCHEMA = %s AND TABLE_TYPE = 'BASE TABLE' AND LOWER(TABLE_NAME) IN ({placeholders})
+        """, (database, *sorted(names)))
+        return {row['TABLE_NAME']: int(row.get('TABLE_ROWS') or 0) for row in cursor.fetchall()}
+
+    def simulate(self, sql: str, candidate_ddls: List[str], database: str,
+                 stop: Optional[threading.Event] = None) -> List[Dict[str, Any]]:
+        """
+        Evaluate every candidate index for `sql` against `database`. Returns
+        one result per candidate, in order; a candidate that could not be
+        evaluated carries an "error" instead of plans.
+        """
+        if get_features(sql).statement_type not in STATEMENT_KEYWORDS:
+            raise ValueError("What-if simulation needs a SELECT, INSERT, UPDATE, DELETE or REPLACE statement")
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(candidate_ddls)
+        candidates: List[tuple] = []
+        for i, ddl in enumerate(candidate_ddls):
+            try:
+                candidates.append((i, parse_index_ddl(ddl)))
+            except ValueError as e:
+                results[i] = {"candidate": ddl, "error": str(e)}
+
+        if candidates:
+            branch_name = f"whatif_{uuid.uuid4().hex[:8]}"
+            if len(f"{database}_branch_{branch_name}") > MAX_IDENTIFIER_LENGTH:
+                raise ValueError(f"Database name too long for a what-if branch: {database}")
+
+            conn = self.connection_factory()
+            branch_db = None
+            try:
+                cursor = conn.cursor(dictionary=True)
+                source_rows = self._source_tables(cursor, sql, database, [c for _, c in candidates])
+                tables = sorted(source_rows)
+                known = {t.lower(): t for t in tables}
+                for i, candidate in candidates:
+                    if candidate.table not in known:
+                        results[i] = {"candidate": candidate.ddl, "error": f"Table '{candidate.table}' not found in {database}"}
+                    else:
+                        candidate.table = known[candidate.table]
+                candidates = [(i, c) for i, c in candidates if results[i] is None]
+
+                if candidates and not (stop and stop.is_set()):
+                    branch_db = BranchManager.create_branch_database(
+                        conn, database, branch_name,
+                        copy_data=True, tables=tables, sample_rows=self.sample_rows
+                    )
+                    conn.commit()
+
+                    scale = {}
+                    for table in tables:
+                        cursor.execute(f"SELECT COUNT(*) AS n FROM `{branch_db}`.`{table}`")
+                        sampled = int(cursor.fetchone()['n'] or 0)
+                        scale[table.lower()] = max(1.0, source_rows[table] / sampled) if sampled else 1.0
+
+                    errors = self._build(branch_db, tables, candidates, sql)
+                    built = [(i, c) for i, c in candidates if i not in errors]
+                    for i, candidate in candidates:
+                        if i in errors:
+                            results[i] = {"candidate": candidate.ddl, "error": errors[i]}
+
+                    for _, candidate in built:
+                        cursor.execute(candidate.ignored_sql(branch_db))
+                    cursor.execute(f"USE `{branch_db}`")
+                    branch_sql = retarget_sql(sql, database, branch_db)
+                    before = self.explainer.explain(branch_sql, branch_db, fmt="json", cursor=cursor, use_cache=False)
+
+                    for i, candidate in built:
+                        if stop and stop.is_set():
+                            break
+                        results[i] = self._evaluate(cursor, branch_db, candidate, sql, branch_sql, before, scale)
+                cursor.close()
+            finally:
+                if branch_db:
+                    self._drop(conn, branch_db)
+                conn.close()
+
+            for i, candidate in candidates:
+                if results[i] is None:
+                    results[i] = {"candidate": candidate.ddl, "error": "What-if simulation stopped"}
+
+        return results
+
+    def _build_table(self, branch_db: str, table: str, candidates: List[Tuple[int, IndexCandidate]],
+                     sql: str) -> Dict[int, str]:
+        """Create the table's candidates and refresh its statistics; errors per candidate"""
+        errors = {}
+        conn = self.connection_factory()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            for i, candidate in candidates:
+                try:
+                    cursor.execute(candidate.create_sql(branch_db))
+                except Exception as e:
+                    db_error = ErrorFactory.database_error(
+                        "What-if index could not be built",
+                        original_error=e,
+                        candidate=candidate.ddl,
+                        sql=sql[:100]
+                    )
+                    logger.warning(f"[IndexWhatIf] {db_error}")
+                    errors[i] = str(db_error)
+            self._analyze(cursor, branch_db, [table])
+            cursor.close()
+        finally:
+            conn.close()
+        return errors
+
+    def _build(self, branch_db: str, tables: List[str], candidates: List[Tuple[int, IndexCandidate]],
+               sql: str) -> Dict[int, str]:
+        """Build every candidate once, one table per pooled connection"""
+        per_table = {table: [(i, c) for i, c in candidates if c.table == table] for table in tables}
+        errors: Dict[int, str] = {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(tables)),
+                                thread_name_prefix="index-whatif") as pool:
+            futures = [pool.submit(self._build_table, branch_db, table, per_table[table], sql) for table in tables]
+            for future in futures:
+                errors.update(future.result())
+        return errors
+
+    def _evaluate(self, cursor, branch_db: str, candidate: IndexCandidate, sql: str, branch_sql: str,
+                  before: Any, scale: Dict[str, float]) -> Dict[str, Any]:
+        visible = False
+        try:
+            cursor.execute(candidate.ignored_sql(branch_db, ignored=False))
+            visible = True
+            after = self.explainer.explain(branch_sql, branch_db, fmt="json", cursor=cursor, use_cache=False)
+
+            before_tree, after_tree = parse_plan(before), parse_plan(after)
+            index_used = any(
+                node.key and candidate.name.lower() in node.key.lower().split(",")
+                for node in plan_tables(after_tree)
+            )
+            return {
+                "candidate": candidate.ddl,
+                "index": candidate,
+                "before": before,
+                "after": after,
+                "before_tree": before_tree,
+                "after_tree": after_tree,
+                "cost_before": plan_cost(before_tree),
+                "cost_after": plan_cost(after_tree),
+                "index_used": index_used,
+                "plan_diff": diff_plans(before_tree, after_tree),
+                "scale": scale,
+            }
+        except Exception as e:
+            db_error = ErrorFactory.database_error(
+                "What-if index simulation failed",
+                original_error=e,
+                candidate=candidate.ddl,
+                sql=sql[:100]
+            )
+            logger.warning(f"[IndexWhatIf] {db_error}")
+            return {"candidate": candidate.ddl, "error": str(db_error)}
+        finally:
+            # The next candidate must not see this one
+            if visible:
+                cursor.execute(candidate.ignored_sql(branch_db))
+
+    @staticmethod
+    def _drop(conn, branch_db: str) -> None:
+        try:
+            BranchManager.drop_branch_database(conn, branch_db)
+            conn.commit()
+        except Exception as e:
+            db_error = ErrorFactory.database_error(
+                "Failed to drop what-if branch",
+                original_error=e,
+                branch_database=branch_db
+            )
+            logger.error(f"[IndexWhatIf] {db_error}")
@@ -0,0 +1,472 @@
+"""
+Shared gateway for SkyAI Copilot chat calls
+
+Every LLM call in the backend goes through a single LLMGateway so that:
+- identical prompts are answered from a prompt-hash response cache
+- concurrent identical prompts share one upstream request (in-flight dedup)
+- one pooled async HTTP client is reused instead of a client per call
+- each endpoint has a concurrency limit and a circuit breaker, so a slow
+  upstream fails fast instead of holding every worker
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+from config import SKYAI_API_URL
+from error_factory import ErrorFactory, APIError
+from services.cache import SimpleCache, llm_response_cache
+
+logger = logging.getLogger("uvicorn")
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    CLOSED -> OPEN after `failure_threshold` failures in a row.
+    OPEN -> HALF_OPEN once `reset_timeout` seconds have passed; a single
+    trial request is let through and decides whether to close or re-open.
+    Callers release the trial slot in a finally block, so a trial that is
+    cancelled or fails outside the upstream call doesn't keep it forever.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failure_count = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    def allow_request(self) -> bool:
+        """Return True if a request may be sent upstream right now"""
+        if self.state == self.CLOSED:
+            return True
+
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = False
+
+        # HALF_OPEN: only one trial request at a time
+        if self._trial_in_flight:
+            return False
+        self._trial_in_flight = True
+        return True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failure_count = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def release_trial(self):
+        """Free the half-open slot of a trial that ended without an outcome (cancelled, unexpected error)"""
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failure_count += 1
+        self._trial_in_flight = False
+        if self.state == self.HALF_OPEN or self.failure_count >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "failure_count": self.failure_count,
+            "opened_at": self.opened_at,
+        }
+
+
+class LLMGateway:
+    """Cached, deduplicated and rate-limited client for the SkyAI Copilot API"""
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        cache: Optional[SimpleCache] = None,
+        max_concurrency: int = 4,
+        max_connections: int = 20,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        default_timeout: float = 30.0,
+    ):
+        self.base_url = (base_url or SKYAI_API_URL).rstrip("/")
+        self._api_key = api_key
+        self.cache = cache if cache is not None else llm_response_cache
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.default_timeout = default_timeout
+
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._stats = {
+            "requests": 0,
+            "cache_hits": 0,
+            "dedup_hits": 0,
+            "upstream_calls": 0,
+            "upstream_errors": 0,
+            "circuit_rejections": 0,
+        }
+
+        # Loop-bound state, (re)created lazily by _bind_loop()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def api_key(self) -> Optional[str]:
+        # Read lazily so keys loaded after import (dotenv) are picked up
+        return self._api_key or os.getenv("SKYSQL_API_KEY")
+
+    def _bind_loop(self):
+        """Reset loop-bound primitives when called from a different event loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._client = None
+        self._semaphores = {}
+        self._inflight = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    def _get_semaphore(self, path: str) -> asyncio.Semaphore:
+        if path not in self._semaphores:
+            self._semaphores[path] = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphores[path]
+
+    def get_breaker(self, path: str) -> CircuitBreaker:
+        if path not in self._breakers:
+            self._breakers[path] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return self._breakers[path]
+
+    @staticmethod
+    def make_cache_key(path: str, payload: Dict[str, Any]) -> str:
+        """Stable hash of endpoint + request payload"""
+        raw = path + "\n" + json.dumps(payload, sort_keys=True, default=str)
+        return "llm:" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def chat(
+        self,
+        prompt: str,
+        agent_id: Optional[str] = None,
+        context: Optional[str] = None,
+        path: str = "/chat/",
+        timeout: Optional[float] = None,
+        use_cache: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        Send a prompt to the Copilot chat endpoint.
+
+        Returns the decoded JSON body. Raises APIError on upstream errors,
+        timeouts (504) or when the circuit for this endpoint is open (503).
+        """
+        payload: Dict[str, Any] = {"prompt": prompt}
+        if agent_id:
+            payload["agent_id"] = agent_id
+        if context is not None:
+            payload["context"] = context
+        return await self.post(path, payload, timeout=timeout, use_cache=use_cache)
+
+    async def post(
+        self,
+        path: str,
+        payload: Dict[str, Any],
+        timeout: Optional[float] = None,
+        use_cache: bool = True,
+    ) -> Dict[str, Any]:
+        """POST a JSON payload through cache, dedup, concurrency limit and breaker"""
+        self._bind_loop()
+        self._stats["requests"] += 1
+
+        key = self.make_cache_key(path, payload)
+        if use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self._stats["cache_hits"] += 1
+                return cached
+
+        # Share the result of an identical request that is already in flight.
+        # The upstream call runs as its own task and every caller awaits it
+        # through shield(), so cancelling one caller (timeout, client
+        # disconnect) doesn't cancel it for the others.
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self._stats["dedup_hits"] += 1
+        else:
+            pending = asyncio.ensure_future(self._send(path, payload, timeout or self.default_timeout))
+            self._inflight[key] = pending
+            pending.add_done_callback(lambda task: self._finish_inflight(key, task, use_cache))
+        return await asyncio.shield(pending)
+
+    def _finish_inflight(self, key: str, task: asyncio.Future, use_cache: bool):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if task.cancelled():
+            return
+        # Retrieving the exception also keeps a task nobody awaited anymore from warning
+        if task.exception() is None and use_cache:
+            self.cache.set(key, task.result())
+
+    async def _send(self, path: str, payload: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        url = f"{self.base_url}{path}"
+        breaker = self.get_breaker(path)
+
+        if not self.api_key:
+            raise ErrorFactory.api_error(
+                "SkyAI Copilot is not configured",
+                status_code=503,
+                endpoint=url,
+                hint="Set SKYSQL_API_KEY"
+            )
+
+        if not breaker.allow_request():
+            self._stats["circuit_rejections"] += 1
+            raise ErrorFactory.api_error(
+                "SkyAI Copilot circuit open - upstream is failing, request rejected",
+                status_code=503,
+                endpoint=url,
+                failures=breaker.failure_count
+            )
+
+        trial = breaker.state == CircuitBreaker.HALF_OPEN
+        try:
+            return await self._post_upstream(path, url, payload, timeout, breaker)
+        finally:
+            if trial:
+                breaker.release_trial()
+
+    async def _post_upstream(self, path: str, url: str, payload: Dict[str, Any], timeout: float,
+                             breaker: CircuitBreaker) -> Dict[str, Any]:
+        async with self._get_semaphore(path):
+            self._stats["upstream_calls"] += 1
+            try:
+                response = await self._get_client().post(
+                    url,
+                    headers={
+                        "Content-Type": "application/json",
+                        "X-API-Key": self.api_key
+                    },
+                    json=payload,
+                    timeout=timeout
+                )
+            except httpx.TimeoutException as e:
+                breaker.record_failure()
+                self._stats["upstream_errors"] += 1
+                raise ErrorFactory.api_error(
+                    "SkyAI Copilot request timed out",
+                    status_code=504,
+                    original_error=e,
+                    endpoint=url
+                )
+            except httpx.RequestError as e:
+                breaker.record_failure()
+                self._stats["upstream_errors"] += 1
+                raise ErrorFactory.api_error(
+                    "SkyAI Copilot connection failed",
+                    status_code=503,
+                    original_error=e,
+                    endpoint=url
+                )
+
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            # 4xx means the upstream is healthy but rejected this request
+            breaker.record_success()
+
+        if response.status_code != 200:
+            self._stats["upstream_errors"] += 1
+            raise ErrorFactory.api_error(
+                f"SkyAI Copilot API error: {response.text[:200]}",
+                status_code=response.status_code,
+                endpoint=url
+            )
+
+        try:
+            return response.json()
+        except ValueError as e:
+            raise ErrorFactory.api_error(
+                "SkyAI Copilot returned a non-JSON body",
+                status_code=502,
+                original_error=e,
+                endpoint=url
+            )
+
+    async def stream_chat(
+        self,
+        prompt: str,
+        agent_id: Optional[str] = None,
+        context: Optional[str] = None,
+        path: str = "/chat/",
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Stream answer text chunks for a prompt.
+
+        Uses server-sent events when the upstream supports them and falls
+        back to a single chunk with the full answer otherwise. A cached
+        answer is replayed immediately; a completed stream is cached under
+        the same key as chat() so both paths share results.
+        """
+        self._bind_loop()
+        self._stats["requests"] += 1
+
+        payload: Dict[str, Any] = {"prompt": prompt}
+        if agent_id:
+            payload["agent_id"] = agent_id
+        if context is not None:
+            payload["context"] = context
+
+        key = self.make_cache_key(path, payload)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self._stats["cache_hits"] += 1
+            yield extract_answer(cached)
+            return
+
+        url = f"{self.base_url}{path}"
+        breaker = self.get_breaker(path)
+        if not self.api_key:
+            raise ErrorFactory.api_error(
+                "SkyAI Copilot is not configured",
+                status_code=503,
+                endpoint=url,
+                hint="Set SKYSQL_API_KEY"
+            )
+        if not breaker.allow_request():
+            self._stats["circuit_rejections"] += 1
+            raise ErrorFactory.api_error(
+                "SkyAI Copilot circuit open - upstream is failing, request rejected",
+                status_code=503,
+                endpoint=url,
+                failures=breaker.failure_count
+            )
+
+        trial = breaker.state == CircuitBreaker.HALF_OPEN
+        try:
+            chunks = []
+            async with self._get_semaphore(path):
+                self._stats["upstream_calls"] += 1
+                try:
+                    async with self._get_client().stream(
+                        "POST",
+                        url,
+                        headers={
+                            "Content-Type": "application/json",
+                            "Accept": "text/event-stream, application/json",
+                            "X-API-Key": self.api_key
+                        },
+                        json={**payload, "stream": True},
+                        timeout=timeout or self.default_timeout
+                    ) as response:
+                        if response.status_code != 200:
+                            body = await response.aread()
+                            if response.status_code >= 500:
+                                breaker.record_failure()
+                            else:
+                                breaker.record_success()
+                            self._stats["upstream_errors"] += 1
+                            raise ErrorFactory.api_error(
+                                f"SkyAI Copilot API error: {body[:200].decode('utf-8', errors='ignore')}",
+                                status_code=response.status_code,
+                                endpoint=url
+                            )
+
+                        content_type = response.headers.get("content-type", "")
+                        if content_type.startswith("text/event-stream"):
+                            async for line in response.aiter_lines():
+                                if not line.startswith("data:"):
+                                    continue
+                                data = line[len("data:"):].strip()
+                                if data == "[DONE]":
+                                    break
+                                try:
+                                    text = extract_answer(json.loads(data))
+                                except ValueError:
+                                    text = data
+                                if text:
+                                    chunks.append(text)
+                                    yield text
+                        else:
+                            body = await response.aread()
+                            text = extract_answer(json.loads(body))
+                            chunks.append(text)
+                            yield text
+                except httpx.TimeoutException as e:
+                    breaker.record_failure()
+                    self._stats["upstream_errors"] += 1
+                    raise ErrorFactory.api_error(
+                        "SkyAI Copilot request timed out",
+                        status_code=504,
+                        original_error=e,
+                        endpoint=url
+                    )
+                except httpx.RequestError as e:
+                    breaker.record_failure()
+                    self._stats["upstream_errors"] += 1
+                    raise ErrorFactory.api_error(
+                        "SkyAI Copilot connection failed",
+                        status_code=503,
+                        original_error=e,
+                        endpoint=url
+                    )
+
+            breaker.record_success()
+            self.cache.set(key, {"answer": "".join(chunks)})
+        finally:
+            # Consumer stopped early, or the body wasn't valid JSON
+            if trial:
+                breaker.release_trial()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "inflight": len(self._inflight),
+            "breakers": {path: b.to_dict() for path, b in self._breakers.items()},
+        }
+
+    async def aclose(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+
+def extract_answer(result: Any) -> str:
+    """Pull the answer text out of a Copilot response body or stream event"""
+    if not isinstance(result, dict):
+        return str(result)
+    for key in ("answer", "response", "message", "token", "delta", "text"):
+        value = result.get(key)
+        if isinstance(value, str):
+            return value
+    return ""
+
+
+# Global instance
+llm_gateway = LLMGateway()
@@ -0,0 +1,126 @@
+"""
+Bulk column sampler for PII detection
+
+/masking/analyze used to run `SELECT col FROM table LIMIT 5` for every
+column of the schema. The sampler instead:
+
+- reads the column list once from information_schema and keeps only the
+  candidate columns (`is_candidate(column, data_type)`, for PII detection
+  a name and type prefilter), so most columns are never queried,
+- samples all candidate columns of a table with one query
+  (`SELECT c1, c2, ... WHERE c1 IS NOT NULL OR ... LIMIT sample_rows`)
+  and keeps the first `samples_per_column` non-NULL values of each,
+- samples tables concurrently, one pooled connection per worker.
+"""
+
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from database import get_pooled_connection
+from services.chunked_archiver import quote
+
+logger = logging.getLogger("uvicorn")
+
+# (table, column, data_type)
+ColumnInfo = Tuple[str, str, str]
+
+
+class PIISampler:
+    def __init__(self, connection_factory: Callable = get_pooled_connection,
+                 sample_rows: int = 50, samples_per_column: int = 5, max_workers: int = 4):
+        self.connection_factory = connection_factory
+        self.sample_rows = max(1, sample_rows)
+        self.samples_per_column = max(1, samples_per_column)
+        self.max_workers = max(1, max_workers)
+
+    def list_columns(self, database: str, tables: Optional[List[str]] = None) -> List[ColumnInfo]:
+        """Every column of the schema (or of `tables`), in table / ordinal order"""
+        params: List[Any] = [database]
+        tables_clause = ""
+        if tables:
+            tables_clause = "AND TABLE_NAME IN (" + ", ".join(["%s"] * len(tables)) + ")"
+            params.extend(tables)
+        conn = self.connection_factory()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE
+                FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = %s {tables_clause}
+                ORDER BY TABLE_NAME, ORDINAL_POSITION
+            """, params)
+            rows = cursor.fetchall()
+            cursor.close()
+        finally:
+            conn.close()
+        return [(row[0], row[1], row[2]) for row in rows]
+
+    def sample_table(self, database: str, table: str, columns: List[str]) -> Dict[str, List[Any]]:
+        """Up to samples_per_column non-NULL values of each column, one query"""
+        quoted = [quote(c) for c in columns]
+        not_null = " OR ".join(f"{c} IS NOT NULL" for c in quoted)
+        conn = self.connection_factory()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT {', '.join(quoted)} FROM {quote(database)}.{quote(table)}
+                WHERE {not_null}
+                LIMIT {int(self.sample_rows)}
+            """)
+            rows = cursor.fetchall()
+            cursor.close()
+        finally:
+            conn.close()
+
+        samples: Dict[str, List[Any]] = {c: [] for c in columns}
+        for i, column in enumerate(columns):
+            values = samples[column]
+            for row in rows:
+                if row[i] is not None:
+                    values.append(row[i])
+                    if len(values) >= self.samples_per_column:
+                        break
+        return samples
+
+    def sample(self, database: str, tables: Optional[List[str]] = None,
+               is_candidate: Optional[Callable[[str, str], bool]] = None
+               ) -> Tuple[List[ColumnInfo], Dict[Tuple[str, str], List[Any]], Dict[str, Any]]:
+        """
+        All columns, samples of the candidate columns keyed by
+        (table, column), and query / timing stats.
+        """
+        quote(database)
+        started = time.perf_counter()
+        columns = self.list_columns(database, tables)
+
+        by_table: Dict[str, List[str]] = {}
+        for table, column, data_type in columns:
+            if is_candidate is None or is_candidate(column, data_type):
+                by_table.setdefault(table, []).append(column)
+
+        samples: Dict[Tuple[str, str], List[Any]] = {}
+        if by_table:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(by_table)),
+                                    thread_name_prefix="pii-sampler") as pool:
+                results = pool.map(lambda item: (item[0], self.sample_table(database, item[0], item[1])),
+                                   by_table.items())
+                for table, table_samples in results:
+                    for column, values in table_samples.items():
+                        samples[(table, column)] = values
+
+        stats = {
+            "columns": len(columns),
+            "candidate_columns": len(samples),
+            "tables_sampled": len(by_table),
+            "queries": 1 + len(by_table),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+        logger.info(f"[PIISampler] {database}: {stats['candidate_columns']}/{stats['columns']} candidate columns "
+                    f"sampled with {stats['queries']} queries in {stats['elapsed_ms']}ms")
+        return columns, samples, stats
+
+
+# Global instance
+pii_sampler = PIISampler()
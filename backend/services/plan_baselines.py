@@ -0,0 +1,129 @@
+"""
+In-memory store for query_plan_baselines
+
+Baselines are loaded from the query_plan_baselines table once and kept,
+together with their parsed plan tree, in plan_baseline_cache keyed by
+fingerprint. /plan/baseline/compare then only needs the database for the
+current EXPLAIN. Writers (create / delete) update the cache directly; rows
+changed by other processes are picked up when the TTL expires.
+"""
+
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from database import get_db_connection
+from error_factory import ErrorFactory
+from services.cache import plan_baseline_cache, SimpleCache
+from services.plan_model import parse_plan
+
+logger = logging.getLogger("uvicorn")
+
+
+class PlanBaselineStore:
+    def __init__(self, cache: SimpleCache = plan_baseline_cache,
+                 connection_factory: Callable = get_db_connection):
+        self.cache = cache
+        self.connection_factory = connection_factory
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _entry(row: Dict[str, Any]) -> Dict[str, Any]:
+        best_plan = row.get("best_plan")
+        if isinstance(best_plan, (str, bytes)):
+            best_plan = json.loads(best_plan) if best_plan else {}
+        return {
+            "fingerprint": row["fingerprint"],
+            "query_pattern": row.get("query_pattern"),
+            "best_plan": best_plan or {},
+            "plan_tree": parse_plan(best_plan or {}),
+            "best_execution_time_ms": row.get("best_execution_time_ms") or 0,
+            "best_cost": float(row.get("best_cost") or 0.0),
+            "created_at": row.get("created_at"),
+            "last_validated": row.get("last_validated"),
+        }
+
+    def get(self, fingerprint: str, cursor=None) -> Optional[Dict[str, Any]]:
+        """
+        Cached baseline for `fingerprint`, loading it on a miss. An open
+        `cursor` (dictionary=True) can be passed to reuse the caller's connection.
+        """
+        entry = self.cache.get(fingerprint)
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        query = "SELECT * FROM query_plan_baselines WHERE fingerprint = %s"
+        if cursor is not None:
+            cursor.execute(query, (fingerprint,))
+            row = cursor.fetchone()
+        else:
+            conn = self.connection_factory()
+            try:
+                cur = conn.cursor(dictionary=True)
+                cur.execute(query, (fingerprint,))
+                row = cur.fetchone()
+                cur.close()
+            finally:
+                conn.close()
+
+        if not row:
+            return None
+        entry = self._entry(row)
+        self.cache.set(fingerprint, entry)
+        return entry
+
+    def put(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Cache a baseline that was just written to the table"""
+        entry = self._entry(row)
+        self.cache.set(entry["fingerprint"], entry)
+        return entry
+
+    def invalidate(self, fingerprint: Optional[str] = None) -> None:
+        if fingerprint is None:
+            self.cache.clear()
+        else:
+            self.cache.remove(fingerprint)
+
+    def warm(self, limit: int = 1000) -> int:
+        """Load the most recently validated baselines in one query"""
+        try:
+            conn = self.connection_factory()
+            try:
+                cursor = conn.cursor(dictionary=True)
+                cursor.execute(
+                    "SELECT * FROM query_plan_baselines ORDER BY last_validated DESC LIMIT %s",
+                    (limit,)
+                )
+                rows = cursor.fetchall()
+                cursor.close()
+            finally:
+                conn.close()
+        except Exception as e:
+            db_error = ErrorFactory.database_error(
+                "Failed to preload plan baselines",
+                original_error=e
+            )
+            logger.warning(f"[PlanBaselineStore] {db_error}")
+            return 0
+
+        for row in rows:
+            self.put(row)
+        return len(rows)
+
+    def cached_entries(self) -> List[Dict[str, Any]]:
+        entries = []
+        for fingerprint in list(self.cache.cache):
+            entry = self.cache.get(fingerprint)
+            if entry is not None:
+                entries.append(entry)
+        return entries
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"cached": len(self.cache.cache), "hits": self.hits, "misses": self.misses}
+
+
+# Global store
+plan_baseline_store = PlanBaselineStore()
@@ -0,0 +1,387 @@
+"""
+Execution plan model for EXPLAIN FORMAT=JSON output
+
+parse_plan() turns the full EXPLAIN JSON document (MariaDB or MySQL
+flavour) into a tree of normalized PlanNode objects: query blocks, nested
+loops, joins, sorts, temporary tables, unions and subqueries, with a cost
+estimate per table access.
+
+plan_distance() is a Zhang-Shasha ordered tree edit distance where each
+node is weighted by its share of the plan cost, so an access change on the
+most expensive table of a join counts more than one on a 10-row lookup
+table. The result is normalized to 0.0 (identical) .. 1.0 (unrelated).
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+# Table accesses weigh BASE_WEIGHT plus up to COST_WEIGHT for the most
+# expensive one; structural nodes (query blocks, loops) weigh STRUCTURE_WEIGHT
+BASE_WEIGHT = 1.0
+COST_WEIGHT = 4.0
+STRUCTURE_WEIGHT = 0.25
+
+# Relabel cost components when two nodes have the same operation and table
+ACCESS_TYPE_CHANGE = 0.5
+KEY_CHANGE = 0.3
+FLAGS_CHANGE = 0.2
+
+# JSON keys that introduce a child operation, mapped to the node operation name
+CONTAINER_KEYS = {
+    "query_block": "query_block",
+    "nested_loop": "nested_loop",
+    "ordering_operation": "sort",
+    "filesort": "sort",
+    "read_sorted_file": "sort",
+    "grouping_operation": "group",
+    "duplicates_removal": "distinct",
+    "temporary_table": "temporary_table",
+    "buffer_result": "temporary_table",
+    "union_result": "union",
+    "query_specifications": "union",
+    "materialized_from_subquery": "materialized",
+    "materialization": "materialized",
+    "subqueries": "subquery",
+    "attached_subqueries": "subquery",
+    "select_list_subqueries": "subquery",
+    "having_subqueries": "subquery",
+    "optimized_away_subqueries": "subquery",
+    "order_by_subqueries": "subquery",
+    "group_by_subqueries": "subquery",
+    "block-nl-join": "block_nl_join",
+    "window_functions_computation": "window",
+}
+
+
+class PlanNode:
+    """One normalized operation of an execution plan"""
+
+    __slots__ = ("op", "table", "access_type", "key", "rows", "cost", "flags", "children")
+
+    def __init__(self, op: str, table: Optional[str] = None, access_type: Optional[str] = None,
+                 key: Optional[str] = None, rows: float = 0.0, cost: float = 0.0, flags: Tuple[str, ...] = ()):
+        self.op = op
+        self.table = table
+        self.access_type = access_type
+        self.key = key
+        self.rows = rows
+        self.cost = cost
+        self.flags = flags
+        self.children: List["PlanNode"] = []
+
+    def walk(self):
+        """Pre-order iteration"""
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def label(self) -> str:
+        if self.op == "table":
+            parts = [self.table or "?", self.access_type or "?"]
+            if self.key:
+                parts.append(self.key)
+            return "table(" + ", ".join(parts) + ")"
+        return self.op
+
+    def to_dict(self) -> Dict[str, Any]:
+        node = {"op": self.op}
+        if self.op == "table":
+            node.update({
+                "table": self.table,
+                "access_type": self.access_type,
+                "key": self.key,
+                "rows": self.rows,
+                "cost": round(self.cost, 4),
+            })
+        if self.flags:
+            node["flags"] = list(self.flags)
+        if self.children:
+            node["children"] = [c.to_dict() for c in self.children]
+        return node
+
+
+def _number(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _table_node(table: Dict[str, Any]) -> PlanNode:
+    rows = _number(table.get("rows_examined_per_scan", table.get("rows", 0)))
+    cost_info = table.get("cost_info") or {}
+    if "cost" in table:
+        # MariaDB 11.x
+        cost = _number(table["cost"])
+    elif cost_info:
+        # MySQL: own cost, not the prefix cost of the join so far
+        cost = _number(cost_info.get("read_cost")) + _number(cost_info.get("eval_cost"))
+    else:
+        # MariaDB 10.x has no per-table cost, rows * filtered is the best proxy
+        cost = rows * _number(table.get("filtered", 100)) / 100.0
+
+    flags = []
+    for flag in ("using_index", "using_filesort", "using_temporary_table", "using_join_buffer",
+                 "using_index_condition", "using_where"):
+        if table.get(flag):
+            flags.append(flag)
+    if table.get("attached_condition") and "using_where" not in flags:
+        flags.append("using_where")
+
+    node = PlanNode(
+        "table",
+        table=table.get("table_name"),
+        access_type=(table.get("access_type") or "").upper() or None,
+        key=table.get("key"),
+        rows=rows,
+        cost=cost,
+        flags=tuple(flags)
+    )
+    # Derived tables / subqueries hang off the table entry
+    _collect_children(table, node)
+    return node
+
+
+def _container_node(op: str, body: Any) -> PlanNode:
+    node = PlanNode(op)
+    if isinstance(body, dict):
+        flags = tuple(k for k in ("using_filesort", "using_temporary_table") if body.get(k))
+        node.flags = flags
+        _collect_children(body, node)
+    elif isinstance(body, list):
+        for item in body:
+            _append_item(item, node)
+    return node
+
+
+def _append_item(item: Any, parent: PlanNode) -> None:
+    """List entries are either {"table": {...}}, {"query_block": {...}} or nested containers"""
+    if not isinstance(item, dict):
+        return
+    if "table" in item and isinstance(item["table"], dict) and len(item) == 1:
+        parent.children.append(_table_node(item["table"]))
+    elif "table_name" in item:
+        parent.children.append(_table_node(item))
+    else:
+        _collect_children(item, parent)
+
+
+def _collect_children(body: Dict[str, Any], parent: PlanNode) -> None:
+    for key, value in body.items():
+        if key == "table" and isinstance(value, dict):
+            parent.children.append(_table_node(value))
+        elif key in CONTAINER_KEYS:
+            parent.children.append(_container_node(CONTAINER_KEYS[key], value))
+        elif isinstance(value, dict) and key not in ("cost_info", "possible_keys", "used_key_parts"):
+            # Unknown wrapper (e.g. "having_condition" objects): keep looking for operations
+            _collect_children(value, parent)
+
+
+def parse_plan(plan: Any) -> PlanNode:
+    """
+    Build the plan tree from an EXPLAIN FORMAT=JSON document (dict or JSON
+    string). An empty/invalid plan yields a bare root node.
+    """
+    if isinstance(plan, (str, bytes)):
+        try:
+            plan = json.loads(plan)
+        except ValueError:
+            plan = {}
+    root = PlanNode("plan")
+    if isinstance(plan, dict):
+        _collect_children(plan, root)
+    _assign_cost_shares(root)
+    return root
+
+
+def _assign_cost_shares(root: PlanNode) -> None:
+    """Containers take the summed cost of their tables, used for weighting"""
+    def total(node: PlanNode) -> float:
+        if node.op == "table":
+            return node.cost + sum(total(c) for c in node.children)
+        node.cost = sum(total(c) for c in node.children)
+        return node.cost
+    total(root)
+
+
+def plan_tables(root: PlanNode) -> List[PlanNode]:
+    """Table accesses in plan (join) order"""
+    return [n for n in root.walk() if n.op == "table"]
+
+
+def plan_cost(root: PlanNode) -> float:
+    return root.cost
+
+
+# =============================================================================
+# Tree edit distance
+# =============================================================================
+
+def _postorder(root: PlanNode):
+    """Returns (nodes in post-order, leftmost leaf index per node, keyroots)"""
+    nodes: List[PlanNode] = []
+    leftmost: List[int] = []
+
+    def visit(node: PlanNode) -> int:
+        first_leaf = None
+        for child in node.children:
+            leaf = visit(child)
+            if first_leaf is None:
+                first_leaf = leaf
+        nodes.append(node)
+        index = len(nodes) - 1
+        leftmost.append(index if first_leaf is None else first_leaf)
+        return leftmost[index]
+
+    visit(root)
+    seen = {}
+    for i, l in enumerate(leftmost):
+        seen[l] = i  # highest node sharing each leftmost leaf
+    keyroots = sorted(seen.values())
+    return nodes, leftmost, keyroots
+
+
+def _weights(nodes: List[PlanNode], total_cost: float) -> List[float]:
+    weights = []
+    for n in nodes:
+        if n.op != "table":
+            weights.append(STRUCTURE_WEIGHT)
+        elif total_cost > 0:
+            weights.append(BASE_WEIGHT + COST_WEIGHT * n.cost / total_cost)
+        else:
+            weights.append(BASE_WEIGHT)
+    return weights
+
+
+def node_difference(a: PlanNode, b: PlanNode) -> float:
+    """0.0 = same operation, 1.0 = unrelated operations"""
+    if a.op != b.op or a.table != b.table:
+        return 1.0
+    diff = 0.0
+    if a.access_type != b.access_type:
+        diff += ACCESS_TYPE_CHANGE
+    if a.key != b.key:
+        diff += KEY_CHANGE
+    if a.flags != b.flags:
+        diff += FLAGS_CHANGE
+    return min(diff, 1.0)
+
+
+def tree_edit_distance(root1: PlanNode, root2: PlanNode) -> Tuple[float, float]:
+    """
+    Weighted Zhang-Shasha distance. Returns (distance, max_distance) where
+    max_distance is the cost of deleting every node of one tree and
+    inserting every node of the other.
+    """
+    nodes1, l1, keyroots1 = _postorder(root1)
+    nodes2, l2, keyroots2 = _postorder(root2)
+    w1 = _weights(nodes1, root1.cost)
+    w2 = _weights(nodes2, root2.cost)
+
+    treedist = [[0.0] * len(nodes2) for _ in nodes1]
+
+    for i in keyroots1:
+        for j in keyroots2:
+            li, lj = l1[i], l2[j]
+            rows, cols = i - li + 2, j - lj + 2
+            fd = [[0.0] * cols for _ in range(rows)]
+            for x in range(1, rows):
+                fd[x][0] = fd[x - 1][0] + w1[li + x - 1]
+            for y in range(1, cols):
+                fd[0][y] = fd[0][y - 1] + w2[lj + y - 1]
+            for x in range(1, rows):
+                a = li + x - 1
+                for y in range(1, cols):
+                    b = lj + y - 1
+                    delete = fd[x - 1][y] + w1[a]
+                    insert = fd[x][y - 1] + w2[b]
+                    if l1[a] == li and l2[b] == lj:
+                        relabel = fd[x - 1][y - 1] + node_difference(nodes1[a], nodes2[b]) * (w1[a] + w2[b]) / 2
+                        fd[x][y] = min(delete, insert, relabel)
+                        treedist[a][b] = fd[x][y]
+                    else:
+                        subtree = fd[l1[a] - li][l2[b] - lj] + treedist[a][b]
+                        fd[x][y] = min(delete, insert, subtree)
+
+    return treedist[-1][-1], sum(w1) + sum(w2)
+
+
+def plan_distance(plan1: Any, plan2: Any) -> float:
+    """
+    Normalized weighted tree edit distance between two plans (EXPLAIN JSON
+    documents or parsed PlanNode trees). 0.0 = identical, 1.0 = completely different.
+    """
+    root1 = plan1 if isinstance(plan1, PlanNode) else parse_plan(plan1)
+    root2 = plan2 if isinstance(plan2, PlanNode) else parse_plan(plan2)
+    if not root1.children or not root2.children:
+        return 0.0 if not root1.children and not root2.children else 1.0
+    distance, max_distance = tree_edit_distance(root1, root2)
+    if max_distance <= 0:
+        return 0.0
+    # Relabels cost at most half the delete+insert of the pair, scale so a
+    # full access-path change on every node approaches 1.0
+    return min(1.0, 2.0 * distance / max_distance)
+
+
+def diff_plans(plan1: Any, plan2: Any) -> Dict[str, Any]:
+    """
+    Human-readable differences: per-table access changes, added/removed
+    tables and join order changes, plus the weighted distance.
+    """
+    root1 = plan1 if isinstance(plan1, PlanNode) else parse_plan(plan1)
+    root2 = plan2 if isinstance(plan2, PlanNode) else parse_plan(plan2)
+    tables1 = plan_tables(root1)
+    tables2 = plan_tables(root2)
+    by_name1 = {t.table: t for t in tables1}
+    by_name2 = {t.table: t for t in tables2}
+
+    changes = []
+    for name, before in by_name1.items():
+        after = by_name2.get(name)
+        if after is None:
+            changes.append({"table": name, "change": "removed", "before": before.label()})
+            continue
+        if node_difference(before, after) > 0:
+            changes.append({
+                "table": name,
+                "change": "access_changed",
+                "before": {"access_type": before.access_type, "key": before.key, "rows": before.rows,
+                           "flags": list(before.flags)},
+                "after": {"access_type": after.access_type, "key": after.key, "rows": after.rows,
+                          "flags": list(after.flags)},
+            })
+    for name, after in by_name2.items():
+        if name not in by_name1:
+            changes.append({"table": name, "change": "added", "after": after.label()})
+
+    order1 = [t.table for t in tables1 if t.table in by_name2]
+    order2 = [t.table for t in tables2 if t.table in by_name1]
+    ops1 = sorted(n.op for n in root1.walk() if n.op != "table")
+    ops2 = sorted(n.op for n in root2.walk() if n.op != "table")
+
+    # Any table losing its index access is a flip regardless of its cost share
+    lost_index = [
+        c["table"] for c in changes
+        if c["change"] == "access_changed" and c["after"]["access_type"] == "ALL"
+        and c["before"]["access_type"] != "ALL"
+    ]
+
+    return {
+        "distance": round(plan_distance(root1, root2), 4),
+        "lost_index_access": lost_index,
+        "join_order_changed": order1 != order2,
+        "join_order": {"before": order1, "after": order2},
+        "operations_changed": ops1 != ops2,
+        "table_changes": changes,
+        "cost": {"before": round(root1.cost, 4), "after": round(root2.cost, 4)},
+    }
+
+
+def detect_plan_flip(baseline: Any, current: Any, threshold: float = 0.3) -> Tuple[Dict[str, Any], bool]:
+    """
+    Returns (diff, flipped). A plan flipped when the weighted distance
+    exceeds `threshold`, the join order changed, or a table lost its index access.
+    """
+    diff = diff_plans(baseline, current)
+    flipped = diff["distance"] > threshold or diff["join_order_changed"] or bool(diff["lost_index_access"])
+    return diff, flipped
@@ -0,0 +1,299 @@
+"""
+Continuous plan-regression watcher
+
+Periodically picks the most expensive statements from mysql.slow_log that
+have a stored baseline in query_plan_baselines, runs EXPLAIN FORMAT=JSON
+for each through the shared explain service (never the statement itself;
+unchanged tables are answered from its cache) and compares the plan with the
+baseline tree. Plan flips are pushed to a bounded in-memory event queue
+(GET /plan/baseline/watcher/events) and optionally POSTed to a webhook.
+
+EXPLAINs run on a small thread pool (bounded concurrency), each one after
+a random stagger, and the scheduler job itself is jittered so several
+backends don't hit the server at the same moment.
+"""
+
+import os
+import json
+import time
+import random
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from database import get_db_connection
+from error_factory import ErrorFactory
+from parser.query_parser import SlowQueryParser
+from services.anti_patterns import get_features, STATEMENT_KEYWORDS
+from services.explain_service import explain_service, ExplainService
+from services.plan_baselines import plan_baseline_store, PlanBaselineStore
+from services.plan_model import parse_plan, detect_plan_flip
+
+logger = logging.getLogger("uvicorn")
+
+# Slow log rows fetched per watched fingerprint, before grouping by fingerprint
+SLOW_LOG_ROWS_PER_TARGET = 20
+
+
+class PlanRegressionWatcher:
+    def __init__(self, store: PlanBaselineStore = plan_baseline_store,
+                 connection_factory: Callable = get_db_connection,
+                 top_n: int = 20, max_concurrency: int = 4,
+                 interval_seconds: int = 300, jitter: float = 0.2,
+                 stagger_seconds: float = 2.0, lookback_hours: int = 24,
+                 flip_threshold: float = 0.3, max_events: int = 500,
+                 webhook_url: Optional[str] = None,
+                 explainer: ExplainService = explain_service):
+        self.store = store
+        self.connection_factory = connection_factory
+        self.explainer = explainer
+        self.top_n = top_n
+        self.max_concurrency = max_concurrency
+        self.interval_seconds = interval_seconds
+        self.jitter = jitter
+        self.stagger_seconds = stagger_seconds
+        self.lookback_hours = lookback_hours
+        self.flip_threshold = flip_threshold
+        self.webhook_url = webhook_url
+        self.parser = SlowQueryParser()
+
+        self.events: deque = deque(maxlen=max_events)
+        self._event_id = 0
+        self._last_flip_signature: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+
+        self.is_running = False
+        self.run_count = 0
+        self.check_count = 0
+        self.error_count = 0
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    # ------------------------------------------------------------------
+    # Target selection
+    # ------------------------------------------------------------------
+
+    def _slow_log_costs(self) -> Dict[str, Dict[str, Any]]:
+        """fingerprint -> {"cost", "executions", "database"} from mysql.slow_log"""
+        conn = self.connection_factory()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(
+                """
+                SELECT db, sql_text, COUNT(*) AS executions,
+                       SUM(TIME_TO_SEC(query_time)) AS total_time
+                FROM mysql.slow_log
+                WHERE start_time >= NOW() - INTERVAL %s HOUR
+                GROUP BY db, sql_text
+                ORDER BY total_time DESC
+                LIMIT %s
+                """,
+                (self.lookback_hours, self.top_n * SLOW_LOG_ROWS_PER_TARGET)
+            )
+            rows = cursor.fetchall()
+            cursor.close()
+        finally:
+            conn.close()
+
+        costs: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            sql_text = row.get("sql_text") or ""
+            if isinstance(sql_text, bytes):
+                sql_text = sql_text.decode("utf-8", errors="ignore")
+            fingerprint = self.parser.normalize_query(sql_text).lower()
+            group = costs.setdefault(fingerprint, {"cost": 0.0, "executions": 0, "database": row.get("db") or None})
+            group["cost"] += float(row.get("total_time") or 0)
+            group["executions"] += int(row.get("executions") or 0)
+        return costs
+
+    def select_targets(self) -> List[Dict[str, Any]]:
+        """Top-N baselined statements by slow log cost (falls back to baseline cost)"""
+        self.store.warm()
+        baselines = self.store.cached_entries()
+        if not baselines:
+            return []
+
+        try:
+            costs = self._slow_log_costs()
+        except Exception as e:
+            db_error = ErrorFactory.database_error(
+                "Failed to read mysql.slow_log, watching baselines by cost",
+                original_error=e
+            )
+            logger.warning(f"[PlanWatcher] {db_error}")
+            costs = {}
+
+        targets = []
+        for entry in baselines:
+            sql = entry.get("query_pattern") or ""
+            if get_features(sql).statement_type not in STATEMENT_KEYWORDS:
+                continue  # EXPLAIN only makes sense for DML
+            stats = costs.get(self.parser.normalize_query(sql).lower())
+            targets.append({
+                "fingerprint": entry["fingerprint"],
+                "sql": sql,
+                "database": stats["database"] if stats else None,
+                "slow_log_cost": stats["cost"] if stats else 0.0,
+                "executions": stats["executions"] if stats else 0,
+                "baseline_cost": entry["best_cost"],
+            })
+
+        targets.sort(key=lambda t: (t["slow_log_cost"], t["baseline_cost"]), reverse=True)
+        return targets[:self.top_n]
+
+    # ------------------------------------------------------------------
+    # Checks
+    # ------------------------------------------------------------------
+
+    def _explain(self, sql: str, database: Optional[str]) -> Dict[str, Any]:
+        return self.explainer.explain(sql, database, fmt="json")
+
+    def check_target(self, target: Dict[str, Any]) -> Dict[str, Any]:
+        if self.stagger_seconds > 0:
+            time.sleep(random.uniform(0, self.stagger_seconds))
+
+        fingerprint = target["fingerprint"]
+        result = {"fingerprint": fingerprint, "flipped": False}
+        try:
+            baseline = self.store.get(fingerprint)
+            if baseline is None:
+                result["error"] = "baseline removed"
+                return result
+            current_plan = self._explain(target["sql"], target.get("database"))
+            diff, flipped = detect_plan_flip(baseline["plan_tree"], parse_plan(current_plan), self.flip_threshold)
+            result.update({"flipped": flipped, "distance": diff["distance"]})
+            if flipped:
+                self._emit_flip(target, diff, current_plan)
+            else:
+                with self._lock:
+                    self._last_flip_signature.pop(fingerprint, None)
+        except Exception as e:
+            db_error = ErrorFactory.database_error(
+                f"EXPLAIN failed for baseline {fingerprint}",
+                original_error=e
+            )
+            logger.warning(f"[PlanWatcher] {db_error}")
+            with self._lock:
+                self.error_count += 1
+            result["error"] = str(db_error)
+        finally:
+            with self._lock:
+                self.check_count += 1
+        return result
+
+    def _emit_flip(self, target: Dict[str, Any], diff: Dict[str, Any], current_plan: Dict[str, Any]) -> None:
+        # Only raise once per distinct flipped plan, not on every run
+        signature = json.dumps(current_plan, sort_keys=True, default=str)
+        with self._lock:
+            if self._last_flip_signature.get(target["fingerprint"]) == signature:
+                return
+            self._last_flip_signature[target["fingerprint"]] = signature
+            self._event_id += 1
+            event = {
+                "id": self._event_id,
+                "type": "plan_flip",
+                "detected_at": datetime.now(timezone.utc).isoformat(),
+                "fingerprint": target["fingerprint"],
+                "database": target.get("database"),
+                "query_preview": target["sql"][:200],
+                "slow_log_cost": target.get("slow_log_cost", 0.0),
+                "plan_diff": diff,
+            }
+            self.events.append(event)
+
+        logger.warning(f"[PlanWatcher] Plan flip for {target['fingerprint']} (distance {diff['distance']})")
+        if self.webhook_url:
+            self._post_webhook(event)
+
+    def _post_webhook(self, event: Dict[str, Any]) -> None:
+        import requests
+        try:
+            requests.post(self.webhook_url, json=event, timeout=5)
+        except Exception as e:
+            service_error = ErrorFactory.service_error(
+                "Plan Regression Watcher",
+                "Failed to deliver plan flip webhook",
+                original_error=e,
+                webhook_url=self.webhook_url
+            )
+            logger.warning(f"[PlanWatcher] {service_error}")
+
+    def run_once(self) -> Dict[str, Any]:
+        """One watch cycle. Overlapping runs (scheduler + manual) are skipped."""
+        if not self._run_lock.acquire(blocking=False):
+            return {"skipped": True, "reason": "a watch cycle is already running"}
+        try:
+            start = time.time()
+            try:
+                targets = self.select_targets()
+            except Exception as e:
+                db_error = ErrorFactory.database_error(
+                    "Failed to load plan baselines",
+                    original_error=e
+                )
+                logger.error(f"[PlanWatcher] {db_error}")
+                self.error_count += 1
+                targets = []
+
+            results = []
+            if targets:
+                with ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                        thread_name_prefix="plan-watcher") as pool:
+                    results = list(pool.map(self.check_target, targets))
+
+            self.run_count += 1
+            self.last_run = {
+                "finished_at": datetime.now(timezone.utc).isoformat(),
+                "elapsed_ms": round((time.time() - start) * 1000, 2),
+                "checked": len(results),
+                "flips": sum(1 for r in results if r.get("flipped")),
+                "errors": sum(1 for r in results if r.get("error")),
+            }
+            return {"skipped": False, **self.last_run, "results": results}
+        finally:
+            self._run_lock.release()
+
+    def next_delay(self) -> float:
+        """Interval with +/- jitter, for callers scheduling their own loop"""
+        return self.interval_seconds * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def get_events(self, since: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        with self._lock:
+            events = [e for e in self.events if e["id"] > since]
+        return events[-limit:]
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "is_running": self.is_running,
+            "interval_seconds": self.interval_seconds,
+            "jitter": self.jitter,
+            "top_n": self.top_n,
+            "max_concurrency": self.max_concurrency,
+            "run_count": self.run_count,
+            "check_count": self.check_count,
+            "error_count": self.error_count,
+            "pending_events": len(self.events),
+            "last_run": self.last_run,
+            "baselines": self.store.get_stats(),
+            "explain_cache": self.explainer.get_stats(),
+        }
+
+
+# Global instance
+_watcher_instance: Optional[PlanRegressionWatcher] = None
+
+
+def get_plan_watcher() -> PlanRegressionWatcher:
+    """Get or create the global watcher instance (configured from the environment)"""
+    global _watcher_instance
+    if _watcher_instance is None:
+        _watcher_instance = PlanRegressionWatcher(
+            top_n=int(os.getenv("PLAN_WATCHER_TOP_N", "20")),
+            max_concurrency=int(os.getenv("PLAN_WATCHER_CONCURRENCY", "4")),
+            interval_seconds=int(os.getenv("PLAN_WATCHER_INTERVAL", "300")),
+            webhook_url=os.getenv("PLAN_WATCHER_WEBHOOK_URL") or None
+        )
+    return _watcher_instance
@@ -4,6 +4,7 @@ import logging
 
 from models import PredictRequest, PredictResponse, SimilarIssue
 from parser.query_parser import SlowQueryParser
+from services import anti_patterns
 from error_factory import ErrorFactory, ServiceError
 
 logger = logging.getLogger("uvicorn")
@@ -53,21 +54,6 @@ class PredictionService:
         try:
             query_embedding = self.embedding_service.get_embedding(fingerprint)
             raw_similar_docs = self.vector_store.search_similar(query_embedding, limit=10, threshold=0.7)
-            
-            # Deduplicate results by base source_id (e.g., MDEV-37723#fragment -> MDEV-37723)
-            seen_base_ids = set()
-            similar_docs = []
-            for doc in raw_similar_docs:
-                source_id = doc.get('source_id', 'unknown')
-                base_id = source_id.split('#')[0]
-                if base_id not in seen_base_ids:
-                    seen_base_ids.add(base_id)
-                    similar_docs.append(doc)
-                if len(similar_docs) >= 3:
-                    break
-                    
-            print(f"[/predict] Found {len(similar_docs)} unique tickets (after base ID dedup)")
-            
         except Exception as e:
             # Use ErrorFactory for structured error handling
             service_error = ErrorFactory.service_error(
@@ -77,7 +63,32 @@ class PredictionService:
                 query_fingerprint=fingerprint if 'fingerprint' in locals() else None
             )
             print(f"[/predict] Vector search failed: {service_error}")
-            similar_docs = []
+            raw_similar_docs = []
+        
+        response = self.assess_risk(sql, raw_similar_docs)
+        
+        elapsed_total = (time.time() - start_total) * 1000
+        print(f"[PERF] Total /predict processing took {elapsed_total:.2f}ms")
+        return response
+
+    def assess_risk(self, sql: str, raw_similar_docs: List[Dict[str, Any]]) -> PredictResponse:
+        """
+        Score a query given its (already retrieved) vector search neighbours.
+        Shared by /predict and the batch endpoint, which retrieves in bulk.
+        """
+        # Deduplicate results by base source_id (e.g., MDEV-37723#fragment -> MDEV-37723)
+        seen_base_ids = set()
+        similar_docs = []
+        for doc in raw_similar_docs:
+            source_id = doc.get('source_id', 'unknown')
+            base_id = source_id.split('#')[0]
+            if base_id not in seen_base_ids:
+                seen_base_ids.add(base_id)
+                similar_docs.append(doc)
+            if len(similar_docs) >= 3:
+                break
+                
+        print(f"[/predict] Found {len(similar_docs)} unique tickets (after base ID dedup)")
         
         # 3. Build context from similar issues
         similar_issues = []
@@ -103,37 +114,23 @@ class PredictionService:
         
         context = "\n\n".join(context_parts) if context_parts else "No similar issues found in knowledge base."
         
-        # 4. Risk Assessment - Heuristic-based analysis
-        # (No external AI dependency - uses pattern matching and similar issues)
-        sql_upper = sql.upper()
+        # 4. Risk Assessment - Rule engine + similar issues
+        # (No external AI dependency - uses the shared anti-pattern rules)
+        features, findings = anti_patterns.analyze(sql)
         risk_score = 30
         risk_level = "LOW"
         reason = "Query pattern analysis"
         query_analysis = "Analyzed query structure for common performance issues."
         suggested_fix = None
-        
-        # Check for risky patterns
-        if "SELECT *" in sql_upper and "WHERE" not in sql_upper:
-            risk_score = 85
-            risk_level = "HIGH"
-            reason = "SELECT * without WHERE clause - likely full table scan"
-            query_analysis = "Full table scan detected. No filtering will cause all rows to be examined."
-            suggested_fix = "Add a WHERE clause to filter results, or specify only needed columns."
-        elif "LIKE '%" in sql_upper or 'LIKE "%' in sql_upper:
-            risk_score = 70
-            risk_level = "MEDIUM"
-            reason = "Leading wildcard in LIKE - cannot use index"
-            query_analysis = "Leading wildcard patterns prevent index usage, causing full scans."
-        elif "IN (SELECT" in sql_upper:
-            risk_score = 60
-            risk_level = "MEDIUM"
-            reason = "Subquery in IN clause - may cause performance issues"
-            query_analysis = "Subqueries in IN clauses can be inefficient. Consider rewriting as JOIN."
-        elif "CROSS JOIN" in sql_upper or ", " in sql_upper and "WHERE" not in sql_upper:
-            risk_score = 80
-            risk_level = "HIGH"
-            reason = "Potential cartesian product - no join condition detected"
-            query_analysis = "Missing join conditions can create cartesian products with massive row counts."
+
+        # Findings are ordered by severity, LOW findings only annotate the answer
+        top = findings[0] if findings and findings[0].severity != "LOW" else None
+        if top:
+            risk_score = top.score
+            risk_level = top.severity
+            reason = top.message
+            query_analysis = top.explanation
+            suggested_fix = top.suggested_fix
         elif similar_issues:
             risk_score = 55
             risk_level = "MEDIUM"
@@ -141,17 +138,14 @@ class PredictionService:
             query_analysis = f"Query pattern matches historical issue {similar_issues[0].id}."
         else:
             # Check for positive patterns
-            if "WHERE" in sql_upper and "=" in sql_upper:
+            if features.has_where and features.has_equality:
                 risk_score = 25
                 query_analysis = "Query has filtering conditions. Check that indexed columns are used."
-            if "LIMIT" in sql_upper:
+            if features.has_limit:
                 risk_score = max(10, risk_score - 10)
                 query_analysis += " LIMIT clause present - reduces result set size."
-        
+
         print(f"[/predict] Heuristic analysis complete: {risk_level} ({risk_score})")
-        
-        elapsed_total = (time.time() - start_total) * 1000
-        print(f"[PERF] Total /predict processing took {elapsed_total:.2f}ms")
     
         return PredictResponse(
             risk_level=risk_level,
@@ -159,5 +153,6 @@ class PredictionService:
             reason=reason,
             similar_issues=similar_issues,
             suggested_fix=suggested_fix,
-            query_analysis=query_analysis
+            query_analysis=query_analysis,
+            findings=findings
         )
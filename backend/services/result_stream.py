@@ -0,0 +1,143 @@
+"""
+Capped, streamed result sets for user-supplied SQL
+
+Endpoints that run arbitrary SELECTs (sandbox, MCP query_database) used to
+call fetchall(), so a large result was fully materialized in process
+memory before anything was cut. ResultStreamer instead:
+
+- reads from an unbuffered cursor (`conn.cursor(buffered=False)`) in
+  fetchmany() batches, so only one batch is held at a time,
+- caps the rows the server sends with sql_select_limit (row cap + 1, to
+  detect truncation; an explicit LIMIT in the statement still applies),
+- stops at the row cap or when the encoded rows reach the byte cap, then
+  discards the rest of the (already server-capped) result,
+- reports rows returned vs rows the server read (Rows_read session
+  status delta) and why the result was truncated.
+
+Rows are yielded as JSON-safe lists, ready for a JSON body or NDJSON lines.
+"""
+import json
+import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Optional
+
+DEFAULT_ROW_LIMIT = 1000
+DEFAULT_BYTE_LIMIT = 2 * 1024 * 1024
+FETCH_BATCH = 500
+
+# No proxy buffering, rows reach the client as they are read
+NDJSON_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+
+def json_value(value: Any) -> Any:
+    """Driver value -> JSON-serializable value"""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", errors="replace")
+    return str(value)
+
+
+def ndjson_line(data: Dict[str, Any]) -> str:
+    return json.dumps(data, default=str) + "\n"
+
+
+class ResultStreamer:
+    def __init__(self, cursor, row_limit: int = DEFAULT_ROW_LIMIT,
+                 byte_limit: int = DEFAULT_BYTE_LIMIT, batch_size: int = FETCH_BATCH):
+        self.cursor = cursor
+        self.row_limit = max(1, row_limit)
+        self.byte_limit = max(1, byte_limit)
+        self.batch_size = batch_size
+
+        self.rows_returned = 0
+        self.bytes_returned = 0
+        self.rows_examined: Optional[int] = None
+        self.truncated = False
+        self.truncated_reason: Optional[str] = None
+        self._rows_read_before: Optional[int] = None
+        self._finished = False
+
+    def _rows_read(self) -> Optional[int]:
+        try:
+            self.cursor.execute("SHOW SESSION STATUS LIKE 'Rows_read'")
+            rows = self.cursor.fetchall()
+            return int(rows[0][1]) if rows else None
+        except Exception:
+            return None
+
+    def execute(self, sql: str) -> None:
+        self._rows_read_before = self._rows_read()
+        self.cursor.execute(f"SET SESSION sql_select_limit = {self.row_limit + 1}")
+        self.cursor.execute(sql)
+
+    @property
+    def columns(self) -> List[str]:
+        return [d[0] for d in self.cursor.description] if self.cursor.description else []
+
+    @property
+    def has_result_set(self) -> bool:
+        return bool(self.cursor.description)
+
+    def rows(self) -> Iterator[List[Any]]:
+        """Yield rows until the result, the row cap or the byte cap ends"""
+        try:
+            while self.has_result_set:
+                batch = self.cursor.fetchmany(self.batch_size)
+                if not batch:
+                    break
+                for row in batch:
+                    if self.rows_returned >= self.row_limit:
+                        self._truncate("row_limit")
+                        return
+                    values = [json_value(v) for v in row]
+                    size = len(json.dumps(values, default=str))
+                    if self.bytes_returned + size > self.byte_limit:
+                        self._truncate("byte_limit")
+                        return
+                    self.bytes_returned += size
+                    self.rows_returned += 1
+                    yield values
+        finally:
+            self.finish()
+
+    def _truncate(self, reason: str) -> None:
+        self.truncated = True
+        self.truncated_reason = reason
+
+    def finish(self) -> None:
+        """Discard unread rows (at most the row cap), restore the session, read Rows_read"""
+        if self._finished:
+            return
+        self._finished = True
+        if self.has_result_set:
+            try:
+                while self.cursor.fetchmany(self.batch_size):
+                    pass
+            except Exception:
+                pass
+        try:
+            self.cursor.execute("SET SESSION sql_select_limit = DEFAULT")
+        except Exception:
+            pass
+        after = self._rows_read()
+        if after is not None and self._rows_read_before is not None:
+            self.rows_examined = max(0, after - self._rows_read_before)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rows_returned": self.rows_returned,
+            "rows_examined": self.rows_examined,
+            "bytes_returned": self.bytes_returned,
+            "truncated": self.truncated,
+            "truncated_reason": self.truncated_reason,
+            "row_limit": self.row_limit,
+            "byte_limit": self.byte_limit,
+        }
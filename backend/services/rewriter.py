@@ -3,24 +3,78 @@ import time
 import re
 import json
 import asyncio
-import httpx
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
-from models import RewriteRequest, RewriteResponse, SimilarJiraTicket, IndexSimulationResponse
+from models import RewriteRequest, RewriteResponse, SimilarJiraTicket, IndexSimulationResponse, ExplainPlan
 from parser.query_parser import SlowQueryParser
 from config import SKYAI_AGENT_ID
 from error_factory import ErrorFactory, ServiceError, APIError, DatabaseError
 
 from services.index import IndexSimulationService
+from services.anti_patterns import detect_anti_patterns, get_features
+from services.explain_service import explain_service
 from services.cache import query_rewrite_cache
+from services.llm_gateway import llm_gateway
+
+# Per-stage time budgets (seconds). A stage that overruns is dropped and the
+# response is built from the stages that finished.
+DEFAULT_STAGE_TIMEOUTS = {
+    "rag": 5.0,
+    "explain": 3.0,
+    "llm": 25.0,
+    "simulation": 5.0,
+}
+
+# Max cosine distance for a knowledge-base hit to count as similar
+RAG_DISTANCE_THRESHOLD = 0.8
+
+# How long the LLM stage waits for RAG/EXPLAIN context before prompting without it
+LLM_CONTEXT_GRACE_SECONDS = 0.5
 
 class QueryRewriterService:
-    def __init__(self, embedding_service, vector_store, rag_enabled: bool, index_service: Optional[IndexSimulationService] = None):
+    def __init__(self, embedding_service, vector_store, rag_enabled: bool, index_service: Optional[IndexSimulationService] = None,
+                 stage_timeouts: Optional[Dict[str, float]] = None, llm_context_grace: float = LLM_CONTEXT_GRACE_SECONDS,
+                 parallel_stages: bool = True):
         self.embedding_service = embedding_service
         self.vector_store = vector_store
         self.rag_enabled = rag_enabled
         self.index_service = index_service
         self.parser = SlowQueryParser()
+        self.stage_timeouts = {**DEFAULT_STAGE_TIMEOUTS, **(stage_timeouts or {})}
+        self.llm_context_grace = llm_context_grace
+        # False runs the stages one after another (baseline for scripts/profile_perf.py)
+        self.parallel_stages = parallel_stages
+
+    @staticmethod
+    def build_similar_tickets(raw_similar_docs: List[dict]) -> Tuple[List[SimilarJiraTicket], List[dict]]:
+        """Deduplicate vector search hits by base source_id and convert the top 3 to tickets"""
+        similar_jira_tickets = []
+        similar_docs = []
+        
+        # Deduplicate results by base source_id
+        seen_base_ids = set()
+        for doc in raw_similar_docs:
+            source_id = doc.get('source_id', 'unknown')
+            base_id = source_id.split('#')[0]
+            if base_id not in seen_base_ids:
+                seen_base_ids.add(base_id)
+                similar_docs.append(doc)
+            if len(similar_docs) >= 3:
+                break
+
+        for doc in similar_docs:
+            source_id = doc.get('source_id', 'unknown')
+            content = doc.get('content', '')[:100]
+            distance = doc.get('distance', 1.0)
+            similarity = round((1 - distance) * 100, 1)
+            
+            similar_jira_tickets.append(SimilarJiraTicket(
+                id=source_id,
+                title=content.split('\n')[0][:80] if content else source_id,
+                similarity=similarity
+            ))
+        
+        return similar_jira_tickets, similar_docs
 
     async def _search_similar_jira(self, sql: str) -> Tuple[List[SimilarJiraTicket], List[dict]]:
         """Async helper for RAG search - runs in parallel with other operations"""
@@ -33,36 +87,18 @@ class QueryRewriterService:
         try:
             rag_start = time.time()
             fingerprint = self.parser.normalize_query(sql)
-            query_embedding = self.embedding_service.get_embedding(fingerprint)
-            
             loop = asyncio.get_running_loop()
+            query_embedding = await loop.run_in_executor(
+                None,
+                self.embedding_service.get_embedding,
+                fingerprint
+            )
+            
             raw_similar_docs = await loop.run_in_executor(
                 None, 
-                lambda: self.vector_store.search_similar(query_embedding, limit=10, threshold=0.8)
+                lambda: self.vector_store.search_similar(query_embedding, limit=10, threshold=RAG_DISTANCE_THRESHOLD)
             )
-            
-            # Deduplicate results by base source_id
-            seen_base_ids = set()
-            for doc in raw_similar_docs:
-                source_id = doc.get('source_id', 'unknown')
-                base_id = source_id.split('#')[0]
-                if base_id not in seen_base_ids:
-                    seen_base_ids.add(base_id)
-                    similar_docs.append(doc)
-                if len(similar_docs) >= 3:
-                    break
-
-            for doc in similar_docs:
-                source_id = doc.get('source_id', 'unknown')
-                content = doc.get('content', '')[:100]
-                distance = doc.get('distance', 1.0)
-                similarity = round((1 - distance) * 100, 1)
-                
-                similar_jira_tickets.append(SimilarJiraTicket(
-                    id=source_id,
-                    title=content.split('\n')[0][:80] if content else source_id,
-                    similarity=similarity
-                ))
+            similar_jira_tickets, similar_docs = self.build_similar_tickets(raw_similar_docs)
             
             print(f"[PERF] RAG search took {(time.time() - rag_start) * 1000:.2f}ms")
         except Exception as e:
@@ -77,7 +113,7 @@ class QueryRewriterService:
         
         return similar_jira_tickets, similar_docs
 
-    async def _call_skyai(self, sql: str, anti_patterns: List[str], similar_jira_tickets: List[SimilarJiraTicket], similar_docs: List[dict]) -> Tuple[str, Optional[str], dict]:
+    async def _call_skyai(self, sql: str, anti_patterns: List[str], similar_jira_tickets: List[SimilarJiraTicket], similar_docs: List[dict], plan_summary: Optional[str] = None) -> Tuple[str, Optional[str], dict]:
         """Async helper for SkyAI API call"""
         skysql_api_key = os.getenv("SKYSQL_API_KEY")
         
@@ -104,7 +140,7 @@ class QueryRewriterService:
 
 **DETECTED ANTI-PATTERNS:**
 {chr(10).join(f"- {p}" for p in anti_patterns)}
-
+{f"{chr(10)}**CURRENT EXECUTION PLAN:**{chr(10)}{plan_summary}{chr(10)}" if plan_summary else ""}
 **INSTRUCTIONS:**
 1. Rewrite this query for MASSIVE performance gains.
 2. **STRICTLY PROHIBITED:** No `SLEEP()`, no artificial delays, no dummy columns (`UNION ALL SELECT 'DELAY'`).
@@ -115,22 +151,10 @@ class QueryRewriterService:
 
         try:
             api_start = time.time()
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://api.skysql.com/copilot/v1/chat/",
-                    headers={
-                        "Content-Type": "application/json",
-                        "X-API-Key": skysql_api_key
-                    },
-                    json={"prompt": prompt, "agent_id": SKYAI_AGENT_ID},
-                    timeout=20.0
-                )
+            # Gateway raises APIError on non-200 / timeout / open circuit
+            result = await llm_gateway.chat(prompt, agent_id=SKYAI_AGENT_ID, timeout=20.0)
+            print(f"[PERF] SkyAI call took {(time.time() - api_start) * 1000:.2f}ms")
             
-            if response.status_code != 200:
-                print(f"[/rewrite] SkyAI Error: {response.status_code}")
-                return sql, None, {}
-            
-            result = response.json()
             ai_response = result.get("response", result.get("message", ""))
             
             data = {}
@@ -207,18 +231,201 @@ class QueryRewriterService:
                 "SkyAI Copilot API call failed",
                 status_code=500,
                 original_error=e,
-                endpoint="https://api.skysql.com/copilot/v1/chat/"
+                endpoint=f"{llm_gateway.base_url}/chat/"
             )
             print(f"[/rewrite] AI Error: {api_error}")
         
         return sql, None, {}
 
-    async def rewrite_query(self, request: RewriteRequest) -> RewriteResponse:
+    def _detect_anti_patterns(self, sql: str) -> Tuple[List[str], List[str]]:
+        """Step 1: Detect anti-patterns. Returns (anti_patterns, rewrite_hints)"""
+        findings = detect_anti_patterns(sql)
+        return [f.message for f in findings], [f.suggested_fix for f in findings if f.suggested_fix]
+
+    async def _explain_original(self, sql: str, database: Optional[str]) -> Optional[ExplainPlan]:
+        """EXPLAIN the original query (shared explain cache, runs on a worker thread)"""
+        try:
+            plan_rows = await explain_service.aexplain(sql, database)
+            row = plan_rows[0] if plan_rows else None
+        except Exception as e:
+            db_error = ErrorFactory.database_error(
+                "Failed to EXPLAIN original query for rewrite",
+                original_error=e,
+                database=database,
+                sql=sql[:100]
+            )
+            print(f"[/rewrite] EXPLAIN failed: {db_error}")
+            return None
+
+        if not row:
+            return None
+        rows = int(row.get('rows') or 0)
+        return ExplainPlan(
+            access_type=row.get('type') or 'ALL',
+            rows_examined=rows,
+            key=row.get('key'),
+            key_len=row.get('key_len'),
+            extra=row.get('Extra'),
+            estimated_time_ms=round(rows * 0.05, 2)
+        )
+
+    async def _llm_stage(self, sql: str, anti_patterns: List[str], rag_task: asyncio.Task, explain_task: asyncio.Task) -> Tuple[str, Optional[str], dict]:
+        """
+        Speculative LLM prompting: give RAG/EXPLAIN a short grace period to
+        enrich the prompt, then prompt with whatever context is ready.
+        """
+        similar_jira_tickets, similar_docs, plan_summary = [], [], None
+        if anti_patterns:
+            pending = [t for t in (rag_task, explain_task) if not t.done()]
+            if pending:
+                await asyncio.wait(pending, timeout=self.llm_context_grace)
+            if rag_task.done() and not rag_task.cancelled():
+                similar_jira_tickets, similar_docs = rag_task.result()
+            if explain_task.done() and not explain_task.cancelled() and explain_task.result():
+                plan = explain_task.result()
+                plan_summary = f"type={plan.access_type}, rows={plan.rows_examined}, key={plan.key}, extra={plan.extra}"
+
+        return await self._call_skyai(
+            sql, anti_patterns, similar_jira_tickets, similar_docs, plan_summary=plan_summary
+        )
+
+    @staticmethod
+    async def _precomputed(value):
+        return value
+
+    async def _run_stage(self, name: str, coro, default, timings: Dict[str, float], degraded: List[str]):
+        """Run one pipeline stage with its timeout; on timeout/failure return `default`"""
+        stage_start = time.time()
+        try:
+            return await asyncio.wait_for(coro, timeout=self.stage_timeouts.get(name))
+        except asyncio.TimeoutError:
+            print(f"[/rewrite] Stage '{name}' timed out after {self.stage_timeouts.get(name)}s - continuing with partial result")
+            degraded.append(name)
+            return default
+        except Exception as e:
+            service_error = ErrorFactory.service_error(
+                "Rewrite Pipeline",
+                f"Stage '{name}' failed",
+                original_error=e
+            )
+            print(f"[/rewrite] {service_error}")
+            degraded.append(name)
+            return default
+        finally:
+            timings[name] = round((time.time() - stage_start) * 1000, 2)
+
+    def _apply_heuristic_rewrites(self, sql: str, explanation: str) -> Tuple[str, str]:
+        """Fallback rewrites when the AI didn't respond or returned the same query"""
+        rewritten_sql = sql
+
+        # 1. Basic IN subquery to JOIN rewrite
+        if get_features(sql).in_subquery:
+            # Improved regex to handle newlines and content after subquery
+            match = re.search(
+                r'(\w+)\s+IN\s*\(\s*SELECT\s+(\w+)\s+FROM\s+(\w+)(?:\s+WHERE\s+(.+?))?\s*\)',
+                sql, re.IGNORECASE | re.DOTALL
+            )
+            if match:
+                full_match = match.group(0)
+                outer_col = match.group(1)
+                inner_col = match.group(2)
+                inner_table = match.group(3)
+                inner_where = match.group(4)
+                inner_alias = inner_table[0].lower() + "2"
+
+                # JOIN Construction
+                join_stmt = f"INNER JOIN {inner_table} {inner_alias} ON {outer_col} = {inner_alias}.{inner_col}"
+                if inner_where:
+                    # Clean up inner where
+                    clean_inner_where = inner_where.strip()
+                    join_stmt += f" AND {inner_alias}.{clean_inner_where}"
+
+                # Intelligent replacement: remove the IN (...) part from the WHERE clause
+                # If it was the only condition, remove 'WHERE'
+                # Otherwise keep the rest
+
+                # Check if IN is preceded by WHERE
+                where_pattern = r'\s+WHERE\s+' + re.escape(full_match)
+                if re.search(where_pattern, sql, re.IGNORECASE | re.DOTALL):
+                    rewritten_sql = re.sub(where_pattern, f" {join_stmt} WHERE ", sql, flags=re.IGNORECASE | re.DOTALL)
+                else:
+                    rewritten_sql = sql.replace(full_match, f" {join_stmt} ")
+
+                # Cleanup if we have "WHERE AND" or "WHERE OR" or "WHERE )"
+                rewritten_sql = re.sub(r'WHERE\s+(AND|OR)\s+', 'WHERE ', rewritten_sql, flags=re.IGNORECASE)
+                rewritten_sql = re.sub(r'WHERE\s+\)', ')', rewritten_sql, flags=re.IGNORECASE)
+                # If WHERE is empty at the end
+                rewritten_sql = re.sub(r'WHERE\s*$', '', rewritten_sql, flags=re.IGNORECASE)
+
+                explanation = "Heuristic rewrite applied to convert IN subquery to JOIN."
+
+        # 2. SELECT * to SELECT [columns] (heuristic)
+        if 'SELECT *' in rewritten_sql.upper():
+            # Try to guess table from FROM clause
+            from_match = re.search(r'FROM\s+(\w+)', rewritten_sql, re.IGNORECASE)
+            if from_match:
+                table = from_match.group(1)
+                # Mock a list of columns for common tables in our shop demo
+                cols_map = {
+                    "orders": "id, customer_id, order_date, total_amount, status",
+                    "shop_orders": "id, customer_id, order_date, total_amount, status",
+                    "customers": "id, name, email, country, segment",
+                    "shop_customers": "id, name, email, country, segment",
+                    "products": "id, name, category, price, stock",
+                    "shop_products": "id, name, category, price, stock"
+                }
+                if table.lower() in cols_map:
+                     rewritten_sql = re.sub(r'SELECT\s+\*', f"SELECT {cols_map[table.lower()]}", rewritten_sql, flags=re.IGNORECASE)
+                     explanation += " SELECT * replaced with explicit column list."
+
+        return rewritten_sql, explanation
+
+    async def _simulate_rewrite_index(self, rewritten_sql: str, database: Optional[str]) -> Optional[IndexSimulationResponse]:
+        """Step 4: Optional automatic index simulation for the rewritten query"""
+        proposed_idx = None
+        try:
+            # Try to guess a good index if the rewrite added a WHERE/JOIN column
+            # Extract JOIN/WHERE columns for index proposal
+            columns_match = re.findall(r'(\w+)\s*=\s*\w+\.\w+|(\w+)\s*=\s*(?:[\'"][\w\s\-_]+[\'"]|[:\w\d?]+)', rewritten_sql)
+            if columns_match:
+                potential_cols = [c[0] or c[1] for c in columns_match if c[0] or c[1]]
+                if potential_cols:
+                    table_match = re.search(r'FROM\s+(\w+)|JOIN\s+(\w+)', rewritten_sql, re.IGNORECASE)
+                    table = (table_match.group(1) or table_match.group(2)) if table_match else "unknown"
+                    idx_name = f"idx_auto_{potential_cols[0]}"
+                    proposed_idx = f"CREATE INDEX {idx_name} ON {table}({potential_cols[0]})"
+
+            if proposed_idx and self.index_service:
+                return await self.index_service.perform_index_simulation(rewritten_sql, proposed_idx)
+        except Exception as e:
+            # Use ErrorFactory for simulation errors
+            service_error = ErrorFactory.service_error(
+                "Index Simulation",
+                "Automatic index simulation failed",
+                original_error=e,
+                proposed_index=proposed_idx
+            )
+            print(f"[/rewrite] Auto-simulation failed: {service_error}")
+        return None
+
+    async def rewrite_query(self, request: RewriteRequest, rag_results: Optional[Tuple[List[SimilarJiraTicket], List[dict]]] = None) -> RewriteResponse:
         """
         🔧 Self-Healing SQL - Automatic query rewriting!
-        
+
         Analyzes a query for anti-patterns and rewrites it for better performance.
         Uses SkyAI Copilot for intelligent rewriting and RAG for historical context.
+
+        Pipeline (DAG of asyncio tasks):
+            anti-patterns ─┐
+            RAG search ────┼─> LLM rewrite ─> heuristics ─> index simulation
+            EXPLAIN ───────┘
+        RAG, EXPLAIN and the LLM call start together; the LLM waits at most
+        `llm_context_grace` seconds for RAG/EXPLAIN context. Every stage has
+        its own timeout and a stage that overruns is reported in
+        `degraded_stages` instead of failing the whole request.
+
+        `rag_results` lets batch callers pass in tickets retrieved in bulk,
+        skipping the per-query embedding + vector search.
         """
         start_total = time.time()
         sql = request.sql.strip()
@@ -233,58 +440,47 @@ class QueryRewriterService:
                 similar_jira_tickets=[],
                 anti_patterns_detected=[]
             )
-        
+
         # Check cache first for identical queries (remove bypass for prod)
         cache_key = f"rewrite:{sql}"
         cached_result = query_rewrite_cache.get(cache_key)
         if cached_result and os.getenv("BYPASS_CACHE") != "true":
             print(f"[CACHE HIT] Returning cached rewrite result")
             return cached_result
-        
-        sql_upper = sql.upper()
-        
-        # Step 1: Detect anti-patterns
-        anti_patterns = []
-        rewrite_hints = []
-        
-        # Pattern: IN (SELECT ...) - subquery that can be JOIN
-        if re.search(r'\bIN\s*\(\s*SELECT\b', sql_upper):
-            anti_patterns.append("IN (SELECT ...) subquery - can be rewritten as JOIN")
-            rewrite_hints.append("Convert IN subquery to INNER JOIN for better performance")
-        
-        # Pattern: SELECT * - should specify columns
-        if re.search(r'\bSELECT\s+\*\b', sql_upper):
-            anti_patterns.append("SELECT * - retrieves all columns unnecessarily")
-            rewrite_hints.append("Specify only required columns instead of SELECT *")
-        
-        # Pattern: LIKE '%...' - leading wildcard prevents index use
-        if re.search(r"LIKE\s+['\"]%", sql_upper):
-            anti_patterns.append("LIKE '%...' - leading wildcard prevents index usage")
-            rewrite_hints.append("Consider FULLTEXT search or restructuring the query")
-        
-        # Pattern: OR on different columns - often can be UNION
-        if re.search(r'\bWHERE\b.*\bOR\b.*\bOR\b', sql_upper):
-            anti_patterns.append("Multiple OR conditions - may prevent index optimization")
-            rewrite_hints.append("Consider splitting into UNION ALL for index usage")
-        
-        # Pattern: NOT IN (SELECT ...) - often slow
-        if re.search(r'\bNOT\s+IN\s*\(\s*SELECT\b', sql_upper):
-            anti_patterns.append("NOT IN (SELECT ...) - can be slow with NULLs")
-            rewrite_hints.append("Consider LEFT JOIN + IS NULL or NOT EXISTS")
-        
-        # Pattern: Correlated subquery in SELECT
-        if re.search(r'\bSELECT\b.*\(\s*SELECT\b', sql_upper) and 'WHERE' not in sql_upper.split('(')[0]:
-            anti_patterns.append("Correlated subquery in SELECT - executes per row")
-            rewrite_hints.append("Consider rewriting as JOIN with aggregation")
-        
-        # Pattern: ORDER BY without LIMIT
-        if 'ORDER BY' in sql_upper and 'LIMIT' not in sql_upper:
-            anti_patterns.append("ORDER BY without LIMIT - sorts entire result set")
-            rewrite_hints.append("Add LIMIT if only top N results are needed")
-        
-        # 🚀 PARALLEL: Start RAG search (uses new helper method)
-        similar_jira_tickets, similar_docs = await self._search_similar_jira(sql)
-        
+
+        database = request.database or "shop_demo"
+        timings: Dict[str, float] = {}
+        degraded: List[str] = []
+
+        # Step 1: Detect anti-patterns (CPU only, feeds the LLM prompt)
+        detect_start = time.time()
+        anti_patterns, rewrite_hints = self._detect_anti_patterns(sql)
+        timings["anti_patterns"] = round((time.time() - detect_start) * 1000, 2)
+
+        # Step 2: RAG search, EXPLAIN and speculative LLM prompt
+        rag_coro = self._precomputed(rag_results) if rag_results is not None else self._search_similar_jira(sql)
+        rag_task = asyncio.create_task(
+            self._run_stage("rag", rag_coro, ([], []), timings, degraded)
+        )
+        if not self.parallel_stages:
+            await rag_task
+        explain_task = asyncio.create_task(
+            self._run_stage("explain", self._explain_original(sql, database), None, timings, degraded)
+        )
+        if not self.parallel_stages:
+            await explain_task
+        llm_task = asyncio.create_task(
+            self._run_stage(
+                "llm",
+                self._llm_stage(sql, anti_patterns, rag_task, explain_task),
+                (sql, None, {}),
+                timings,
+                degraded
+            )
+        )
+        (similar_jira_tickets, similar_docs), original_plan, (rewritten_sql, suggested_ddl, jira_analysis) = \
+            await asyncio.gather(rag_task, explain_task, llm_task)
+
         # Fill default analyses for tickets with content preview
         for ticket in similar_jira_tickets:
             raw_content = next((d['content'] for d in similar_docs if d['source_id'] == ticket.id), "")
@@ -295,11 +491,7 @@ class QueryRewriterService:
                 ticket.analysis = f"Insight: {preview}..."
             else:
                 ticket.analysis = "Analysing historical context..."
-        # 🚀 OPTIMIZED: Use new helper for SkyAI call (with trimmed prompt)
-        rewritten_sql, suggested_ddl, jira_analysis = await self._call_skyai(
-            sql, anti_patterns, similar_jira_tickets, similar_docs
-        )
-        
+
         # Set default values
         improvements = rewrite_hints
         if rewritten_sql != sql:
@@ -311,7 +503,7 @@ class QueryRewriterService:
             estimated_speedup = f"{min(95, len(anti_patterns) * 20)}%" if anti_patterns else "0%"
             confidence = 0.5
             explanation = f"Analysis detected {len(anti_patterns)} optimization opportunity(ies)." if anti_patterns else "No optimization applied."
-        
+
         # Apply AI analyses to tickets
         for ticket in similar_jira_tickets:
             ai_analysis = jira_analysis.get(ticket.id) or jira_analysis.get(ticket.id.split('#')[0])
@@ -324,108 +516,34 @@ class QueryRewriterService:
                     ticket.analysis = f"Content Preview: {clean_content[:150]}..."
                 else:
                     ticket.analysis = "Analysis unavailable"
-        
-        # Fallback: Apply heuristic rewrites if AI didn't respond or returned same query
+
+        # Step 3: Heuristic rewrites if AI didn't respond or returned same query
         if rewritten_sql == sql and anti_patterns:
-            # 1. Basic IN subquery to JOIN rewrite
-            if 'IN (SELECT' in sql_upper:
-                # Improved regex to handle newlines and content after subquery
-                match = re.search(
-                    r'(\w+)\s+IN\s*\(\s*SELECT\s+(\w+)\s+FROM\s+(\w+)(?:\s+WHERE\s+(.+?))?\s*\)',
-                    sql, re.IGNORECASE | re.DOTALL
-                )
-                if match:
-                    full_match = match.group(0)
-                    outer_col = match.group(1)
-                    inner_col = match.group(2)
-                    inner_table = match.group(3)
-                    inner_where = match.group(4)
-                    inner_alias = inner_table[0].lower() + "2"
-                    
-                    # JOIN Construction
-                    join_stmt = f"INNER JOIN {inner_table} {inner_alias} ON {outer_col} = {inner_alias}.{inner_col}"
-                    if inner_where:
-                        # Clean up inner where
-                        clean_inner_where = inner_where.strip()
-                        join_stmt += f" AND {inner_alias}.{clean_inner_where}"
-                    
-                    # Intelligent replacement: remove the IN (...) part from the WHERE clause
-                    # If it was the only condition, remove 'WHERE'
-                    # Otherwise keep the rest
-                    
-                    # Check if IN is preceded by WHERE
-                    where_pattern = r'\s+WHERE\s+' + re.escape(full_match)
-                    if re.search(where_pattern, sql, re.IGNORECASE | re.DOTALL):
-                        rewritten_sql = re.sub(where_pattern, f" {join_stmt} WHERE ", sql, flags=re.IGNORECASE | re.DOTALL)
-                    else:
-                        rewritten_sql = sql.replace(full_match, f" {join_stmt} ")
-                    
-                    # Cleanup if we have "WHERE AND" or "WHERE OR" or "WHERE )"
-                    rewritten_sql = re.sub(r'WHERE\s+(AND|OR)\s+', 'WHERE ', rewritten_sql, flags=re.IGNORECASE)
-                    rewritten_sql = re.sub(r'WHERE\s+\)', ')', rewritten_sql, flags=re.IGNORECASE)
-                    # If WHERE is empty at the end
-                    rewritten_sql = re.sub(r'WHERE\s*$', '', rewritten_sql, flags=re.IGNORECASE)
-
-                    explanation = "Heuristic rewrite applied to convert IN subquery to JOIN."
-    
-            # 2. SELECT * to SELECT [columns] (heuristic)
-            if 'SELECT *' in rewritten_sql.upper():
-                # Try to guess table from FROM clause
-                from_match = re.search(r'FROM\s+(\w+)', rewritten_sql, re.IGNORECASE)
-                if from_match:
-                    table = from_match.group(1)
-                    # Mock a list of columns for common tables in our shop demo
-                    cols_map = {
-                        "orders": "id, customer_id, order_date, total_amount, status",
-                        "shop_orders": "id, customer_id, order_date, total_amount, status",
-                        "customers": "id, name, email, country, segment",
-                        "shop_customers": "id, name, email, country, segment",
-                        "products": "id, name, category, price, stock",
-                        "shop_products": "id, name, category, price, stock"
-                    }
-                    if table.lower() in cols_map:
-                         rewritten_sql = re.sub(r'SELECT\s+\*', f"SELECT {cols_map[table.lower()]}", rewritten_sql, flags=re.IGNORECASE)
-                         explanation += " SELECT * replaced with explicit column list."
-    
+            rewritten_sql, explanation = self._apply_heuristic_rewrites(sql, explanation)
+
         # Step 4: Optional Automatic Index Simulation for the rewritten query
         simulation_data = None
         if rewritten_sql != sql:
-            try:
-                # Try to guess a good index if the rewrite added a WHERE/JOIN column
-                proposed_idx = None
-                # Extract JOIN/WHERE columns for index proposal
-                columns_match = re.findall(r'(\w+)\s*=\s*\w+\.\w+|(\w+)\s*=\s*(?:[\'"][\w\s\-_]+[\'"]|[:\w\d?]+)', rewritten_sql)
-                if columns_match:
-                    potential_cols = [c[0] or c[1] for c in columns_match if c[0] or c[1]]
-                    if potential_cols:
-                        table_match = re.search(r'FROM\s+(\w+)|JOIN\s+(\w+)', rewritten_sql, re.IGNORECASE)
-                        table = (table_match.group(1) or table_match.group(2)) if table_match else "unknown"
-                        idx_name = f"idx_auto_{potential_cols[0]}"
-                        proposed_idx = f"CREATE INDEX {idx_name} ON {table}({potential_cols[0]})"
-                
-                if proposed_idx and self.index_service:
-                    simulation_data = await self.index_service.perform_index_simulation(rewritten_sql, proposed_idx)
-            except Exception as e:
-                # Use ErrorFactory for simulation errors
-                service_error = ErrorFactory.service_error(
-                    "Index Simulation",
-                    "Automatic index simulation failed",
-                    original_error=e,
-                    proposed_index=proposed_idx if 'proposed_idx' in locals() else None
-                )
-                print(f"[/rewrite] Auto-simulation failed: {service_error}")
- 
+            simulation_data = await self._run_stage(
+                "simulation",
+                self._simulate_rewrite_index(rewritten_sql, database),
+                None,
+                timings,
+                degraded
+            )
+
         # Resolve final suggested_ddl
         final_suggested_ddl = None
-        if 'suggested_ddl' in locals() and suggested_ddl:
+        if suggested_ddl:
             final_suggested_ddl = suggested_ddl
         elif simulation_data and hasattr(simulation_data, 'create_index_sql') and simulation_data.create_index_sql:
             final_suggested_ddl = simulation_data.create_index_sql
- 
+
         # 📊 Performance timing
         total_time = (time.time() - start_total) * 1000
-        print(f"[PERF] Total rewrite_query took {total_time:.2f}ms")
- 
+        timings["total"] = round(total_time, 2)
+        print(f"[PERF] Total rewrite_query took {total_time:.2f}ms (stages: {timings})")
+
         response = RewriteResponse(
             original_sql=sql,
             rewritten_sql=rewritten_sql,
@@ -436,12 +554,16 @@ class QueryRewriterService:
             similar_jira_tickets=similar_jira_tickets,
             anti_patterns_detected=anti_patterns,
             suggested_ddl=final_suggested_ddl,
-            simulation=simulation_data
+            simulation=simulation_data,
+            original_plan=original_plan,
+            stage_timings_ms=timings,
+            degraded_stages=degraded
         )
-        
-        # Cache the result for future identical queries
-        query_rewrite_cache.set(cache_key, response)
-        
+
+        # Only cache complete results so a transient timeout isn't served for 10 minutes
+        if not degraded:
+            query_rewrite_cache.set(cache_key, response)
+
         return response
 
     async def execute_fix(self, request) -> dict:
@@ -0,0 +1,257 @@
+"""
+Sandbox A/B benchmark
+
+A single timed run per query says little: the first run pays for cold
+buffer pool pages, later ones hit the cache, and any run can be slowed by
+unrelated load. The benchmark therefore:
+
+- gives each query its own pooled connection, so session counters and
+  session state never mix,
+- runs `warmup` unrecorded executions of each query first,
+- records `repetitions` executions, alternating the A/B order every
+  round so slow drift affects both sides equally,
+- runs A and B at the same time on their two connections when both are
+  read-only (paired rounds see the same server conditions); statements
+  that write run one after the other so they can't block each other,
+- reads SHOW SESSION STATUS before and after each execution (Handler_read_*,
+  Innodb_rows_read, Created_tmp_*), minus the counters the status query
+  and the transaction themselves add, measured once per connection,
+- reports median / p95 per side and a two-sided Mann-Whitney U test on
+  the timings.
+
+Every execution runs inside a transaction that is rolled back, like
+/sandbox/test.
+"""
+
+import math
+import time
+import logging
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from database import get_pooled_connection
+
+logger = logging.getLogger("uvicorn")
+
+STATUS_COUNTERS = (
+    "Handler_read_first", "Handler_read_key", "Handler_read_last", "Handler_read_next",
+    "Handler_read_prev", "Handler_read_rnd", "Handler_read_rnd_next",
+    "Innodb_rows_read", "Created_tmp_tables", "Created_tmp_disk_tables", "Sort_merge_passes",
+)
+
+SIGNIFICANCE_LEVEL = 0.05
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def mann_whitney_u(a: List[float], b: List[float]) -> Tuple[float, float]:
+    """
+    Two-sided Mann-Whitney U test (normal approximation with tie and
+    continuity correction). Returns (U for `a`, p-value).
+    """
+    n1, n2 = len(a), len(b)
+    if n1 == 0 or n2 == 0:
+        return 0.0, 1.0
+    combined = sorted([(v, 0) for v in a] + [(v, 1) for v in b])
+    ranks = [0.0] * len(combined)
+    ties = 0.0
+    i = 0
+    while i < len(combined):
+        j = i
+        while j + 1 < len(combined) and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2.0 + 1
+        group = j - i + 1
+        ties += group ** 3 - group
+        i = j + 1
+
+    rank_sum_a = sum(r for r, (_, side) in zip(ranks, combined) if side == 0)
+    u = rank_sum_a - n1 * (n1 + 1) / 2.0
+    n = n1 + n2
+    mean = n1 * n2 / 2.0
+    variance = n1 * n2 / 12.0 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return u, 1.0
+    z = (abs(u - mean) - 0.5) / math.sqrt(variance)
+    return u, min(1.0, math.erfc(max(z, 0.0) / math.sqrt(2)))
+
+
+class QueryRunner:
+    """One side of the comparison: a pooled connection and its session counters"""
+
+    def __init__(self, sql: str, database: Optional[str], timeout_seconds: int,
+                 connection_factory: Callable = get_pooled_connection):
+        self.sql = sql
+        self.database = database
+        self.timeout_seconds = timeout_seconds
+        self.connection_factory = connection_factory
+        self.conn = None
+        self.cursor = None
+        self.overhead: Dict[str, int] = {}
+        self.times_ms: List[float] = []
+        self.counters: List[Dict[str, int]] = []
+        self.rows = 0
+
+    def open(self) -> None:
+        self.conn = self.connection_factory(database=self.database)
+        self.cursor = self.conn.cursor()
+        self.cursor.execute(f"SET SESSION max_statement_time = {int(self.timeout_seconds)}")
+        try:
+            # Repeated runs must execute, not be answered from the query cache
+            self.cursor.execute("SET SESSION query_cache_type = OFF")
+        except Exception:
+            pass  # query cache not compiled in / disabled server-wide
+
+        # What SHOW STATUS and the empty transaction add on their own
+        before = self._status()
+        self.cursor.execute("START TRANSACTION")
+        self.cursor.execute("ROLLBACK")
+        after = self._status()
+        self.overhead = {name: after[name] - before[name] for name in after}
+
+    def _status(self) -> Dict[str, int]:
+        placeholders = ", ".join(["%s"] * len(STATUS_COUNTERS))
+        self.cursor.execute(f"SHOW SESSION STATUS WHERE Variable_name IN ({placeholders})", STATUS_COUNTERS)
+        values = {name: 0 for name in STATUS_COUNTERS}
+        for name, value in self.cursor.fetchall():
+            values[name] = int(value or 0)
+        return values
+
+    def run(self, record: bool = True) -> float:
+        before = self._status()
+        self.cursor.execute("START TRANSACTION")
+        try:
+            start = time.perf_counter()
+            self.cursor.execute(self.sql)
+            if self.cursor.description:
+                rows = len(self.cursor.fetchall())
+            else:
+                rows = self.cursor.rowcount
+            elapsed_ms = (time.perf_counter() - start) * 1000
+        finally:
+            # CRITICAL: never persist anything
+            self.cursor.execute("ROLLBACK")
+        after = self._status()
+
+        if record:
+            self.rows = rows
+            self.times_ms.append(elapsed_ms)
+            self.counters.append({
+                name: max(0, after[name] - before[name] - self.overhead.get(name, 0))
+                for name in STATUS_COUNTERS
+            })
+        return elapsed_ms
+
+    def close(self) -> None:
+        if self.cursor:
+            try:
+                self.cursor.close()
+            except Exception:
+                pass
+        if self.conn:
+            self.conn.close()
+
+    def summary(self) -> Dict[str, Any]:
+        times = self.times_ms
+        return {
+            "runs": len(times),
+            "rows": self.rows,
+            "median_ms": round(statistics.median(times), 3),
+            "p95_ms": round(percentile(times, 95), 3),
+            "mean_ms": round(statistics.fmean(times), 3),
+            "stdev_ms": round(statistics.stdev(times), 3) if len(times) > 1 else 0.0,
+            "min_ms": round(min(times), 3),
+            "max_ms": round(max(times), 3),
+            # Per-execution counters are deterministic for a given plan; median drops outliers
+            "session_status": {
+                name: int(statistics.median(c[name] for c in self.counters)) for name in STATUS_COUNTERS
+            },
+        }
+
+
+class SandboxBenchmark:
+    def __init__(self, connection_factory: Callable = get_pooled_connection):
+        self.connection_factory = connection_factory
+
+    def compare(self, original_sql: str, optimized_sql: str, database: Optional[str] = None,
+                repetitions: int = 10, warmup: int = 2, timeout_seconds: int = 20,
+                read_only: bool = False) -> Dict[str, Any]:
+        """
+        Benchmark `original_sql` (A) against `optimized_sql` (B). `read_only`
+        tells whether both statements are SELECTs and may run concurrently.
+        Database errors are raised to the caller.
+        """
+        original = QueryRunner(original_sql, database, timeout_seconds, self.connection_factory)
+        optimized = QueryRunner(optimized_sql, database, timeout_seconds, self.connection_factory)
+        start = time.time()
+        try:
+            original.open()
+            optimized.open()
+
+            for _ in range(warmup):
+                original.run(record=False)
+                optimized.run(record=False)
+
+            with ThreadPoolExecutor(max_workers=2, thread_name_prefix="sandbox-bench") as pool:
+                for round_no in range(repetitions):
+                    order = (original, optimized) if round_no % 2 == 0 else (optimized, original)
+                    if read_only:
+                        futures = [pool.submit(runner.run) for runner in order]
+                        for future in futures:
+                            future.result()
+                    else:
+                        for runner in order:
+                            runner.run()
+        finally:
+            original.close()
+            optimized.close()
+
+        a, b = original.summary(), optimized.summary()
+        _, p_value = mann_whitney_u(original.times_ms, optimized.times_ms)
+        significant = p_value < SIGNIFICANCE_LEVEL
+
+        improvement = 0.0
+        if a["median_ms"] > 0:
+            improvement = (a["median_ms"] - b["median_ms"]) / a["median_ms"] * 100
+
+        if significant and improvement > 10:
+            recommendation = "Use optimized query"
+        elif significant and improvement < -10:
+            recommendation = "Keep original query"
+        elif significant:
+            recommendation = "Marginal improvement"
+        else:
+            recommendation = "No significant difference"
+
+        return {
+            "mode": "benchmark",
+            "original": a,
+            "optimized": b,
+            "improvement_percent": round(improvement, 2),
+            "p95_improvement_percent": round((a["p95_ms"] - b["p95_ms"]) / a["p95_ms"] * 100, 2) if a["p95_ms"] else 0.0,
+            "session_status_delta": {
+                name: b["session_status"][name] - a["session_status"][name] for name in STATUS_COUNTERS
+            },
+            "significance": {
+                "test": "mann-whitney-u",
+                "p_value": round(p_value, 5),
+                "alpha": SIGNIFICANCE_LEVEL,
+                "significant": significant,
+            },
+            "repetitions": repetitions,
+            "warmup": warmup,
+            "concurrent": read_only,
+            "recommendation": recommendation,
+            "elapsed_ms": round((time.time() - start) * 1000, 2),
+        }
+
+
+# Global instance
+sandbox_benchmark = SandboxBenchmark()
@@ -0,0 +1,339 @@
+"""
+Set-based schema snapshots for drift detection
+
+Drift detection used to run SHOW CREATE TABLE for every table and parse
+each DDL line by line. SchemaSnapshotEngine loads a whole database in a
+handful of information_schema queries (tables, columns, index columns,
+foreign keys, check constraints) into a compact model:
+
+- TableDef holds columns, indexes and constraints as tuples, plus a
+  fingerprint over all of them, so equal tables are recognised without
+  walking their definitions,
+- a snapshot is cached per database under a checksum of the definition
+  rows (COUNT + BIT_XOR(CRC32(...)) per information_schema view, one
+  round trip); an unchanged schema is answered from the cache,
+- diff_snapshots() compares two models in memory and only returns the
+  tables whose fingerprints differ.
+
+parser/ddl_parser.py builds the same model from schema files checked into
+Git (services/git_schema.py).
+"""
+
+import time
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from database import get_db_connection
+from parser.sql_tokenizer import tokenize, WORD, IDENT, STRING
+
+logger = logging.getLogger("uvicorn")
+
+
+class ColumnDef(NamedTuple):
+    name: str
+    type: str  # full column type, upper case: INT(11) UNSIGNED, VARCHAR(255)
+    nullable: bool
+    default: Optional[str]
+    auto_increment: bool
+
+
+class IndexDef(NamedTuple):
+    name: str
+    type: str  # PRIMARY KEY, UNIQUE, KEY, FULLTEXT, SPATIAL
+    columns: Tuple[str, ...]
+
+
+class ForeignKeyDef(NamedTuple):
+    name: str
+    columns: Tuple[str, ...]
+    ref_table: str
+    ref_columns: Tuple[str, ...]
+    on_delete: str = "RESTRICT"
+    on_update: str = "RESTRICT"
+
+
+class TableDef:
+    __slots__ = ("name", "engine", "charset", "columns", "indexes", "foreign_keys", "checks", "_fingerprint")
+
+    def __init__(self, name: str, engine: Optional[str] = None, charset: Optional[str] = None):
+        self.name = name
+        self.engine = engine
+        self.charset = charset
+        self.columns: Dict[str, ColumnDef] = {}
+        self.indexes: Dict[str, IndexDef] = {}
+        self.foreign_keys: Dict[str, ForeignKeyDef] = {}
+        self.checks: Dict[str, str] = {}
+        self._fingerprint: Optional[str] = None
+
+    @property
+    def fingerprint(self) -> str:
+        """Stable hash of the definition (column order and name case ignored)"""
+        if self._fingerprint is None:
+            parts = (
+                (self.engine or "").upper(),
+                (self.charset or "").lower(),
+                sorted((k.lower(), c.type, c.nullable, c.default, c.auto_increment) for k, c in self.columns.items()),
+                sorted((k.lower(), i.type, tuple(c.lower() for c in i.columns)) for k, i in self.indexes.items()),
+                sorted((k.lower(), tuple(f.columns), f.ref_table.lower(), tuple(f.ref_columns), f.on_delete, f.on_update)
+                       for k, f in self.foreign_keys.items()),
+                sorted((k.lower(), v) for k, v in self.checks.items()),
+            )
+            self._fingerprint = hashlib.sha1(repr(parts).encode()).hexdigest()
+        return self._fingerprint
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Shape used by DriftDetector / DriftFixGenerator"""
+        return {
+            'columns': {
+                name: {'type': c.type, 'nullable': c.nullable, 'default': c.default, 'auto_increment': c.auto_increment}
+                for name, c in self.columns.items()
+            },
+            'indexes': {name: {'type': i.type, 'columns': list(i.columns)} for name, i in self.indexes.items()},
+            'foreign_keys': {
+                name: {'columns': list(f.columns), 'ref_table': f.ref_table, 'ref_columns': list(f.ref_columns),
+                       'on_delete': f.on_delete, 'on_update': f.on_update}
+                for name, f in self.foreign_keys.items()
+            },
+            'checks': dict(self.checks),
+            'engine': self.engine,
+            'charset': self.charset
+        }
+
+
+class SchemaSnapshot:
+    __slots__ = ("database", "tables", "checksum", "taken_at", "load_time_ms", "queries")
+
+    def __init__(self, database: str, tables: Dict[str, TableDef], checksum: str,
+                 load_time_ms: float = 0.0, queries: int = 0):
+        self.database = database
+        self.tables = tables
+        self.checksum = checksum
+        self.taken_at = time.time()
+        self.load_time_ms = load_time_ms
+        self.queries = queries
+
+
+def normalize_default(value: Optional[str]) -> Optional[str]:
+    """information_schema and DDL defaults -> one form (quotes stripped, NULL -> None)"""
+    if value is None:
+        return None
+    value = str(value)
+    if value.upper() == "NULL":
+        return None
+    if len(value) >= 2 and value[0] == value[-1] == "'":
+        return value[1:-1].replace("''", "'")
+    return value
+
+
+def normalize_expression(text: str) -> str:
+    """CHECK clauses and expression defaults, independent of quoting, case and spacing"""
+    return " ".join(
+        f"'{t.value}'" if t.kind == STRING else t.value.lower() if t.kind in (WORD, IDENT) else t.value
+        for t in tokenize(text or "")
+    )
+
+
+def charset_of(collation: Optional[str]) -> Optional[str]:
+    return collation.split("_", 1)[0] if collation else None
+
+
+def index_type(name: str, non_unique: int, kind: Optional[str]) -> str:
+    if name.upper() == "PRIMARY":
+        return "PRIMARY KEY"
+    if kind in ("FULLTEXT", "SPATIAL"):
+        return kind
+    return "UNIQUE" if not int(non_unique) else "KEY"
+
+
+def diff_snapshots(expected: Dict[str, TableDef], actual: Dict[str, TableDef]
+                   ) -> Tuple[List[Tuple[str, TableDef, TableDef]], List[str], List[str]]:
+    """(tables whose definitions differ, tables missing from actual, tables only in actual)"""
+    expected_names = {name.lower(): name for name in expected}
+    actual_names = {name.lower(): name for name in actual}
+    changed = []
+    for key in sorted(expected_names.keys() & actual_names.keys()):
+        left, right = expected[expected_names[key]], actual[actual_names[key]]
+        if left.fingerprint != right.fingerprint:
+            changed.append((actual_names[key], left, right))
+    missing = sorted(expected_names[k] for k in expected_names.keys() - actual_names.keys())
+    extra = sorted(actual_names[k] for k in actual_names.keys() - expected_names.keys())
+    return changed, missing, extra
+
+
+# One round trip: count + order-independent checksum of every definition row
+CHECKSUM_SQL = """
+    SELECT 'tables', COUNT(*), COALESCE(BIT_XOR(CRC32(CONCAT_WS('|', TABLE_NAME, TABLE_TYPE, ENGINE, TABLE_COLLATION))), 0)
+    FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s
+    UNION ALL
+    SELECT 'columns', COUNT(*), COALESCE(BIT_XOR(CRC32(CONCAT_WS('|', TABLE_NAME, COLUMN_NAME, ORDINAL_POSITION,
+           COLUMN_TYPE, IS_NULLABLE, COALESCE(COLUMN_DEFAULT, '<none>'), EXTRA, COALESCE(COLLATION_NAME, '')))), 0)
+    FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = %s
+    UNION ALL
+    SELECT 'indexes', COUNT(*), COALESCE(BIT_XOR(CRC32(CONCAT_WS('|', TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX,
+           COLUMN_NAME, NON_UNIQUE, INDEX_TYPE, COALESCE(SUB_PART, '')))), 0)
+    FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = %s
+    UNION ALL
+    SELECT 'foreign_keys', COUNT(*), COALESCE(BIT_XOR(CRC32(CONCAT_WS('|', TABLE_NAME, CONSTRAINT_NAME, COLUMN_NAME,
+           ORDINAL_POSITION, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME))), 0)
+    FROM information_schema.KEY_COLUMN_USAGE WHERE TABLE_SCHEMA = %s AND REFERENCED_TABLE_NAME IS NOT NULL
+    UNION ALL
+    SELECT 'fk_rules', COUNT(*), COALESCE(BIT_XOR(CRC32(CONCAT_WS('|', TABLE_NAME, CONSTRAINT_NAME,
+           UPDATE_RULE, DELETE_RULE))), 0)
+    FROM information_schema.REFERENTIAL_CONSTRAINTS WHERE CONSTRAINT_SCHEMA = %s
+"""
+
+# Appended when the server has CHECK_CONSTRAINTS (MariaDB 10.3.10+ / MySQL 8.0.16+)
+CHECKS_CHECKSUM_SQL = """
+    UNION ALL
+    SELECT 'checks', COUNT(*), COALESCE(BIT_XOR(CRC32(CONCAT_WS('|', TABLE_NAME, CONSTRAINT_NAME, CHECK_CLAUSE))), 0)
+    FROM information_schema.CHECK_CONSTRAINTS WHERE CONSTRAINT_SCHEMA = %s
+"""
+
+
+class SchemaSnapshotEngine:
+    def __init__(self, connection_factory: Callable = get_db_connection):
+        self.connection_factory = connection_factory
+        self._cache: Dict[str, SchemaSnapshot] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.checks_available = True  # cleared once the server turns out to lack CHECK_CONSTRAINTS
+
+    def checksum(self, cursor, database: str) -> str:
+        if self.checks_available:
+            try:
+                cursor.execute(CHECKSUM_SQL + CHECKS_CHECKSUM_SQL, (database,) * 6)
+            except Exception as e:
+                # Only the missing view if the query without it works; load() skips checks too
+                cursor.execute(CHECKSUM_SQL, (database,) * 5)
+                self.checks_available = False
+                logger.debug(f"Check constraints left out of the schema checksum for {database}: {e}")
+        else:
+            cursor.execute(CHECKSUM_SQL, (database,) * 5)
+        rows = sorted(tuple(str(v) for v in row) for row in cursor.fetchall())
+        return hashlib.sha1(repr(rows).encode()).hexdigest()
+
+    def load(self, cursor, database: str) -> Tuple[Dict[str, TableDef], int]:
+        """Whole-database model; returns (tables, queries issued)"""
+        cursor.execute("""
+            SELECT TABLE_NAME, ENGINE, TABLE_COLLATION
+            FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = %s AND TABLE_TYPE = 'BASE TABLE'
+        """, (database,))
+        tables = {name: TableDef(name, engine, charset_of(collation)) for name, engine, collation in cursor.fetchall()}
+        queries = 1
+
+        cursor.execute("""
+            SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_DEFAULT, EXTRA
+            FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = %s
+            ORDER BY TABLE_NAME, ORDINAL_POSITION
+        """, (database,))
+        queries += 1
+        for table, name, col_type, nullable, default, extra in cursor.fetchall():
+            table_def = tables.get(table)
+            if table_def is not None:
+                table_def.columns[name] = ColumnDef(
+                    name, str(col_type).upper(), nullable == 'YES', normalize_default(default),
+                    'auto_increment' in (extra or '').lower()
+                )
+
+        cursor.execute("""
+            SELECT TABLE_NAME, INDEX_NAME, NON_UNIQUE, INDEX_TYPE, COLUMN_NAME
+            FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = %s
+            ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX
+        """, (database,))
+        queries += 1
+        index_columns: Dict[Tuple[str, str], List[Any]] = {}
+        for table, name, non_unique, kind, column in cursor.fetchall():
+            entry = index_columns.setdefault((table, name), [index_type(name, non_unique, kind), []])
+            entry[1].append(column)
+        for (table, name), (kind, columns) in index_columns.items():
+            if table in tables:
+                tables[table].indexes[name] = IndexDef(name, kind, tuple(columns))
+
+        cursor.execute("""
+            SELECT k.TABLE_NAME, k.CONSTRAINT_NAME, k.COLUMN_NAME, k.REFERENCED_TABLE_NAME,
+                   k.REFERENCED_COLUMN_NAME, r.DELETE_RULE, r.UPDATE_RULE
+            FROM information_schema.KEY_COLUMN_USAGE k
+            JOIN information_schema.REFERENTIAL_CONSTRAINTS r
+              ON r.CONSTRAINT_SCHEMA = k.TABLE_SCHEMA AND r.CONSTRAINT_NAME = k.CONSTRAINT_NAME
+             AND r.TABLE_NAME = k.TABLE_NAME
+            WHERE k.TABLE_SCHEMA = %s AND k.REFERENCED_TABLE_NAME IS NOT NULL
+            ORDER BY k.TABLE_NAME, k.CONSTRAINT_NAME, k.ORDINAL_POSITION
+        """, (database,))
+        queries += 1
+        fk_parts: Dict[Tuple[str, str], List[Any]] = {}
+        for table, name, column, ref_table, ref_column, on_delete, on_update in cursor.fetchall():
+            entry = fk_parts.setdefault((table, name), [[], ref_table, [], on_delete, on_update])
+            entry[0].append(column)
+            entry[2].append(ref_column)
+        for (table, name), (columns, ref_table, ref_columns, on_delete, on_update) in fk_parts.items():
+            if table in tables:
+                tables[table].foreign_keys[name] = ForeignKeyDef(
+                    name, tuple(columns), ref_table, tuple(ref_columns),
+                    (on_delete or "RESTRICT").upper(), (on_update or "RESTRICT").upper()
+                )
+
+        try:
+            cursor.execute("""
+                SELECT TABLE_NAME, CONSTRAINT_NAME, CHECK_CLAUSE
+                FROM information_schema.CHECK_CONSTRAINTS
+                WHERE CONSTRAINT_SCHEMA = %s
+            """, (database,))
+            queries += 1
+            for table, name, clause in cursor.fetchall():
+                if table in tables:
+                    tables[table].checks[name] = normalize_expression(clause)
+        except Exception as e:
+            # CHECK_CONSTRAINTS needs MariaDB 10.3.10+ / MySQL 8.0.16+
+            logger.debug(f"Check constraints unavailable for {database}: {e}")
+
+        return tables, queries
+
+    def get(self, database: str, force: bool = False) -> Tuple[SchemaSnapshot, bool]:
+        """(snapshot, changed since the previously cached one)"""
+        conn = self.connection_factory()
+        cursor = conn.cursor()
+        try:
+            checksum = self.checksum(cursor, database)
+            with self._lock:
+                cached = self._cache.get(database)
+            if cached is not None and cached.checksum == checksum and not force:
+                self.hits += 1
+                return cached, False
+
+            self.misses += 1
+            started = time.perf_counter()
+            tables, queries = self.load(cursor, database)
+            snapshot = SchemaSnapshot(database, tables, checksum,
+                                      load_time_ms=round((time.perf_counter() - started) * 1000, 2),
+                                      queries=queries + 1)
+            with self._lock:
+                self._cache[database] = snapshot
+            logger.info(f"Schema snapshot of {database}: {len(tables)} tables in {queries + 1} queries "
+                        f"({snapshot.load_time_ms}ms)")
+            return snapshot, cached is not None and cached.checksum != checksum
+        finally:
+            cursor.close()
+            conn.close()
+
+    def invalidate(self, database: Optional[str] = None) -> None:
+        with self._lock:
+            if database is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(database, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            cached = {db: {"tables": len(s.tables), "checksum": s.checksum, "taken_at": s.taken_at,
+                           "load_time_ms": s.load_time_ms} for db, s in self._cache.items()}
+        return {"hits": self.hits, "misses": self.misses, "cached": cached}
+
+
+# Global instance
+schema_snapshots = SchemaSnapshotEngine()
@@ -0,0 +1,17 @@
+"""
+Server-sent events helpers for streaming endpoints
+"""
+import json
+from typing import Any
+
+# Disable proxy buffering so events reach the browser as they are produced
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Encode one SSE frame: `event: <name>` followed by a JSON `data:` line"""
+    payload = json.dumps(data, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
@@ -0,0 +1,264 @@
+"""
+Schema-wide table statistics with periodic snapshots
+
+Archiving analysis used to run one performance_schema query (plus its own
+information_schema lookups) per table and classified access from
+cumulative counters, i.e. from whatever happened since the server
+started. TableStatsCollector instead:
+
+- reads sizes, row estimates and table IO counters for a whole schema in
+  two set-based queries (information_schema.TABLES and
+  performance_schema.table_io_waits_summary_by_table),
+- keeps a bounded series of snapshots per schema, taken by the scheduler
+  every TABLE_STATS_INTERVAL seconds and on every analysis,
+- derives access rates and growth from the delta between the current
+  snapshot and the oldest one inside the analysis window. Counters that
+  went backwards (server restart, performance_schema truncated) restart
+  the baseline instead of producing negative rates.
+
+Without an earlier snapshot, rates fall back to the cumulative counters
+and growth is unknown (None).
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from database import get_db_connection
+from error_factory import ErrorFactory
+
+logger = logging.getLogger("uvicorn")
+
+SECONDS_PER_DAY = 86400
+# Shortest window that gives meaningful rates; closer snapshots are skipped
+MIN_DELTA_SECONDS = 60
+
+
+@dataclass
+class TableStats:
+    table: str
+    data_bytes: int = 0
+    index_bytes: int = 0
+    rows: int = 0
+    create_time: Optional[datetime] = None
+    update_time: Optional[datetime] = None
+    read_count: Optional[int] = None  # None when performance_schema is unavailable
+    write_count: Optional[int] = None
+    read_time_sec: float = 0.0
+    write_time_sec: float = 0.0
+
+    @property
+    def size_bytes(self) -> int:
+        return self.data_bytes + self.index_bytes
+
+
+Snapshot = Tuple[float, Dict[str, TableStats]]
+
+
+def access_frequency(accesses_per_day: Optional[float]) -> str:
+    """Same buckets the per-table analyzer used, applied to a daily rate"""
+    if accesses_per_day is None:
+        return 'unknown'
+    if accesses_per_day == 0:
+        return 'never'
+    if accesses_per_day < 10:
+        return 'rare'
+    if accesses_per_day < 100:
+        return 'low'
+    if accesses_per_day < 1000:
+        return 'medium'
+    return 'high'
+
+
+class TableStatsCollector:
+    def __init__(self, connection_factory: Callable = get_db_connection,
+                 max_snapshots: int = 168, interval_seconds: int = 3600,
+                 databases: Optional[List[str]] = None,
+                 clock: Callable[[], float] = time.time):
+        self.connection_factory = connection_factory
+        self.max_snapshots = max_snapshots
+        self.interval_seconds = interval_seconds
+        self.databases = databases or ["shop_demo"]
+        self.clock = clock
+        self.snapshots: Dict[str, Deque[Snapshot]] = {}
+        self.is_running = False
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Collection
+    # ------------------------------------------------------------------
+
+    def collect(self, database: str, tables: Optional[List[str]] = None) -> Dict[str, TableStats]:
+        """Sizes and IO counters of every base table in `database`"""
+        table_filter, params = "", [database]
+        if tables:
+            table_filter = "AND TABLE_NAME IN (" + ",".join(["%s"] * len(tables)) + ")"
+            params.extend(tables)
+
+        conn = self.connection_factory()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"""
+                SELECT TABLE_NAME, COALESCE(DATA_LENGTH, 0), COALESCE(INDEX_LENGTH, 0),
+                       COALESCE(TABLE_ROWS, 0), CREATE_TIME, UPDATE_TIME
+                FROM INFORMATION_SCHEMA.TABLES
+                WHERE TABLE_SCHEMA = %s AND TABLE_TYPE = 'BASE TABLE' {table_filter}
+            """, params)
+            stats = {
+                row[0]: TableStats(row[0], int(row[1]), int(row[2]), int(row[3]), row[4], row[5])
+                for row in cursor.fetchall()
+            }
+
+            try:
+                cursor.execute(f"""
+                    SELECT OBJECT_NAME, COUNT_READ, COUNT_WRITE,
+                           SUM_TIMER_READ / 1000000000000, SUM_TIMER_WRITE / 1000000000000
+                    FROM performance_schema.table_io_waits_summary_by_table
+                    WHERE OBJECT_SCHEMA = %s {table_filter.replace('TABLE_NAME', 'OBJECT_NAME')}
+                """, params)
+                io_rows = cursor.fetchall()
+            except Exception as e:
+                logger.warning(f"Table IO statistics unavailable for {database}: {e}")
+                io_rows = []
+
+            for name, reads, writes, read_time, write_time in io_rows:
+                entry = stats.get(name)
+                if entry is not None:
+                    entry.read_count = int(reads or 0)
+                    entry.write_count = int(writes or 0)
+                    entry.read_time_sec = float(read_time or 0)
+                    entry.write_time_sec = float(write_time or 0)
+            # performance_schema is enabled but the table has not been touched yet
+            if io_rows:
+                for entry in stats.values():
+                    if entry.read_count is None:
+                        entry.read_count = entry.write_count = 0
+            return stats
+        finally:
+            cursor.close()
+            conn.close()
+
+    def snapshot(self, database: str, tables: Optional[List[str]] = None, force: bool = True) -> Snapshot:
+        """
+        Collect and record a snapshot (partial snapshots are returned, not
+        stored). Without `force` it is only stored once `interval_seconds`
+        have passed since the last stored one, so ad-hoc calls don't evict
+        the scheduled snapshots from the ring.
+        """
+        snap = (self.clock(), self.collect(database, tables))
+        if not tables:
+            with self._lock:
+                series = self.snapshots.setdefault(database, deque(maxlen=self.max_snapshots))
+                if force or not series or snap[0] - series[-1][0] >= self.interval_seconds:
+                    series.append(snap)
+        return snap
+
+    def run_once(self) -> None:
+        """Scheduler job: one snapshot per configured database"""
+        for database in self.databases:
+            try:
+                self.snapshot(database)
+            except Exception as e:
+                db_error = ErrorFactory.database_error(
+                    f"Failed to snapshot table statistics for {database}",
+                    original_error=e
+                )
+                logger.warning(str(db_error))
+
+    # ------------------------------------------------------------------
+    # Deltas
+    # ------------------------------------------------------------------
+
+    def _baseline(self, database: str, now: float, window_hours: Optional[float]) -> Optional[Snapshot]:
+        """Oldest stored snapshot inside the window, at least MIN_DELTA_SECONDS old"""
+        with self._lock:
+            series = list(self.snapshots.get(database, ()))
+        oldest_allowed = now - window_hours * 3600 if window_hours else float("-inf")
+        for taken_at, stats in series:
+            if oldest_allowed <= taken_at <= now - MIN_DELTA_SECONDS:
+                return taken_at, stats
+        return None
+
+    @staticmethod
+    def _table_metrics(current: TableStats, base: Optional[TableStats], elapsed: Optional[float]) -> Dict[str, Any]:
+        reads, writes = current.read_count, current.write_count
+        basis, growth_rate, window_days = "cumulative", None, None
+        if base is not None and elapsed:
+            window_days = elapsed / SECONDS_PER_DAY
+            counters_reset = (reads is not None and base.read_count is not None
+                              and (reads < base.read_count or writes < base.write_count))
+            if reads is not None and base.read_count is not None and not counters_reset:
+                reads, writes = reads - base.read_count, writes - base.write_count
+                basis = "delta"
+            elif counters_reset:
+                basis = "since_reset"
+            if base.size_bytes > 0:
+                # Fraction of the table size added per 30 days
+                growth_rate = (current.size_bytes - base.size_bytes) / base.size_bytes / window_days * 30
+
+        total = None if reads is None else reads + writes
+        per_day = None
+        if total is not None and basis == "delta":
+            per_day = total / window_days
+        elif total is not None:
+            # Cumulative counters: same scale as before (counts, not rates)
+            per_day = total
+
+        return {
+            'read_count': reads or 0,
+            'write_count': writes or 0,
+            'total_access': total or 0,
+            'total_read_time_sec': round(current.read_time_sec, 2),
+            'total_write_time_sec': round(current.write_time_sec, 2),
+            'accesses_per_day': round(per_day, 2) if per_day is not None and basis == "delta" else None,
+            'access_frequency': access_frequency(per_day),
+            'basis': basis,
+            'window_days': round(window_days, 3) if window_days is not None else None,
+            'growth_rate': round(growth_rate, 4) if growth_rate is not None else None,
+        }
+
+    def analyze(self, database: str, tables: Optional[List[str]] = None,
+                window_hours: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Current size/rows plus access and growth metrics per table, from the
+        delta against the oldest snapshot within `window_hours` (all stored
+        snapshots by default)
+        """
+        now, current = self.snapshot(database, tables, force=False)
+        baseline = self._baseline(database, now, window_hours)
+        base_stats, elapsed = ({}, None) if baseline is None else (baseline[1], now - baseline[0])
+
+        result = {}
+        for name, stats in current.items():
+            metrics = self._table_metrics(stats, base_stats.get(name), elapsed)
+            metrics.update({
+                'table': name,
+                'size_bytes': stats.size_bytes,
+                'size_gb': round(stats.size_bytes / 1024 ** 3, 2),
+                'rows': stats.rows,
+                'create_time': stats.create_time,
+                'update_time': stats.update_time,
+            })
+            result[name] = metrics
+        return result
+
+
+_table_stats_instance: Optional[TableStatsCollector] = None
+
+
+def get_table_stats() -> TableStatsCollector:
+    """Get or create the global collector (configured from the environment)"""
+    global _table_stats_instance
+    if _table_stats_instance is None:
+        databases = [d.strip() for d in os.getenv("TABLE_STATS_DATABASES", "shop_demo").split(",") if d.strip()]
+        _table_stats_instance = TableStatsCollector(
+            max_snapshots=int(os.getenv("TABLE_STATS_MAX_SNAPSHOTS", "168")),
+            interval_seconds=int(os.getenv("TABLE_STATS_INTERVAL", "3600")),
+            databases=databases
+        )
+    return _table_stats_instance
@@ -0,0 +1,193 @@
+"""
+Bounded log of MCP tool calls
+
+MCPService kept its dashboard feed in a list trimmed with pop(0) and
+stored the raw arguments, which for query_database can be large SQL.
+ToolCallLog instead:
+
+- keeps the last `capacity` calls in a preallocated ring of __slots__
+  records (one slot overwritten per call, no list shifting),
+- stores argument previews (long strings cut to ARGUMENT_PREVIEW_CHARS),
+- records duration, result size, status and error class of every call,
+- aggregates per-tool counters and a fixed-bucket latency histogram over
+  all calls since start, not just the ones still in the ring, so
+  /mcp/stats shows which tools agents call most and how slow they are.
+"""
+
+import time
+import threading
+from bisect import bisect_left
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+DEFAULT_CAPACITY = 200
+ARGUMENT_PREVIEW_CHARS = 200
+
+# Histogram upper bounds in ms; the last bucket counts everything slower
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+def preview_arguments(args: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Tool arguments with long strings cut, safe to keep in memory"""
+    preview = {}
+    for key, value in (args or {}).items():
+        if value is None or isinstance(value, (bool, int, float)):
+            preview[key] = value
+            continue
+        text = value if isinstance(value, str) else repr(value)
+        if len(text) > ARGUMENT_PREVIEW_CHARS:
+            text = f"{text[:ARGUMENT_PREVIEW_CHARS]}... ({len(text)} chars)"
+        preview[key] = text
+    return preview
+
+
+class ToolCallRecord:
+    __slots__ = ("timestamp", "tool", "arguments", "status", "detail", "duration_ms",
+                 "result_bytes", "error_class", "cached")
+
+    def __init__(self, tool: str, arguments: Dict[str, Any], status: str, detail: str,
+                 duration_ms: Optional[float], result_bytes: Optional[int],
+                 error_class: Optional[str], cached: bool):
+        self.timestamp = time.time()
+        self.tool = tool
+        self.arguments = arguments
+        self.status = status
+        self.detail = detail
+        self.duration_ms = duration_ms
+        self.result_bytes = result_bytes
+        self.error_class = error_class
+        self.cached = cached
+
+    def to_dict(self) -> Dict[str, Any]:
+        moment = datetime.fromtimestamp(self.timestamp)
+        return {
+            "time": moment.strftime("%H:%M:%S"),
+            "timestamp": moment.isoformat(),
+            "tool": self.tool,
+            "arguments": self.arguments,
+            "status": self.status,
+            "detail": self.detail,
+            "duration_ms": round(self.duration_ms, 2) if self.duration_ms is not None else None,
+            "result_bytes": self.result_bytes,
+            "error_class": self.error_class,
+            "cached": self.cached,
+        }
+
+
+class ToolStats:
+    __slots__ = ("calls", "errors", "timeouts", "cache_hits", "timed_calls", "total_ms", "max_ms",
+                 "result_bytes", "buckets", "error_classes")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.cache_hits = 0
+        self.timed_calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.result_bytes = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.error_classes: Dict[str, int] = {}
+
+    def add(self, record: ToolCallRecord) -> None:
+        self.calls += 1
+        if record.status == "timeout":
+            self.timeouts += 1
+        elif record.status != "success":
+            self.errors += 1
+        if record.cached:
+            self.cache_hits += 1
+        if record.error_class:
+            self.error_classes[record.error_class] = self.error_classes.get(record.error_class, 0) + 1
+        if record.result_bytes:
+            self.result_bytes += record.result_bytes
+        if record.duration_ms is not None:
+            self.timed_calls += 1
+            self.total_ms += record.duration_ms
+            self.max_ms = max(self.max_ms, record.duration_ms)
+            self.buckets[bisect_left(LATENCY_BUCKETS_MS, record.duration_ms)] += 1
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Upper bound of the histogram bucket holding the pct-th timed call (max_ms beyond the last bound)"""
+        if not self.timed_calls:
+            return None
+        rank = max(1, int(round(pct / 100 * self.timed_calls)))
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return float(LATENCY_BUCKETS_MS[index]) if index < len(LATENCY_BUCKETS_MS) else round(self.max_ms, 2)
+        return round(self.max_ms, 2)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "cache_hits": self.cache_hits,
+            "avg_ms": round(self.total_ms / self.timed_calls, 2) if self.timed_calls else None,
+            "max_ms": round(self.max_ms, 2),
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "avg_result_bytes": round(self.result_bytes / self.calls) if self.calls else 0,
+            "error_classes": dict(self.error_classes),
+            "latency_histogram": self.buckets[:],
+        }
+
+
+class ToolCallLog:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = max(1, capacity)
+        self._records: List[Optional[ToolCallRecord]] = [None] * self.capacity
+        self._next = 0
+        self.total_calls = 0
+        self._stats: Dict[str, ToolStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, tool: str, args: Optional[Dict[str, Any]], status: str, detail: str = "",
+               duration_ms: Optional[float] = None, result_bytes: Optional[int] = None,
+               error_class: Optional[str] = None, cached: bool = False) -> ToolCallRecord:
+        record = ToolCallRecord(tool, preview_arguments(args), status, detail or f"Executed {tool}",
+                                duration_ms, result_bytes, error_class, cached)
+        with self._lock:
+            self._records[self._next] = record
+            self._next = (self._next + 1) % self.capacity
+            self.total_calls += 1
+            stats = self._stats.get(tool)
+            if stats is None:
+                stats = self._stats[tool] = ToolStats()
+            stats.add(record)
+        return record
+
+    def recent(self, limit: Optional[int] = None) -> List[ToolCallRecord]:
+        """Records still in the ring, oldest first (the last `limit` when given)"""
+        with self._lock:
+            ordered = self._records[self._next:] + self._records[:self._next]
+        records = [r for r in ordered if r is not None]
+        if limit is not None:
+            records = records[-limit:] if limit > 0 else []
+        return records
+
+    def history(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        return [r.to_dict() for r in self.recent(limit)]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tools = {name: stats.to_dict() for name, stats in self._stats.items()}
+            total_calls = self.total_calls
+        return {
+            "total_calls": total_calls,
+            "history_capacity": self.capacity,
+            "latency_buckets_ms": list(LATENCY_BUCKETS_MS),
+            # Most called first
+            "tools": dict(sorted(tools.items(), key=lambda item: item[1]["calls"], reverse=True)),
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records = [None] * self.capacity
+            self._next = 0
+            self.total_calls = 0
+            self._stats.clear()
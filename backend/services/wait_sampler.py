@@ -0,0 +1,383 @@
+"""
+Periodic performance_schema sampling for wait-event analysis
+
+/wait-events/analyze read events_waits_summary_global_by_event_name,
+whose counters accumulate from server start, so its top-10 reflected the
+server's whole history rather than what is slow right now.
+WaitEventSampler instead:
+
+- snapshots three summary tables every WAIT_SAMPLER_INTERVAL seconds:
+  wait events, statement digests (top `digest_limit` by total latency)
+  and table IO waits. Each is one set-based query that skips rows with
+  no activity, on a pooled connection,
+- keeps the last `capacity` snapshots in a fixed ring. Each series
+  interns its keys (event name, schema:digest, schema.table) once and
+  stores a snapshot as two typed arrays indexed by key number (counts as
+  int64, timer sums as float64 ms), not as dicts of dicts,
+- drops keys no stored snapshot references anymore (e.g. digests that
+  left the top `digest_limit`) once the ring has overwritten them, so
+  the key tables don't grow with every digest ever seen,
+- computes deltas and per-second rates between any two snapshots, for a
+  time window or for each consecutive interval. Counters that went
+  backwards (server restart, TRUNCATE of a summary table) count from
+  zero instead of producing negative deltas. A key missing from the
+  baseline only counts from zero when the baseline was complete (every
+  active row read): a digest entering the top `digest_limit` has been
+  counting since server start, so its lifetime totals are not the
+  window's and it is left out.
+"""
+
+import os
+import time
+import logging
+import threading
+from array import array
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from database import get_pooled_connection
+from error_factory import ErrorFactory
+
+logger = logging.getLogger("uvicorn")
+
+# Absent from a snapshot (e.g. a digest outside the top `digest_limit`): baseline unknown
+MISSING = -1
+
+WAITS_QUERY = """
+    SELECT EVENT_NAME, COUNT_STAR, SUM_TIMER_WAIT / 1000000000
+    FROM performance_schema.events_waits_summary_global_by_event_name
+    WHERE COUNT_STAR > 0
+      AND (EVENT_NAME LIKE 'wait/io/%' OR EVENT_NAME LIKE 'wait/lock/%' OR EVENT_NAME LIKE 'wait/synch/%')
+"""
+
+STATEMENTS_QUERY = """
+    SELECT CONCAT(COALESCE(SCHEMA_NAME, ''), ':', DIGEST), LEFT(DIGEST_TEXT, 200),
+           COUNT_STAR, SUM_TIMER_WAIT / 1000000000
+    FROM performance_schema.events_statements_summary_by_digest
+    WHERE COUNT_STAR > 0
+    ORDER BY SUM_TIMER_WAIT DESC
+    LIMIT %s
+"""
+
+TABLE_IO_QUERY = """
+    SELECT CONCAT(OBJECT_SCHEMA, '.', OBJECT_NAME), COUNT_STAR, SUM_TIMER_WAIT / 1000000000
+    FROM performance_schema.table_io_waits_summary_by_table
+    WHERE COUNT_STAR > 0
+      AND OBJECT_SCHEMA NOT IN ('mysql', 'performance_schema', 'information_schema', 'sys')
+"""
+
+SERIES = ("waits", "statements", "table_io")
+
+
+class CounterSeries:
+    """One summary table: interned keys and, per ring slot, count / timer arrays"""
+
+    def __init__(self, capacity: int):
+        self.index: Dict[str, int] = {}
+        self.keys: List[str] = []
+        self.labels: Dict[int, str] = {}
+        self.last_seen = array('q')  # per key: sequence number of the last snapshot holding it
+        self.counts: List[Optional[array]] = [None] * capacity
+        self.timers: List[Optional[array]] = [None] * capacity
+        # Per slot: every row with activity was read (no LIMIT cut, no read error)
+        self.complete: List[bool] = [False] * capacity
+
+    def store(self, slot: int, rows: Iterable[Tuple[str, Optional[str], int, float]], sequence: int,
+              complete: bool = True) -> None:
+        """rows: (key, label or None, count, timer_ms)"""
+        values = []
+        last_seen = self.last_seen
+        for key, label, count, timer_ms in rows:
+            position = self.index.get(key)
+            if position is None:
+                position = self.index[key] = len(self.keys)
+                self.keys.append(key)
+                last_seen.append(sequence)
+                if label:
+                    self.labels[position] = label
+            else:
+                last_seen[position] = sequence
+            values.append((position, count, timer_ms))
+        counts = array('q', [MISSING]) * len(self.keys)
+        timers = array('d', [0.0]) * len(self.keys)
+        for position, count, timer_ms in values:
+            counts[position] = count
+            timers[position] = timer_ms
+        self.counts[slot] = counts
+        self.timers[slot] = timers
+        self.complete[slot] = complete
+
+    def expire(self, oldest_sequence: int, slots: List[int]) -> int:
+        """
+        Drop keys last seen before the oldest stored snapshot and renumber
+        the rest in every stored slot; returns the number dropped. Only
+        compacts once a quarter of the keys are stale, so the arrays are
+        not rebuilt on every sample.
+        """
+        stale = sum(1 for seen in self.last_seen if seen < oldest_sequence)
+        if not stale or stale * 4 < len(self.keys):
+            return 0
+        kept = [position for position, seen in enumerate(self.last_seen) if seen >= oldest_sequence]
+        for slot in slots:
+            # Keys are numbered by first appearance, so the kept keys a slot
+            # knew about are still a prefix of the new numbering
+            counts, timers = self.counts[slot], self.timers[slot]
+            known = [position for position in kept if position < len(counts)]
+            self.counts[slot] = array('q', [counts[position] for position in known])
+            self.timers[slot] = array('d', [timers[position] for position in known])
+        self.keys = [self.keys[position] for position in kept]
+        self.index = {key: position for position, key in enumerate(self.keys)}
+        self.labels = {new: self.labels[old] for new, old in enumerate(kept) if old in self.labels}
+        self.last_seen = array('q', [self.last_seen[position] for position in kept])
+        return stale
+
+    def delta(self, base_slot: int, slot: int) -> List[Tuple[int, int, float]]:
+        """
+        (key number, count delta, timer delta ms) of keys active between the
+        two snapshots. Keys absent from the baseline count from zero only if
+        the baseline is complete; otherwise their baseline is unknown.
+        """
+        counts, timers = self.counts[slot], self.timers[slot]
+        base_counts, base_timers = self.counts[base_slot], self.timers[base_slot]
+        base_complete = self.complete[base_slot]
+        deltas = []
+        for position, (count, base, timer_ms, base_ms) in enumerate(zip(counts, base_counts, timers, base_timers)):
+            if count == base or count == MISSING:
+                continue
+            if base == MISSING:
+                if not base_complete:
+                    continue
+                base, base_ms = 0, 0.0
+            delta_count, delta_ms = count - base, timer_ms - base_ms
+            if delta_count < 0 or delta_ms < 0:
+                # Counters reset since the baseline
+                delta_count, delta_ms = count, timer_ms
+            if delta_count > 0:
+                deltas.append((position, delta_count, delta_ms))
+        # Keys first seen after the baseline
+        if base_complete:
+            for position in range(len(base_counts), len(counts)):
+                if counts[position] > 0:
+                    deltas.append((position, counts[position], timers[position]))
+        return deltas
+
+
+class WaitEventSampler:
+    def __init__(self, connection_factory: Callable = get_pooled_connection,
+                 capacity: int = 360, interval_seconds: int = 10, digest_limit: int = 200,
+                 clock: Callable[[], float] = time.time):
+        self.connection_factory = connection_factory
+        self.capacity = max(2, capacity)
+        self.interval_seconds = interval_seconds
+        self.digest_limit = digest_limit
+        self.clock = clock
+        self.is_running = False
+
+        self.times = array('d', [0.0]) * self.capacity
+        self.series = {name: CounterSeries(self.capacity) for name in SERIES}
+        self.size = 0
+        self._next = 0
+        self._lock = threading.Lock()
+        self._unavailable: Dict[str, str] = {}
+        self.samples_taken = 0
+        self.keys_expired = 0
+        self.last_sample_ms: Optional[float] = None
+
+    # ------------------------------------------------------------------
+    # Sampling
+    # ------------------------------------------------------------------
+
+    def _read(self, cursor, name: str, sql: str, params: Optional[tuple] = None) -> List[tuple]:
+        try:
+            if params:
+                cursor.execute(sql, params)
+            else:
+                cursor.execute(sql)
+            rows = cursor.fetchall()
+            self._unavailable.pop(name, None)
+            return rows
+        except Exception as e:
+            # Consumer disabled or table missing: keep sampling the others, warn once
+            if name not in self._unavailable:
+                logger.warning(f"[WaitSampler] {name} summary unavailable: {e}")
+            self._unavailable[name] = str(e)
+            return []
+
+    def collect(self) -> Dict[str, List[Tuple[str, Optional[str], int, float]]]:
+        conn = self.connection_factory()
+        cursor = conn.cursor()
+        try:
+            waits = self._read(cursor, "waits", WAITS_QUERY)
+            statements = self._read(cursor, "statements", STATEMENTS_QUERY, (self.digest_limit,))
+            table_io = self._read(cursor, "table_io", TABLE_IO_QUERY)
+        finally:
+            cursor.close()
+            conn.close()
+        return {
+            "waits": [(r[0], None, int(r[1] or 0), float(r[2] or 0)) for r in waits],
+            "statements": [(r[0], r[1], int(r[2] or 0), float(r[3] or 0)) for r in statements],
+            "table_io": [(r[0], None, int(r[1] or 0), float(r[2] or 0)) for r in table_io],
+        }
+
+    def sample(self) -> float:
+        """Take and store one snapshot; returns its timestamp"""
+        started = time.perf_counter()
+        rows = self.collect()
+        taken_at = self.clock()
+        with self._lock:
+            slot = self._next
+            sequence = self.samples_taken
+            self.times[slot] = taken_at
+            for name, series in self.series.items():
+                # A full top-`digest_limit` list may have left out digests that are active
+                complete = name not in self._unavailable and (
+                    name != "statements" or len(rows[name]) < self.digest_limit)
+                series.store(slot, rows[name], sequence, complete)
+            self._next = (slot + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+            self.samples_taken += 1
+            # Snapshot sequence numbers still in the ring start here
+            oldest = self.samples_taken - self.size
+            slots = self._slots()
+            for series in self.series.values():
+                self.keys_expired += series.expire(oldest, slots)
+        self.last_sample_ms = round((time.perf_counter() - started) * 1000, 2)
+        return taken_at
+
+    def run_once(self) -> None:
+        """Scheduler job"""
+        try:
+            self.sample()
+        except Exception as e:
+            db_error = ErrorFactory.database_error(
+                "Failed to sample performance_schema wait events",
+                original_error=e
+            )
+            logger.warning(str(db_error))
+
+    # ------------------------------------------------------------------
+    # Deltas
+    # ------------------------------------------------------------------
+
+    def _slots(self) -> List[int]:
+        """Stored slots, oldest first"""
+        start = (self._next - self.size) % self.capacity
+        return [(start + i) % self.capacity for i in range(self.size)]
+
+    def _rows(self, name: str, deltas: List[Tuple[int, int, float]], elapsed: float,
+              top: Optional[int]) -> List[Dict[str, Any]]:
+        series = self.series[name]
+        total_ms = sum(d[2] for d in deltas)
+        deltas = sorted(deltas, key=lambda d: d[2], reverse=True)
+        if top is not None:
+            deltas = deltas[:top]
+        rows = []
+        for position, count, wait_ms in deltas:
+            row = {
+                "key": series.keys[position],
+                "count": count,
+                "total_wait_ms": round(wait_ms, 2),
+                "avg_wait_ms": round(wait_ms / count, 3),
+                "per_sec": round(count / elapsed, 2),
+                "wait_ms_per_sec": round(wait_ms / elapsed, 2),
+                "percentage": round(wait_ms / total_ms * 100, 1) if total_ms > 0 else 0.0,
+            }
+            if position in series.labels:
+                row["text"] = series.labels[position]
+            rows.append(row)
+        return rows
+
+    def analyze(self, window_seconds: float, top: int = 10, refresh_after: Optional[float] = None
+                ) -> Optional[Dict[str, Any]]:
+        """
+        Deltas between the latest snapshot and the oldest one at most
+        `window_seconds` older, plus per-interval totals over that window.
+        A fresh snapshot is taken first when the latest is older than
+        `refresh_after` seconds (the sampling interval by default).
+        None when the window holds fewer than two snapshots.
+        """
+        refresh_after = self.interval_seconds if refresh_after is None else refresh_after
+        with self._lock:
+            latest = self.times[(self._next - 1) % self.capacity] if self.size else None
+        if latest is None or self.clock() - latest >= refresh_after:
+            self.sample()
+
+        with self._lock:
+            slots = self._slots()
+            end = slots[-1]
+            in_window = [s for s in slots if self.times[end] - self.times[s] <= window_seconds]
+            if len(in_window) < 2:
+                return None
+            start = in_window[0]
+            elapsed = self.times[end] - self.times[start]
+            result = {
+                "window": {
+                    "requested_seconds": window_seconds,
+                    "start": self.times[start],
+                    "end": self.times[end],
+                    "elapsed_seconds": round(elapsed, 3),
+                    "snapshots": len(in_window),
+                },
+            }
+            totals = {}
+            for name in SERIES:
+                deltas = self.series[name].delta(start, end)
+                result[name] = self._rows(name, deltas, elapsed, top)
+                totals[name] = {
+                    "keys": len(deltas),
+                    "count": sum(d[1] for d in deltas),
+                    "wait_ms": round(sum(d[2] for d in deltas), 2),
+                }
+            result["totals"] = totals
+
+            waits = self.series["waits"]
+            timeline = []
+            for base, slot in zip(in_window, in_window[1:]):
+                interval = self.times[slot] - self.times[base]
+                deltas = waits.delta(base, slot)
+                wait_ms = sum(d[2] for d in deltas)
+                top_wait = max(deltas, key=lambda d: d[2]) if deltas else None
+                timeline.append({
+                    "start": self.times[base],
+                    "end": self.times[slot],
+                    "waits": sum(d[1] for d in deltas),
+                    "wait_ms": round(wait_ms, 2),
+                    "wait_ms_per_sec": round(wait_ms / interval, 2) if interval > 0 else None,
+                    "top_event": waits.keys[top_wait[0]] if top_wait else None,
+                })
+            result["timeline"] = timeline
+        return result
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            slots = self._slots()
+            oldest = self.times[slots[0]] if slots else None
+            newest = self.times[slots[-1]] if slots else None
+            keys = {name: len(series.keys) for name, series in self.series.items()}
+        return {
+            "is_running": self.is_running,
+            "interval_seconds": self.interval_seconds,
+            "capacity": self.capacity,
+            "snapshots": len(slots),
+            "oldest": oldest,
+            "newest": newest,
+            "samples_taken": self.samples_taken,
+            "last_sample_ms": self.last_sample_ms,
+            "tracked_keys": keys,
+            "keys_expired": self.keys_expired,
+            "unavailable": dict(self._unavailable),
+        }
+
+
+_wait_sampler_instance: Optional[WaitEventSampler] = None
+
+
+def get_wait_sampler() -> WaitEventSampler:
+    """Get or create the global sampler (configured from the environment)"""
+    global _wait_sampler_instance
+    if _wait_sampler_instance is None:
+        _wait_sampler_instance = WaitEventSampler(
+            capacity=int(os.getenv("WAIT_SAMPLER_SNAPSHOTS", "360")),
+            interval_seconds=int(os.getenv("WAIT_SAMPLER_INTERVAL", "10")),
+            digest_limit=int(os.getenv("WAIT_SAMPLER_DIGESTS", "200"))
+        )
+    return _wait_sampler_instance
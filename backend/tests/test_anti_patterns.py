@@ -0,0 +1,70 @@
+import sys
+import os
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.anti_patterns import analyze, get_features
+from routers.blast_radius import detect_affected_tables, estimate_lock_duration
+from routers.cost_attribution import estimate_io_requests
+
+
+def rule_ids(sql):
+    return [f.rule_id for f in analyze(sql)[1]]
+
+
+def test_findings_are_ordered_by_severity():
+    findings = analyze("SELECT * FROM orders ORDER BY created_at")[1]
+    assert findings[0].rule_id == "select_star_no_where"
+    assert findings[0].severity == "HIGH"
+    assert findings[0].suggested_fix
+    assert [f.severity for f in findings] == sorted(
+        (f.severity for f in findings), key=lambda s: {"HIGH": 0, "MEDIUM": 1, "LOW": 2}[s]
+    )
+
+
+def test_multiline_in_subquery_and_not_in():
+    sql = """
+    SELECT id FROM orders
+    WHERE customer_id IN (
+        SELECT id FROM customers WHERE status = 'active'
+    )
+    """
+    assert "in_subquery" in rule_ids(sql)
+    assert "not_in_subquery" not in rule_ids(sql)
+
+    ids = rule_ids("SELECT id FROM a WHERE x NOT IN (SELECT x FROM b)")
+    assert "not_in_subquery" in ids
+    assert "in_subquery" not in ids
+
+
+def test_strings_and_comments_do_not_trigger_rules():
+    sql = "SELECT id FROM notes WHERE body = 'SELECT * FROM x WHERE a IN (SELECT 1)' -- SLEEP(10)"
+    assert rule_ids(sql) == []
+
+
+def test_plain_column_list_is_not_a_cartesian_product():
+    # The old substring check flagged any ", " without WHERE
+    assert "cartesian_product" not in rule_ids("SELECT id, name FROM customers LIMIT 10")
+    assert "cartesian_product" in rule_ids("SELECT a.id, b.id FROM a, b")
+    assert "cartesian_product" in rule_ids("SELECT a.id FROM a CROSS JOIN b")
+
+
+def test_select_list_subquery_and_or_chain():
+    assert "select_list_subquery" in rule_ids(
+        "SELECT c.id, (SELECT COUNT(*) FROM orders o WHERE o.cid = c.id) FROM customers c WHERE c.id = 1"
+    )
+    assert "multiple_or" in rule_ids("SELECT id FROM t WHERE a = 1 OR b = 2 OR c = 3")
+    assert "leading_wildcard_like" in rule_ids("SELECT id FROM t WHERE name LIKE '%son'")
+
+
+def test_features_used_by_blast_radius_and_cost():
+    assert detect_affected_tables("UPDATE shop.orders o JOIN `customers` c ON c.id = o.cid SET o.x = 1") == [
+        "shop.orders", "customers"
+    ]
+    assert detect_affected_tables("SELECT * FROM a, b WHERE a.id = b.id") == ["a", "b"]
+    assert estimate_lock_duration("select id from t where id = 1 for update") == 50.0
+    assert estimate_lock_duration("DELETE FROM t", table_size_estimate=1000) == 2.0
+    assert get_features("ALTER TABLE t ADD COLUMN c INT").alter_table
+    assert estimate_io_requests("SELECT * FROM t WHERE id IN (\nSELECT id FROM u)") == 5000
+    assert estimate_io_requests("SELECT id FROM t WHERE id = 1") == 100
@@ -0,0 +1,184 @@
+import csv
+import gzip
+import os
+import sys
+import zlib
+import threading
+from datetime import datetime, timedelta
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.archive_export import ArchiveExporter, LocalTarget, CSV_GZIP
+
+CUTOFF = datetime(2024, 1, 1)
+
+
+def row_crc(i, ts, note):
+    return zlib.crc32(f"{i}#{ts}#{note}".encode())
+
+
+class FakeServer:
+    """orders(id, updated_at, note); every connection sees the live rows"""
+
+    def __init__(self, rows):
+        self.orders = rows
+        self.lock = threading.Lock()
+        self.connections = 0
+
+    def connect(self, database=None):
+        with self.lock:
+            self.connections += 1
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, server):
+        self.server = server
+
+    def cursor(self, buffered=True):
+        return FakeCursor(self.server, buffered)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, server, buffered):
+        self.server = server
+        self.buffered = buffered
+        self.rows = []
+        self.description = None
+
+    def _match(self, sql, params):
+        cutoff, *bounds = params
+        ids = [i for i, (ts, _) in self.server.orders.items() if ts < cutoff]
+        if bounds:
+            low, high = bounds
+            inclusive = "`id` <= %s" in sql
+            ids = [i for i in ids if low <= i and (i <= high if inclusive else i < high)]
+        return sorted(ids)
+
+    def execute(self, sql, params=()):
+        sql = " ".join(sql.split())
+        orders = self.server.orders
+        self.rows, self.description = [], None
+        if "INFORMATION_SCHEMA.STATISTICS" in sql:
+            self.rows = [("id",)]
+        elif "INFORMATION_SCHEMA.COLUMNS" in sql:
+            self.rows = [("id",), ("updated_at",), ("note",)]
+        elif sql.startswith("SELECT MIN("):
+            ids = [i for i, (ts, _) in orders.items() if ts < params[0]]
+            self.rows = [(min(ids), max(ids)) if ids else (None, None)]
+        elif sql.startswith("SELECT COUNT(*)"):
+            ids = self._match(sql, params)
+            crc = 0
+            for i in ids:
+                crc ^= row_crc(i, *orders[i])
+            self.rows = [(len(ids), crc)]
+        elif sql.startswith("SELECT `id`, `updated_at`, `note`, CRC32("):
+            assert not self.buffered
+            self.rows = [(i, orders[i][0], orders[i][1], row_crc(i, *orders[i])) for i in self._match(sql, params)]
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def close(self):
+        pass
+
+
+def make_rows():
+    # 300 rows over 6 days before the cutoff, 100 after it
+    rows = {}
+    for i in range(1, 401):
+        ts = CUTOFF - timedelta(days=6) + timedelta(hours=(i - 1) * 0.48) if i <= 300 else CUTOFF + timedelta(days=1)
+        rows[i] = (ts, None if i % 7 == 0 else f"order {i}")
+    return rows
+
+
+def read_partition_files(root):
+    rows = []
+    for dirpath, _, files in os.walk(os.path.join(root, "orders")):
+        for name in files:
+            if name.endswith(".csv.gz"):
+                with gzip.open(os.path.join(dirpath, name), "rt", newline="") as f:
+                    reader = csv.reader(f)
+                    assert next(reader) == ["id", "updated_at", "note"]
+                    for row in reader:
+                        assert os.path.basename(dirpath) == "dt=" + row[1][:10]
+                        rows.append(row)
+    return rows
+
+
+def test_split_ranges():
+    ranges = ArchiveExporter.split_ranges((1, 100), 4)
+    assert ranges == [(1, 26), (26, 51), (51, 76), (76, 100)]
+    assert ArchiveExporter.split_ranges((1, 2), 4) == [(1, 2)]
+    assert ArchiveExporter.split_ranges(("a", "z"), 4) == [(None, None)]
+    assert ArchiveExporter.split_ranges(None, 4) == []
+
+
+def test_parallel_export_is_partitioned_and_verified(tmp_path):
+    server = FakeServer(make_rows())
+    exporter = ArchiveExporter(connection_factory=server.connect)
+    target = LocalTarget(str(tmp_path))
+    manifest = exporter.export("shop_demo", "orders", date_column="updated_at", fmt=CSV_GZIP,
+                               target=target, parallelism=3, cutoff=CUTOFF, chunk_rows=10)
+
+    assert manifest["rows_exported"] == 300
+    assert len(manifest["ranges"]) == 12
+    assert manifest["last_pk"] == [300]
+    assert manifest["columns"] == ["id", "updated_at", "note"]
+    # Per-chunk checksums for the delete job add up to each range's checksum
+    for entry in manifest["ranges"]:
+        assert sum(c["rows"] for c in entry["chunks"]) == entry["rows"]
+        crc = 0
+        for c in entry["chunks"]:
+            crc ^= c["crc"]
+        assert crc == entry["crc"]
+    chunks = [c for entry in manifest["ranges"] for c in entry["chunks"]]
+    assert [(c["rows"], c["last_pk"]) for c in chunks[:4]] == [(10, [10]), (10, [20]), (5, [25]), (10, [35])]
+    assert sum(f["rows"] for f in manifest["files"]) == 300
+    assert {f["dt"] for f in manifest["files"]} == {(CUTOFF - timedelta(days=d)).strftime("%Y-%m-%d") for d in range(1, 7)}
+    assert os.path.exists(os.path.join(str(tmp_path), "orders", "_manifests", manifest["export_id"] + ".json"))
+
+    rows = read_partition_files(str(tmp_path))
+    assert sorted(int(r[0]) for r in rows) == list(range(1, 301))
+    assert [r[2] for r in rows if int(r[0]) == 7] == ["\\N"]
+
+    assert exporter.verify(manifest, target)["verified"]
+
+
+def test_verify_detects_changed_rows_and_files(tmp_path):
+    server = FakeServer(make_rows())
+    exporter = ArchiveExporter(connection_factory=server.connect)
+    target = LocalTarget(str(tmp_path))
+    manifest = exporter.export("shop_demo", "orders", fmt=CSV_GZIP, target=target, parallelism=2, cutoff=CUTOFF)
+
+    # A row touched after the export moves past the cutoff: its range no longer matches
+    server.orders[5] = (CUTOFF + timedelta(days=2), "updated")
+    result = exporter.verify(manifest, target)
+    assert not result["verified"]
+    assert [m["index"] for m in result["range_mismatches"]] == [0]
+    assert result["file_mismatches"] == []
+
+    # Any column counts, also when the date column stays the same
+    server.orders[5] = make_rows()[5]
+    assert exporter.verify(manifest, target)["verified"]
+    server.orders[50] = (server.orders[50][0], "edited")
+    assert [m["index"] for m in exporter.verify(manifest, target)["range_mismatches"]] == [1]
+
+    with open(target._path(manifest["files"][0]["key"]), "ab") as f:
+        f.write(b"garbage")
+    assert exporter.verify(manifest, target)["file_mismatches"] == [manifest["files"][0]["key"]]
@@ -0,0 +1,135 @@
+import pytest
+import sys
+import os
+import asyncio
+from unittest.mock import MagicMock
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import ValidationError
+
+from models import BatchAnalysisRequest, MAX_BATCH_STATEMENTS
+from services.batch import BatchAnalysisService
+from services.prediction import PredictionService
+
+
+STATEMENTS = [
+    "SELECT * FROM orders WHERE id = 1",
+    "SELECT * FROM orders WHERE id = 2",
+    "SELECT * FROM customers",
+    "",
+    "SELECT * FROM orders WHERE id = 3",
+]
+
+
+def make_service():
+    embedding = MagicMock()
+    embedding.get_embeddings_batch.side_effect = lambda texts: [[0.1] * 4 for _ in texts]
+    vector_store = MagicMock()
+    vector_store.search_similar_batch.side_effect = lambda embeddings, **kw: [
+        [{"source_id": "MDEV-1", "content": "Full scan on orders", "distance": 0.2}] for _ in embeddings
+    ]
+    # Built like deps.py does: the rag_enabled flag is False in production
+    prediction = PredictionService(embedding, vector_store, False)
+    rewriter = MagicMock()
+    rewriter.rag_enabled = False
+    rewriter.build_similar_tickets.side_effect = lambda docs: (["ticket"], docs)
+    return BatchAnalysisService(embedding, vector_store, prediction, rewriter), embedding, vector_store
+
+
+def test_group_by_fingerprint_dedupes_literals():
+    service, _, _ = make_service()
+    groups = service.group_by_fingerprint(STATEMENTS)
+
+    assert len(groups) == 2
+    assert groups["SELECT * FROM orders WHERE id = ?"]["indexes"] == [0, 1, 4]
+    assert groups["SELECT * FROM customers"]["indexes"] == [2]
+
+
+@pytest.mark.asyncio
+async def test_stream_predictions_embeds_and_searches_once():
+    service, embedding, vector_store = make_service()
+
+    events = [e async for e in service.stream_predictions(STATEMENTS)]
+
+    assert events[0] == {"event": "start", "statements": 5, "unique_fingerprints": 2}
+    assert events[-1]["event"] == "done"
+    results = [e for e in events if e["event"] == "result"]
+    assert len(results) == 2
+    assert all(r["result"]["similar_issues"][0]["id"] == "MDEV-1" for r in results)
+    # One embedding batch and one bulk vector search for the whole snapshot
+    embedding.get_embeddings_batch.assert_called_once()
+    vector_store.search_similar_batch.assert_called_once()
+    embedding.get_embedding.assert_not_called()
+    vector_store.search_similar.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_stream_rewrites_bounds_concurrency():
+    service, _, _ = make_service()
+    running = 0
+    peak = 0
+
+    async def fake_rewrite(request, rag_results=None):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+        result = MagicMock()
+        result.model_dump.return_value = {"rewritten_sql": request.sql}
+        return result
+
+    service.rewriter_service.rewrite_query = fake_rewrite
+    statements = [f"SELECT * FROM t{i}" for i in range(10)]
+
+    events = [e async for e in service.stream_rewrites(statements, max_concurrency=3)]
+
+    assert len([e for e in events if e["event"] == "result"]) == 10
+    assert peak == 3
+
+
+@pytest.mark.asyncio
+async def test_stream_rewrites_passes_bulk_rag_results():
+    service, embedding, vector_store = make_service()
+    seen = []
+
+    async def fake_rewrite(request, rag_results=None):
+        seen.append(rag_results)
+        result = MagicMock()
+        result.model_dump.return_value = {"rewritten_sql": request.sql}
+        return result
+
+    service.rewriter_service.rewrite_query = fake_rewrite
+    events = [e async for e in service.stream_rewrites(STATEMENTS)]
+
+    assert len([e for e in events if e["event"] == "result"]) == 2
+    assert all(r[0] == ["ticket"] for r in seen)
+    vector_store.search_similar_batch.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_stream_predictions_without_vector_store_reports_rag_unavailable():
+    service, _, _ = make_service()
+    service.vector_store = None
+    service.prediction_service.vector_store = None
+
+    events = [e async for e in service.stream_predictions(STATEMENTS)]
+
+    results = [e for e in events if e["event"] == "result"]
+    assert len(results) == 2 and all(r["result"]["risk_level"] == "UNKNOWN" for r in results)
+
+
+@pytest.mark.asyncio
+async def test_oversized_batches_are_rejected_not_truncated():
+    statements = [f"SELECT * FROM orders WHERE id = {i}" for i in range(MAX_BATCH_STATEMENTS + 1)]
+    with pytest.raises(ValidationError):
+        BatchAnalysisRequest(statements=statements)
+    assert len(BatchAnalysisRequest(statements=statements[:-1]).statements) == MAX_BATCH_STATEMENTS
+
+    service, embedding, _ = make_service()
+    with pytest.raises(ValueError):
+        async for _ in service.stream_predictions(statements):
+            pass
+    embedding.get_embeddings_batch.assert_not_called()
@@ -0,0 +1,271 @@
+import asyncio
+import re
+import sys
+import os
+import threading
+import zlib
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from services.branch_cloner import BranchCloner, validate_filter, COMPLETED, FAILED, DONE
+import routers.database_branching as database_branching
+
+BRANCH = "shop_branch_dev"
+COLUMNS = {"customers": ("id",), "orders": ("id", "customer_id"), "items": ("id", "order_id")}
+FOREIGN_KEYS = [("orders", "fk_customer", "customer_id", "customers", "id"),
+                ("items", "fk_order", "order_id", "orders", "id")]
+
+
+class FakeServer:
+    """`shop` with customers <- orders <- items; writes are applied on commit"""
+
+    def __init__(self, fail_insert=None):
+        self.source = {
+            "customers": {i: {"id": i} for i in range(1, 51)},
+            "orders": {i: {"id": i, "customer_id": i % 50 + 1} for i in range(1, 201)},
+            "items": {i: {"id": i, "order_id": i % 200 + 1} for i in range(1, 401)},
+        }
+        self.branch = None
+        self.jobs = {}
+        self.tables = {}
+        self.inserts = []  # (table, rows) in commit order
+        self.fail_insert = fail_insert  # (table, n): the n-th chunk INSERT into that table fails
+        self.insert_counts = {}
+        self.lock = threading.Lock()
+
+    def connect(self, database=None):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, server):
+        self.server = server
+        self.pending = []
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self, dictionary)
+
+    def commit(self):
+        with self.server.lock:
+            for apply in self.pending:
+                apply()
+        self.pending = []
+
+    def rollback(self):
+        self.pending = []
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, conn, dictionary):
+        self.conn = conn
+        self.server = conn.server
+        self.dictionary = dictionary
+        self.rows = []
+        self.rowcount = 0
+
+    def _matches(self, table, row, sql, params):
+        params = list(params)
+        if "`id` > %s" in sql and row["id"] <= params.pop(0):
+            return False
+        if "`id` <= %s" in sql and row["id"] > params.pop(0):
+            return False
+        terms = []
+        sample = re.search(r"MOD\(CRC32\(CONCAT_WS\('#', `id`\)\), (\d+)\) < (\d+)", sql)
+        if sample:
+            terms.append(zlib.crc32(str(row["id"]).encode()) % int(sample.group(1)) < int(sample.group(2)))
+        limit = re.search(r"\(id <= (\d+)\)", sql)
+        if limit:
+            terms.append(row["id"] <= int(limit.group(1)))
+        for column, child_column, child in re.findall(r"\(`(\w+)`\) IN \(SELECT `(\w+)` FROM `\w+`\.`(\w+)`\)", sql):
+            terms.append(any(r[child_column] == row[column] for r in self.server.branch[child].values()))
+        return not terms or any(terms)
+
+    def execute(self, sql, params=()):
+        server, sql = self.server, " ".join(sql.split())
+        self.rows = []
+        if "information_schema.SCHEMATA" in sql:
+            self.rows = [("shop",)] if params[0] == "shop" else []
+        elif "TABLE_TYPE = 'BASE TABLE'" in sql:
+            self.rows = [(t,) for t in sorted(server.source)]
+        elif sql.startswith(("CREATE DATABASE IF NOT EXISTS `pilot", "CREATE TABLE IF NOT EXISTS `pilot",
+                             "SET SESSION", "USE ")):
+            pass
+        elif sql.startswith("DROP DATABASE"):
+            server.branch = None
+        elif sql.startswith("CREATE DATABASE"):
+            if server.branch is None:
+                server.branch = {}
+        elif sql.startswith("INSERT INTO `pilot_branching`.`clone_jobs`"):
+            job_id, source, branch, options, status = params
+            self.conn.pending.append(lambda: server.jobs.__setitem__(job_id, {
+                "job_id": job_id, "source_database": source, "branch_database": branch, "options": options,
+                "status": status, "error": None}))
+        elif sql.startswith("INSERT INTO `pilot_branching`.`clone_tables`"):
+            job_id, table, status = params
+            self.conn.pending.append(lambda: server.tables.__setitem__((job_id, table), {
+                "job_id": job_id, "table_name": table, "status": status, "last_pk": None,
+                "rows_copied": 0, "chunks": 0}))
+        elif "DATA_LENGTH + INDEX_LENGTH" in sql:
+            self.rows = [(0.42,)]
+        elif "information_schema.STATISTICS" in sql:
+            self.rows = [(t, "id") for t in sorted(params[1:])]
+        elif "TABLE_ROWS" in sql:
+            self.rows = [(t, len(server.source[t])) for t in params[1:]]
+        elif sql.startswith("SELECT MIN("):
+            table = re.search(r"FROM `shop`\.`(\w+)`", sql).group(1)
+            self.rows = [(min(server.source[table]), max(server.source[table]))]
+        elif "KEY_COLUMN_USAGE" in sql:
+            self.rows = FOREIGN_KEYS
+        elif sql.startswith("SHOW CREATE TABLE"):
+            table = re.search(r"`shop`\.`(\w+)`", sql).group(1)
+            self.rows = [(table, f"CREATE TABLE `{table}` (...)")]
+        elif sql.startswith("DROP TABLE IF EXISTS"):
+            server.branch.pop(re.search(r"\.`(\w+)`$", sql).group(1), None)
+        elif sql.startswith("CREATE TABLE `"):
+            server.branch[re.match(r"CREATE TABLE `(\w+)`", sql).group(1)] = {}
+        elif sql.startswith("SELECT `id` FROM `shop`"):
+            table = re.search(r"FROM `shop`\.`(\w+)`", sql).group(1)
+            offset = int(sql.rsplit("OFFSET", 1)[1])
+            ids = sorted(i for i in server.source[table] if not params or i > params[0])
+            self.rows = [(ids[offset],)] if offset < len(ids) else []
+        elif sql.startswith(f"INSERT INTO `{BRANCH}`"):
+            table = re.match(rf"INSERT INTO `{BRANCH}`\.`(\w+)`", sql).group(1)
+            count = server.insert_counts[table] = server.insert_counts.get(table, 0) + 1
+            if server.fail_insert == (table, count):
+                raise RuntimeError("Lost connection to server during query")
+            rows = {i: dict(r) for i, r in server.source[table].items() if self._matches(table, r, sql, params)}
+            duplicates = set(rows) & set(server.branch[table])
+            if duplicates:
+                raise RuntimeError(f"Duplicate entry {min(duplicates)} for key 'PRIMARY'")
+            self.rowcount = len(rows)
+
+            def insert():
+                server.branch[table].update(rows)
+                server.inserts.append((table, len(rows)))
+            self.conn.pending.append(insert)
+        elif sql.startswith("UPDATE `pilot_branching`.`clone_tables`"):
+            status, last_pk, copied, chunks, job_id, table = params
+
+            def checkpoint():
+                state = server.tables[(job_id, table)]
+                state.update(status=status, last_pk=last_pk, rows_copied=state["rows_copied"] + copied,
+                             chunks=state["chunks"] + chunks)
+            self.conn.pending.append(checkpoint)
+        elif sql.startswith("UPDATE `pilot_branching`.`clone_jobs`"):
+            status, error, job_id = params
+            self.conn.pending.append(lambda: server.jobs[job_id].update(status=status, error=error))
+        elif sql.startswith("SELECT * FROM `pilot_branching`.`clone_jobs`"):
+            self.rows = [dict(server.jobs[params[0]])] if params[0] in server.jobs else []
+        elif sql.startswith("SELECT * FROM `pilot_branching`.`clone_tables`"):
+            self.rows = [dict(r) for (job_id, _), r in server.tables.items() if job_id == params[0]]
+        else:
+            raise AssertionError(f"Unexpected SQL: {sql}")
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def close(self):
+        pass
+
+
+def test_full_clone_in_parallel_chunks():
+    server = FakeServer()
+    cloner = BranchCloner(connection_factory=server.connect)
+    job = cloner.start("shop", "dev", copy_data=True, chunk_size=64, parallelism=3, background=False)
+
+    assert job.status == COMPLETED, job.error
+    assert job.branch_database == BRANCH
+    for table, rows in server.source.items():
+        assert server.branch[table] == rows
+        assert server.tables[(job.job_id, table)]["status"] == DONE
+    # PK-ordered chunks of at most 64 rows; no ordering constraint without a subset
+    assert max(n for _, n in server.inserts) == 64
+    assert job.tables["items"].chunks == 7 and job.dependencies == {t: set() for t in COLUMNS}
+    summary = job.to_dict()
+    assert summary["rows_copied"] == 650 and summary["progress_pct"] == 100.0
+    assert server.jobs[job.job_id]["status"] == COMPLETED
+
+
+def test_sampled_clone_keeps_foreign_keys_closed():
+    server = FakeServer()
+    cloner = BranchCloner(connection_factory=server.connect)
+    job = cloner.start("shop", "dev", copy_data=True, sample_percent=10, filters={"items": "id <= 40"},
+                       chunk_size=50, background=False)
+
+    assert job.status == COMPLETED, job.error
+    branch = server.branch
+    assert set(branch["items"]) == set(range(1, 41))
+    # Every copied child row finds its parent
+    assert {r["order_id"] for r in branch["items"].values()} <= set(branch["orders"])
+    assert {r["customer_id"] for r in branch["orders"].values()} <= set(branch["customers"])
+    assert 40 <= len(branch["orders"]) < 200 and len(branch["customers"]) < 50
+    # Children are cloned before their parents
+    order = [table for table, _ in server.inserts]
+    assert order.index("items") < order.index("orders") < order.index("customers")
+    assert job.tables["customers"].to_dict()["fk_closure_from"] == ["orders"]
+
+
+def test_row_filters_are_single_conditions_on_the_table():
+    for condition in ("id <= 40", "status IN ('new', 'paid') AND (qty > 1 OR items.id < 5)", "`items`.`id` = 3"):
+        validate_filter("items", condition)
+    for condition in ("id <= 40 # x", "id) OR (1", "id IN (SELECT id FROM mysql.user)", "id = 1 UNION SELECT 1",
+                      "mysql.user.id = 1", "`mysql`.`user` = 1", "note = 'a\\' OR 1'", "id = 1; DROP TABLE t",
+                      "(id = 1", "id = @@version", "orders.id = 1", " "):
+        with pytest.raises(ValueError):
+            validate_filter("items", condition)
+
+    # Rejected before any connection is opened
+    cloner = BranchCloner(connection_factory=lambda database=None: pytest.fail("connected"))
+    with pytest.raises(ValueError):
+        cloner.start("shop", "dev", copy_data=True, filters={"items": "id > 0 OR id IN (SELECT 1)"}, background=False)
+
+
+def test_failed_clone_resumes_from_checkpoint():
+    server = FakeServer(fail_insert=("items", 3))
+    job = BranchCloner(connection_factory=server.connect).start("shop", "dev", copy_data=True, chunk_size=100,
+                                                                parallelism=1, background=False)
+    assert job.status == FAILED and "Lost connection" in job.error
+    assert server.tables[(job.job_id, "items")]["last_pk"] == "[200]"
+
+    # A new process picks the job up from the state tables; nothing is copied twice
+    server.fail_insert = None
+    resumed = BranchCloner(connection_factory=server.connect).resume(job.job_id, background=False)
+    assert resumed.status == COMPLETED, resumed.error
+    for table, rows in server.source.items():
+        assert server.branch[table] == rows
+    assert resumed.tables["items"].chunks == 5  # 2 before the failure, 3 after (the last one is empty)
+
+
+def test_create_endpoint_returns_job_id(monkeypatch):
+    server = FakeServer()
+    cloner = BranchCloner(connection_factory=server.connect)
+    monkeypatch.setattr(database_branching, "branch_cloner", cloner)
+
+    result = asyncio.run(database_branching.create_branch(database_branching.BranchCreateRequest(
+        source_database="shop", branch_name="dev", copy_data=True)))
+    assert result["success"] and result["branch"]["branch_database"] == BRANCH
+    job = cloner.get(result["job_id"])
+    job.thread.join(timeout=10)
+    status = asyncio.run(database_branching.get_branch_job(result["job_id"]))
+    assert status["job"]["status"] == COMPLETED and status["job"]["tables_done"] == 3
+    assert status["job"]["size_mb"] == 0.42 and status["job"]["creation_time_sec"] is not None
+
+    # wait=true answers once the branch is cloned, with its size like before clone jobs
+    waited = asyncio.run(database_branching.create_branch(database_branching.BranchCreateRequest(
+        source_database="shop", branch_name="dev", copy_data=True, wait=True)))
+    assert waited["success"] and waited["status"] == COMPLETED
+    assert waited["branch"]["size_mb"] == 0.42 and waited["branch"]["creation_time_sec"] >= 0
+    assert server.branch["items"] == server.source["items"]
+
+    missing = asyncio.run(database_branching.create_branch(database_branching.BranchCreateRequest(
+        source_database="nope", branch_name="dev")))
+    assert not missing["success"] and "not found" in missing["message"]
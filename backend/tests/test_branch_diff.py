@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import re
+import sys
+import os
+import zlib
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.branch_diff import BranchDataDiff, INSERTED, DELETED, UPDATED
+import routers.database_branching as database_branching
+
+SOURCE, BRANCH = "shop", "shop_branch_dev"
+
+
+class FakeServer:
+    """Two schemas of {table: {id: row}}; evaluates the diff's range queries"""
+
+    def __init__(self):
+        orders = {i: {"id": i, "status": "paid" if i % 3 else "new", "total": i % 97, "note": None}
+                  for i in range(1, 5001)}
+        customers = {i: {"id": i, "name": f"c{i}"} for i in range(1, 301)}
+        self.data = {SOURCE: {"orders": orders, "customers": customers, "logs": {}},
+                     BRANCH: {"orders": {i: dict(r) for i, r in orders.items()},
+                              "customers": {i: dict(r) for i, r in customers.items()}, "logs": {}}}
+        self.columns = {SOURCE: {"orders": ["id", "status", "total", "note"], "customers": ["id", "name"],
+                                 "logs": ["message"]},
+                        BRANCH: {"orders": ["id", "status", "total", "note"], "customers": ["id", "name", "email"],
+                                 "logs": ["message"]}}
+        self.queries = []
+
+    def connect(self, database=None):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, server):
+        self.server = server
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.server)
+
+    def close(self):
+        pass
+
+
+def row_hash(row, columns, algorithm):
+    text = "#".join([str(row[c]) for c in columns if row[c] is not None] +
+                    ["".join("1" if row[c] is None else "0" for c in columns)])
+    if algorithm == "md5":
+        return hashlib.md5(text.encode()).hexdigest()
+    return zlib.crc32(text.encode())
+
+
+class FakeCursor:
+    def __init__(self, server):
+        self.server = server
+        self.rows = []
+
+    def _range(self, sql, params, database, table):
+        params = list(params)
+        low = params.pop(0) if "`id` > %s" in sql else None
+        high = params.pop(0) if "`id` <= %s" in sql else None
+        return sorted((i, r) for i, r in self.server.data[database][table].items()
+                      if (low is None or i > low) and (high is None or i <= high))
+
+    def execute(self, sql, params=()):
+        server, sql = self.server, " ".join(sql.split())
+        server.queries.append(sql)
+        self.rows = []
+        if "information_schema.COLUMNS" in sql:
+            self.rows = [(t, c) for t, columns in server.columns[params[0]].items() for c in columns]
+            return
+        if "information_schema.STATISTICS" in sql:
+            self.rows = [(t, "id") for t in server.data[params[0]] if t != "logs"]
+            return
+        database, table = re.search(r"FROM `(\w+)`\.`(\w+)`", sql).groups()
+        columns = re.search(r"CONCAT_WS\('#', (.*?), CONCAT\(", sql)
+        columns = re.findall(r"`(\w+)`", columns.group(1)) if columns else []
+        algorithm = "md5" if "MD5(" in sql else "crc32"
+        rows = self._range(sql, params, database, table)
+        if "ROW_NUMBER()" in sql:
+            step = int(re.search(r"MOD\(rn, (\d+)\)", sql).group(1))
+            self.rows = [(i,) for n, (i, _) in enumerate(rows, 1) if n % step == 0]
+        elif "BIT_XOR" in sql:
+            checksum = 0
+            for _, row in rows:
+                value = row_hash(row, columns, algorithm)
+                checksum ^= int(value[:16], 16) if algorithm == "md5" else value
+            self.rows = [(len(rows), checksum)]
+        else:
+            self.rows = [(i, row_hash(row, columns, algorithm)) for i, row in rows]
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+def change_branch(server):
+    branch = server.data[BRANCH]
+    branch["orders"][1234]["status"] = "refunded"
+    branch["orders"][2222]["note"] = ""  # NULL -> '' is a change
+    del branch["orders"][4000]
+    branch["orders"][9001] = {"id": 9001, "status": "new", "total": 1, "note": None}
+    branch["customers"][7]["email"] = "x@example.com"  # column only in the branch: not compared
+
+
+def test_diff_finds_changed_rows_without_scanning_tables():
+    server = FakeServer()
+    change_branch(server)
+    differ = BranchDataDiff(connection_factory=server.connect, chunk_size=1000, leaf_rows=50, fanout=8)
+    result = differ.diff(SOURCE, BRANCH)
+
+    orders = next(t for t in result["tables"] if t["table"] == "orders")
+    assert orders["rows"] == [
+        {"pk": [1234], "change": UPDATED},
+        {"pk": [2222], "change": UPDATED},
+        {"pk": [4000], "change": DELETED},
+        {"pk": [9001], "change": INSERTED},
+    ]
+    assert (orders["inserted"], orders["deleted"], orders["updated"]) == (1, 1, 2)
+    assert result["tables_with_changes"] == ["orders"]
+    assert result["skipped_tables"] == [{"table": "logs", "reason": "no primary key"}]
+    customers = next(t for t in result["tables"] if t["table"] == "customers")
+    assert customers["status"] == "identical" and customers["columns_ignored"] == ["email"]
+
+    # 10,600 rows on both sides; only boundaries and rows around the 4 changes are fetched
+    assert result["rows_fetched"] < 400
+    assert orders["chunks_mismatched"] < orders["chunks_checked"] / 2
+
+
+def test_identical_branch_costs_one_checksum_per_chunk():
+    server = FakeServer()
+    result = BranchDataDiff(connection_factory=server.connect, chunk_size=1000, algorithm="md5").diff(SOURCE, BRANCH)
+    assert result["tables_with_changes"] == [] and result["rows_fetched"] == 5
+    checksums = [q for q in server.queries if "BIT_XOR" in q]
+    # orders: 5 boundaries -> 6 ranges, customers: 1 range; both sides each
+    assert len(checksums) == 2 * (6 + 1)
+
+
+def test_compare_endpoint_reports_data_changes(monkeypatch):
+    server = FakeServer()
+    change_branch(server)
+
+    class Schema:
+        @staticmethod
+        def get_schema_diff(conn, db1, db2):
+            return {"tables_only_in_source": [], "tables_only_in_branch": [],
+                    "common_tables": ["customers", "logs", "orders"], "schema_differences": []}
+
+    monkeypatch.setattr(database_branching, "get_db_connection", server.connect)
+    monkeypatch.setattr(database_branching.BranchManager, "get_schema_diff", Schema.get_schema_diff)
+    monkeypatch.setattr(database_branching, "BranchDataDiff",
+                        lambda **kwargs: BranchDataDiff(connection_factory=server.connect, leaf_rows=50, **kwargs))
+
+    result = asyncio.run(database_branching.compare_branches(database_branching.BranchCompareRequest(
+        source_database=SOURCE, branch_database=BRANCH, compare_data=True, tables=["orders"], chunk_size=500)))
+    assert result["success"] and result["has_differences"]
+    assert result["summary"]["rows_changed"] == 4
+    assert [t["table"] for t in result["data_differences"]["tables"]] == ["orders"]
+
+    invalid = asyncio.run(database_branching.compare_branches(database_branching.BranchCompareRequest(
+        source_database=SOURCE, branch_database=BRANCH, compare_data=True, algorithm="sha1")))
+    assert not invalid["success"] and "sha1" in invalid["message"]
@@ -0,0 +1,237 @@
+import json
+import sys
+import os
+import zlib
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.chunked_archiver import ChunkedArchiver, ArchiveThrottle, keyset_condition, COMPLETED, FAILED
+
+CUTOFF = 100
+
+
+class FakeServer:
+    """orders(id, updated_at) in memory; writes are applied on commit"""
+
+    def __init__(self, rows, fail_delete_on_chunk=None, threads_running=None):
+        self.orders = dict(rows)
+        self.archive = {}
+        self.jobs = {}
+        self.chunk_deletes = 0
+        self.fail_delete_on_chunk = fail_delete_on_chunk
+        self.threads_running = list(threads_running or [])
+        self.max_chunk_rows = 0
+
+    def connect(self, database=None):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, server):
+        self.server = server
+        self.pending = []
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self, dictionary)
+
+    def commit(self):
+        for apply in self.pending:
+            apply()
+        self.pending = []
+
+    def rollback(self):
+        self.pending = []
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, conn, dictionary):
+        self.conn = conn
+        self.server = conn.server
+        self.dictionary = dictionary
+        self.rows = []
+        self.rowcount = 0
+
+    def _chunk(self, params):
+        cutoff, *keys = params
+        low = keys[0] if len(keys) == 2 else None
+        high = keys[-1]
+        return sorted(i for i, ts in self.server.orders.items()
+                      if ts < cutoff and (low is None or i > low) and i <= high)
+
+    def execute(self, sql, params=()):
+        server, sql = self.server, " ".join(sql.split())
+        self.rows = []
+        if sql.startswith("SELECT NOW()"):
+            self.rows = [(CUTOFF,)]
+        elif sql.startswith("INSERT INTO `shop_demo`.archive_jobs"):
+            job_id = params[0]
+            self.conn.pending.append(lambda: server.jobs.__setitem__(job_id, {
+                "job_id": job_id, "table_name": params[1], "archive_table": params[2], "date_column": params[3],
+                "cutoff": params[4], "batch_size": params[5], "pk_limit": params[6], "checksums": params[7],
+                "status": params[8], "last_pk": None,
+                "rows_copied": 0, "rows_deleted": 0, "chunks": 0}))
+        elif "INFORMATION_SCHEMA.STATISTICS" in sql:
+            self.rows = [("id",)]
+        elif sql.startswith("SELECT MIN("):
+            self.rows = [(min(server.orders), max(server.orders))]
+        elif sql.startswith("SHOW GLOBAL STATUS"):
+            running = server.threads_running.pop(0) if server.threads_running else 1
+            self.rows = [("Threads_running", str(running))]
+        elif sql.startswith("SELECT `id` FROM") and "ORDER BY" in sql:
+            cutoff, *keys = params
+            last = keys.pop(0) if "`id` > %s" in sql else None
+            upper = keys[0] if keys else None
+            limit = int(sql.rsplit("LIMIT", 1)[1])
+            ids = sorted(i for i, ts in server.orders.items()
+                         if ts < cutoff and (last is None or i > last) and (upper is None or i <= upper))
+            self.rows = [(i,) for i in ids[:limit]]
+        elif sql.startswith("SELECT COUNT(*)") and sql.endswith("FOR UPDATE"):
+            ids = self._chunk(params)
+            self.rows = [(len(ids), chunk_crc(server.orders, ids))]
+        elif sql.endswith("FOR UPDATE"):
+            self.rows = [(i,) for i in self._chunk(params)]
+        elif sql.startswith("INSERT INTO `shop_demo`.`orders_archive`"):
+            ids = self._chunk(params)
+            server.max_chunk_rows = max(server.max_chunk_rows, len(ids))
+            self.rowcount = len(ids)
+            self.conn.pending.append(lambda: server.archive.update({i: server.orders[i] for i in ids}))
+        elif sql.startswith("DELETE FROM"):
+            server.chunk_deletes += 1
+            if server.chunk_deletes == server.fail_delete_on_chunk:
+                raise RuntimeError("Lock wait timeout exceeded")
+            ids = self._chunk(params)
+            self.rowcount = len(ids)
+            self.conn.pending.append(lambda: [server.orders.pop(i) for i in ids])
+        elif sql.startswith("UPDATE `shop_demo`.archive_jobs SET last_pk"):
+            last_pk, copied, deleted, status, job_id = params
+
+            def checkpoint():
+                job = server.jobs[job_id]
+                job.update(last_pk=last_pk, status=status, chunks=job["chunks"] + 1,
+                           rows_copied=job["rows_copied"] + copied, rows_deleted=job["rows_deleted"] + deleted)
+            self.conn.pending.append(checkpoint)
+        elif sql.startswith("UPDATE `shop_demo`.archive_jobs SET status"):
+            status, error, job_id = params
+            self.conn.pending.append(lambda: server.jobs[job_id].update(status=status, error=error))
+        elif sql.startswith("SELECT * FROM `shop_demo`.archive_jobs"):
+            self.rows = [dict(server.jobs[params[0]])]
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def close(self):
+        pass
+
+
+class StubExplainer:
+    def explain(self, sql, database=None, **kwargs):
+        return [{"rows": 60}]
+
+
+def chunk_crc(orders, ids):
+    crc = 0
+    for i in ids:
+        crc ^= zlib.crc32(f"{i}#{orders[i]}".encode())
+    return crc
+
+
+def make_rows():
+    # ids 1..100, every other row is older than the cutoff
+    return {i: (50 if i % 2 else 150) for i in range(1, 101)}
+
+
+def make_archiver(server):
+    throttle = lambda: ArchiveThrottle(check_interval_s=0)
+    return ChunkedArchiver(connection_factory=server.connect, throttle_factory=throttle, explainer=StubExplainer())
+
+
+def test_keyset_condition_expands_composite_keys():
+    sql, params = keyset_condition(["a", "b"], [1, 2], ">", ">")
+    assert sql == "((`a` > %s) OR (`a` = %s AND `b` > %s))"
+    assert params == [1, 1, 2]
+    sql, params = keyset_condition(["a", "b"], [5, 9], "<", "<=")
+    assert sql == "((`a` < %s) OR (`a` = %s AND `b` <= %s))"
+
+
+def test_archives_in_chunks_with_checkpoints():
+    server = FakeServer(make_rows(), threads_running=[3, 40, 40, 3])
+    archiver = make_archiver(server)
+    job = archiver.start("shop_demo", "orders", 90, batch_size=7, background=False)
+
+    assert job.status == COMPLETED
+    assert job.rows_copied == job.rows_deleted == 50
+    assert job.chunks == 8
+    assert server.max_chunk_rows == 7
+    assert sorted(server.archive) == list(range(1, 101, 2))
+    assert all(ts >= CUTOFF for ts in server.orders.values()) and len(server.orders) == 50
+    assert server.jobs[job.job_id]["status"] == COMPLETED
+    assert job.to_dict()["progress_pct"] == 100.0
+
+
+def test_failed_chunk_rolls_back_and_resumes_from_checkpoint():
+    server = FakeServer(make_rows(), fail_delete_on_chunk=3)
+    archiver = make_archiver(server)
+    job = archiver.start("shop_demo", "orders", 90, batch_size=10, background=False)
+
+    assert job.status == FAILED
+    assert job.chunks == 2 and job.rows_copied == 20
+    # The failed chunk copied nothing: archive and checkpoint match
+    assert len(server.archive) == 20
+    assert json.loads(server.jobs[job.job_id]["last_pk"]) == [39]
+
+    # Resume from the persisted checkpoint (as after a restart)
+    fresh = make_archiver(server)
+    resumed = fresh.resume(job.job_id, "shop_demo", background=False)
+    assert resumed.status == COMPLETED
+    assert resumed.rows_copied == 50
+    assert sorted(server.archive) == list(range(1, 101, 2))
+    assert len(server.orders) == 50
+
+
+def test_delete_only_mode_stops_at_pk_limit():
+    server = FakeServer(make_rows())
+    archiver = make_archiver(server)
+    job = archiver.start("shop_demo", "orders", 90, batch_size=8, background=False,
+                         copy_rows=False, cutoff=CUTOFF, pk_limit=[59])
+
+    assert job.status == COMPLETED
+    assert server.archive == {}
+    assert job.rows_deleted == job.rows_copied == 30
+    # Old rows past the exported key range are left alone
+    assert sorted(i for i, ts in server.orders.items() if ts < CUTOFF) == list(range(61, 101, 2))
+    assert job.to_dict()["mode"] == "delete_only"
+
+
+def test_delete_only_mode_checks_export_checksums_per_chunk():
+    server = FakeServer(make_rows())
+    old = [i for i in range(1, 60, 2)]
+    chunks = [{"last_pk": [ids[-1]], "rows": len(ids), "crc": chunk_crc(server.orders, ids)}
+              for ids in (old[:10], old[10:20], old[20:])]
+    checksums = {"columns": ["id", "updated_at"], "chunks": json.loads(json.dumps(chunks))}
+    # A row of the second chunk is changed after the export, still older than the cutoff
+    server.orders[25] = 60
+
+    archiver = make_archiver(server)
+    job = archiver.start("shop_demo", "orders", 90, batch_size=8, background=False,
+                         copy_rows=False, cutoff=CUTOFF, pk_limit=[59], checksums=checksums)
+
+    assert job.status == FAILED
+    assert "rows changed since the export" in job.error
+    assert job.chunks == 1 and job.rows_deleted == 10
+    # The mismatching chunk is rolled back: the changed row and its neighbours stay
+    assert sorted(i for i, ts in server.orders.items() if ts < CUTOFF) == list(range(21, 101, 2))
+    assert json.loads(server.jobs[job.job_id]["last_pk"]) == [19]
+
+    # With the row back as exported, a resumed job (state read back) deletes the rest
+    server.orders[25] = 50
+    resumed = make_archiver(server).resume(job.job_id, "shop_demo", background=False)
+    assert resumed.status == COMPLETED
+    assert resumed.chunks == 3 and resumed.rows_deleted == 30
+    assert sorted(i for i, ts in server.orders.items() if ts < CUTOFF) == list(range(61, 101, 2))
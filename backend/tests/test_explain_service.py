@@ -0,0 +1,142 @@
+import threading
+import time
+import sys
+import os
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.cache import SimpleCache
+from services.explain_service import ExplainService
+
+
+class FakeDB:
+    """information_schema.TABLES versions + EXPLAIN rows, counting EXPLAINs"""
+
+    def __init__(self, explain_delay=0.0):
+        self.update_time = "2024-01-01 10:00:00"
+        self.analyzed_at = "2024-01-01 09:00:00"
+        self.explains = 0
+        self.version_queries = 0
+        self.explain_delay = explain_delay
+        self.lock = threading.Lock()
+
+    def connect(self, database=None):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.db)
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+
+    def execute(self, sql, params=None):
+        if "information_schema.TABLES" in sql:
+            self.db.version_queries += 1
+            self.rows = [{"table_schema": "shop_demo", "table_name": "orders", "create_time": "2023-12-01",
+                          "update_time": self.db.update_time, "analyzed_at": self.db.analyzed_at}]
+        elif sql.startswith("EXPLAIN"):
+            with self.db.lock:
+                self.db.explains += 1
+            time.sleep(self.db.explain_delay)
+            self.rows = [{"id": 1, "select_type": "SIMPLE", "table": "orders", "type": "ALL", "rows": 1000}]
+        else:
+            raise AssertionError(f"unexpected statement: {sql}")
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+def make_service(db, **kwargs):
+    return ExplainService(connection_factory=db.connect, cache=SimpleCache(ttl_seconds=60), **kwargs)
+
+
+def test_repeated_explain_is_cached():
+    db = FakeDB()
+    service = make_service(db)
+
+    first = service.explain("SELECT * FROM orders WHERE customer_id = 5", "shop_demo")
+    second = service.explain("SELECT  *\n  FROM orders WHERE customer_id = 5;", "shop_demo")
+    assert first == second and first[0]["type"] == "ALL"
+    assert db.explains == 1
+    assert db.version_queries == 1
+
+    # Callers get their own copy
+    first[0]["type"] = "ref"
+    assert service.explain("SELECT * FROM orders WHERE customer_id = 5", "shop_demo")[0]["type"] == "ALL"
+
+    # Different literal, different plan
+    service.explain("SELECT * FROM orders WHERE customer_id = 6", "shop_demo")
+    assert db.explains == 2
+
+
+def test_ddl_and_analyze_invalidate():
+    db = FakeDB()
+    service = make_service(db, schema_check_interval=0)
+    sql = "SELECT * FROM orders WHERE customer_id = 5"
+
+    service.explain(sql, "shop_demo")
+    service.explain(sql, "shop_demo")
+    assert db.explains == 1
+
+    db.update_time = "2024-01-01 11:00:00"  # ALTER TABLE
+    service.explain(sql, "shop_demo")
+    assert db.explains == 2
+
+    db.analyzed_at = "2024-01-01 12:00:00"  # ANALYZE TABLE
+    service.explain(sql, "shop_demo")
+    assert db.explains == 3
+
+
+def test_explicit_invalidate():
+    db = FakeDB()
+    service = make_service(db)
+    sql = "SELECT * FROM orders WHERE customer_id = 5"
+
+    service.explain(sql, "shop_demo")
+    assert service.invalidate("shop_demo") == 1
+    service.explain(sql, "shop_demo")
+    assert db.explains == 2
+    assert db.version_queries == 2
+
+
+def test_concurrent_identical_explains_are_deduplicated():
+    db = FakeDB(explain_delay=0.1)
+    service = make_service(db)
+    results = []
+
+    def worker():
+        results.append(service.explain("SELECT * FROM orders WHERE total > 100", "shop_demo"))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert db.explains == 1
+    assert len(results) == 8 and all(r == results[0] for r in results)
+    assert service.get_stats()["deduplicated"] == 7
+
+
+def test_only_dml_is_explained():
+    service = make_service(FakeDB())
+    try:
+        service.explain("ANALYZE DELETE FROM orders", "shop_demo")
+        assert False, "ANALYZE must be rejected"
+    except ValueError:
+        pass
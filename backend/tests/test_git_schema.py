@@ -0,0 +1,151 @@
+import asyncio
+import pytest
+import sys
+import os
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parser.ddl_parser import parse_ddl, CREATE, ADD_INDEX, DROP
+from services.cache import SimpleCache
+from services.git_schema import GitSchemaLoader, blob_hash, REPOSITORY_ROOT
+from services.schema_snapshot import SchemaSnapshotEngine, TableDef, ColumnDef, IndexDef, ForeignKeyDef
+import routers.schema_drift as schema_drift
+
+ORDERS_DDL = """
+/*!40101 SET NAMES utf8mb4 */;
+-- orders table
+CREATE TABLE IF NOT EXISTS `shop_demo`.`orders` (
+  `id` int unsigned NOT NULL AUTO_INCREMENT,
+  `customer_id` INTEGER DEFAULT NULL COMMENT 'who; ordered',
+  status ENUM('new','paid') NOT NULL DEFAULT 'new',
+  total DECIMAL(10,2) NOT NULL DEFAULT '0.00',
+  is_gift BOOLEAN DEFAULT FALSE,
+  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`),
+  KEY idx_customer (customer_id, created_at),
+  UNIQUE (status, id),
+  CONSTRAINT fk_customer FOREIGN KEY (customer_id) REFERENCES customers (id) ON DELETE SET NULL,
+  CHECK (total >= 0)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+INSERT INTO orders VALUES (1, 2, 'new', 0, 0, NOW());
+CREATE INDEX idx_total ON orders (total);
+DROP TABLE IF EXISTS legacy, `old_orders`;
+"""
+
+
+def expected_orders() -> TableDef:
+    """What the information_schema snapshot reports for the same table"""
+    table = TableDef("orders", "InnoDB", "utf8mb4")
+    table.columns = {
+        "id": ColumnDef("id", "INT(10) UNSIGNED", False, None, True),
+        "customer_id": ColumnDef("customer_id", "INT(11)", True, None, False),
+        "status": ColumnDef("status", "ENUM('NEW','PAID')", False, "new", False),
+        "total": ColumnDef("total", "DECIMAL(10,2)", False, "0.00", False),
+        "is_gift": ColumnDef("is_gift", "TINYINT(1)", True, "0", False),
+        "created_at": ColumnDef("created_at", "TIMESTAMP", False, "current_timestamp()", False),
+    }
+    table.indexes = {
+        "PRIMARY": IndexDef("PRIMARY", "PRIMARY KEY", ("id",)),
+        "idx_customer": IndexDef("idx_customer", "KEY", ("customer_id", "created_at")),
+        "status": IndexDef("status", "UNIQUE", ("status", "id")),
+    }
+    table.foreign_keys = {"fk_customer": ForeignKeyDef("fk_customer", ("customer_id",), "customers", ("id",),
+                                                       "SET NULL", "RESTRICT")}
+    table.checks = {"CONSTRAINT_1": "total >= 0"}
+    return table
+
+
+def test_parser_matches_information_schema_model():
+    operations, skipped = parse_ddl(ORDERS_DDL)
+    assert skipped == 1  # INSERT (the /*!...*/ version comment is dropped by the tokenizer)
+    assert [op[0] for op in operations] == [CREATE, ADD_INDEX, DROP]
+    orders = operations[0][1]
+    assert orders.to_dict() == expected_orders().to_dict()
+    assert orders.fingerprint == expected_orders().fingerprint
+    assert operations[1][1:] == ("orders", IndexDef("idx_total", "KEY", ("total",)))
+    assert operations[2][1] == ("legacy", "old_orders")
+
+
+def write_schema(root, tables):
+    os.makedirs(root, exist_ok=True)
+    for i in range(tables):
+        with open(os.path.join(root, f"{i:04d}_t{i}.sql"), "w") as f:
+            f.write(f"CREATE TABLE t{i} (id INT NOT NULL AUTO_INCREMENT, name VARCHAR(50), "
+                    f"PRIMARY KEY (id), KEY idx_name (name)) ENGINE=InnoDB;\n")
+
+
+def test_loader_caches_by_blob_hash_and_parses_in_parallel(tmp_path):
+    root = str(tmp_path / "schema")
+    write_schema(root, 40)
+    with open(os.path.join(root, "9999_indexes.sql"), "w") as f:
+        f.write("CREATE UNIQUE INDEX uq_name ON t3 (name);")
+
+    cache_dir = str(tmp_path / "cache")
+    loader = GitSchemaLoader(cache=SimpleCache(), cache_dir=cache_dir, root=root, max_workers=2,
+                             parallel_threshold=10)
+    first = loader.load(root)
+    assert len(first.tables) == 40 and first.files == 41
+    assert first.parsed == 41 and first.cache_hits == 0
+    assert first.tables["t3"].indexes["uq_name"].type == "UNIQUE"
+
+    # A new process (empty memory cache) reuses the on-disk entries; only the edited file is parsed
+    with open(os.path.join(root, "0005_t5.sql"), "a") as f:
+        f.write("CREATE INDEX idx_id_name ON t5 (id, name);\n")
+    again = GitSchemaLoader(cache=SimpleCache(), cache_dir=cache_dir, root=root).load(root)
+    assert again.parsed == 1 and again.cache_hits == 40
+    assert "idx_id_name" in again.tables["t5"].indexes
+    # Cached tables were not modified by CREATE INDEX of another load
+    assert "uq_name" not in loader._cached(blob_hash(open(os.path.join(root, "0003_t3.sql"), "rb").read()))[0][0][1].indexes
+
+    # One process pool serves every load
+    pool = loader._pool
+    write_schema(str(tmp_path / "schema2"), 12)
+    loader.root = str(tmp_path)
+    assert len(loader.load("schema2").tables) == 12 and loader._pool is pool
+    loader.shutdown()
+    assert loader._pool is None
+
+
+def test_schema_paths_are_confined_to_the_root(tmp_path):
+    root = str(tmp_path / "repo")
+    write_schema(os.path.join(root, "db"), 1)
+    write_schema(str(tmp_path / "outside"), 1)
+    os.symlink(str(tmp_path / "outside"), os.path.join(root, "link"))
+    loader = GitSchemaLoader(cache=SimpleCache(), root=root)
+
+    assert len(loader.load("db").tables) == 1
+    assert len(loader.load(os.path.join(root, "db")).tables) == 1
+    for path in ("../outside", str(tmp_path / "outside"), "link", "/etc/passwd"):
+        with pytest.raises(ValueError, match="outside GIT_SCHEMA_ROOT"):
+            loader.load(path)
+    # Without GIT_SCHEMA_ROOT the repository checkout is the root
+    assert GitSchemaLoader(cache=SimpleCache()).root == os.path.realpath(REPOSITORY_ROOT)
+
+
+def test_detect_drift_against_git_checkout(tmp_path, monkeypatch):
+    from tests.test_schema_snapshot import FakeCatalog
+
+    catalog = FakeCatalog(tables=3)
+    root = str(tmp_path)
+    for name in ("t0", "t1"):
+        with open(os.path.join(root, f"{name}.sql"), "w") as f:
+            f.write(f"""CREATE TABLE {name} (
+                id INT NOT NULL AUTO_INCREMENT,
+                customer_id INT NULL,
+                status VARCHAR(20) NOT NULL DEFAULT 'new',
+                {'note TEXT,' if name == 't1' else ''}
+                PRIMARY KEY (id),
+                KEY idx_cust (customer_id, status)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;""")
+
+    monkeypatch.setattr(schema_drift, "schema_snapshots", SchemaSnapshotEngine(connection_factory=catalog.connect))
+    monkeypatch.setattr(schema_drift, "git_schema_loader", GitSchemaLoader(cache=SimpleCache(), root=root))
+    result = asyncio.run(schema_drift.detect_drift(schema_drift.DriftDetectRequest(git_schema_path=root)))
+
+    report = result["drift_report"]
+    assert result["success"]
+    assert report["extra_tables"] == ["t2"]
+    assert list(report["drifts"]) == ["t1"]
+    assert report["drifts"]["t1"]["missing_columns"] == ["note"]
+    assert report["git_schema"]["files"] == 2
@@ -0,0 +1,81 @@
+import sys
+import os
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parser.query_shape import parse_query, EQ, IN, RANGE, JOIN
+from services.index_advisor import IndexAdvisor, TableInfo
+
+
+def make_schema():
+    def table(name, rows, columns, indexes):
+        info = TableInfo(name, rows)
+        info.columns = {c: 4 for c in columns}
+        info.indexes = indexes
+        return info
+
+    return {
+        "orders": table("orders", 500000, ["id", "customer_id", "status", "created_at", "total"],
+                        {"PRIMARY": ["id"]}),
+        "customers": table("customers", 50000, ["id", "email", "country"], {"PRIMARY": ["id"]}),
+        "settings": table("settings", 20, ["id", "name"], {"PRIMARY": ["id"]}),
+    }
+
+
+def test_query_shape_predicates():
+    root = parse_query(
+        "SELECT o.id FROM orders o JOIN customers c ON c.id = o.customer_id "
+        "WHERE o.status = 'paid' AND o.created_at >= '2024-01-01' AND c.country IN ('FR', 'DE') "
+        "AND (o.total > 10 OR o.total IS NULL) ORDER BY o.created_at DESC"
+    )
+    kinds = {(str(p.column), p.kind, p.in_or) for p in root.predicates}
+    assert ("o.status", EQ, False) in kinds
+    assert ("o.created_at", RANGE, False) in kinds
+    assert ("c.country", IN, False) in kinds
+    assert ("o.total", RANGE, True) in kinds
+    assert any(p.kind == JOIN for p in root.predicates)
+    assert [str(c) for c, desc in root.order_by] == ["o.created_at"]
+    assert root.resolve(root.order_by[0][0]).table == "orders"
+
+
+def test_advisor_picks_composite_for_heavy_fingerprint():
+    advisor = IndexAdvisor()
+    workload = advisor.aggregate(
+        [{"sql": f"SELECT * FROM orders WHERE customer_id = {i} AND created_at > '2024-01-0{i % 9 + 1}'",
+          "executions": 10, "total_time": 30.0} for i in range(20)]
+        + [{"sql": "SELECT id FROM customers WHERE email = 'a@b.c'", "executions": 5, "total_time": 10.0}]
+        + [{"sql": "SELECT * FROM settings WHERE name = 'x'", "executions": 500, "total_time": 50.0}]
+    )
+    # Literal-only differences collapse into one fingerprint
+    assert len(workload) == 3
+
+    result = advisor.recommend("shop_demo", workload=workload, schema=make_schema())
+    statements = [r["create_index_sql"] for r in result["recommendations"]]
+    assert statements[0] == "CREATE INDEX idx_orders_customer_id_created_at ON orders (customer_id, created_at)"
+    assert any("customers (email)" in s for s in statements)
+    # Tiny tables are never indexed, and the single-column prefix is redundant
+    assert not any("settings" in s for s in statements)
+    assert not any(s.endswith("orders (customer_id)") for s in statements)
+    assert 0 < result["estimated_total_savings_s"] < result["total_workload_time_s"]
+    assert result["recommendations"][0]["queries_improved"] == 1
+
+
+def test_write_budget_limits_indexes_on_hot_tables():
+    advisor = IndexAdvisor()
+    reads = [{"sql": "SELECT * FROM orders WHERE status = 'new'", "executions": 100, "total_time": 20.0},
+             {"sql": "SELECT * FROM customers WHERE country = 'FR'", "executions": 100, "total_time": 20.0}]
+    writes = [{"sql": "INSERT INTO orders (customer_id, status) VALUES (1, 'new')",
+               "executions": 100000, "total_time": 100.0}]
+    workload = advisor.aggregate(reads + writes)
+
+    for strategy in ("greedy", "knapsack"):
+        result = advisor.recommend("shop_demo", workload=workload, schema=make_schema(),
+                                   write_budget_pct=1.0, strategy=strategy)
+        tables = [r["table"] for r in result["recommendations"]]
+        # An index on orders would cost 10s of extra writes, more than the 1.4s budget
+        assert tables == ["customers"]
+        assert result["write_overhead_s"] <= result["write_budget_s"]
+
+    relaxed = advisor.recommend("shop_demo", workload=workload, schema=make_schema(), write_budget_pct=50.0)
+    assert sorted(r["table"] for r in relaxed["recommendations"]) == ["customers", "orders"]
@@ -0,0 +1,210 @@
+import asyncio
+import json
+import re
+import threading
+import sys
+import os
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.cache import SimpleCache
+from services.explain_service import ExplainService
+from services.index import IndexSimulationService
+from services.index_whatif import IndexWhatIfEngine, parse_index_ddl, retarget_sql
+
+
+class FakeServer:
+    """Just enough of MariaDB for branching: databases, tables, indexes, EXPLAIN"""
+
+    def __init__(self):
+        self.databases = {"shop_demo": {"orders": set(), "customers": set()}}
+        self.table_rows = {"orders": 100000, "customers": 5000}
+        self.statements = []
+        self.ignored = set()
+        self.lock = threading.Lock()
+
+    def connect(self, database=None):
+        return FakeConnection(self, database)
+
+
+class FakeConnection:
+    def __init__(self, server, database):
+        self.server = server
+        self.database = database
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.server = conn.server
+        self.rows = []
+
+    def execute(self, sql, params=None):
+        server = self.server
+        sql = " ".join(sql.split())
+        with server.lock:
+            server.statements.append(sql)
+        self.rows = []
+        m = re.match(r"DROP DATABASE IF EXISTS `(\w+)`", sql)
+        if m:
+            server.databases.pop(m.group(1), None)
+            return
+        m = re.match(r"CREATE DATABASE `(\w+)`", sql)
+        if m:
+            server.databases[m.group(1)] = {}
+            return
+        m = re.match(r"SHOW CREATE TABLE `(\w+)`\.`(\w+)`", sql)
+        if m:
+            self.rows = [{"Create Table": f"CREATE TABLE `{m.group(2)}` (id INT)"}]
+            return
+        m = re.match(r"USE `(\w+)`", sql)
+        if m:
+            self.conn.database = m.group(1)
+            return
+        m = re.match(r"CREATE TABLE `(\w+)`", sql)
+        if m:
+            server.databases[self.conn.database][m.group(1)] = set()
+            return
+        m = re.match(r"CREATE (?:UNIQUE )?INDEX `(\w+)` ON `(\w+)`\.`(\w+)`", sql)
+        if m:
+            assert m.group(2) != "shop_demo", "index must never be created on the source database"
+            server.databases[m.group(2)][m.group(3)].add(m.group(1))
+            return
+        m = re.match(r"ALTER TABLE `(\w+)`\.`(\w+)` ALTER INDEX `(\w+)` (NOT )?IGNORED", sql)
+        if m:
+            assert m.group(3) in server.databases[m.group(1)][m.group(2)]
+            (server.ignored.discard if m.group(4) else server.ignored.add)(m.group(3))
+            return
+        if "INFORMATION_SCHEMA.TABLES" in sql and "IN (" in sql:
+            self.rows = [{"TABLE_NAME": t, "TABLE_ROWS": server.table_rows[t]}
+                         for t in server.databases["shop_demo"] if t in params[1:]]
+            return
+        if "SELECT TABLE_ROWS" in sql:
+            self.rows = [{"TABLE_ROWS": server.table_rows[params[1]]}]
+            return
+        if sql.startswith(("SET", "INSERT", "ANALYZE")):
+            return
+        if sql.startswith("SELECT COUNT(*)"):
+            self.rows = [{"n": 1000}]
+            return
+        if sql.startswith("EXPLAIN FORMAT=JSON"):
+            indexes = server.databases[self.conn.database]["orders"] - server.ignored
+            if "idx_customer" in indexes:
+                table = {"table_name": "orders", "access_type": "ref", "key": "idx_customer", "rows": 10, "filtered": 100}
+            else:
+                table = {"table_name": "orders", "access_type": "ALL", "rows": 1000, "filtered": 10}
+            self.rows = [{"EXPLAIN": json.dumps({"query_block": {"select_id": 1, "table": table}})}]
+            return
+        raise AssertionError(f"unexpected statement: {sql}")
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def close(self):
+        pass
+
+
+def make_service(server):
+    explainer = ExplainService(connection_factory=server.connect, cache=SimpleCache(ttl_seconds=60))
+    engine = IndexWhatIfEngine(connection_factory=server.connect, explainer=explainer, sample_rows=1000)
+    return IndexSimulationService(whatif_engine=engine, use_branch=True)
+
+
+def test_parse_index_ddl():
+    idx = parse_index_ddl("CREATE INDEX idx_a ON shop_demo.orders (customer_id, order_date DESC)")
+    assert (idx.name, idx.table, idx.column_names) == ("idx_a", "orders", ["customer_id", "order_date"])
+    idx = parse_index_ddl("ALTER TABLE orders ADD UNIQUE KEY uk_ref (ref(10))")
+    assert idx.unique and idx.column_names == ["ref"]
+    for bad in ("DROP TABLE orders", "CREATE INDEX i ON t (a); DROP TABLE t"):
+        try:
+            parse_index_ddl(bad)
+            assert False, bad
+        except ValueError:
+            pass
+    assert retarget_sql("SELECT * FROM shop_demo.orders", "shop_demo", "b1") == "SELECT * FROM `b1`.orders"
+
+
+def test_whatif_candidates_on_branches():
+    server = FakeServer()
+    service = make_service(server)
+    sql = "SELECT * FROM orders WHERE customer_id = 42"
+
+    good, unused, invalid = asyncio.run(service.simulate_candidates(sql, [
+        "CREATE INDEX idx_customer ON orders (customer_id)",
+        "CREATE INDEX idx_status ON orders (status)",
+        "DROP TABLE orders",
+    ], "shop_demo"))
+
+    assert good.mode == "whatif" and good.index_used
+    assert good.current_plan.access_type == "ALL" and good.with_index_plan.key == "idx_customer"
+    assert good.cost_before == 100.0 and good.cost_after == 10.0
+    assert good.improvement_percent == 90.0 and good.recommendation == "HIGHLY RECOMMENDED"
+    # Branch rows are projected back to the source table size (100000 rows / 1000 sampled)
+    assert good.current_plan.rows_examined == 100000
+
+    assert unused.mode == "whatif" and not unused.index_used
+    assert unused.recommendation == "NOT RECOMMENDED"
+
+    # Invalid DDL is never executed, it gets the heuristic estimate
+    assert invalid.mode == "heuristic"
+    assert not any("DROP TABLE" in s for s in server.statements)
+
+    # One branch for all candidates, each index built once and only visible for its own EXPLAIN
+    assert len([s for s in server.statements if s.startswith("CREATE DATABASE")]) == 1
+    assert [s.split(" ON ")[0] for s in server.statements if s.startswith("CREATE INDEX")] == [
+        "CREATE INDEX `idx_customer`", "CREATE INDEX `idx_status`"]
+    assert not any(s.startswith("DROP INDEX") for s in server.statements)
+    toggles = [s.split("ALTER INDEX ")[1] for s in server.statements if "ALTER INDEX" in s]
+    assert toggles == ["`idx_customer` IGNORED", "`idx_status` IGNORED",
+                       "`idx_customer` NOT IGNORED", "`idx_customer` IGNORED",
+                       "`idx_status` NOT IGNORED", "`idx_status` IGNORED"]
+
+    # Every branch is torn down, the source is untouched
+    assert list(server.databases) == ["shop_demo"]
+    assert server.databases["shop_demo"] == {"orders": set(), "customers": set()}
+
+
+def test_falls_back_to_heuristic_without_branch():
+    server = FakeServer()
+    service = make_service(server)
+    service.whatif.connection_factory = lambda database=None: (_ for _ in ()).throw(RuntimeError("no access"))
+
+    result = asyncio.run(service.perform_index_simulation(
+        "SELECT * FROM orders WHERE customer_id = 42", "CREATE INDEX idx_customer ON orders (customer_id)"))
+    assert result.mode == "heuristic"
+
+
+def test_whatif_is_on_by_default_and_checks_identifier_lengths(monkeypatch):
+    engine = make_service(FakeServer()).whatif
+    monkeypatch.delenv("INDEX_WHATIF_ENABLED", raising=False)
+    assert IndexSimulationService(whatif_engine=engine).use_branch is True
+    monkeypatch.setenv("INDEX_WHATIF_ENABLED", "false")
+    assert IndexSimulationService(whatif_engine=engine).use_branch is False
+
+    server = FakeServer()
+    server.databases = {"d" * 45: server.databases["shop_demo"]}
+    service = make_service(server)
+    result = asyncio.run(service.perform_index_simulation(
+        "SELECT * FROM orders WHERE customer_id = 42", "CREATE INDEX idx_customer ON orders (customer_id)", "d" * 45))
+    # `{db}_branch_whatif_xxxxxxxx` would exceed 64 characters: no DDL is sent
+    assert result.mode == "heuristic" and server.statements == []
+
+    stopped = threading.Event()
+    stopped.set()
+    results = make_service(FakeServer()).whatif.simulate(
+        "SELECT * FROM orders WHERE customer_id = 42", ["CREATE INDEX idx_customer ON orders (customer_id)"],
+        "shop_demo", stopped)
+    assert results[0]["error"] == "What-if simulation stopped"
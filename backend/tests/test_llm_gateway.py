@@ -0,0 +1,235 @@
+import pytest
+import sys
+import os
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.cache import SimpleCache, llm_response_cache
+from services.llm_gateway import LLMGateway, CircuitBreaker
+from error_factory import APIError
+
+
+class StubSkyAIHandler(BaseHTTPRequestHandler):
+    """Minimal stand-in for the SkyAI Copilot chat endpoint"""
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        with server.lock:
+            server.hits += 1
+        time.sleep(server.delay)
+
+        if server.fail:
+            self.send_response(500)
+            self.end_headers()
+            self.wfile.write(b"upstream exploded")
+            return
+
+        if server.sse and payload.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for word in ["echo:", " ", payload.get("prompt")]:
+                self.wfile.write(f"data: {json.dumps({'token': word})}\n\n".encode())
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            return
+
+        body = json.dumps({"answer": f"echo: {payload.get('prompt')}"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubSkyAIHandler)
+    server.hits = 0
+    server.delay = 0.0
+    server.fail = False
+    server.sse = False
+    server.lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_gateway(server, **kwargs) -> LLMGateway:
+    host, port = server.server_address
+    return LLMGateway(
+        base_url=f"http://{host}:{port}/copilot/v1",
+        api_key="test-key",
+        cache=SimpleCache(ttl_seconds=60),
+        **kwargs
+    )
+
+
+@pytest.mark.asyncio
+async def test_identical_prompt_served_from_cache(stub_server):
+    gateway = make_gateway(stub_server)
+
+    first = await gateway.chat("why is my query slow?")
+    second = await gateway.chat("why is my query slow?")
+    await gateway.aclose()
+
+    assert first == second == {"answer": "echo: why is my query slow?"}
+    assert stub_server.hits == 1
+    assert gateway.get_stats()["cache_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_prompts_are_deduplicated(stub_server):
+    stub_server.delay = 0.2
+    gateway = make_gateway(stub_server)
+
+    results = await asyncio.gather(*[gateway.chat("same prompt") for _ in range(5)])
+    await gateway.aclose()
+
+    assert all(r == {"answer": "echo: same prompt"} for r in results)
+    assert stub_server.hits == 1
+    assert gateway.get_stats()["dedup_hits"] == 4
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_after_repeated_failures(stub_server):
+    stub_server.fail = True
+    gateway = make_gateway(stub_server, failure_threshold=2, reset_timeout=60.0)
+
+    for i in range(2):
+        with pytest.raises(APIError) as exc:
+            await gateway.chat(f"prompt {i}")
+        assert exc.value.status_code == 500
+
+    # Circuit is now open: rejected without reaching the upstream
+    with pytest.raises(APIError) as exc:
+        await gateway.chat("prompt 3")
+    await gateway.aclose()
+
+    assert exc.value.status_code == 503
+    assert stub_server.hits == 2
+    assert gateway.get_stats()["circuit_rejections"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stream_chat_yields_sse_tokens_and_caches_answer(stub_server):
+    stub_server.sse = True
+    gateway = make_gateway(stub_server)
+
+    chunks = [c async for c in gateway.stream_chat("hello")]
+    # Non-streaming call afterwards is answered from the cache
+    result = await gateway.chat("hello")
+    await gateway.aclose()
+
+    assert chunks == ["echo:", " ", "hello"]
+    assert result == {"answer": "echo: hello"}
+    assert stub_server.hits == 1
+
+
+@pytest.mark.asyncio
+async def test_stream_chat_falls_back_to_single_chunk(stub_server):
+    gateway = make_gateway(stub_server)
+
+    chunks = [c async for c in gateway.stream_chat("hello")]
+    await gateway.aclose()
+
+    assert chunks == ["echo: hello"]
+
+
+def test_response_cache_is_bounded_lru():
+    cache = SimpleCache(ttl_seconds=60, max_entries=3)
+    for key in ("a", "b", "c"):
+        cache.set(key, key.upper())
+    assert cache.get("a") == "A"  # a is now the most recently used
+    cache.set("d", "D")
+    assert len(cache.cache) == 3 and cache.get("b") is None
+    assert [cache.get(k) for k in ("a", "c", "d")] == ["A", "C", "D"]
+
+    # Expired entries go first when the cache is full, even if recently used
+    cache.cache["a"] = ("A", time.time() - 120)
+    cache.cache.move_to_end("a")
+    cache.set("e", "E")
+    assert list(cache.cache) == ["c", "d", "e"]
+
+    # The gateway's default cache is keyed by prompt hash: it must not grow without bound
+    assert llm_response_cache.max_entries
+
+
+def test_circuit_half_open_allows_single_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    assert breaker.allow_request() is True
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request() is False
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_cancelling_first_caller_keeps_shared_request_for_waiters(stub_server):
+    stub_server.delay = 0.2
+    gateway = make_gateway(stub_server)
+
+    first = asyncio.create_task(gateway.chat("shared prompt"))
+    await asyncio.sleep(0.05)
+    second = asyncio.create_task(gateway.chat("shared prompt"))
+    await asyncio.sleep(0.05)
+    first.cancel()
+
+    result = await second
+    await gateway.aclose()
+
+    assert first.cancelled()
+    assert result == {"answer": "echo: shared prompt"}
+    assert stub_server.hits == 1 and gateway.get_stats()["inflight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_half_open_trial_releases_the_slot(stub_server):
+    stub_server.delay = 0.3
+    gateway = make_gateway(stub_server, failure_threshold=1, reset_timeout=0.0)
+    breaker = gateway.get_breaker("/chat/")
+    breaker.record_failure()
+
+    # The trial request itself is cancelled mid-flight
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(gateway._send("/chat/", {"prompt": "trial"}, 5.0), 0.05)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    stub_server.delay = 0.0
+    assert await gateway.chat("next") == {"answer": "echo: next"}
+    await gateway.aclose()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_abandoned_half_open_stream_releases_the_slot(stub_server):
+    stub_server.sse = True
+    gateway = make_gateway(stub_server, failure_threshold=1, reset_timeout=0.0)
+    breaker = gateway.get_breaker("/chat/")
+    breaker.record_failure()
+
+    stream = gateway.stream_chat("hello")
+    assert await stream.__anext__() == "echo:"
+    # Client disconnects mid-stream
+    await stream.aclose()
+    await gateway.aclose()
+
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request() is True
@@ -0,0 +1,206 @@
+import asyncio
+import json
+import random
+import sys
+import os
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.masking_engine import MaskingEngine, NdjsonMaskingStream, column_masker
+import routers.data_masking as data_masking
+from routers.data_masking import DataMasker, detect_pii_columns
+
+EDGE_VALUES = [None, "", "x", "1234", "12", "abc", 42, 3.5, True, "a@b", "@", "ab@cd", "john.doe@example.com",
+               "+33 6 12 34 56 78", "0612345678", "+1 (555) 010-9999", "4532-1234-5678-9010",
+               "4532 1234 5678 9010", "4532123456789010", "123-45-6789", "123456789", "1-2",
+               "FR7612345678901234567890123", "DE12", "123 Main   Street ", "  leading", "Ünïcödé 7 straße"]
+
+
+def random_value(rng):
+    alphabet = "0123456789 -+()@.abcXYZ"
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 24)))
+
+
+def test_columnar_masks_match_data_masker_cell_for_cell():
+    rng = random.Random(7)
+    values = EDGE_VALUES + [random_value(rng) for _ in range(2000)]
+    for pii_type in ("email", "phone", "credit_card", "ssn", "iban", "address"):
+        for level in ("partial", "full", "anything-else"):
+            expected = [DataMasker.apply_masking(v, pii_type, level) for v in values]
+            assert column_masker(pii_type, level)(values) == expected, (pii_type, level)
+    assert column_masker("name", "full") is None
+
+    engine = MaskingEngine()
+    rows = [[1, "john.doe@example.com", "+33 6 12 34 56 78"], [2, None, "0612345678"], [3, "a@b.io"]]
+    maskers = engine.maskers({1: "email", 2: "phone"}, "partial")
+    # Same output as DataMasker, quirks included (phone digits equal to the first one are starred)
+    assert engine.mask_rows(rows, maskers) == [
+        [1, "j***@e***.com", "+** 6 12 *4 56 78"], [2, None, "*612345678"], [3, "***@***.io"]]
+    assert engine.maskers({1: "email"}, "none") == {}
+
+
+def test_ndjson_stream_masks_in_batches_across_chunk_boundaries():
+    lines = [{"type": "columns", "columns": ["id", "email", "credit_card"], "query_type": "SELECT"}]
+    lines += [{"type": "row", "values": [i, f"user{i}@example.com", "4532-1234-5678-9010"]} for i in range(25)]
+    body = "".join(json.dumps(line) + "\n" for line in lines)
+    body += json.dumps([25, None, "4532123456789010"]) + "\n"
+    body += json.dumps({"type": "summary", "rows_returned": 26})  # no trailing newline
+
+    stream = NdjsonMaskingStream(detect_pii_columns, "partial", MaskingEngine(batch_rows=10))
+    data = body.encode()
+    out = []
+    for start in range(0, len(data), 37):
+        out.extend(stream.feed(data[start:start + 37]))
+    out.extend(stream.finish())
+    out = [json.loads(line) for line in out]
+
+    assert out[0]["type"] == "columns" and out[0]["masked_columns"] == ["email", "credit_card"]
+    rows = [line["values"] for line in out if line["type"] == "row"]
+    assert len(rows) == 26
+    assert rows[3] == [3, "u***@e***.com", "****-****-****-9010"]
+    assert rows[25] == [25, None, "************9010"]
+    assert out[-2] == {"type": "summary", "rows_returned": 26}
+    summary = out[-1]
+    assert summary["type"] == "masking_summary" and summary["rows"] == 26 and summary["cells_masked"] == 51
+
+
+class FakeRequest:
+    """Request body delivered in small chunks, as from a real client"""
+
+    def __init__(self, body, content_type="application/x-ndjson"):
+        self.body = body
+        self.headers = {"content-type": content_type}
+
+    async def stream(self):
+        for start in range(0, len(self.body), 16):
+            yield self.body[start:start + 16]
+
+
+async def stream_endpoint(body, **params):
+    response = await data_masking.apply_masking_stream(FakeRequest(body), **params)
+    return [chunk async for chunk in response.body_iterator]
+
+
+def test_apply_endpoints_use_the_engine():
+    result = asyncio.run(data_masking.apply_masking(data_masking.MaskingApplyRequest(
+        query_result={"columns": ["id", "phone"], "rows": [[1, "+33 6 12 34 56 78"]]}, role="developer")))
+    assert result["masking_level"] == "full" and result["result"]["rows"] == [[1, "***-***-****"]]
+
+    body = b'{"columns": ["id", "ssn"]}\n[1, "123-45-6789"]\n[2, "987-65-4321"]\n'
+    out = [json.loads(line) for line in asyncio.run(stream_endpoint(body, role="dba"))]
+    assert [line["values"] for line in out if line["type"] == "row"] == [[1, "***-**-6789"], [2, "***-**-4321"]]
+    assert out[-1]["type"] == "masking_summary" and out[-1]["masked_columns"] == ["ssn"]
+
+    broken = asyncio.run(stream_endpoint(b'{"columns": ["email"]}\nnot json\n'))
+    assert json.loads(broken[-1])["type"] == "error"
+
+
+class StreamingCursor:
+    """Unbuffered cursor over `total` generated rows; counts the rows fetched so far"""
+
+    def __init__(self, total, columns=("id", "email", "card_number"),
+                 sources=(("customers", "id"), ("customers", "email"), ("customers", "card_number"))):
+        self.total = total
+        self.columns = columns
+        self.sources = sources  # (org_table, org_field) per result column; None: no metadata
+        self.fetched = 0
+        self.description = None
+        self.metadata = None
+        self.rows = iter(())
+        self.statements = []
+
+    def execute(self, sql):
+        self.statements.append(sql)
+        if sql.startswith("SHOW SESSION STATUS"):
+            self.description, self.rows = [("Variable_name",), ("Value",)], iter([("Rows_read", self.fetched)])
+        elif sql.startswith("SET SESSION"):
+            self.description = None
+        else:
+            self.description = [(name,) for name in self.columns]
+            if self.sources is not None:
+                self.metadata = {"org_table": tuple(t for t, _ in self.sources),
+                                 "org_field": tuple(f for _, f in self.sources)}
+            self.rows = ((i, f"user{i}@example.com", "4532 1234 5678 9010") for i in range(self.total))
+
+    def fetchmany(self, size):
+        batch = [row for _, row in zip(range(size), self.rows)]
+        if self.description and self.description[0][0] == "id":
+            self.fetched += len(batch)
+        return batch
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def close(self):
+        pass
+
+
+class StreamingConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.closed = False
+
+    def cursor(self, buffered=True):
+        assert buffered is False
+        return self._cursor
+
+    def close(self):
+        self.closed = True
+
+
+def test_masking_proxy_streams_masked_rows_from_the_cursor(monkeypatch):
+    cursor = StreamingCursor(total=10000)
+    conn = StreamingConnection(cursor)
+    monkeypatch.setattr(data_masking, "get_pooled_connection", lambda database=None: conn)
+    monkeypatch.setattr(data_masking, "masking_engine", MaskingEngine(batch_rows=100))
+
+    response = asyncio.run(data_masking.stream_masked_query(data_masking.MaskingQueryRequest(
+        sql="SELECT id, email, card_number FROM customers", max_rows=5000)))
+
+    async def consume(body_iterator):
+        lines, fetched_at_first_row = [], None
+        async for line in body_iterator:
+            lines.append(json.loads(line))
+            if fetched_at_first_row is None and lines[-1]["type"] == "row":
+                fetched_at_first_row = cursor.fetched
+        return lines, fetched_at_first_row
+
+    lines, fetched_at_first_row = asyncio.run(consume(response.body_iterator))
+    assert lines[0]["masked_columns"] == ["email", "card_number"]
+    assert lines[1]["values"] == [0, "u***@e***.com", "**** **** **** 9010"]
+    # The first masked row is out after one fetch batch, not the whole result
+    assert fetched_at_first_row <= 500
+
+    assert len([line for line in lines if line["type"] == "row"]) == 5000
+    assert lines[-1]["type"] == "summary" and lines[-1]["truncated_reason"] == "row_limit"
+    assert lines[-1]["masking_level"] == "partial" and conn.closed
+
+    blocked = asyncio.run(data_masking.stream_masked_query(data_masking.MaskingQueryRequest(
+        sql="DELETE FROM customers")))
+    assert asyncio.run(consume(blocked.body_iterator))[0] == [
+        {"type": "error", "error": "Only read-only queries (SELECT, SHOW, DESCRIBE, EXPLAIN) are allowed"}]
+
+
+def test_masking_proxy_masks_by_source_column_and_fails_closed(monkeypatch):
+    # SELECT id, email AS e, CONCAT(card_number, '') AS c FROM customers
+    cursor = StreamingCursor(total=3, columns=("id", "e", "c"),
+                             sources=(("customers", "id"), ("customers", "email"), ("", "")))
+    monkeypatch.setattr(data_masking, "get_pooled_connection", lambda database=None: StreamingConnection(cursor))
+
+    async def consume(response):
+        return [json.loads(line) async for line in response.body_iterator]
+
+    # role is not a request field: a client can't ask for clear values
+    lines = asyncio.run(consume(asyncio.run(data_masking.stream_masked_query(data_masking.MaskingQueryRequest(
+        sql="SELECT id, email AS e, CONCAT(card_number, '') AS c FROM customers", role="admin",
+        masking_level="none")))))
+    assert lines[0]["masked_columns"] == ["e", "c"] and lines[0]["unverified_columns"] == ["c"]
+    assert lines[1]["values"] == [0, "u***@e***.com", "****"]
+    assert lines[-1]["masking_level"] == "partial"
+
+    # Without source metadata nothing is streamed
+    cursor = StreamingCursor(total=3, sources=None)
+    lines = asyncio.run(consume(asyncio.run(data_masking.stream_masked_query(data_masking.MaskingQueryRequest(
+        sql="SELECT id, email, card_number FROM customers")))))
+    assert [line["type"] for line in lines] == ["error"] and "metadata unavailable" in lines[0]["error"]
@@ -0,0 +1,141 @@
+import asyncio
+import threading
+import time
+import sys
+import os
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mcp_service import MCPService
+from services.cache import SimpleCache
+
+RESULTS = {
+    "SHOW TABLES": ([("Tables_in_shop_demo",)], [("orders",), ("customers",)]),
+    "DESCRIBE orders": ([("Field",), ("Type",)], [("id", "int"), ("total", "decimal")]),
+    "SHOW INDEX FROM orders": ([("Table",), ("Key_name",)], [("orders", "PRIMARY")]),
+    "SHOW CREATE TABLE orders": ([("Table",), ("Create Table",)], [("orders", "CREATE TABLE orders (...)")]),
+    "SELECT SLEEP(1)": ([("SLEEP(1)",)], [(0,)]),
+}
+
+
+class FakeServer:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.statements = []
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    def connect(self, database=None):
+        with self.lock:
+            self.connections += 1
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, server):
+        self.server = server
+
+    def cursor(self, buffered=True, dictionary=False):
+        return FakeCursor(self.server)
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, server):
+        self.server = server
+        self.description = None
+        self.rows = []
+        self.rowcount = 0
+
+    def execute(self, sql, params=()):
+        with self.server.lock:
+            self.server.statements.append(sql)
+        self.description, self.rows = None, []
+        if sql.startswith("SHOW SESSION STATUS"):
+            self.description, self.rows = [("Variable_name",), ("Value",)], [("Rows_read", 0)]
+        elif sql in RESULTS:
+            if sql.startswith("SELECT"):
+                time.sleep(self.server.delay)
+            self.description, rows = RESULTS[sql]
+            self.rows = list(rows)
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def fetchall(self):
+        return self.fetchmany(len(self.rows))
+
+    def close(self):
+        pass
+
+
+def statements(server, prefix):
+    return [s for s in server.statements if s.startswith(prefix)]
+
+
+def test_schema_tools_use_the_pool_and_the_cache():
+    server = FakeServer()
+    service = MCPService(connection_factory=server.connect, schema_cache=SimpleCache(ttl_seconds=300))
+
+    schema = service.execute_tool("get_schema", {"database": "shop_demo", "table": "orders"})
+    assert [c["Field"] for c in schema["columns"]] == ["id", "total"]
+    assert schema["create_statement"] == "CREATE TABLE orders (...)"
+    assert service.execute_tool("list_tables", {"database": "shop_demo"})["tables"] == ["orders", "customers"]
+    assert server.connections == 4
+
+    # Served from the cache, no connection
+    assert service.execute_tool("get_schema", {"database": "shop_demo", "table": "orders"}) == schema
+    service.execute_tool("list_tables", {"database": "shop_demo"})
+    assert server.connections == 4
+    assert [(h["tool"], h["cached"]) for h in service.tool_history] == [
+        ("get_schema", False), ("list_tables", False), ("get_schema", True), ("list_tables", True)]
+    assert all(h["duration_ms"] is not None for h in service.tool_history)
+
+    # refresh bypasses the cache, DDL invalidation empties it for the database
+    service.execute_tool("list_tables", {"database": "shop_demo", "refresh": True})
+    assert server.connections == 5
+    assert service.invalidate_schema_cache("other_db") == 0
+    assert service.invalidate_schema_cache("shop_demo") == 2
+    service.execute_tool("get_schema", {"database": "shop_demo", "table": "orders"})
+    assert server.connections == 8
+
+
+def test_async_tools_run_off_the_loop_with_timeouts():
+    server = FakeServer(delay=0.3)
+    service = MCPService(connection_factory=server.connect, schema_cache=SimpleCache(),
+                         tool_timeouts={"query_database": 0.1}, max_workers=4)
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        slow, fast = await asyncio.gather(
+            service.execute_tool_async("query_database", {"sql": "SELECT SLEEP(1)"}),
+            service.execute_tool_async("list_tables", {"database": "shop_demo"}),
+        )
+        task.cancel()
+        return slow, fast, ticks
+
+    started = time.perf_counter()
+    slow, fast, ticks = asyncio.run(run())
+    assert time.perf_counter() - started < 0.3
+    assert slow == {"error": "Tool query_database timed out after 0.1s"}
+    assert fast["tables"] == ["orders", "customers"]
+    # The loop kept running while the query blocked its worker thread
+    assert ticks >= 5
+    # The server-side limit follows the tool timeout
+    assert statements(server, "SET SESSION max_statement_time") == ["SET SESSION max_statement_time = 0.1"]
+
+    history = {h["tool"]: h for h in service.tool_history}
+    assert history["query_database"]["status"] == "timeout" and history["list_tables"]["status"] == "success"
+    assert 100 <= history["query_database"]["duration_ms"] < 300
@@ -0,0 +1,109 @@
+import asyncio
+import re
+import sys
+import os
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.pii_sampler import PIISampler
+import routers.data_masking as data_masking
+from routers.data_masking import PIIDetector
+
+# Per table: 2 PII columns, 1 name-only false positive (datetime), 17 plain columns
+TABLE_COLUMNS = ([("id", "int"), ("contact_email", "varchar"), ("phone", "varchar"), ("email_sent_at", "datetime")] +
+                 [(f"c{i}", "varchar") for i in range(16)])
+
+
+class FakeSchema:
+    """`tables` tables of 20 columns; rows are generated on demand"""
+
+    def __init__(self, tables=25, rows=30):
+        self.tables = [f"t{i:02d}" for i in range(tables)]
+        self.rows = rows
+        self.queries = []
+
+    def value(self, column, row):
+        if column == "contact_email":
+            return None if row % 3 == 0 else f"user{row}@example.com"
+        if column == "phone":
+            return f"+33 6 12 34 56 {row % 90 + 10}"
+        return f"{column}-{row}"
+
+    def connect(self, database=None):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, schema):
+        self.schema = schema
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.schema)
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, schema):
+        self.schema = schema
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        schema, sql = self.schema, " ".join(sql.split())
+        schema.queries.append(sql)
+        if "information_schema.COLUMNS" in sql:
+            tables = params[1:] or schema.tables
+            self.rows = [(t, c, data_type) for t in tables for c, data_type in TABLE_COLUMNS]
+        else:
+            columns = re.findall(r"`(\w+)`", sql.split(" FROM ")[0])
+            limit = int(sql.rsplit("LIMIT", 1)[1])
+            self.rows = [tuple(schema.value(c, r) for c in columns) for r in range(min(limit, schema.rows))]
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+def test_sampler_uses_one_query_per_table_for_candidate_columns():
+    schema = FakeSchema(tables=25)
+    sampler = PIISampler(connection_factory=schema.connect, max_workers=4)
+    columns, samples, stats = sampler.sample("shop_demo", is_candidate=PIIDetector.is_candidate)
+
+    assert len(columns) == 500
+    assert stats["queries"] == 26 and len(schema.queries) == 26  # information_schema + 1 per table
+    assert set(samples) == {(t, c) for t in schema.tables for c in ("contact_email", "phone")}
+    # NULLs are skipped; at most 5 values per column
+    assert samples[("t03", "contact_email")] == [f"user{r}@example.com" for r in (1, 2, 4, 5, 7)]
+    sample_sql = [q for q in schema.queries if "information_schema" not in q][0]
+    assert "`contact_email` IS NOT NULL OR `phone` IS NOT NULL" in sample_sql and "LIMIT 50" in sample_sql
+
+
+def test_detector_prefilters_by_name_and_type():
+    assert PIIDetector.is_candidate("contact_email", "varchar")
+    assert not PIIDetector.is_candidate("email_sent_at", "datetime")
+    assert not PIIDetector.is_candidate("total", "decimal")
+    assert PIIDetector.is_candidate("card_number", "bigint")
+
+    detected = PIIDetector.detect_pii_column("email", ["a@b.io", "not an email"], "varchar")
+    assert detected["pii_type"] == "email" and detected["confidence"] == 0.875
+    # Without a type (e.g. /masking/apply) the name alone decides, as before
+    assert PIIDetector.detect_pii_column("email_sent_at", [])["pii_type"] == "email"
+
+
+def test_analyze_endpoint_reports_pii_columns(monkeypatch):
+    schema = FakeSchema(tables=3)
+    monkeypatch.setattr(data_masking, "pii_sampler", PIISampler(connection_factory=schema.connect))
+
+    result = asyncio.run(data_masking.analyze_pii_columns(data_masking.MaskingAnalyzeRequest(tables=["t00", "t01"])))
+    assert result["success"]
+    assert result["total_columns_analyzed"] == 40
+    assert [(c["table"], c["column"], c["pii_type"]) for c in result["pii_columns"]] == [
+        ("t00", "contact_email", "email"), ("t00", "phone", "phone"),
+        ("t01", "contact_email", "email"), ("t01", "phone", "phone"),
+    ]
+    assert result["pii_columns"][0]["sample_masked"] == "u***@e***.com"
+    assert result["sampling"]["queries"] == 3
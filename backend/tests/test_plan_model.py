@@ -0,0 +1,118 @@
+import copy
+import sys
+import os
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.plan_model import parse_plan, plan_distance, diff_plans, plan_tables
+from services.plan_baselines import PlanBaselineStore
+from services.cache import SimpleCache
+
+# MySQL-style two table join
+JOIN_PLAN = {
+    "query_block": {
+        "select_id": 1,
+        "cost_info": {"query_cost": "120.00"},
+        "nested_loop": [
+            {"table": {"table_name": "customers", "access_type": "ALL", "rows_examined_per_scan": 1000,
+                       "cost_info": {"read_cost": "10.00", "eval_cost": "100.00"}}},
+            {"table": {"table_name": "orders", "access_type": "ref", "key": "idx_customer_id",
+                       "rows_examined_per_scan": 5, "cost_info": {"read_cost": "5.00", "eval_cost": "5.00"}}},
+        ],
+    }
+}
+
+# MariaDB-style single table plan with a dependent subquery
+MARIADB_PLAN = {
+    "query_block": {
+        "select_id": 1,
+        "filesort": {
+            "sort_key": "o.order_date",
+            "temporary_table": {
+                "table": {"table_name": "o", "access_type": "range", "key": "idx_date", "rows": 200, "filtered": 100}
+            },
+        },
+        "subqueries": [
+            {"query_block": {"select_id": 2,
+                             "table": {"table_name": "c", "access_type": "eq_ref", "key": "PRIMARY", "rows": 1}}}
+        ],
+    }
+}
+
+
+def test_parse_full_tree():
+    root = parse_plan(MARIADB_PLAN)
+    ops = [n.op for n in root.walk()]
+    assert ops == ["plan", "query_block", "sort", "temporary_table", "table", "subquery", "query_block", "table"]
+    assert [t.table for t in plan_tables(root)] == ["o", "c"]
+    assert plan_tables(parse_plan(JOIN_PLAN))[1].access_type == "REF"
+
+
+def test_identical_and_empty_plans():
+    assert plan_distance(JOIN_PLAN, copy.deepcopy(JOIN_PLAN)) == 0.0
+    assert plan_distance(JOIN_PLAN, {}) == 1.0
+    assert plan_distance(JOIN_PLAN, MARIADB_PLAN) > 0.5
+
+
+def test_join_flip_is_detected_and_cost_weighted():
+    flipped = copy.deepcopy(JOIN_PLAN)
+    flipped["query_block"]["nested_loop"][1]["table"].update(
+        access_type="ALL", key=None, rows_examined_per_scan=100000,
+        cost_info={"read_cost": "5000.00", "eval_cost": "10000.00"}
+    )
+    diff = diff_plans(JOIN_PLAN, flipped)
+    assert diff["lost_index_access"] == ["orders"]
+    assert diff["table_changes"][0]["before"]["key"] == "idx_customer_id"
+    assert diff["distance"] > 0.3
+
+    # Same access change on the cheap table weighs less than on the expensive one
+    cheap = copy.deepcopy(JOIN_PLAN)
+    cheap["query_block"]["nested_loop"][1]["table"]["access_type"] = "range"
+    expensive = copy.deepcopy(JOIN_PLAN)
+    expensive["query_block"]["nested_loop"][0]["table"]["access_type"] = "index"
+    assert plan_distance(JOIN_PLAN, cheap) < plan_distance(JOIN_PLAN, expensive)
+
+
+def test_join_order_change():
+    swapped = copy.deepcopy(JOIN_PLAN)
+    swapped["query_block"]["nested_loop"].reverse()
+    diff = diff_plans(JOIN_PLAN, swapped)
+    assert diff["join_order_changed"]
+    assert diff["join_order"]["after"] == ["orders", "customers"]
+    assert 0.0 < diff["distance"] < 1.0
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = 0
+        self._last = None
+
+    def execute(self, sql, params=None):
+        self.executed += 1
+        self._last = self.rows.get(params[0]) if params else None
+
+    def fetchone(self):
+        return self._last
+
+    def close(self):
+        pass
+
+
+def test_baseline_store_serves_from_memory():
+    cursor = FakeCursor({"abc": {"fingerprint": "abc", "query_pattern": "SELECT 1",
+                                 "best_plan": '{"query_block": {"table": {"table_name": "t", "access_type": "ALL"}}}',
+                                 "best_execution_time_ms": 3, "best_cost": 1.5}})
+    store = PlanBaselineStore(cache=SimpleCache(ttl_seconds=60))
+
+    first = store.get("abc", cursor=cursor)
+    second = store.get("abc", cursor=cursor)
+    assert first is second
+    assert cursor.executed == 1
+    assert plan_tables(first["plan_tree"])[0].table == "t"
+
+    store.invalidate("abc")
+    store.get("abc", cursor=cursor)
+    assert cursor.executed == 2
+    assert store.get("missing", cursor=cursor) is None
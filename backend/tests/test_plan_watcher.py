@@ -0,0 +1,128 @@
+import json
+import threading
+import time
+import sys
+import os
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.cache import SimpleCache
+from services.plan_baselines import PlanBaselineStore
+from services.explain_service import ExplainService
+from services.plan_watcher import PlanRegressionWatcher
+
+BASELINE_PLAN = {"query_block": {"table": {"table_name": "orders", "access_type": "ref", "key": "idx_customer", "rows": 5}}}
+FLIPPED_PLAN = {"query_block": {"table": {"table_name": "orders", "access_type": "ALL", "rows": 100000}}}
+
+BASELINES = [
+    {"fingerprint": f"fp{i}", "query_pattern": f"SELECT id FROM orders WHERE customer_id = {i}",
+     "best_plan": json.dumps(BASELINE_PLAN), "best_execution_time_ms": 2, "best_cost": float(i)}
+    for i in range(6)
+]
+
+
+class FakeDB:
+    """Records statements; EXPLAIN returns the flipped plan for fp1's statement"""
+
+    def __init__(self, explain_delay=0.0):
+        self.statements = []
+        self.active = 0
+        self.peak = 0
+        self.explain_delay = explain_delay
+        self.lock = threading.Lock()
+
+    def connect(self, database=None):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.db)
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+
+    def execute(self, sql, params=None):
+        self.db.statements.append(sql.strip())
+        if "FROM query_plan_baselines" in sql:
+            self.rows = BASELINES
+        elif "mysql.slow_log" in sql:
+            self.rows = [{"db": "shop_demo", "sql_text": "SELECT id FROM orders WHERE customer_id = 77",
+                          "executions": 40, "total_time": 120.0}]
+        elif "information_schema.TABLES" in sql:
+            self.rows = [{"table_schema": "shop_demo", "table_name": "orders", "create_time": "2024-01-01",
+                          "update_time": None, "analyzed_at": "2024-01-02"}]
+        elif sql.startswith("EXPLAIN"):
+            with self.db.lock:
+                self.db.active += 1
+                self.db.peak = max(self.db.peak, self.db.active)
+            time.sleep(self.db.explain_delay)
+            with self.db.lock:
+                self.db.active -= 1
+            plan = FLIPPED_PLAN if sql.endswith("customer_id = 1") else BASELINE_PLAN
+            self.rows = [{"EXPLAIN": json.dumps(plan)}]
+        else:
+            raise AssertionError(f"watcher must only EXPLAIN, got: {sql}")
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def close(self):
+        pass
+
+
+def make_watcher(db, **kwargs):
+    store = PlanBaselineStore(cache=SimpleCache(ttl_seconds=60), connection_factory=db.connect)
+    explainer = ExplainService(connection_factory=db.connect, cache=SimpleCache(ttl_seconds=60))
+    return PlanRegressionWatcher(store=store, connection_factory=db.connect, stagger_seconds=0,
+                                 explainer=explainer, **kwargs)
+
+
+def test_flip_detected_with_explain_only():
+    db = FakeDB()
+    watcher = make_watcher(db, top_n=3)
+
+    result = watcher.run_once()
+    assert result["checked"] == 3
+    explains = [s for s in db.statements if s.startswith("EXPLAIN")]
+    assert len(explains) == 3
+
+    # Slow log cost ranks every fingerprint equally here, baseline cost breaks ties
+    checked = {r["fingerprint"] for r in result["results"]}
+    assert checked == {"fp5", "fp4", "fp3"}
+    assert watcher.get_events() == []
+
+
+def test_flip_event_raised_once_per_plan():
+    db = FakeDB()
+    watcher = make_watcher(db, top_n=6)
+
+    watcher.run_once()
+    events = watcher.get_events()
+    assert [e["fingerprint"] for e in events] == ["fp1"]
+    assert events[0]["plan_diff"]["lost_index_access"] == ["orders"]
+
+    # Same flipped plan on the next cycle: no duplicate event
+    watcher.run_once()
+    assert len(watcher.get_events()) == 1
+    assert watcher.get_events(since=events[0]["id"]) == []
+
+
+def test_concurrency_is_bounded():
+    db = FakeDB(explain_delay=0.05)
+    watcher = make_watcher(db, top_n=6, max_concurrency=2)
+    watcher.run_once()
+    assert db.peak == 2
@@ -0,0 +1,140 @@
+import asyncio
+import json
+import sys
+import os
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.result_stream import ResultStreamer
+from models import SandboxRequest
+import routers.sandbox as sandbox
+
+
+class FakeUnbufferedCursor:
+    """Produces rows lazily and honours sql_select_limit like the server"""
+
+    def __init__(self, total_rows, row_width=10):
+        self.total_rows = total_rows
+        self.row_width = row_width
+        self.select_limit = None
+        self.rows_read = 0
+        self.produced = 0
+        self.statements = []
+        self.description = None
+        self.rowcount = -1
+        self._iter = iter(())
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+        self.description = None
+        if sql.startswith("SET SESSION sql_select_limit"):
+            value = sql.rsplit("=", 1)[1].strip()
+            self.select_limit = None if value == "DEFAULT" else int(value)
+            self._iter = iter(())
+        elif sql.startswith("SHOW SESSION STATUS"):
+            self.description = [("Variable_name",), ("Value",)]
+            self._iter = iter([("Rows_read", str(self.rows_read))])
+        elif sql.startswith("SELECT"):
+            self.description = [("id",), ("payload",)]
+            limit = self.total_rows if self.select_limit is None else min(self.total_rows, self.select_limit)
+            self._iter = self._produce(limit)
+        elif sql.startswith("UPDATE"):
+            self.rowcount = 42
+            self._iter = iter(())
+        else:
+            self._iter = iter(())
+
+    def _produce(self, limit):
+        for i in range(limit):
+            self.produced += 1
+            self.rows_read += 1
+            yield (i, "x" * self.row_width)
+
+    def fetchmany(self, size):
+        batch = []
+        for row in self._iter:
+            batch.append(row)
+            if len(batch) >= size:
+                break
+        return batch
+
+    def fetchall(self):
+        return list(self._iter)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self, **kwargs):
+        assert kwargs.get("buffered") is False
+        return self._cursor
+
+    def close(self):
+        pass
+
+
+def test_row_cap_stops_the_server_early():
+    cursor = FakeUnbufferedCursor(total_rows=1_000_000)
+    streamer = ResultStreamer(cursor, row_limit=100, byte_limit=10 ** 9, batch_size=30)
+    streamer.execute("SELECT id, payload FROM big")
+    rows = list(streamer.rows())
+
+    assert len(rows) == 100
+    assert rows[0] == [0, "x" * 10]
+    assert streamer.truncated and streamer.truncated_reason == "row_limit"
+    # sql_select_limit = cap + 1: the server never sends the other million rows
+    assert cursor.produced == 101
+    assert streamer.rows_examined == 101
+    assert cursor.statements[-2] == "SET SESSION sql_select_limit = DEFAULT"
+
+
+def test_byte_cap_and_untruncated_results():
+    cursor = FakeUnbufferedCursor(total_rows=500, row_width=100)
+    streamer = ResultStreamer(cursor, row_limit=1000, byte_limit=1200)
+    streamer.execute("SELECT id, payload FROM big")
+    rows = list(streamer.rows())
+    assert 0 < len(rows) < 20
+    assert streamer.truncated_reason == "byte_limit"
+    assert streamer.bytes_returned <= 1200
+
+    cursor = FakeUnbufferedCursor(total_rows=5)
+    streamer = ResultStreamer(cursor, row_limit=5)
+    streamer.execute("SELECT id, payload FROM small")
+    assert len(list(streamer.rows())) == 5
+    assert not streamer.truncated
+    assert streamer.stats()["rows_returned"] == 5
+
+
+def test_sandbox_json_and_ndjson(monkeypatch):
+    cursor = FakeUnbufferedCursor(total_rows=50_000)
+    monkeypatch.setattr(sandbox, "get_db_connection", lambda database=None: FakeConnection(cursor))
+
+    request = SandboxRequest(sql="SELECT id, payload FROM big", max_rows=10)
+    response = asyncio.run(sandbox.test_query_in_sandbox(request))
+    assert response.success
+    assert len(response.result.rows) == 10
+    assert response.result.truncated and response.result.rows_examined == 11
+    assert "ROLLBACK" in cursor.statements
+
+    cursor = FakeUnbufferedCursor(total_rows=50_000)
+    monkeypatch.setattr(sandbox, "get_db_connection", lambda database=None: FakeConnection(cursor))
+
+    async def stream():
+        response = await sandbox.stream_query_in_sandbox(request)
+        return [json.loads(line) async for line in response.body_iterator]
+
+    lines = asyncio.run(stream())
+    assert lines[0]["type"] == "columns" and lines[0]["columns"] == ["id", "payload"]
+    assert sum(1 for line in lines if line["type"] == "row") == 10
+    assert lines[-1]["type"] == "summary" and lines[-1]["truncated"] is True
+    assert cursor.produced == 11
+
+    cursor = FakeUnbufferedCursor(total_rows=0)
+    monkeypatch.setattr(sandbox, "get_db_connection", lambda database=None: FakeConnection(cursor))
+    response = asyncio.run(sandbox.test_query_in_sandbox(SandboxRequest(sql="UPDATE big SET a = 1")))
+    assert response.result.rows == [[42]]
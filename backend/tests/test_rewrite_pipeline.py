@@ -0,0 +1,75 @@
+import pytest
+import sys
+import os
+import time
+import asyncio
+from unittest.mock import MagicMock
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.rewriter import QueryRewriterService
+from services.cache import query_rewrite_cache
+from models import RewriteRequest
+
+
+def make_service(**kwargs):
+    service = QueryRewriterService(
+        embedding_service=MagicMock(),
+        vector_store=MagicMock(),
+        rag_enabled=False,
+        index_service=None,
+        **kwargs
+    )
+
+    async def fake_explain(sql, database):
+        await asyncio.sleep(0.2)
+        return None
+
+    async def fake_search_jira(sql):
+        await asyncio.sleep(0.2)
+        return [], []
+
+    service._explain_original = fake_explain
+    service._search_similar_jira = fake_search_jira
+    return service
+
+
+@pytest.mark.asyncio
+async def test_stages_overlap():
+    query_rewrite_cache.clear()
+    service = make_service(llm_context_grace=0.0)
+
+    async def fake_call_skyai(sql, *args, **kwargs):
+        await asyncio.sleep(0.2)
+        return sql, None, {}
+    service._call_skyai = fake_call_skyai
+
+    start = time.perf_counter()
+    response = await service.rewrite_query(RewriteRequest(sql="SELECT id FROM orders ORDER BY id"))
+    elapsed = time.perf_counter() - start
+
+    # RAG, EXPLAIN and LLM (0.2s each) run concurrently
+    assert elapsed < 0.5
+    assert response.degraded_stages == []
+    assert {"rag", "explain", "llm"} <= set(response.stage_timings_ms)
+
+
+@pytest.mark.asyncio
+async def test_slow_llm_stage_returns_partial_result():
+    query_rewrite_cache.clear()
+    service = make_service(stage_timeouts={"llm": 0.1})
+
+    async def hanging_call_skyai(sql, *args, **kwargs):
+        await asyncio.sleep(5)
+        return "SELECT 1", None, {}
+    service._call_skyai = hanging_call_skyai
+
+    sql = "SELECT id FROM orders ORDER BY id"
+    response = await service.rewrite_query(RewriteRequest(sql=sql))
+
+    assert response.degraded_stages == ["llm"]
+    assert "ORDER BY without LIMIT - sorts entire result set" in response.anti_patterns_detected
+    assert response.rewritten_sql == sql
+    # Partial results are not cached
+    assert query_rewrite_cache.get(f"rewrite:{sql}") is None
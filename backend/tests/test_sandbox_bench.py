@@ -0,0 +1,129 @@
+import threading
+import time
+import sys
+import os
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.sandbox_bench import SandboxBenchmark, mann_whitney_u, percentile, STATUS_COUNTERS
+
+
+class FakeServer:
+    """SHOW STATUS bumps the counters itself, like the real server does"""
+
+    def __init__(self):
+        self.executions = []
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def connect(self, database=None):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, server):
+        self.server = server
+        self.status = {name: 0 for name in STATUS_COUNTERS}
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+        self.description = None
+        self.rowcount = 0
+
+    def execute(self, sql, params=None):
+        status, server = self.conn.status, self.conn.server
+        self.description = None
+        if sql.startswith("SHOW SESSION STATUS"):
+            status["Handler_read_rnd_next"] += 7
+            status["Created_tmp_tables"] += 1
+            self.rows = [(name, str(status[name])) for name in params]
+            self.description = [("Variable_name",), ("Value",)]
+        elif sql.startswith("SELECT"):
+            with server.lock:
+                server.executions.append(sql)
+                server.active += 1
+                server.peak = max(server.peak, server.active)
+            slow = "slow" in sql
+            time.sleep(0.006 if slow else 0.001)
+            with server.lock:
+                server.active -= 1
+            if slow:
+                status["Handler_read_rnd_next"] += 1000
+                status["Innodb_rows_read"] += 1000
+            else:
+                status["Handler_read_key"] += 1
+                status["Innodb_rows_read"] += 1
+            self.rows = [(1,)]
+            self.description = [("id",)]
+        elif sql.startswith("UPDATE"):
+            with server.lock:
+                server.executions.append(sql)
+            self.rowcount = 3
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+def test_mann_whitney_and_percentile():
+    _, p_separated = mann_whitney_u([10, 11, 12, 13, 14, 15, 16, 17], [1, 2, 3, 4, 5, 6, 7, 8])
+    assert p_separated < 0.01
+    _, p_same = mann_whitney_u([1, 2, 3, 4, 5, 6], [1, 2, 3, 4, 5, 6])
+    assert p_same > 0.9
+    assert percentile([5, 1, 4, 2, 3], 95) == 5
+    assert percentile(list(range(1, 101)), 95) == 95
+
+
+def test_benchmark_alternates_and_reports_status_deltas():
+    server = FakeServer()
+    bench = SandboxBenchmark(connection_factory=server.connect)
+    result = bench.compare("SELECT slow FROM t", "SELECT fast FROM t", "shop_demo",
+                           repetitions=8, warmup=2, read_only=False)
+
+    # Warmup then alternating A/B, B/A rounds
+    recorded = server.executions[4:]
+    assert recorded[:4] == ["SELECT slow FROM t", "SELECT fast FROM t", "SELECT fast FROM t", "SELECT slow FROM t"]
+    assert len(recorded) == 16
+
+    assert result["original"]["runs"] == 8
+    # Status query / transaction overhead is calibrated out
+    assert result["original"]["session_status"]["Handler_read_rnd_next"] == 1000
+    assert result["original"]["session_status"]["Created_tmp_tables"] == 0
+    assert result["optimized"]["session_status"]["Handler_read_key"] == 1
+    assert result["session_status_delta"]["Innodb_rows_read"] == -999
+    assert result["significance"]["significant"]
+    assert result["improvement_percent"] > 10
+    assert result["recommendation"] == "Use optimized query"
+
+
+def test_read_only_queries_run_concurrently():
+    server = FakeServer()
+    bench = SandboxBenchmark(connection_factory=server.connect)
+    result = bench.compare("SELECT slow FROM t", "SELECT slow FROM t", "shop_demo",
+                           repetitions=6, warmup=0, read_only=True)
+    assert server.peak == 2
+    assert result["concurrent"] is True
+    assert result["optimized"]["runs"] == 6
+
+
+def test_writes_run_sequentially():
+    server = FakeServer()
+    bench = SandboxBenchmark(connection_factory=server.connect)
+    result = bench.compare("UPDATE t SET a = 1", "UPDATE t SET a = 2", "shop_demo",
+                           repetitions=4, warmup=1, read_only=False)
+    assert server.peak == 0
+    assert result["original"]["rows"] == 3
+    assert result["concurrent"] is False
@@ -0,0 +1,162 @@
+import asyncio
+import sys
+import os
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.schema_snapshot import SchemaSnapshotEngine, TableDef, ColumnDef, diff_snapshots, normalize_default
+import routers.schema_drift as schema_drift
+
+
+class FakeCatalog:
+    """information_schema rows for `tables` tables with the same layout"""
+
+    def __init__(self, tables=300):
+        self.columns = []
+        self.indexes = []
+        for t in range(tables):
+            name = f"t{t}"
+            self.columns += [
+                (name, "id", "int(11)", "NO", None, "auto_increment"),
+                (name, "customer_id", "int(11)", "YES", "NULL", ""),
+                (name, "status", "varchar(20)", "NO", "'new'", ""),
+            ]
+            self.indexes += [(name, "PRIMARY", 0, "BTREE", "id"), (name, "idx_cust", 1, "BTREE", "customer_id"),
+                             (name, "idx_cust", 1, "BTREE", "status")]
+        self.tables = [(f"t{t}", "InnoDB", "utf8mb4_general_ci") for t in range(tables)]
+        self.foreign_keys = [("t1", "fk_t0", "customer_id", "t0", "id", "CASCADE", "RESTRICT")]
+        self.checks = [("t2", "chk_status", "`status` in ('new','paid')")]
+        self.checks_supported = True
+        self.version = 1
+        self.queries = []
+
+    def connect(self, database=None):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def cursor(self):
+        return FakeCursor(self.catalog)
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        catalog = self.catalog
+        catalog.queries.append(sql)
+        if "CHECK_CONSTRAINTS" in sql and not catalog.checks_supported:
+            raise RuntimeError("Unknown table 'CHECK_CONSTRAINTS' in information_schema")
+        if "UNION ALL" in sql:
+            self.rows = [("tables", len(catalog.tables), catalog.version), ("columns", len(catalog.columns), 7)]
+            if "CHECK_CONSTRAINTS" in sql:
+                self.rows.append(("checks", len(catalog.checks), hash(tuple(catalog.checks))))
+        elif "FROM information_schema.TABLES" in sql:
+            self.rows = catalog.tables
+        elif "FROM information_schema.COLUMNS" in sql:
+            self.rows = catalog.columns
+        elif "FROM information_schema.STATISTICS" in sql:
+            self.rows = catalog.indexes
+        elif "KEY_COLUMN_USAGE" in sql:
+            self.rows = catalog.foreign_keys
+        elif "CHECK_CONSTRAINTS" in sql:
+            self.rows = catalog.checks
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+def test_snapshot_loads_schema_in_a_handful_of_queries_and_caches():
+    catalog = FakeCatalog(tables=300)
+    engine = SchemaSnapshotEngine(connection_factory=catalog.connect)
+
+    snapshot, changed = engine.get("shop_demo")
+    assert not changed
+    assert len(snapshot.tables) == 300
+    assert len(catalog.queries) <= 6
+
+    t1 = snapshot.tables["t1"]
+    assert t1.columns["id"] == ColumnDef("id", "INT(11)", False, None, True)
+    assert t1.columns["status"].default == "new" and t1.columns["customer_id"].default is None
+    assert t1.indexes["PRIMARY"].type == "PRIMARY KEY"
+    assert t1.indexes["idx_cust"].columns == ("customer_id", "status")
+    assert t1.foreign_keys["fk_t0"].on_delete == "CASCADE"
+    assert t1.to_dict()["indexes"]["idx_cust"] == {"type": "KEY", "columns": ["customer_id", "status"]}
+
+    # Unchanged checksum: answered from the cache with one query
+    catalog.queries.clear()
+    cached, changed = engine.get("shop_demo")
+    assert cached is snapshot and not changed
+    assert len(catalog.queries) == 1
+
+    catalog.version = 2
+    catalog.columns.append(("t5", "note", "text", "YES", None, ""))
+    reloaded, changed = engine.get("shop_demo")
+    assert changed and reloaded is not snapshot
+    assert engine.get_stats()["hits"] == 1
+
+
+def test_check_constraint_changes_invalidate_the_snapshot():
+    catalog = FakeCatalog(tables=5)
+    engine = SchemaSnapshotEngine(connection_factory=catalog.connect)
+    snapshot, _ = engine.get("shop_demo")
+    assert list(snapshot.tables["t2"].checks) == ["chk_status"]
+
+    # Only the CHECK clause changes: no other DDL, the cached snapshot must not be served
+    catalog.checks = [("t2", "chk_status", "`status` in ('new','paid','sent')")]
+    reloaded, changed = engine.get("shop_demo")
+    assert changed and "'sent'" in reloaded.tables["t2"].checks["chk_status"]
+
+    # Older servers without CHECK_CONSTRAINTS: checksum without the term, asked once
+    catalog = FakeCatalog(tables=5)
+    catalog.checks_supported = False
+    engine = SchemaSnapshotEngine(connection_factory=catalog.connect)
+    snapshot, _ = engine.get("shop_demo")
+    assert snapshot.tables["t2"].checks == {} and not engine.checks_available
+    catalog.queries.clear()
+    assert engine.get("shop_demo")[0] is snapshot
+    assert len(catalog.queries) == 1 and "CHECK_CONSTRAINTS" not in catalog.queries[0]
+
+
+def test_diff_snapshots_only_returns_changed_tables():
+    catalog = FakeCatalog(tables=50)
+    engine = SchemaSnapshotEngine(connection_factory=catalog.connect)
+    before, _ = engine.get("shop_demo")
+
+    catalog.version = 2
+    catalog.columns = [c if c[:2] != ("t7", "status") else ("t7", "status", "varchar(40)", "NO", "'new'", "")
+                       for c in catalog.columns]
+    catalog.tables.append(("t_new", "InnoDB", "utf8mb4_general_ci"))
+    after, _ = engine.get("shop_demo")
+
+    changed, missing, extra = diff_snapshots(before.tables, after.tables)
+    assert [name for name, _, _ in changed] == ["t7"]
+    assert missing == [] and extra == ["t_new"]
+
+    # Column order does not matter for the fingerprint
+    a, b = TableDef("x"), TableDef("x")
+    a.columns = {"a": ColumnDef("a", "INT", True, None, False), "b": ColumnDef("b", "INT", True, None, False)}
+    b.columns = dict(reversed(list(a.columns.items())))
+    assert a.fingerprint == b.fingerprint
+    assert normalize_default("'it''s'") == "it's" and normalize_default("NULL") is None
+
+
+def test_detect_drift_uses_snapshot(monkeypatch):
+    catalog = FakeCatalog(tables=20)
+    monkeypatch.setattr(schema_drift, "schema_snapshots", SchemaSnapshotEngine(connection_factory=catalog.connect))
+    result = asyncio.run(schema_drift.detect_drift(schema_drift.DriftDetectRequest(tables=["t1", "t2"])))
+    assert result["success"]
+    assert result["drift_report"]["tables_analyzed"] == 2
+    assert result["drift_report"]["total_issues"] == 0
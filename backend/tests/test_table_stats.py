@@ -0,0 +1,153 @@
+import sys
+import os
+from datetime import datetime
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.table_stats import TableStatsCollector, access_frequency
+
+GB = 1024 ** 3
+
+
+class FakeServer:
+    """tables: name -> [data_bytes, rows, reads, writes]"""
+
+    def __init__(self, tables, performance_schema=True):
+        self.tables = tables
+        self.performance_schema = performance_schema
+        self.queries = 0
+
+    def connect(self, database=None):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, server):
+        self.server = server
+
+    def cursor(self):
+        return FakeCursor(self.server)
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, server):
+        self.server = server
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        self.server.queries += 1
+        names = params[1:] or list(self.server.tables)
+        if "INFORMATION_SCHEMA.TABLES" in sql:
+            self.rows = [(n, self.server.tables[n][0], 0, self.server.tables[n][1], None, datetime(2024, 1, 1))
+                         for n in names if n in self.server.tables]
+        elif "performance_schema" in sql:
+            if not self.server.performance_schema:
+                raise RuntimeError("Table 'performance_schema.table_io_waits_summary_by_table' doesn't exist")
+            self.rows = [(n, self.server.tables[n][2], self.server.tables[n][3], 2.0, 0)
+                         for n in names if n in self.server.tables]
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_collector(server, clock):
+    return TableStatsCollector(connection_factory=server.connect, clock=clock)
+
+
+def test_whole_schema_in_two_queries_with_deltas():
+    tables = {f"t{i}": [10 * GB, 1000, 5000, 100] for i in range(200)}
+    tables["hot"] = [10 * GB, 1000, 5000, 100]
+    server = FakeServer(tables)
+    clock = Clock()
+    collector = make_collector(server, clock)
+
+    first = collector.analyze("shop_demo")
+    assert server.queries == 2
+    assert len(first) == 201
+    # No earlier snapshot: cumulative counters, growth unknown
+    assert first["t0"]["basis"] == "cumulative" and first["t0"]["growth_rate"] is None
+    assert first["t0"]["access_frequency"] == "high"
+    assert first["t0"]["total_read_time_sec"] == 2.0
+
+    # One day later: t0 untouched, hot grew 10% and was read 50k times
+    clock.now += 86400
+    tables["hot"] = [11 * GB, 1100, 55000, 100]
+    second = collector.analyze("shop_demo")
+    assert server.queries == 4
+    assert second["t0"]["basis"] == "delta"
+    assert second["t0"]["access_frequency"] == "never"
+    assert second["t0"]["growth_rate"] == 0
+    assert second["hot"]["accesses_per_day"] == 50000
+    assert second["hot"]["access_frequency"] == "high"
+    assert second["hot"]["growth_rate"] == 3.0  # 10%/day -> 300% per 30 days
+
+
+def test_window_and_counter_reset():
+    tables = {"orders": [GB, 10, 1000, 0]}
+    server = FakeServer(tables)
+    clock = Clock()
+    collector = make_collector(server, clock)
+    collector.snapshot("shop_demo")
+    clock.now += 3600 * 10
+    tables["orders"][2] = 1010
+    collector.snapshot("shop_demo")
+    clock.now += 3600 * 2
+    tables["orders"][2] = 1012
+
+    # 2h window: baseline is the second snapshot
+    result = collector.analyze("shop_demo", window_hours=3)["orders"]
+    assert result["read_count"] == 2 and result["window_days"] == round(2 / 24, 3)
+
+    # Server restart: counters went backwards, no negative rates
+    clock.now += 3600
+    tables["orders"][2] = 3
+    result = collector.analyze("shop_demo")["orders"]
+    assert result["basis"] == "since_reset"
+    assert result["read_count"] == 3
+    assert result["access_frequency"] == "rare"
+
+
+def test_ad_hoc_analyze_keeps_scheduled_snapshots():
+    tables = {"orders": [GB, 10, 1000, 0]}
+    server = FakeServer(tables)
+    clock = Clock()
+    collector = make_collector(server, clock)
+    collector.snapshot("shop_demo")
+    clock.now += 3600
+    collector.snapshot("shop_demo")
+
+    # Minutes apart: current values are returned, the ring is not touched
+    for _ in range(5):
+        clock.now += 60
+        tables["orders"][2] += 6
+        result = collector.analyze("shop_demo")["orders"]
+    assert len(collector.snapshots["shop_demo"]) == 2
+    assert result["read_count"] == 30 and result["window_days"] == round((3600 + 300) / 86400, 3)
+
+    # A full interval after the last stored snapshot it is kept
+    clock.now += 3600
+    collector.analyze("shop_demo")
+    assert len(collector.snapshots["shop_demo"]) == 3
+
+
+def test_missing_performance_schema_is_unknown():
+    server = FakeServer({"orders": [GB, 10, 0, 0]}, performance_schema=False)
+    result = make_collector(server, Clock()).analyze("shop_demo")["orders"]
+    assert result["access_frequency"] == "unknown"
+    assert result["size_gb"] == 1.0
+    assert access_frequency(0) == "never" and access_frequency(500) == "medium"
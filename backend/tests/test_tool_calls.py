@@ -0,0 +1,56 @@
+import sys
+import os
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.tool_calls import ToolCallLog, ToolCallRecord, LATENCY_BUCKETS_MS
+
+
+def test_ring_keeps_the_last_calls_with_argument_previews():
+    log = ToolCallLog(capacity=5)
+    for i in range(12):
+        log.record("list_tables", {"database": f"db{i}"}, "success", duration_ms=i)
+
+    assert log.total_calls == 12
+    assert [r.arguments["database"] for r in log.recent()] == ["db7", "db8", "db9", "db10", "db11"]
+    assert [h["arguments"]["database"] for h in log.history(limit=2)] == ["db10", "db11"]
+    assert log.history(limit=0) == []
+
+    sql = "SELECT " + ", ".join(f"c{i}" for i in range(500)) + " FROM t"
+    record = log.record("query_database", {"sql": sql, "max_rows": 10, "tables": ["a", "b"]}, "success")
+    assert record.arguments["sql"].endswith(f"... ({len(sql)} chars)") and len(record.arguments["sql"]) < 250
+    assert record.arguments["max_rows"] == 10 and record.arguments["tables"] == "['a', 'b']"
+    assert record.detail == "Executed query_database"
+    assert not hasattr(record, "__dict__") and "__slots__" in ToolCallRecord.__dict__
+
+    entry = log.history()[-1]
+    assert set(entry) == {"time", "timestamp", "tool", "arguments", "status", "detail", "duration_ms",
+                          "result_bytes", "error_class", "cached"}
+
+
+def test_stats_aggregate_every_call_per_tool():
+    log = ToolCallLog(capacity=3)
+    for duration in (0.5, 3, 3, 4, 40, 45, 48, 90, 400, 45000):
+        log.record("query_database", {"sql": "SELECT 1"}, "success", duration_ms=duration, result_bytes=100)
+    log.record("query_database", {"sql": "SELECT x"}, "error", duration_ms=2,
+               error_class="OperationalError", result_bytes=60)
+    log.record("query_database", {"sql": "SELECT SLEEP(60)"}, "timeout", duration_ms=30000, error_class="TimeoutError")
+    log.record("get_schema", {"database": "shop_demo", "table": "orders"}, "success", duration_ms=0.1, cached=True)
+
+    stats = log.stats()
+    assert stats["total_calls"] == 13 and stats["history_capacity"] == 3
+    assert list(stats["tools"]) == ["query_database", "get_schema"]
+
+    query = stats["tools"]["query_database"]
+    assert (query["calls"], query["errors"], query["timeouts"], query["cache_hits"]) == (12, 1, 1, 0)
+    assert query["error_classes"] == {"OperationalError": 1, "TimeoutError": 1}
+    assert query["max_ms"] == 45000 and query["avg_result_bytes"] == 88
+    histogram = dict(zip(LATENCY_BUCKETS_MS + ("inf",), query["latency_histogram"]))
+    assert histogram[1] == 1 and histogram[2] == 1 and histogram[5] == 3 and histogram[50] == 3
+    assert histogram[30000] == 1 and histogram["inf"] == 1
+    assert query["p50_ms"] == 50.0 and query["p95_ms"] == 30000.0 and query["p99_ms"] == 45000
+
+    assert stats["tools"]["get_schema"]["cache_hits"] == 1
+    log.clear()
+    assert log.stats()["tools"] == {} and log.recent() == []
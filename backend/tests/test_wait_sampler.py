@@ -0,0 +1,218 @@
+import asyncio
+import sys
+import os
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.wait_sampler import WaitEventSampler
+import routers.wait_events as wait_events
+
+
+class FakeServer:
+    """Cumulative performance_schema counters: key -> [count, timer_ms]"""
+
+    def __init__(self):
+        self.waits = {"wait/io/file/innodb/innodb_data_file": [1000000, 900000.0],
+                      "wait/synch/mutex/innodb/buf_pool_mutex": [50000, 2000.0]}
+        self.statements = {"shop_demo:abc": ["SELECT * FROM orders WHERE id = ?", 10, 100.0]}
+        self.table_io = {"shop_demo.orders": [500, 50.0]}
+        self.statements_enabled = True
+        self.queries = 0
+
+    def connect(self, database=None):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, server):
+        self.server = server
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.server)
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, server):
+        self.server = server
+        self.rows = []
+
+    def execute(self, sql, params=None):
+        server = self.server
+        server.queries += 1
+        if "events_waits_summary_global_by_event_name" in sql:
+            self.rows = [(k, c, t) for k, (c, t) in server.waits.items()]
+        elif "events_statements_summary_by_digest" in sql:
+            if not server.statements_enabled:
+                raise RuntimeError("Table 'events_statements_summary_by_digest' doesn't exist")
+            ranked = sorted(server.statements.items(), key=lambda item: item[1][2], reverse=True)
+            self.rows = [(k, text, c, t) for k, (text, c, t) in ranked[:params[0]]]
+        elif "table_io_waits_summary_by_table" in sql:
+            self.rows = [(k, c, t) for k, (c, t) in server.table_io.items()]
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def add(counters, key, count, ms):
+    counters[key][-2] += count
+    counters[key][-1] += ms
+
+
+def test_window_deltas_reflect_recent_activity_not_history():
+    server, clock = FakeServer(), Clock()
+    sampler = WaitEventSampler(connection_factory=server.connect, capacity=4, interval_seconds=10,
+                               digest_limit=2, clock=clock)
+    sampler.sample()
+    assert server.queries == 3
+
+    # Interval 1: mutex contention; interval 2: a new hot statement and table
+    clock.now += 10
+    add(server.waits, "wait/synch/mutex/innodb/buf_pool_mutex", 400, 300.0)
+    add(server.waits, "wait/io/file/innodb/innodb_data_file", 10, 100.0)
+    sampler.sample()
+    clock.now += 10
+    add(server.waits, "wait/synch/mutex/innodb/buf_pool_mutex", 100, 200.0)
+    server.statements["shop_demo:def"] = ["UPDATE stock SET qty = qty - ?", 20, 400.0]
+    server.table_io["shop_demo.stock"] = [40, 30.0]
+    sampler.sample()
+
+    result = sampler.analyze(window_seconds=60, top=5)
+    assert result["window"]["elapsed_seconds"] == 20 and result["window"]["snapshots"] == 3
+    # Cumulatively the data file dominates; over the window the mutex does
+    waits = result["waits"]
+    assert waits[0]["key"] == "wait/synch/mutex/innodb/buf_pool_mutex"
+    assert (waits[0]["count"], waits[0]["total_wait_ms"], waits[0]["per_sec"]) == (500, 500.0, 25.0)
+    assert waits[0]["percentage"] == 83.3
+    assert [s["key"] for s in result["statements"]] == ["shop_demo:def"]
+    assert result["statements"][0]["text"].startswith("UPDATE stock")
+    assert [t["key"] for t in result["table_io"]] == ["shop_demo.stock"]
+    assert [(t["wait_ms"], t["top_event"]) for t in result["timeline"]] == [
+        (400.0, "wait/synch/mutex/innodb/buf_pool_mutex"), (200.0, "wait/synch/mutex/innodb/buf_pool_mutex")]
+
+    # A shorter window only sees the last interval; the latest snapshot is fresh, no new sample
+    queries = server.queries
+    assert sampler.analyze(window_seconds=10)["waits"][0]["count"] == 100
+    assert server.queries == queries
+
+
+def test_ring_resets_and_unavailable_summaries():
+    server, clock = FakeServer(), Clock()
+    server.statements_enabled = False
+    sampler = WaitEventSampler(connection_factory=server.connect, capacity=3, interval_seconds=10, clock=clock)
+    for _ in range(5):
+        sampler.sample()
+        clock.now += 10
+    status = sampler.get_status()
+    assert status["snapshots"] == 3 and status["samples_taken"] == 5
+    assert status["oldest"] == 1_000_020.0 and "statements" in status["unavailable"]
+
+    # Server restart: counters start over and are used as the delta
+    server.waits = {"wait/io/file/innodb/innodb_data_file": [30, 6.0]}
+    result = sampler.analyze(window_seconds=15)
+    assert result["waits"] == [{
+        "key": "wait/io/file/innodb/innodb_data_file", "count": 30, "total_wait_ms": 6.0, "avg_wait_ms": 0.2,
+        "per_sec": 3.0, "wait_ms_per_sec": 0.6, "percentage": 100.0}]
+    assert result["statements"] == []
+
+    # Fewer than two snapshots inside the window
+    assert WaitEventSampler(connection_factory=server.connect, clock=clock).analyze(window_seconds=60) is None
+
+
+def test_keys_of_overwritten_snapshots_are_dropped():
+    server, clock = FakeServer(), Clock()
+    sampler = WaitEventSampler(connection_factory=server.connect, capacity=3, interval_seconds=10, clock=clock)
+    # A new digest every interval, each one leaving the top list again
+    for i in range(20):
+        server.statements = {f"shop_demo:d{i}": [f"SELECT {i}", 5, 50.0]}
+        add(server.waits, "wait/io/file/innodb/innodb_data_file", 10, 10.0)
+        sampler.sample()
+        clock.now += 10
+
+    statements = sampler.series["statements"]
+    assert len(statements.keys) <= 4 and set(statements.index) >= {"shop_demo:d17", "shop_demo:d18", "shop_demo:d19"}
+    assert all(statements.keys[position].startswith("shop_demo:d") for position in statements.labels)
+    assert sampler.get_status()["keys_expired"] >= 16
+
+    # Renumbered keys still give the right deltas: d19 is new since the baseline
+    result = sampler.analyze(window_seconds=30, refresh_after=60)
+    assert [(s["key"], s["text"]) for s in result["statements"]] == [("shop_demo:d19", "SELECT 19")]
+    assert result["waits"][0]["count"] == 20
+
+
+def test_digests_entering_the_top_list_are_not_counted_with_their_history():
+    server, clock = FakeServer(), Clock()
+    server.statements["shop_demo:def"] = ["SELECT * FROM stock", 20, 400.0]
+    sampler = WaitEventSampler(connection_factory=server.connect, capacity=4, interval_seconds=10,
+                               digest_limit=2, clock=clock)
+    sampler.sample()
+
+    # A digest running since server start (900 s of lifetime wait) overtakes the top 2
+    clock.now += 10
+    server.statements["shop_demo:old"] = ["SELECT * FROM audit_log", 5000, 900000.0]
+    add(server.statements, "shop_demo:abc", 3, 30.0)
+    sampler.sample()
+
+    statements = sampler.analyze(window_seconds=10, refresh_after=60)["statements"]
+    # Its baseline is unknown: the baseline top list was full, it may have been just below it
+    assert [s["key"] for s in statements] == []
+    assert "shop_demo:old" in sampler.series["statements"].index
+
+    # From the next snapshot on, it has a baseline and only its new activity counts
+    clock.now += 10
+    add(server.statements, "shop_demo:old", 10, 50.0)
+    sampler.sample()
+    statements = sampler.analyze(window_seconds=10, refresh_after=60)["statements"]
+    assert [(s["key"], s["count"], s["total_wait_ms"], s["percentage"]) for s in statements] == [
+        ("shop_demo:old", 10, 50.0, 100.0)]
+
+
+def test_analyze_endpoint_uses_the_window(monkeypatch):
+    server, clock = FakeServer(), Clock()
+    sampler = WaitEventSampler(connection_factory=server.connect, interval_seconds=10, clock=clock)
+    sampler.sample()
+    clock.now += 10
+    add(server.waits, "wait/synch/mutex/innodb/buf_pool_mutex", 400, 300.0)
+
+    monkeypatch.setattr(wait_events, "get_wait_sampler", lambda: sampler)
+    monkeypatch.setattr(wait_events, "get_db_connection", lambda: FakeConnection(server))
+    monkeypatch.setattr(wait_events, "analyze_wait_events_live", lambda conn: {
+        "wait_events": [], "lock_waits": [],
+        "summary": {"total_wait_events": 0, "total_lock_waits": 0, "total_wait_time_ms": 0, "basis": "cumulative"}})
+
+    response = asyncio.run(wait_events.analyze_wait_events(wait_events.WaitEventsRequest(window_seconds=300)))
+    assert response.mode == "live" and response.summary["basis"] == "window"
+    assert [e.event_name for e in response.top_wait_events] == ["wait/synch/mutex/innodb/buf_pool_mutex"]
+    assert response.window["elapsed_seconds"] == 10 and len(response.timeline) == 1
+
+    cumulative = asyncio.run(wait_events.analyze_wait_events(wait_events.WaitEventsRequest()))
+    assert cumulative.summary["basis"] == "cumulative" and cumulative.window is None
+
+    # Totals cover every active event, not only the top ones returned
+    clock.now += 10
+    add(server.waits, "wait/io/file/innodb/innodb_data_file", 10, 100.0)
+    top_one = asyncio.run(wait_events.analyze_wait_events(wait_events.WaitEventsRequest(window_seconds=300, top=1)))
+    assert len(top_one.top_wait_events) == 1
+    assert top_one.summary["total_wait_events"] == 2 and top_one.summary["total_wait_time_ms"] == 400.0
+
+    # A failing sampler keeps the live cumulative result instead of mock data
+    def broken(*args):
+        raise RuntimeError("sampler down")
+    monkeypatch.setattr(sampler, "analyze", broken)
+    fallback = asyncio.run(wait_events.analyze_wait_events(wait_events.WaitEventsRequest(window_seconds=300)))
+    assert fallback.mode == "live" and fallback.summary["basis"] == "cumulative"
+    assert fallback.summary["window_note"] == "Sampler unavailable, counters are cumulative"
@@ -593,6 +593,20 @@ export function UnifiedQueryAnalyzerClean({ analysisHistory, setAnalysisHistory,
                 throw new Error(data.message || "Failed to create branch")
             }
 
+            // Tables are cloned by a background job: wait until the branch is complete
+            if (data.job_id) {
+                while (true) {
+                    await new Promise(resolve => setTimeout(resolve, 1000))
+                    const jobRes = await trackedFetch(`${API_BASE}/branching/jobs/${data.job_id}`)
+                    if (!jobRes.ok) throw new Error("Failed to read branch job status")
+                    const { job } = await jobRes.json()
+                    if (job.status === "COMPLETED") break
+                    if (job.status !== "RUNNING") {
+                        throw new Error(job.error || `Branch creation ${job.status.toLowerCase()}`)
+                    }
+                }
+            }
+
             setIsCreatingBranch(false)
             setIsBranchModalOpen(false)
             setBranchCreated(true)